@@ -62,8 +62,15 @@ def create_app(config_name='default'):
             "http://127.0.0.1:8080", "http://127.0.0.1:8081"
         ]
     
-    # Use the same origins as configured for CORS
-    socketio.init_app(app, cors_allowed_origins=cors_origins)
+    # Use the same origins as configured for CORS. With a message queue,
+    # emits from any worker reach clients connected to every other worker.
+    message_queue = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if message_queue == 'local':
+        from .utils.local_pubsub_manager import LocalPubSubManager
+        socketio.init_app(app, cors_allowed_origins=cors_origins,
+                          client_manager=LocalPubSubManager(channel='talaria-chat'))
+    else:
+        socketio.init_app(app, cors_allowed_origins=cors_origins, message_queue=message_queue)
     print(f"SocketIO initialized: {socketio is not None}")
     
     CORS(app, resources={
@@ -9,6 +9,8 @@ from .coupon import Coupon
 from .promotion import Promotion
 from .affiliate import Affiliate
 from .user_referral import UserReferral
+from .stored_file import StoredFile
+from .revenue_rollup import CountryRevenueDaily
 
 __all__ = [
     'AdminUser',
@@ -29,5 +31,7 @@ __all__ = [
     'Coupon',
     'Promotion',
     'Affiliate',
-    'UserReferral'
+    'UserReferral',
+    'StoredFile',
+    'CountryRevenueDaily'
 ]
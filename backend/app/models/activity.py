@@ -23,6 +23,9 @@ class UserActivityLog(db.Model):
     session_id = Column(String(255), nullable=True, index=True)
     request_id = Column(String(255), nullable=True, index=True)
     user_agent = Column(Text, nullable=True)
+    device_type = Column(String(50), nullable=True)  # normalized from user_agent: desktop, mobile, tablet, bot
+    browser = Column(String(100), nullable=True)
+    os = Column(String(100), nullable=True)
     ip_address = Column(String(45), nullable=True, index=True)
     country_code = Column(String(3), nullable=True, index=True)
     city = Column(String(100), nullable=True)
@@ -68,6 +71,9 @@ class UserActivityLog(db.Model):
             'session_id': self.session_id,
             'request_id': self.request_id,
             'user_agent': self.user_agent,
+            'device_type': self.device_type,
+            'browser': self.browser,
+            'os': self.os,
             'ip_address': self.ip_address,
             'country_code': self.country_code,
             'city': self.city,
@@ -98,32 +98,21 @@ class Coupon(db.Model):
         return amount * (self.affiliate_commission_percent / 100)
     
     def record_referral(self):
-        """Record when someone uses this referral code (not necessarily a conversion)"""
-        self.used_count += 1
-        
-        # Track referral (person using code) if this is an affiliate code
-        if self.is_affiliate_code and self.affiliate:
-            self.affiliate.referrals += 1
-            self.affiliate.update_conversion_rate()
-            self.affiliate.calculate_performance()
-        
-        db.session.commit()
+        """Record when someone uses this referral code (not necessarily a conversion); committed by the caller"""
+        from ..services.coupon_redemption_service import coupon_redemption_service
+        redeemed = coupon_redemption_service.redeem_coupon(self.id)
+        db.session.expire(self, ['used_count', 'updated_at'])
+        return redeemed
     
     def record_conversion(self, amount):
-        """Record a successful conversion (payment) from this referral code"""
-        if not self.is_affiliate_code or not self.affiliate or not amount:
+        """Record a successful conversion (payment) from this referral code; committed by the caller"""
+        if not self.is_affiliate_code or not self.affiliate_id or not amount:
             return
         
-        # Track conversion (successful payment) and calculate commission
-        commission = self.calculate_affiliate_commission(amount)
-        self.affiliate.total_earnings += commission
-        self.affiliate.conversions += 1
-        
-        # Update performance metrics based on new values
-        self.affiliate.update_conversion_rate()
-        self.affiliate.calculate_performance()
-        
-        db.session.commit()
+        from ..services.coupon_redemption_service import coupon_redemption_service
+        coupon_redemption_service.record_conversion(self.affiliate_id, self.calculate_affiliate_commission(amount))
+        if self.affiliate is not None:
+            db.session.expire(self.affiliate, ['conversions', 'total_earnings', 'updated_at'])
     
     def record_usage(self, amount=None):
         """Legacy method - now calls record_conversion for backward compatibility"""
@@ -58,7 +58,7 @@ class FraudAlert(db.Model):
     
     # Payment information
     payment_id = Column(Integer, ForeignKey('payments.id'), nullable=True)
-    order_id = Column(Integer, ForeignKey('orders.id'), nullable=True)
+    order_id = Column(Integer, ForeignKey('orders.id'), nullable=True, index=True)
     amount = Column(Float, nullable=True)
     currency = Column(String(3), nullable=True, default='USD')
     
@@ -202,24 +202,31 @@ class FraudPattern(db.Model):
     def __repr__(self):
         return f'<FraudPattern {self.pattern_type}: {self.pattern_key}>'
     
-    def update_pattern(self, risk_score):
-        """Update pattern statistics with new occurrence"""
-        self.occurrence_count += 1
-        self.last_seen = datetime.utcnow()
-        self.total_risk_score += risk_score
+    @staticmethod
+    def risk_level_for_score(score):
+        """Map an average risk score to a severity level"""
+        if score >= 0.9:
+            return AlertSeverity.CRITICAL
+        elif score >= 0.7:
+            return AlertSeverity.HIGH
+        elif score >= 0.5:
+            return AlertSeverity.MEDIUM
+        return AlertSeverity.LOW
+    
+    def apply_occurrences(self, count, total_risk_score, last_seen=None):
+        """Fold several occurrences into the pattern statistics without committing"""
+        self.occurrence_count += count
+        self.last_seen = max(self.last_seen, last_seen) if last_seen and self.last_seen else (last_seen or datetime.utcnow())
+        self.total_risk_score += total_risk_score
         self.average_risk_score = self.total_risk_score / self.occurrence_count
         
         # Update risk level based on average score
-        if self.average_risk_score >= 0.9:
-            self.risk_level = AlertSeverity.CRITICAL
-        elif self.average_risk_score >= 0.7:
-            self.risk_level = AlertSeverity.HIGH
-        elif self.average_risk_score >= 0.5:
-            self.risk_level = AlertSeverity.MEDIUM
-        else:
-            self.risk_level = AlertSeverity.LOW
-        
+        self.risk_level = self.risk_level_for_score(self.average_risk_score)
         self.updated_at = datetime.utcnow()
+    
+    def update_pattern(self, risk_score):
+        """Update pattern statistics with new occurrence"""
+        self.apply_occurrences(1, risk_score, datetime.utcnow())
         db.session.commit()
     
     def to_dict(self):
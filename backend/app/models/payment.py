@@ -4,7 +4,7 @@ Handles orders, payments, and promotion applications
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, JSON, Index, func
 from sqlalchemy.orm import relationship
 from .. import db
 
@@ -22,7 +22,7 @@ class Order(db.Model):
     subtotal = Column(Float, nullable=False, default=0.0)
     tax_amount = Column(Float, nullable=False, default=0.0)
     discount_amount = Column(Float, nullable=False, default=0.0)
-    total_amount = Column(Float, nullable=False, default=0.0)
+    total_amount = Column(Float, nullable=False, default=0.0, index=True)
     
     # Promotion details
     promotion_code = Column(String(50), nullable=True)
@@ -36,17 +36,27 @@ class Order(db.Model):
     
     # Payment details
     payment_provider = Column(String(50), default='stripe')  # stripe, paypal, etc.
-    payment_intent_id = Column(String(255), nullable=True)
+    payment_intent_id = Column(String(255), nullable=True, index=True)
     payment_method_id = Column(String(255), nullable=True)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    paid_at = Column(DateTime, nullable=True)
+    paid_at = Column(DateTime, nullable=True, index=True)
     
     # Additional data
     order_metadata = Column(JSON, nullable=True)  # Store additional order data
     
+    __table_args__ = (
+        # Case-insensitive exact and prefix lookups for payment search; pattern ops
+        # let PostgreSQL serve LIKE 'prefix%' from the same index. Substring search
+        # uses trigram indexes created by the add_payment_search_indexes migration.
+        Index('ix_orders_customer_email_lower', func.lower(customer_email).label('customer_email_lower'),
+              postgresql_ops={'customer_email_lower': 'text_pattern_ops'}),
+        Index('ix_orders_customer_name_lower', func.lower(customer_name).label('customer_name_lower'),
+              postgresql_ops={'customer_name_lower': 'text_pattern_ops'}),
+    )
+    
     # Relationships
     user = relationship('AdminUser', backref='orders')
     promotion = relationship('Promotion', backref='orders')
@@ -147,7 +157,7 @@ class Payment(db.Model):
     __tablename__ = 'payments'
     
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
+    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False, index=True)
     
     # Payment details
     amount = Column(Float, nullable=False)
@@ -82,18 +82,11 @@ class Promotion(db.Model):
         return True
 
     def increment_usage(self, revenue_amount=0):
-        """Increment usage count and revenue"""
-        if self.usage_limit and self.usage_count >= self.usage_limit:
-            return False, "Usage limit reached"
-        
-        if self.status != 'active':
-            return False, f"Promotion is {self.status}"
-        
-        self.usage_count += 1
-        self.revenue += revenue_amount
-        self.conversions += 1
-        self.update_status()
-        return True, "Success"
+        """Increment usage count and revenue atomically; committed by the caller"""
+        from ..services.coupon_redemption_service import coupon_redemption_service
+        result = coupon_redemption_service.redeem_promotion(self.id, revenue_amount)
+        db.session.expire(self, ['usage_count', 'revenue', 'conversions', 'status', 'updated_at'])
+        return result
 
     def __repr__(self):
         return f'<Promotion {self.name}>'
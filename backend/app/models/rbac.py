@@ -2,8 +2,8 @@ from datetime import datetime
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.hybrid import hybrid_property
-from werkzeug.security import generate_password_hash, check_password_hash
 from .. import db
+from ..utils.passwords import hash_password, check_password
 import json
 
 
@@ -187,16 +187,12 @@ class AdminUser(db.Model):
     
     def set_password(self, password):
         """Set admin user password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check admin user password"""
-        # Handle both string and bytes password hashes
-        if isinstance(self.password_hash, bytes):
-            password_hash = self.password_hash.decode('utf-8')
-        else:
-            password_hash = self.password_hash
-        return check_password_hash(password_hash, password)
+        # Handles both string and bytes password hashes
+        return check_password(self.password_hash, password)
 
     def to_dict(self):
         """Convert admin user to dictionary"""
@@ -0,0 +1,30 @@
+from .. import db
+from datetime import datetime
+
+
+class CountryRevenueDaily(db.Model):
+    """Paid-order revenue per customer country per day, rebuilt from orders by the revenue analytics service"""
+
+    __tablename__ = 'country_revenue_daily'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # UTC day of Order.paid_at
+    country = db.Column(db.String(100), nullable=False)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'country', name='uq_country_revenue_daily_day_country'),
+    )
+
+    def __repr__(self):
+        return f'<CountryRevenueDaily {self.day} {self.country} {self.revenue}>'
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'country': self.country,
+            'revenue': self.revenue,
+            'orders': self.orders
+        }
@@ -0,0 +1,29 @@
+from .. import db
+from datetime import datetime
+
+
+class StoredFile(db.Model):
+    """Content-addressed blob in file storage, shared by every record that references it"""
+
+    __tablename__ = 'stored_files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # SHA-256 hex digest
+    storage_key = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    mime_type = db.Column(db.String(100), nullable=False, default='application/octet-stream')
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredFile {self.content_hash[:12]} refs={self.ref_count}>'
+
+    def to_dict(self):
+        return {
+            'content_hash': self.content_hash,
+            'size': self.size,
+            'mime_type': self.mime_type,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
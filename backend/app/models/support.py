@@ -3,8 +3,8 @@ Support System Models
 Defines models for support tickets, categories, and related functionality
 """
 
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, Enum, Index, event, inspect, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.hybrid import hybrid_property
 import enum
@@ -28,6 +28,19 @@ class TicketPriority(enum.Enum):
     URGENT = "urgent"
 
 
+# Hours a ticket may stay unresolved before it is overdue
+SLA_HOURS = {
+    TicketPriority.URGENT: 2,
+    TicketPriority.HIGH: 8,
+    TicketPriority.MEDIUM: 24,
+    TicketPriority.LOW: 72
+}
+DEFAULT_SLA_HOURS = 24
+
+# Statuses that stop the SLA clock
+SLA_STOPPED_STATUSES = (TicketStatus.RESOLVED, TicketStatus.CLOSED)
+
+
 class SupportCategory(db.Model):
     """Support ticket categories"""
     __tablename__ = 'support_categories'
@@ -63,7 +76,16 @@ class SupportCategory(db.Model):
 class SupportTicket(db.Model):
     """Support tickets"""
     __tablename__ = 'support_tickets'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Only tickets with a running SLA clock are indexed, so overdue
+        # queues and counts are range scans over open tickets
+        Index(
+            'ix_support_tickets_open_sla_due_at', 'sla_due_at',
+            postgresql_where=text('sla_due_at IS NOT NULL'),
+            sqlite_where=text('sla_due_at IS NOT NULL')
+        ),
+        {'extend_existing': True}
+    )
     
     id = Column(Integer, primary_key=True)
     ticket_number = Column(String(20), unique=True, nullable=False)
@@ -87,12 +109,19 @@ class SupportTicket(db.Model):
     resolved_at = Column(DateTime, nullable=True)
     closed_at = Column(DateTime, nullable=True)
     hidden_from_user_at = Column(DateTime, nullable=True)  # When ticket should be hidden from users (24h after closing)
+    sla_due_at = Column(DateTime, nullable=True)  # SLA deadline; NULL once resolved or closed
     
     # Rating system
     user_rating = Column(Integer, nullable=True)  # 1-5 stars from user
     user_feedback = Column(Text, nullable=True)  # User's feedback text
     rated_at = Column(DateTime, nullable=True)  # When the rating was given
     
+    # Sentiment tags from the latest customer message (see sentiment_classifier)
+    sentiment = Column(String(20), nullable=True)
+    sentiment_urgency = Column(String(20), nullable=True)
+    sentiment_confidence = Column(Float, nullable=True)
+    sentiment_tagged_at = Column(DateTime, nullable=True)
+    
     # Relationships
     user = relationship('User', backref='support_tickets')
     assigned_admin = relationship('AdminUser', backref='assigned_tickets')
@@ -103,23 +132,24 @@ class SupportTicket(db.Model):
     def __repr__(self):
         return f'<SupportTicket {self.ticket_number}>'
     
+    def compute_sla_due_at(self):
+        """SLA deadline for the current priority and status (None when resolved or closed)"""
+        if self.status in SLA_STOPPED_STATUSES:
+            return None
+        created_at = self.created_at or datetime.utcnow()
+        return created_at + timedelta(hours=SLA_HOURS.get(self.priority, DEFAULT_SLA_HOURS))
+    
     @hybrid_property
     def is_overdue(self):
         """Check if ticket is overdue based on priority"""
-        if self.status in [TicketStatus.RESOLVED, TicketStatus.CLOSED]:
+        if self.status in SLA_STOPPED_STATUSES:
             return False
-        
-        hours_since_created = (datetime.utcnow() - self.created_at).total_seconds() / 3600
-        
-        # Define SLA hours based on priority
-        sla_hours = {
-            TicketPriority.URGENT: 2,
-            TicketPriority.HIGH: 8,
-            TicketPriority.MEDIUM: 24,
-            TicketPriority.LOW: 72
-        }
-        
-        return hours_since_created > sla_hours.get(self.priority, 24)
+        due_at = self.sla_due_at or self.compute_sla_due_at()
+        return datetime.utcnow() > due_at
+    
+    @is_overdue.expression
+    def is_overdue(cls):
+        return cls.sla_due_at < datetime.utcnow()
     
     def generate_ticket_number(self):
         """Generate unique ticket number"""
@@ -158,12 +188,35 @@ class SupportTicket(db.Model):
             'user_rating': self.user_rating,
             'user_feedback': self.user_feedback,
             'rated_at': self.rated_at.isoformat() if self.rated_at else None,
+            'sla_due_at': self.sla_due_at.isoformat() if self.sla_due_at else None,
             'is_overdue': self.is_overdue,
+            'sentiment': self.sentiment,
+            'sentiment_urgency': self.sentiment_urgency,
+            'sentiment_confidence': self.sentiment_confidence,
+            'sentiment_tagged_at': self.sentiment_tagged_at.isoformat() if self.sentiment_tagged_at else None,
             'message_count': len(self.messages) if self.messages else 0,
             'attachment_count': len(self.attachments) if self.attachments else 0
         }
 
 
+@event.listens_for(SupportTicket, 'before_insert')
+def _set_sla_due_at_on_insert(mapper, connection, target):
+    if target.created_at is None:
+        target.created_at = datetime.utcnow()
+    if target.status is None:
+        target.status = TicketStatus.OPEN
+    if target.priority is None:
+        target.priority = TicketPriority.MEDIUM
+    target.sla_due_at = target.compute_sla_due_at()
+
+
+@event.listens_for(SupportTicket, 'before_update')
+def _set_sla_due_at_on_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.priority.history.has_changes() or state.attrs.status.history.has_changes():
+        target.sla_due_at = target.compute_sla_due_at()
+
+
 class SupportMessage(db.Model):
     """Messages/replies in support tickets"""
     __tablename__ = 'support_messages'
@@ -221,6 +274,7 @@ class SupportAttachment(db.Model):
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer, nullable=False)
     mime_type = Column(String(100), nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # StoredFile digest; NULL for legacy files on disk
     uploaded_by = Column(Integer, ForeignKey('users.id'), nullable=True)
     uploaded_by_admin = Column(Integer, ForeignKey('admin_users.id'), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
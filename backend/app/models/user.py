@@ -1,6 +1,6 @@
 from .. import db
+from ..utils.passwords import hash_password, check_password
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 
 
 class User(db.Model):
@@ -44,11 +44,11 @@ class User(db.Model):
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
+        return check_password(self.password_hash, password)
     
     def to_dict(self):
         """Convert user to dictionary"""
@@ -17,6 +17,8 @@ class UserProfile(db.Model):
     avatar_url = db.Column(db.String(500))
     avatar_filename = db.Column(db.String(255))
     avatar_upload_date = db.Column(db.DateTime)
+    avatar_content_hash = db.Column(db.String(64), index=True)  # StoredFile digest of the original upload
+    avatar_variants = db.Column(db.JSON)  # {'source': original digest, 'sizes': {'64': variant digest, ...}}
     
     # Personal Information
     first_name = db.Column(db.String(50))
@@ -89,6 +91,7 @@ class UserProfile(db.Model):
             'user_id': self.user_id,
             'bio': self.bio,
             'avatar_url': self.avatar_url,
+            'avatar_variants': self.avatar_variant_urls,
             'first_name': self.first_name,
             'last_name': self.last_name,
             'display_name': self.display_name,
@@ -128,6 +131,17 @@ class UserProfile(db.Model):
             'last_profile_update': self.last_profile_update.isoformat() if self.last_profile_update else None
         }
     
+    @property
+    def avatar_variant_urls(self):
+        """Resized avatar URLs by pixel size, once the avatar pipeline has built them"""
+        variants = self.avatar_variants or {}
+        if not self.avatar_content_hash or variants.get('source') != self.avatar_content_hash:
+            return {}
+        return {
+            size: f"/api/profile/avatars/{self.avatar_content_hash}/{size}"
+            for size in variants.get('sizes', {})
+        }
+    
     def update_preference(self, key: str, value):
         """Update a specific preference"""
         if not self.preferences:
@@ -2942,6 +2942,7 @@ def get_login_analytics():
         from sqlalchemy import func, extract
         from datetime import datetime, timedelta
         from ..models.activity import UserActivityLog
+        from ..utils.sql_aggregates import count_if
         
         # Get date range (last 7 days)
         end_date = datetime.utcnow()
@@ -2952,7 +2953,7 @@ def get_login_analytics():
             func.date(UserActivityLog.created_at).label('date'),
             func.count(UserActivityLog.id).label('total_logins'),
             func.count(func.distinct(UserActivityLog.user_id)).label('unique_users'),
-            func.count(func.case([(UserActivityLog.status == 'failed', 1)])).label('failed_logins')
+            count_if(UserActivityLog.status == 'failed').label('failed_logins')
         ).filter(
             UserActivityLog.action_type == 'login',
             UserActivityLog.created_at >= start_date,
@@ -2965,7 +2966,7 @@ def get_login_analytics():
         hourly_success_rate = db.session.query(
             extract('hour', UserActivityLog.created_at).label('hour'),
             func.count(UserActivityLog.id).label('total_attempts'),
-            func.count(func.case([(UserActivityLog.status == 'success', 1)])).label('successful_logins')
+            count_if(UserActivityLog.status == 'success').label('successful_logins')
         ).filter(
             UserActivityLog.action_type == 'login',
             UserActivityLog.created_at >= start_date,
@@ -2974,40 +2975,25 @@ def get_login_analytics():
             extract('hour', UserActivityLog.created_at)
         ).order_by('hour').all()
         
-        # Device analytics (based on user agent)
+        # Device analytics (normalized from the user agent when the activity was logged)
         device_analytics = db.session.query(
-            func.case([
-                (UserActivityLog.user_agent.like('%Mobile%'), 'Mobile'),
-                (UserActivityLog.user_agent.like('%Tablet%'), 'Tablet'),
-                (UserActivityLog.user_agent.like('%Windows%'), 'Windows'),
-                (UserActivityLog.user_agent.like('%Mac%'), 'Mac'),
-                (UserActivityLog.user_agent.like('%Linux%'), 'Linux'),
-                (UserActivityLog.user_agent.like('%Android%'), 'Android'),
-                (UserActivityLog.user_agent.like('%iPhone%'), 'iPhone'),
-                (UserActivityLog.user_agent.like('%iPad%'), 'iPad')
-            ], else_='Other').label('device_type'),
+            UserActivityLog.device_type,
             func.count(UserActivityLog.id).label('count')
         ).filter(
             UserActivityLog.action_type == 'login',
             UserActivityLog.created_at >= start_date,
             UserActivityLog.created_at <= end_date
-        ).group_by('device_type').order_by(func.count(UserActivityLog.id).desc()).all()
+        ).group_by(UserActivityLog.device_type).order_by(func.count(UserActivityLog.id).desc()).all()
         
         # Browser analytics
         browser_analytics = db.session.query(
-            func.case([
-                (UserActivityLog.user_agent.like('%Chrome%'), 'Chrome'),
-                (UserActivityLog.user_agent.like('%Firefox%'), 'Firefox'),
-                (UserActivityLog.user_agent.like('%Safari%'), 'Safari'),
-                (UserActivityLog.user_agent.like('%Edge%'), 'Edge'),
-                (UserActivityLog.user_agent.like('%Opera%'), 'Opera')
-            ], else_='Other').label('browser'),
+            UserActivityLog.browser,
             func.count(UserActivityLog.id).label('count')
         ).filter(
             UserActivityLog.action_type == 'login',
             UserActivityLog.created_at >= start_date,
             UserActivityLog.created_at <= end_date
-        ).group_by('browser').order_by(func.count(UserActivityLog.id).desc()).all()
+        ).group_by(UserActivityLog.browser).order_by(func.count(UserActivityLog.id).desc()).all()
         
         # Failed login patterns
         failed_login_patterns = db.session.query(
@@ -3051,9 +3037,9 @@ def get_login_analytics():
         # Format device data
         device_data = [
             {
-                'name': row.device_type,
+                'name': (row.device_type or 'unknown').title(),
                 'value': row.count,
-                'color': get_device_color(row.device_type)
+                'color': get_device_color((row.device_type or 'unknown').title())
             }
             for row in device_analytics
         ]
@@ -3061,7 +3047,7 @@ def get_login_analytics():
         # Format browser data
         browser_data = [
             {
-                'name': row.browser,
+                'name': row.browser if row.browser and row.browser != 'unknown' else 'Other',
                 'value': row.count,
                 'color': get_browser_color(row.browser)
             }
@@ -3109,14 +3095,10 @@ def get_login_analytics():
 def get_device_color(device_type):
     """Get color for device type"""
     colors = {
+        'Desktop': '#10b981',
         'Mobile': '#3b82f6',
         'Tablet': '#8b5cf6',
-        'Windows': '#10b981',
-        'Mac': '#f59e0b',
-        'Linux': '#ef4444',
-        'Android': '#06b6d4',
-        'iPhone': '#f97316',
-        'iPad': '#84cc16'
+        'Bot': '#ef4444'
     }
     return colors.get(device_type, '#6b7280')
 
@@ -3127,7 +3109,8 @@ def get_browser_color(browser):
         'Firefox': '#ff7139',
         'Safari': '#006cff',
         'Edge': '#0078d4',
-        'Opera': '#ff1b2d'
+        'Opera': '#ff1b2d',
+        'Samsung Internet': '#1428a0'
     }
     return colors.get(browser, '#6b7280')
 
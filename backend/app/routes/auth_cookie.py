@@ -16,6 +16,7 @@ from flask_jwt_extended import (
 from .. import db, bcrypt
 from ..models.user import User
 from ..models.rbac import AdminUser, AdminRole, UserRoleAssignment
+from ..services.password_verifier import password_verifier, PasswordVerifierBusy
 import re
 
 auth_cookie_bp = Blueprint('auth_cookie', __name__)
@@ -74,9 +75,15 @@ def login():
         email = data.get('email', '').strip().lower()
         password = data.get('password', '')
         
-        # Prefer admin login first
-        admin = AdminUser.query.filter_by(email=email).first()
-        if admin and admin.check_password(password):
+        # One lookup across admin and user accounts; admin accounts take precedence
+        try:
+            account_type, account = password_verifier.authenticate(email, password)
+        except PasswordVerifierBusy as busy:
+            return jsonify({'error': 'Too many login attempts right now. Please try again shortly.'}), 429, \
+                {'Retry-After': str(busy.retry_after)}
+
+        admin = account if account_type == 'admin' else None
+        if admin:
             # Check if admin user is active
             if not admin.is_active:
                 return jsonify({'error': 'Admin account is suspended. Please contact support.'}), 403
@@ -137,8 +144,8 @@ def login():
             return response
 
         # Try end-user login
-        user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        user = account if account_type == 'user' else None
+        if user:
             # Check if user is active
             if not user.is_active:
                 return jsonify({
@@ -3,7 +3,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from .. import db, bcrypt
 from ..models.user import User
-from ..models.rbac import AdminUser, AdminRole, UserRoleAssignment
+from ..models.rbac import AdminRole, UserRoleAssignment
+from ..services.password_verifier import password_verifier, PasswordVerifierBusy
 import re
 
 auth_simple_bp = Blueprint('auth_simple', __name__)
@@ -102,9 +103,15 @@ def login():
         email = data.get('email', '').strip().lower()
         password = data.get('password', '')
         
-        # Prefer admin login first
-        admin = AdminUser.query.filter_by(email=email).first()
-        if admin and admin.check_password(password):
+        # One lookup across admin and user accounts; admin accounts take precedence
+        try:
+            account_type, account = password_verifier.authenticate(email, password)
+        except PasswordVerifierBusy as busy:
+            return jsonify({'error': 'Too many login attempts right now. Please try again shortly.'}), 429, \
+                {'Retry-After': str(busy.retry_after)}
+
+        admin = account if account_type == 'admin' else None
+        if admin:
             # Check if admin user is active (not suspended)
             if not admin.is_active:
                 return jsonify({'error': 'Admin account is suspended. Please contact support.'}), 403
@@ -164,8 +171,8 @@ def login():
             }), 200
 
         # Try end-user login
-        user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        user = account if account_type == 'user' else None
+        if user:
             # Check if user is active (not suspended)
             if not user.is_active:
                 return jsonify({
@@ -14,6 +14,7 @@ from ..models.user import User
 from ..models.rbac import AdminUser
 from ..services.security_service import SecurityService
 from ..services.audit_service import AuditService
+from ..services.notification_counters import notification_counters
 from ..middleware.rbac_middleware import admin_required
 from ..services.rate_limit_service import rate_limit_admin
 
@@ -204,6 +205,7 @@ def create_notification():
         
         db.session.add(notification)
         db.session.commit()
+        notification_counters.notifications_created([notification.user_id])
         
         # Log the action
         audit_service.log_admin_action(
@@ -244,6 +246,7 @@ def retry_notification(notification_id):
         notification.failed_at = None
         
         db.session.commit()
+        notification_counters.notifications_created([notification.user_id])
         
         # Log the action
         admin_user_id = get_jwt_identity()
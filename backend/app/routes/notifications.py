@@ -7,7 +7,6 @@ from functools import wraps
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import and_, or_, desc, asc
-from datetime import datetime, timedelta
 import logging
 
 from ..models.communication import (
@@ -17,6 +16,7 @@ from ..models.communication import (
 from ..models.rbac import AdminUser
 from ..models.user import User
 from ..services.ticket_notification_service import ticket_notification_service
+from ..services.notification_counters import notification_counters
 from .. import db
 
 logger = logging.getLogger(__name__)
@@ -93,11 +93,8 @@ def get_unread_count():
     try:
         current_user_id = get_jwt_identity()
         
-        # Count unread notifications
-        unread_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            status=NotificationStatus.PENDING
-        ).count()
+        # Cached counter, maintained on insert and mark-read
+        unread_count = notification_counters.get_unread_count(current_user_id)
         
         return jsonify({
             'success': True,
@@ -306,6 +303,7 @@ def test_notification():
         
         db.session.add(notification)
         db.session.commit()
+        notification_counters.notifications_created([notification.user_id])
         
         return jsonify({
             'success': True,
@@ -342,6 +340,7 @@ def clear_notifications():
         # Delete notifications
         deleted_count = query.delete()
         db.session.commit()
+        notification_counters.invalidate(current_user_id)
         
         return jsonify({
             'success': True,
@@ -362,89 +361,9 @@ def get_notification_stats():
     try:
         current_user_id = get_jwt_identity()
         
-        # Get counts by type
-        email_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            type=NotificationType.EMAIL
-        ).count()
-        
-        sms_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            type=NotificationType.SMS
-        ).count()
-        
-        push_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            type=NotificationType.PUSH
-        ).count()
-        
-        in_app_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            type=NotificationType.IN_APP
-        ).count()
-        
-        # Get counts by status
-        pending_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            status=NotificationStatus.PENDING
-        ).count()
-        
-        delivered_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            status=NotificationStatus.DELIVERED
-        ).count()
-        
-        failed_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            status=NotificationStatus.FAILED
-        ).count()
-        
-        # Get counts by priority
-        high_priority_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            priority=NotificationPriority.HIGH
-        ).count()
-        
-        normal_priority_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            priority=NotificationPriority.NORMAL
-        ).count()
-        
-        low_priority_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            priority=NotificationPriority.LOW
-        ).count()
-        
-        # Get recent activity (last 7 days)
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_count = Notification.query.filter(
-            Notification.user_id == current_user_id,
-            Notification.created_at >= week_ago
-        ).count()
-        
         return jsonify({
             'success': True,
-            'stats': {
-                'by_type': {
-                    'email': email_count,
-                    'sms': sms_count,
-                    'push': push_count,
-                    'in_app': in_app_count
-                },
-                'by_status': {
-                    'pending': pending_count,
-                    'delivered': delivered_count,
-                    'failed': failed_count
-                },
-                'by_priority': {
-                    'high': high_priority_count,
-                    'normal': normal_priority_count,
-                    'low': low_priority_count
-                },
-                'recent_activity': {
-                    'last_7_days': recent_count
-                }
-            }
+            'stats': notification_counters.get_stats(current_user_id)
         }), 200
         
     except Exception as e:
@@ -13,9 +13,17 @@ from ..services.payment_audit_service import payment_audit_service
 from ..services.input_sanitization_service import input_sanitization_service
 from ..services.request_signing_service import request_signing_service
 from ..services.pci_compliance_service import pci_compliance_service
+from ..services.pci_log_scanner import pci_log_scanner
+from ..middleware.rbac_middleware import require_permission
 from ..services.fraud_detection_service import fraud_detection_service
+from ..services.fraud_batch_scoring_service import fraud_batch_scoring_service
 from ..services.webhook_security_service import webhook_security_service
 from ..services.payment_monitoring_service import payment_monitoring_service
+from ..services.payment_activation_service import payment_activation_service, PaymentActivationError
+from ..services.coupon_redemption_service import coupon_redemption_service
+from ..services.revenue_analytics_service import revenue_analytics_service
+from ..services.payment_metrics_service import payment_metrics_service
+from ..services.payment_search_service import payment_search_service, PaymentSearchError
 from ..models.payment import Order, Payment
 from ..models.promotion import Promotion
 from config.payment_config import validate_payment_config
@@ -218,8 +226,11 @@ def create_order():
                 logger.warning(f"Referral code is not an affiliate code: {referral_code}")
                 return jsonify({'error': 'Invalid referral code'}), 400
             
-            # Record that someone used this referral code (referral tracking)
-            coupon.record_referral()
+            # Record that someone used this referral code (referral tracking); the
+            # counter is claimed atomically and commits with the order below
+            if not coupon_redemption_service.redeem_coupon(coupon.id):
+                logger.warning(f"Referral code usage limit reached: {referral_code}")
+                return jsonify({'error': 'Referral code is not valid or has expired'}), 400
             
             # Store referral code in order metadata for later processing
             if 'metadata' not in data:
@@ -585,7 +596,6 @@ def get_orders():
 def payment_success():
     """Handle successful payment and update user subscription with enhanced security"""
     try:
-        from datetime import datetime, timedelta
         from flask_jwt_extended import get_jwt_identity
         
         data = request.get_json()
@@ -622,12 +632,6 @@ def payment_success():
             payment_intent = data.get('data', {}).get('object', {})
             payment_intent_id = payment_intent.get('id')
             customer_email = payment_intent.get('receipt_email') or payment_intent.get('customer_email')
-            # Try to find order by payment intent ID
-            if payment_intent_id:
-                from ..models.payment import Order
-                order = Order.query.filter_by(payment_intent_id=payment_intent_id).first()
-                if order:
-                    order_id = order.id
         
         logger.info(f"Processing payment success - Order ID: {order_id}, Payment Intent: {payment_intent_id[:8] if payment_intent_id else 'N/A'}...")
         
@@ -650,566 +654,43 @@ def payment_success():
             # No JWT token - this is OK for payment success
             current_user_id = None
         
-        # Find the order
-        from ..models.payment import Order, Payment
-        order = None
-        if order_id:
-            order = Order.query.get(order_id)
-            logger.debug(f"Looking for order by ID: {order_id}")
-        elif payment_intent_id:
-            order = Order.query.filter_by(payment_intent_id=payment_intent_id).first()
-            logger.debug(f"Looking for order by payment_intent_id: {payment_intent_id[:8]}...")
-        
-        if not order:
-            logger.error(f"Order not found - order_id: {order_id}, payment_intent_id: {payment_intent_id[:8] if payment_intent_id else 'N/A'}...")
-            
-            # Try to find user by email and activate them anyway
-            if customer_email:
-                logger.info(f"Trying to find user by email for activation")
-                user = User.query.filter_by(email=customer_email).first()
-                if user:
-                    logger.info(f"Found user by email, activating them directly")
-                    user.is_active = True
-                    user.subscription_status = 'active'
-                    user.subscription_plan = 'premium'
-                    user.is_admin = False
-                    user.updated_at = datetime.utcnow()
-                    db.session.commit()
-                    
-                    return jsonify({
-                        'success': True,
-                        'message': 'User activated directly (order not found)',
-                        'subscription_updated': True,
-                        'user_activated': True
-                    }), 200
-            
-            return jsonify({'error': 'Order not found'}), 404
-        
-        logger.info(f"Found order: {order.order_number} for {order.customer_email}")
-        
-        # Update order status
-        order.status = 'paid'
-        order.payment_status = 'paid'
-        order.paid_at = datetime.utcnow()
-        order.payment_intent_id = payment_intent_id
-        
-        logger.debug("Updated order status to paid")
-        
-        # Create payment record
-        payment = Payment(
-            order_id=order.id,
-            amount=order.total_amount,
-            currency='usd',
-            payment_method='card',
-            provider='stripe',
-            provider_payment_id=payment_intent_id,
-            provider_transaction_id=f"txn_{order.order_number}_{int(datetime.utcnow().timestamp())}",
-            status='succeeded',
-            processed_at=datetime.utcnow()
-        )
-        
-        db.session.add(payment)
-        logger.debug(f"Created payment record: {payment.id}")
-        
-        # Handle referral code usage tracking for affiliate commissions
-        referral_code_processed = False
         try:
-            # Check if there's a referral code in the order
-            referral_code = None
-            
-            # Check order metadata for referral code
-            if order.order_metadata and 'referral_code' in order.order_metadata:
-                referral_code = order.order_metadata['referral_code']
-                logger.info(f"Found referral code in order metadata: {referral_code}")
-            
-            # Also check promotion_code field (legacy)
-            elif order.promotion_code:
-                # Check if this promotion code is actually an affiliate referral code
-                from ..models.coupon import Coupon
-                coupon = Coupon.query.filter_by(code=order.promotion_code.upper()).first()
-                if coupon and coupon.is_affiliate_code:
-                    referral_code = order.promotion_code
-                    logger.info(f"Found affiliate referral code in promotion_code field: {referral_code}")
-            
-            if referral_code:
-                from ..models.coupon import Coupon
-                coupon = Coupon.query.filter_by(code=referral_code.upper()).first()
-                
-                if coupon and coupon.is_affiliate_code and coupon.is_active:
-                    logger.info(f"Processing affiliate referral code: {referral_code}")
-                    
-                    # Calculate commission amount before recording conversion
-                    commission_amount = coupon.calculate_affiliate_commission(order.total_amount)
-                    
-                    # Record the successful conversion (payment) and update affiliate stats
-                    coupon.record_conversion(order.total_amount)
-                    referral_code_processed = True
-                    
-                    logger.info(f"Affiliate commission processed: ${commission_amount:.2f} for affiliate {coupon.affiliate.name}")
-                    
-                    # Store commission info in order metadata
-                    if not order.order_metadata:
-                        order.order_metadata = {}
-                    order.order_metadata.update({
-                        'affiliate_commission': commission_amount,
-                        'affiliate_id': coupon.affiliate_id,
-                        'affiliate_name': coupon.affiliate.name,
-                        'commission_processed_at': datetime.utcnow().isoformat()
-                    })
-                    
-                else:
-                    logger.warning(f"Referral code {referral_code} not found or inactive")
-        except Exception as e:
-            logger.error(f"Error processing referral code: {str(e)}")
-            # Don't fail the payment process for referral code issues
-        
-        # Update user subscription - prioritize email lookup for inactive users
-        subscription_updated = False
-        from ..models.user import User
-        
-        user = None
-        
-        logger.info("Starting user lookup process for payment success")
-        if not is_production():
-            logger.debug(f"JWT user_id: {current_user_id}")
-            logger.debug(f"Customer email: {customer_email}")
-            logger.debug(f"Order customer_name: {order.customer_name}")
-        
-        # Validate required data
-        if not customer_email:
-            logger.warning("No customer email provided in payment success")
-            return jsonify({'error': 'Customer email is required'}), 400
-        
-        # Strategy 1: Email lookup (most reliable for new users)
-        if customer_email:
-            user = User.query.filter_by(email=customer_email).first()
-            if not is_production():
-                logger.debug(f"Email lookup - User found: {user.email if user else 'None'} (Email: {customer_email})")
-            if user and not is_production():
-                logger.debug(f"User details - is_active: {user.is_active}, subscription_status: {user.subscription_status}, is_admin: {user.is_admin}")
-        
-        # Strategy 2: If we have a JWT token, try to get user by ID (for existing users)
-        if not user and current_user_id:
-            user = User.query.get(current_user_id)
-            if not is_production():
-                logger.debug(f"JWT lookup - User found: {user.email if user else 'None'} (ID: {current_user_id})")
-        
-        # Strategy 3: Try to find by order's user_id if available
-        if not user and hasattr(order, 'user_id') and order.user_id:
-            user = User.query.get(order.user_id)
-            if not is_production():
-                logger.debug(f"Order user_id lookup - User found: {user.email if user else 'None'} (Order user_id: {order.user_id})")
-            if user and not is_production():
-                logger.debug(f"User details - is_active: {user.is_active}, subscription_status: {user.subscription_status}, is_admin: {user.is_admin}")
-        
-        # Strategy 4: Try to find by customer name (fallback)
-        if not user and order.customer_name:
-            # Try exact username match first
-            user = User.query.filter_by(username=order.customer_name).first()
-            if user and not is_production():
-                logger.debug(f"Username lookup - User found: {user.email} (Username: {order.customer_name})")
-            else:
-                # Try to find by first_name or last_name
-                user = User.query.filter(
-                    (User.first_name == order.customer_name) | 
-                    (User.last_name == order.customer_name)
-                ).first()
-                if user and not is_production():
-                    logger.debug(f"Name lookup - User found: {user.email} (Name: {order.customer_name})")
-        
-        if not user:
-            logger.error("No user found with any lookup method")
-            if not is_production():
-                logger.debug(f"Customer email: {customer_email}")
-                logger.debug(f"Order customer_name: {order.customer_name}")
-                logger.debug(f"JWT user_id: {current_user_id}")
-                logger.debug(f"Order user_id: {getattr(order, 'user_id', 'Not available')}")
-            
-            # List all users for debugging (development only)
-            if not is_production():
-                all_users = User.query.all()
-                logger.debug(f"All users in database: {[(u.id, u.email, u.username, u.is_active) for u in all_users]}")
-            
-            return jsonify({
-                'error': f'No user found with email {customer_email}. Please contact support.',
-                'subscription_updated': False
-            }), 404
+            result = payment_activation_service.activate(
+                order_id=order_id,
+                payment_intent_id=payment_intent_id,
+                customer_email=customer_email,
+                current_user_id=current_user_id
+            )
+        except PaymentActivationError as e:
+            return jsonify({'error': e.message, 'subscription_updated': False}), e.status_code
         
-            if not is_production():
-                logger.debug(f"JWT user ID: {current_user_id}")
-            
-            # Log this as a critical error
-            logger.error(f"Payment success called but no user found - email: {customer_email}, order_id: {order_id}")
-            
+        if not result['order_found']:
             return jsonify({
-                'error': 'User not found for payment. Please contact support.',
-                'subscription_updated': False
-            }), 404
-        
-        if user:
-            # Update user subscription and activate account
-            print(f"🔄 Updating user subscription for: {user.email} (ID: {user.id})")
-            print(f"🔄 Before update - is_active: {user.is_active}, subscription_status: {user.subscription_status}, is_admin: {user.is_admin}")
-            
-            # Validate user data before updating
-            if not user.email:
-                logger.error("User has no email address")
-                return jsonify({'error': 'User email is missing'}), 400
-            
-            # Determine subscription plan from order items
-            subscription_plan = 'premium'  # default
-            if order.items:
-                first_item = order.items[0]
-                if hasattr(first_item, 'product_name'):
-                    plan_name = first_item.product_name.lower()
-                    if 'basic' in plan_name:
-                        subscription_plan = 'basic'
-                    elif 'premium' in plan_name:
-                        subscription_plan = 'premium'
-                    elif 'pro' in plan_name:
-                        subscription_plan = 'pro'
-                    elif 'enterprise' in plan_name:
-                        subscription_plan = 'enterprise'
-            
-            # Update user as a regular user (not admin) with active subscription
-            print(f"🔄 Updating user fields...")
-            try:
-                user.is_active = True
-                user.subscription_status = 'active'  # CRITICAL: Must be 'active' not 'premium' or other values
-                user.subscription_plan = subscription_plan
-                user.is_admin = False  # Ensure user is not admin (regular user)
-                user.updated_at = datetime.utcnow()
-                subscription_updated = True
-                logger.info("User fields updated successfully")
-            except Exception as e:
-                log_error_safely("Error updating user fields", e, include_details=False)
-                return jsonify({'error': 'Failed to update user subscription'}), 500
-            
-            # Create UserSubscription record
-            print(f"🔄 Creating UserSubscription record...")
-            try:
-                from ..models.subscription import SubscriptionPlan, BillingCycle
-                from ..models.user_subscription import UserSubscription, SubscriptionStatus
-                from datetime import timedelta
-                
-                logger.debug("Imported subscription models successfully")
-                
-                # Find subscription plan
-                plan = None
-                if not is_production():
-                    logger.debug(f"Looking for subscription plan: {subscription_plan}")
-                
-                if subscription_plan == 'basic':
-                    plan = SubscriptionPlan.query.filter_by(name='Basic').first()
-                elif subscription_plan == 'premium' or subscription_plan == 'pro':
-                    plan = SubscriptionPlan.query.filter_by(name='Professional').first()
-                elif subscription_plan == 'enterprise':
-                    plan = SubscriptionPlan.query.filter_by(name='Enterprise').first()
-                
-                if not plan:
-                    plan = SubscriptionPlan.query.filter_by(name='Basic').first()
-                    if not is_production():
-                        logger.debug("Using fallback Basic plan")
-                
-                if plan:
-                    logger.info(f"Found subscription plan: {plan.name} (ID: {plan.id})")
-                else:
-                    logger.warning("No subscription plan found, skipping UserSubscription creation")
-                
-                if plan:
-                    # Check if user already has an active subscription
-                    existing_subscription = UserSubscription.query.filter_by(
-                        user_id=user.id,
-                        status=SubscriptionStatus.ACTIVE
-                    ).first()
-                    
-                    if not existing_subscription:
-                        try:
-                            subscription = UserSubscription(
-                                user_id=user.id,
-                                plan_id=plan.id,
-                                subscription_id=f"payment_{order.id}",
-                                plan_name=plan.name,
-                                plan_type=plan.billing_cycle.value,
-                                status=SubscriptionStatus.ACTIVE,
-                                amount=order.total_amount,
-                                currency='USD',
-                                billing_cycle=plan.billing_cycle.value.upper(),
-                                unit_amount=order.total_amount,
-                                total_amount=order.total_amount,
-                                start_date=datetime.utcnow(),
-                                end_date=datetime.utcnow() + timedelta(days=30),
-                                payment_method='card',
-                                payment_provider='stripe',
-                                payment_provider_id=payment_intent_id,
-                                admin_notes=f'Created from payment success for order {order.order_number}'
-                            )
-                            
-                            db.session.add(subscription)
-                            logger.info(f"Created UserSubscription {subscription.id} for user {user.email}")
-                        except Exception as e:
-                            log_error_safely("Error creating UserSubscription", e, include_details=False)
-                            # Don't fail the payment process for this
-                    else:
-                        logger.info(f"User {user.email} already has active subscription {existing_subscription.id}")
-                else:
-                    logger.warning(f"No subscription plan found for {subscription_plan}")
-                    
-            except Exception as e:
-                log_error_safely("Database commit failed", e, include_details=False)
-                # Don't fail the payment process for this
-            
-            print(f"🔄 User fields updated:")
-            print(f"   is_active: {user.is_active}")
-            print(f"   subscription_status: {user.subscription_status}")
-            print(f"   subscription_plan: {user.subscription_plan}")
-            print(f"   is_admin: {user.is_admin}")
-            
-            logger.info(f"Updated subscription for user: {user.email} (ID: {user.id})")
-            if not is_production():
-                logger.debug(f"After update - is_active: {user.is_active}, subscription_status: {user.subscription_status}, subscription_plan: {user.subscription_plan}, is_admin: {user.is_admin}")
-            
-            # Verify the changes are applied
-            try:
-                db.session.flush()
-                logger.info("Database flush completed - changes should be visible")
-                
-                # Double-check the user state after flush
-                refreshed_user = User.query.get(user.id)
-                if not is_production():
-                    logger.debug(f"User state after flush - is_active: {refreshed_user.is_active}, subscription_status: {refreshed_user.subscription_status}, is_admin: {refreshed_user.is_admin}")
-            except Exception as e:
-                log_error_safely("Error during database flush", e, include_details=False)
-                return jsonify({'error': 'Failed to save user changes'}), 500
-            
-            # Create a UserSubscription record for detailed tracking
-            try:
-                from ..models.user_subscription import UserSubscription, BillingCycle, SubscriptionStatus
-                from ..models.subscription import SubscriptionPlan
-                
-                # Simple billing cycle mapping function (inline to avoid import issues)
-                def map_plan_billing_cycle_to_user(plan_name):
-                    """Map plan name to billing cycle for user display"""
-                    billing_cycles = {
-                        'basic': 'MONTHLY',
-                        'premium': 'MONTHLY', 
-                        'pro': 'MONTHLY',
-                        'enterprise': 'MONTHLY',
-                        'annual_basic': 'ANNUALLY',
-                        'annual_premium': 'ANNUALLY',
-                        'annual_pro': 'ANNUALLY',
-                        'annual_enterprise': 'ANNUALLY'
-                    }
-                    return billing_cycles.get(plan_name.lower(), 'MONTHLY')
-                
-                # Find the correct subscription plan based on order items
-                plan = None
-                
-                # First try to get plan by ID if available in order metadata
-                plan_id = None
-                if order.order_metadata and 'plan_id' in order.order_metadata:
-                    plan_id = order.order_metadata['plan_id']
-                    if not is_production():
-                        logger.debug(f"Found plan_id in order metadata: {plan_id}")
-                
-                if plan_id:
-                    plan = SubscriptionPlan.query.get(plan_id)
-                    if plan:
-                        logger.info(f"Found plan by order metadata plan_id: {plan.name} (ID: {plan.id})")
-                
-                # If no plan found by ID, try to find by items
-                if not plan:
-                    for item in order.items:
-                        # Try to find plan by name - more flexible matching
-                        plan_name = item.product_name.lower()
-                        
-                        if not is_production():
-                            logger.debug(f"Looking for plan with product name: {item.product_name}")
-                        
-                        # Extract the actual plan name by removing "Subscription" suffix
-                        clean_plan_name = plan_name.replace(' subscription', '').replace(' plan', '').strip()
-                        if not is_production():
-                            logger.debug(f"Cleaned plan name: '{clean_plan_name}'")
-                        
-                        # First try exact name match with cleaned name
-                        plan = SubscriptionPlan.query.filter(
-                            SubscriptionPlan.name.ilike(f"%{clean_plan_name}%")
-                        ).first()
-                        
-                        if plan:
-                            logger.info(f"Found plan by exact match: {plan.name} (ID: {plan.id})")
-                            break
-                        
-                        # If no exact match, try common variations using cleaned name
-                        if 'basic' in clean_plan_name:
-                            plan = SubscriptionPlan.query.filter_by(name='Basic').first()
-                            if plan:
-                                logger.info(f"Found plan by basic variation: {plan.name} (ID: {plan.id})")
-                                break
-                        elif 'professional' in clean_plan_name or 'pro' in clean_plan_name:
-                            plan = SubscriptionPlan.query.filter_by(name='Professional').first()
-                            if plan:
-                                logger.info(f"Found plan by professional variation: {plan.name} (ID: {plan.id})")
-                                break
-                        elif 'enterprise' in clean_plan_name:
-                            plan = SubscriptionPlan.query.filter_by(name='Enterprise').first()
-                            if plan:
-                                logger.info(f"Found plan by enterprise variation: {plan.name} (ID: {plan.id})")
-                                break
-                        elif 'premium' in clean_plan_name:
-                            plan = SubscriptionPlan.query.filter_by(name='Premium').first()
-                            if plan:
-                                logger.info(f"Found plan by premium variation: {plan.name} (ID: {plan.id})")
-                                break
-                        
-                        # If still no match, try to find any plan with similar name
-                        if not plan:
-                            all_plans = SubscriptionPlan.query.filter_by(is_active=True).all()
-                            for p in all_plans:
-                                if any(word in clean_plan_name for word in p.name.lower().split()):
-                                    plan = p
-                                    logger.info(f"Found plan by fuzzy match: {plan.name} (ID: {plan.id})")
-                                    break
-                        
-                        if plan:
-                            logger.info(f"Found plan: {plan.name} (ID: {plan.id}) for product: {item.product_name}")
-                            break
-                
-                # If no plan found, use Basic as default
-                if not plan:
-                    plan = SubscriptionPlan.query.filter_by(name='Basic', is_active=True).first()
-                    logger.warning("No specific plan found, using Basic plan as default")
-                
-                # If still no plan, return error - plans should be pre-configured
-                if not plan:
-                    logger.error("No subscription plans configured in database")
-                    return jsonify({'error': 'No subscription plans available. Please contact support.'}), 500
-                
-                if plan:
-                    logger.info(f"Found plan: {plan.name} (ID: {plan.id})")
-                    
-                    # Create subscription record with correct plan_id
-                    new_subscription = UserSubscription(
-                        user_id=user.id,
-                        plan_id=plan.id,  # Link to the actual plan
-                        subscription_id=f"sub_{order.order_number}",
-                        plan_name=plan.name,
-                        plan_type=plan.billing_cycle.value,
-                        status=SubscriptionStatus.ACTIVE,
-                        amount=order.total_amount,
-                        currency='USD',
-                        billing_cycle=map_plan_billing_cycle_to_user(plan.billing_cycle),
-                        unit_amount=order.total_amount,
-                        total_amount=order.total_amount,
-                        start_date=datetime.utcnow(),
-                        end_date=datetime.utcnow() + timedelta(days=30),  # 30 days subscription
-                        payment_method='card',
-                        payment_provider='stripe',
-                        payment_provider_id=payment_intent_id,
-                        admin_notes=f'Payment success - Order {order.order_number}'
-                    )
-                    
-                    db.session.add(new_subscription)
-                    logger.info(f"Created UserSubscription record for user {user.id} with plan {plan.name}")
-                else:
-                    logger.error("No subscription plan found, cannot create UserSubscription")
-                
-            except Exception as e:
-                logger.warning(f"Could not create UserSubscription record: {e}")
-                # Continue without subscription record - user is still activated
-            
-            # Force a database flush to ensure changes are visible
-            db.session.flush()
-        else:
-            logger.error("Could not find user for payment processing")
-            if not is_production():
-                logger.debug(f"JWT ID: {current_user_id}")
-                logger.debug(f"Customer email: {customer_email}")
-                logger.debug(f"Order customer_name: {order.customer_name}")
-                logger.debug(f"Order user_id: {getattr(order, 'user_id', 'Not available')}")
-                
-                # List all users for debugging (development only)
-                all_users = User.query.all()
-                logger.debug(f"All users in database: {[(u.id, u.email, u.is_active) for u in all_users]}")
-        
-        # Commit the transaction with retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                db.session.commit()
-                logger.info(f"Database transaction committed successfully (attempt {attempt + 1})")
-                break
-            except Exception as e:
-                log_error_safely(f"Database commit failed (attempt {attempt + 1})", e, include_details=False)
-                if attempt < max_retries - 1:
-                    db.session.rollback()
-                    # Wait a bit before retry
-                    import time
-                    time.sleep(0.5)
-                    continue
-                else:
-                    db.session.rollback()
-                    return jsonify({
-                        'error': 'Failed to save payment information. Please contact support.',
-                        'subscription_updated': False
-                    }), 500
-        
-        # Final verification - check if user is properly saved
-        if subscription_updated and user:
-            try:
-                # Force a fresh query from database to verify changes
-                db.session.expire(user)  # Expire the object to force fresh query
-                final_user = User.query.get(user.id)
-                if not is_production():
-                    logger.debug(f"Final verification - User {final_user.email}:")
-                    logger.debug(f"   is_active: {final_user.is_active}")
-                print(f"   subscription_status: {final_user.subscription_status}")
-                print(f"   subscription_plan: {final_user.subscription_plan}")
-                print(f"   is_admin: {final_user.is_admin}")
-                
-                if (final_user.is_active and 
-                    final_user.subscription_status == 'active' and 
-                    final_user.subscription_plan and 
-                    not final_user.is_admin):
-                    print("🎉 User is properly saved as regular user with active subscription!")
-                    print("🎉 Frontend should now recognize this user as having an active subscription!")
-                else:
-                    logger.warning("User is not properly configured - check database")
-                    if not is_production():
-                        logger.debug(f"   Expected: is_active=True, subscription_status='active', is_admin=False")
-                    print(f"   Actual: is_active={final_user.is_active}, subscription_status='{final_user.subscription_status}', is_admin={final_user.is_admin}")
-                    
-                    # If verification fails, return an error
-                    return jsonify({
-                        'error': 'User activation failed. Please contact support.',
-                        'subscription_updated': False
-                    }), 500
-            except Exception as e:
-                log_error_safely("Error during final verification", e, include_details=False)
-                return jsonify({
-                    'error': 'User activation verification failed. Please contact support.',
-                    'subscription_updated': False
-                }), 500
-        
-        logger.info(f"Payment success endpoint completed successfully - Order: {order.order_number}, User: {user.email if user else 'N/A'}")
+                'success': True,
+                'message': 'User activated directly (order not found)',
+                'subscription_updated': True,
+                'user_activated': True
+            }), 200
         
         response_data = {
             'success': True,
             'message': 'Payment processed successfully',
-            'order': order.to_dict(),
-            'payment': payment.to_dict(),
-            'subscription_updated': subscription_updated,
-            'user_activated': subscription_updated,
-            'referral_code_processed': referral_code_processed
+            'order': result['order'],
+            'payment': result['payment'],
+            'subscription_updated': True,
+            'user_activated': True,
+            'referral_code_processed': result['referral_code_processed'],
+            'already_processed': result['already_processed']
         }
         
         # Add affiliate commission info if processed
-        if referral_code_processed and order.order_metadata:
+        commission = result['affiliate_commission']
+        if commission:
             response_data['affiliate_commission'] = {
-                'amount': order.order_metadata.get('affiliate_commission', 0),
-                'affiliate_id': order.order_metadata.get('affiliate_id'),
-                'affiliate_name': order.order_metadata.get('affiliate_name'),
-                'processed_at': order.order_metadata.get('commission_processed_at')
+                'amount': commission['affiliate_commission'],
+                'affiliate_id': commission['affiliate_id'],
+                'affiliate_name': commission['affiliate_name'],
+                'processed_at': commission['commission_processed_at']
             }
         
         return jsonify(response_data), 200
@@ -1219,8 +700,6 @@ def payment_success():
         log_error_safely("Payment success error", e, include_details=False)
         return jsonify({'error': 'Payment processing failed'}), 500
 
-
-
 @payments_bp.route('/invoice/<order_id>', methods=['GET'])
 def get_invoice(order_id):
     """Get invoice/receipt for an order"""
@@ -1356,90 +835,41 @@ def activate_user():
 def get_payment_stats():
     """Get payment statistics for admin dashboard"""
     try:
-        # Get total counts
-        total_orders = Order.query.count()
-        pending_orders = Order.query.filter_by(status='pending').count()
-        paid_orders = Order.query.filter_by(status='paid').count()
-        failed_orders = Order.query.filter_by(status='failed').count()
-        refunded_orders = Order.query.filter_by(status='refunded').count()
-        
-        # Calculate total revenue
-        total_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.status == 'paid',
-            Order.payment_status == 'paid'
-        ).scalar() or 0
-        
-        # Calculate today's revenue
-        from datetime import date
-        today = date.today()
-        today_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.status == 'paid',
-            Order.payment_status == 'paid',
-            db.func.date(Order.paid_at) == today
-        ).scalar() or 0
-        
-        stats = {
-            'total': total_orders,
-            'pending': pending_orders,
-            'paid': paid_orders,
-            'failed': failed_orders,
-            'refunded': refunded_orders,
-            'totalRevenue': float(total_revenue),
-            'todayRevenue': float(today_revenue)
-        }
-        
-        return jsonify(stats), 200
+        return jsonify(payment_metrics_service.get_payment_stats()), 200
         
     except Exception as e:
         logger.error(f"Error fetching payment stats: {str(e)}")
         return jsonify({'error': 'Failed to fetch payment statistics'}), 500
 
+@payments_bp.route('/dashboard-stats', methods=['GET'])
+@jwt_required()
+def get_dashboard_stats():
+    """Get payment and invoice statistics for the admin dashboard in one call"""
+    try:
+        return jsonify(payment_metrics_service.get_dashboard_stats()), 200
+        
+    except Exception as e:
+        logger.error(f"Error fetching dashboard stats: {str(e)}")
+        return jsonify({'error': 'Failed to fetch dashboard statistics'}), 500
+
 @payments_bp.route('/user-countries', methods=['GET'])
 @jwt_required()
 def get_user_countries():
-    """Get user country distribution for analytics"""
+    """Get user country distribution and revenue per country for analytics"""
     try:
-        from ..models.user import User
-        
-        # Get all users with their countries
-        users = User.query.filter(User.country.isnot(None), User.country != '').all()
-        
-        # Count users by country
-        country_stats = {}
-        for user in users:
-            country = user.country
-            if country not in country_stats:
-                country_stats[country] = {'users': 0, 'revenue': 0}
-            country_stats[country]['users'] += 1
-        
-        # Get revenue by country from paid orders
-        paid_orders = Order.query.filter_by(status='paid', payment_status='paid').all()
-        for order in paid_orders:
-            if order.customer_email:
-                # Find user by email
-                user = User.query.filter_by(email=order.customer_email).first()
-                if user and user.country:
-                    country = user.country
-                    if country not in country_stats:
-                        country_stats[country] = {'users': 0, 'revenue': 0}
-                    country_stats[country]['revenue'] += order.total_amount or 0
-        
-        # Convert to list format
-        countries = []
-        for country, stats in country_stats.items():
-            countries.append({
-                'country': country,
-                'users': stats['users'],
-                'revenue': stats['revenue']
-            })
+        try:
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else None
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else None
+        except ValueError:
+            return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
         
-        # Sort by user count
-        countries.sort(key=lambda x: x['users'], reverse=True)
+        countries = revenue_analytics_service.revenue_by_country(start, end)
         
         return jsonify({
             'countries': countries,
             'total_countries': len(countries),
-            'total_users': sum(stats['users'] for stats in country_stats.values())
+            'total_users': sum(row['users'] for row in countries),
+            'total_revenue': sum(row['revenue'] for row in countries)
         })
         
     except Exception as e:
@@ -1620,32 +1050,7 @@ def create_invoice():
 def get_invoice_stats():
     """Get invoice statistics for admin dashboard"""
     try:
-        # Get total paid orders (invoices)
-        total_invoices = Order.query.filter(
-            Order.status == 'paid',
-            Order.payment_status == 'paid'
-        ).count()
-        
-        # Calculate total amount
-        total_amount = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.status == 'paid',
-            Order.payment_status == 'paid'
-        ).scalar() or 0
-        
-        # For now, all invoices are considered paid since we only create invoices for paid orders
-        paid_invoices = total_invoices
-        pending_invoices = 0
-        overdue_invoices = 0
-        
-        stats = {
-            'total': total_invoices,
-            'paid': paid_invoices,
-            'pending': pending_invoices,
-            'overdue': overdue_invoices,
-            'totalAmount': float(total_amount)
-        }
-        
-        return jsonify(stats), 200
+        return jsonify(payment_metrics_service.get_invoice_stats()), 200
         
     except Exception as e:
         logger.error(f"Error fetching invoice stats: {str(e)}")
@@ -1830,26 +1235,12 @@ def resolve_payment_dispute():
 def search_payments():
     """Search for payments by various criteria for dispute resolution"""
     try:
-        email = request.args.get('email')
-        payment_intent_id = request.args.get('payment_intent_id')
-        amount = request.args.get('amount', type=float)
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        
-        query = Order.query
-        
-        if email:
-            query = query.filter(Order.customer_email.ilike(f'%{email}%'))
-        if payment_intent_id:
-            query = query.filter(Order.payment_intent_id == payment_intent_id)
-        if amount:
-            query = query.filter(Order.total_amount == amount)
-        if date_from:
-            query = query.filter(Order.created_at >= date_from)
-        if date_to:
-            query = query.filter(Order.created_at <= date_to)
-        
-        orders = query.order_by(Order.created_at.desc()).limit(50).all()
+        criteria = {
+            key: request.args.get(key)
+            for key in ('email', 'name', 'order_number', 'payment_intent_id', 'amount', 'date_from', 'date_to')
+        }
+        search = payment_search_service.search(criteria, request.args.get('limit', 50, type=int))
+        orders = search['orders']
         
         results = []
         for order in orders:
@@ -1870,15 +1261,12 @@ def search_payments():
         return jsonify({
             'results': results,
             'total': len(results),
-            'search_criteria': {
-                'email': email,
-                'payment_intent_id': payment_intent_id,
-                'amount': amount,
-                'date_from': date_from,
-                'date_to': date_to
-            }
+            'search_criteria': criteria,
+            'search_plan': search['plan']
         }), 200
         
+    except PaymentSearchError as e:
+        return jsonify({'error': e.message}), e.status_code
     except Exception as e:
         logger.error(f"Error searching payments: {str(e)}")
         return jsonify({'error': 'Failed to search payments'}), 500
@@ -1917,6 +1305,41 @@ def analyze_payment_fraud():
         logger.error(f"Fraud analysis error: {str(e)}")
         return jsonify({'error': 'Failed to analyze fraud risk'}), 500
 
+@payments_bp.route('/fraud/batch-score', methods=['POST'])
+@jwt_required()
+@require_permission('security.alerts.respond')
+def batch_score_fraud():
+    """Start re-scoring historical orders against the current fraud rules (admin endpoint)"""
+    try:
+        data = request.get_json() or {}
+
+        options = {
+            'days': min(int(data.get('days', 90)), 365),
+            'chunk_size': min(int(data.get('chunk_size', 500)), 5000),
+            'workers': min(int(data.get('workers', 1)), os.cpu_count() or 1),
+            'persist': not data.get('dry_run', False)
+        }
+
+        # Runs in the background; poll the job for its summary
+        job = fraud_batch_scoring_service.start_job(current_app._get_current_object(), **options)
+        return jsonify(job), 202
+
+    except (TypeError, ValueError):
+        return jsonify({'error': 'days, chunk_size and workers must be integers'}), 400
+    except Exception as e:
+        logger.error(f"Fraud batch scoring error: {str(e)}")
+        return jsonify({'error': 'Failed to start fraud batch scoring'}), 500
+
+@payments_bp.route('/fraud/batch-score/<string:job_id>', methods=['GET'])
+@jwt_required()
+@require_permission('security.alerts.view')
+def get_batch_score_job(job_id):
+    """Status of a fraud batch scoring job, with its summary once finished (admin endpoint)"""
+    job = fraud_batch_scoring_service.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
 @payments_bp.route('/pci/compliance-check', methods=['GET'])
 @jwt_required()
 def check_pci_compliance():
@@ -1927,3 +1350,32 @@ def check_pci_compliance():
     except Exception as e:
         logger.error(f"PCI compliance check error: {str(e)}")
         return jsonify({'error': 'Failed to check PCI compliance'}), 500
+
+@payments_bp.route('/pci/log-scan', methods=['GET'])
+@jwt_required()
+@require_permission('security.audit.view')
+def get_pci_log_scan():
+    """Last report of the incremental log scan for sensitive data"""
+    report = pci_log_scanner.last_report()
+    if report is None:
+        return jsonify({'error': 'Log scan has not run yet'}), 404
+    return jsonify(report), 200
+
+@payments_bp.route('/pci/log-scan', methods=['POST'])
+@jwt_required()
+@require_permission('system.logs')
+def run_pci_log_scan():
+    """Scan log bytes written since the last scan for sensitive data (admin endpoint)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        workers = min(int(data.get('workers', 1)), os.cpu_count() or 1)
+
+        report = pci_log_scanner.scan(workers=max(workers, 1))
+
+        return jsonify(report), 200
+
+    except (TypeError, ValueError):
+        return jsonify({'error': 'workers must be an integer'}), 400
+    except Exception as e:
+        logger.error(f"PCI log scan error: {str(e)}")
+        return jsonify({'error': 'Failed to scan logs'}), 500
@@ -9,6 +9,8 @@ from ..services import (
     security_service, audit_service, rate_limit_service,
     rate_limit_users, rate_limit_search, rate_limit_auth
 )
+from ..services.file_storage_service import file_storage_service
+from ..services.avatar_pipeline import AVATAR_MIME_TYPE, AVATAR_MIME_BY_EXTENSION
 from ..middleware.subscription_middleware import require_active_subscription, require_trial_or_subscription
 from datetime import datetime
 
@@ -161,6 +163,73 @@ def upload_avatar(user_id):
         return jsonify({'error': str(e)}), 500
 
 
+@profile_bp.route('/avatars/<string:content_hash>', methods=['GET'])
+def get_avatar(content_hash):
+    """
+    GET /api/profile/avatars/{hash} - Serve an avatar image
+    Public so <img> tags can load it; only hashes used as avatars are served.
+    """
+    try:
+        profile = UserProfile.query.filter_by(avatar_content_hash=content_hash).first()
+        if not profile:
+            return jsonify({'error': 'Avatar not found'}), 404
+        
+        stored = file_storage_service.get(content_hash)
+        if not stored:
+            return jsonify({'error': 'Avatar not found'}), 404
+        
+        # The type comes from the extension chosen when the image was sniffed at
+        # upload, not from the shared blob row, and only image types are served
+        extension = (profile.avatar_filename or '').rsplit('.', 1)[-1].lower()
+        mime_type = AVATAR_MIME_BY_EXTENSION.get(extension)
+        if not mime_type:
+            return jsonify({'error': 'Avatar not found'}), 404
+        
+        # Content-addressed, so the bytes behind a URL never change
+        response = file_storage_service.send(
+            content_hash,
+            download_name=profile.avatar_filename,
+            mime_type=mime_type,
+            as_attachment=False,
+            max_age=31536000
+        )
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@profile_bp.route('/avatars/<string:content_hash>/<int:size>', methods=['GET'])
+def get_avatar_variant(content_hash, size):
+    """
+    GET /api/profile/avatars/{hash}/{size} - Serve a resized avatar
+    Falls back to the original while the variants are still being built.
+    """
+    try:
+        profile = UserProfile.query.filter_by(avatar_content_hash=content_hash).first()
+        if not profile:
+            return jsonify({'error': 'Avatar not found'}), 404
+        
+        variants = profile.avatar_variants or {}
+        variant_hash = variants.get('sizes', {}).get(str(size)) if variants.get('source') == content_hash else None
+        if not variant_hash:
+            return get_avatar(content_hash)
+        
+        response = file_storage_service.send(
+            variant_hash,
+            download_name=f"avatar_{size}.webp",
+            mime_type=AVATAR_MIME_TYPE,
+            as_attachment=False,
+            max_age=31536000
+        )
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @profile_bp.route('/api/admin/users/<int:user_id>/profile/avatar', methods=['DELETE'])
 @jwt_required()
 @security_service.require_permission('edit_user_profiles')
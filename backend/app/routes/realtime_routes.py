@@ -4,7 +4,8 @@ Real-time update routes
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
+from datetime import datetime
+from .. import db
 from ..services.realtime_service import realtime_service
 from ..models.user_subscription import UserSubscription, SubscriptionStatus
 from ..models.subscription import SubscriptionPlan
@@ -26,23 +27,27 @@ def get_user_updates():
         
         if not subscription:
             return jsonify({'updates': [], 'message': 'No active subscription'}), 200
+        plan_id, plan_name = subscription.plan_id, subscription.plan_name
         
-        # Get updates since last check
-        since_str = request.args.get('since')
-        since = None
-        if since_str:
-            try:
-                since = datetime.fromisoformat(since_str)
-            except ValueError:
-                pass
+        # Sequence cursor from the previous poll; wait > 0 enables long-polling
+        try:
+            cursor = int(request.args.get('cursor', 0))
+            wait = float(request.args.get('wait', 0))
+        except ValueError:
+            return jsonify({'error': 'cursor must be an integer and wait a number of seconds'}), 400
+        
+        # Give the pooled connection back before a long-poll wait; the inbox
+        # does not touch the database
+        db.session.remove()
         
         # Get updates for user's plan
-        updates = realtime_service.get_updates_for_user(user_id, since)
+        result = realtime_service.get_updates_for_user(user_id, cursor=cursor, wait=wait)
         
         return jsonify({
-            'updates': updates,
-            'plan_id': subscription.plan_id,
-            'plan_name': subscription.plan_name,
+            'updates': result['updates'],
+            'cursor': result['cursor'],
+            'plan_id': plan_id,
+            'plan_name': plan_name,
             'timestamp': datetime.utcnow().isoformat()
         }), 200
         
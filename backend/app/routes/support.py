@@ -4,13 +4,12 @@ Handles support tickets, categories, messages, and attachments
 """
 
 from functools import wraps
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import or_, and_, desc, asc
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 import os
-import uuid
 from werkzeug.utils import secure_filename
 
 from ..models.support import (
@@ -21,7 +20,10 @@ from ..models.rbac import AdminUser
 from ..models.user import User
 from .. import db
 from ..services.ai_service import ai_service
+from ..services.ticket_sentiment_service import ticket_sentiment_service
 from ..services.realtime_chat_service import realtime_chat_service
+from ..services.support_analytics_service import support_analytics_service
+from ..services.file_storage_service import file_storage_service, incoming_file, FileTooLargeError
 # Simple admin permission decorator
 def require_admin_permission(permission=None):
     def decorator(f):
@@ -58,6 +60,8 @@ logger = logging.getLogger(__name__)
 
 # Allowed file extensions for attachments
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx'}
+MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_SENTIMENT_BATCH = 500
 
 
 def allowed_file(filename):
@@ -83,6 +87,7 @@ def get_tickets():
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         user_only = request.args.get('user_only', 'false').lower() == 'true'
+        overdue = request.args.get('overdue', 'false').lower() == 'true'
         
         # Check if user is admin with support permissions or support agent
         admin_user = AdminUser.query.get(current_user_id)
@@ -127,6 +132,8 @@ def get_tickets():
             query = query.filter(SupportTicket.priority == TicketPriority(priority))
         if category_id:
             query = query.filter(SupportTicket.category_id == category_id)
+        if overdue:
+            query = query.filter(SupportTicket.is_overdue)
         if assigned_to:
             if assigned_to == 'me':
                 # Show tickets assigned to current user
@@ -225,6 +232,8 @@ def create_ticket():
             assigned_to=data.get('assigned_to') if admin_user else None  # Only admins can assign
         )
         
+        ticket_sentiment_service.tag_ticket(ticket)
+        
         # Generate ticket number
         ticket.ticket_number = ticket.generate_ticket_number()
         
@@ -541,6 +550,10 @@ def add_message(ticket_id):
         
         db.session.add(message)
         
+        # Re-tag the ticket with the customer's latest message
+        if not admin_user and not message.is_internal:
+            ticket_sentiment_service.tag_ticket(ticket, message.message)
+        
         # Update ticket status if needed
         if ticket.status == TicketStatus.OPEN:
             ticket.status = TicketStatus.IN_PROGRESS
@@ -646,40 +659,11 @@ def create_category():
 def get_support_stats():
     """Get support system statistics"""
     try:
-        # Basic counts
-        total_tickets = SupportTicket.query.count()
-        open_tickets = SupportTicket.query.filter_by(status=TicketStatus.OPEN).count()
-        in_progress_tickets = SupportTicket.query.filter_by(status=TicketStatus.IN_PROGRESS).count()
-        resolved_tickets = SupportTicket.query.filter_by(status=TicketStatus.RESOLVED).count()
-        closed_tickets = SupportTicket.query.filter_by(status=TicketStatus.CLOSED).count()
-        
-        # Priority breakdown
-        urgent_tickets = SupportTicket.query.filter_by(priority=TicketPriority.URGENT).count()
-        high_tickets = SupportTicket.query.filter_by(priority=TicketPriority.HIGH).count()
-        medium_tickets = SupportTicket.query.filter_by(priority=TicketPriority.MEDIUM).count()
-        low_tickets = SupportTicket.query.filter_by(priority=TicketPriority.LOW).count()
-        
-        # Overdue tickets
-        overdue_tickets = len([t for t in SupportTicket.query.all() if t.is_overdue])
-        
-        # Unassigned tickets
-        unassigned_tickets = SupportTicket.query.filter_by(assigned_to=None).count()
+        stats = support_analytics_service.get_ticket_stats()
         
         return jsonify({
             'success': True,
-            'stats': {
-                'total_tickets': total_tickets,
-                'open_tickets': open_tickets,
-                'in_progress_tickets': in_progress_tickets,
-                'resolved_tickets': resolved_tickets,
-                'closed_tickets': closed_tickets,
-                'urgent_tickets': urgent_tickets,
-                'high_tickets': high_tickets,
-                'medium_tickets': medium_tickets,
-                'low_tickets': low_tickets,
-                'overdue_tickets': overdue_tickets,
-                'unassigned_tickets': unassigned_tickets
-            }
+            'stats': stats
         }), 200
         
     except Exception as e:
@@ -872,78 +856,7 @@ def rate_ticket(ticket_id):
 def get_support_agent_stats():
     """Get support agent performance statistics"""
     try:
-        # Get support agents - users who have handled support tickets
-        from ..models.user import User
-        
-        # Get all users who have been assigned support tickets
-        agents_with_tickets = db.session.query(User).join(SupportTicket, User.id == SupportTicket.assigned_to).distinct().all()
-        
-        # Also include admin users who might be support agents
-        admin_users = User.query.filter_by(is_admin=True).all()
-        
-        # Combine and deduplicate
-        all_potential_agents = list(set(agents_with_tickets + admin_users))
-        
-        support_agents = []
-        
-        for agent in all_potential_agents:
-            # Get tickets assigned to this agent
-            assigned_tickets = SupportTicket.query.filter(
-                SupportTicket.assigned_to == agent.id
-            ).all()
-            
-            # Only include agents who have actually handled tickets
-            if len(assigned_tickets) > 0:
-                # Calculate statistics
-                total_tickets = len(assigned_tickets)
-                closed_tickets = len([t for t in assigned_tickets if t.status == TicketStatus.CLOSED])
-                resolved_tickets = len([t for t in assigned_tickets if t.status == TicketStatus.RESOLVED])
-                rated_tickets = len([t for t in assigned_tickets if t.user_rating is not None])
-                
-                # Calculate average rating
-                total_rating = sum(t.user_rating for t in assigned_tickets if t.user_rating is not None)
-                avg_rating = round(total_rating / rated_tickets, 2) if rated_tickets > 0 else 0
-                
-                # Get recent ratings (last 30 days)
-                thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-                recent_rated_tickets = [t for t in assigned_tickets 
-                                      if t.user_rating is not None and t.rated_at and t.rated_at >= thirty_days_ago]
-                recent_avg_rating = 0
-                if recent_rated_tickets:
-                    recent_total = sum(t.user_rating for t in recent_rated_tickets)
-                    recent_avg_rating = round(recent_total / len(recent_rated_tickets), 2)
-                
-                # Calculate total rating points (sum of all ratings)
-                total_rating_points = sum(t.user_rating for t in assigned_tickets if t.user_rating is not None)
-                
-                # Calculate rating breakdown
-                rating_breakdown = {
-                    '5_star': len([t for t in assigned_tickets if t.user_rating == 5]),
-                    '4_star': len([t for t in assigned_tickets if t.user_rating == 4]),
-                    '3_star': len([t for t in assigned_tickets if t.user_rating == 3]),
-                    '2_star': len([t for t in assigned_tickets if t.user_rating == 2]),
-                    '1_star': len([t for t in assigned_tickets if t.user_rating == 1])
-                }
-                
-                support_agents.append({
-                    'id': agent.id,
-                    'username': agent.username,
-                    'full_name': agent.full_name or agent.username,
-                    'email': agent.email,
-                    'total_tickets': total_tickets,
-                    'closed_tickets': closed_tickets,
-                    'resolved_tickets': resolved_tickets,
-                    'rated_tickets': rated_tickets,
-                    'total_rating_points': total_rating_points,
-                    'average_rating': avg_rating,
-                    'recent_average_rating': recent_avg_rating,
-                    'completion_rate': round((closed_tickets + resolved_tickets) / total_tickets * 100, 1) if total_tickets > 0 else 0,
-                    'rating_breakdown': rating_breakdown,
-                    'excellence_score': round((avg_rating / 5) * 100, 1) if avg_rating > 0 else 0
-                })
-        
-        # Sort by total rating points (descending) to show best performers first
-        support_agents.sort(key=lambda x: x['total_rating_points'], reverse=True)
+        support_agents = support_analytics_service.get_agent_stats()
         
         return jsonify({
             'success': True,
@@ -1087,49 +1000,35 @@ def upload_attachment(ticket_id):
         if not can_upload:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
-        # Check if file was uploaded
-        if 'file' not in request.files:
+        # Multipart field 'file', or a raw body with an X-File-Name header
+        upload = incoming_file(request, 'file')
+        if not upload:
             return jsonify({'success': False, 'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'success': False, 'error': 'No file selected'}), 400
+        stream, filename, mime_type = upload
         
         # Validate file
-        if not allowed_file(file.filename):
+        if not allowed_file(filename):
             return jsonify({'success': False, 'error': f'File type not allowed. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
         
-        # Check file size (10MB limit)
-        file.seek(0, 2)  # Seek to end
-        file_size = file.tell()
-        file.seek(0)  # Reset to beginning
-        
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            return jsonify({'success': False, 'error': 'File too large. Maximum size is 10MB'}), 400
-        
-        # Create upload directory if it doesn't exist
-        upload_dir = os.path.join(current_app.root_path, '..', 'uploads', 'attachments')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        original_filename = secure_filename(file.filename)
-        file_extension = original_filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        # Save file
-        file.save(file_path)
+        # Stream into content-addressed storage; the 10MB limit is enforced while reading
+        mime_type = mime_type or 'application/octet-stream'
+        try:
+            stored = file_storage_service.save(stream, max_size=MAX_ATTACHMENT_SIZE, mime_type=mime_type)
+        except FileTooLargeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # Create attachment record
+        original_filename = secure_filename(filename)
         attachment = SupportAttachment(
             ticket_id=ticket_id,
-            filename=unique_filename,
+            filename=stored.content_hash,
             original_filename=original_filename,
-            file_path=file_path,
-            file_size=file_size,
-            mime_type=file.content_type or 'application/octet-stream',
+            file_path=stored.storage_key,
+            file_size=stored.size,
+            mime_type=mime_type,
+            content_hash=stored.content_hash,
             uploaded_by_admin=current_user_id if is_admin_upload else None,
-            uploaded_by_user=current_user_id if not is_admin_upload else None
+            uploaded_by=current_user_id if not is_admin_upload else None
         )
         
         db.session.add(attachment)
@@ -1178,7 +1077,14 @@ def download_attachment(attachment_id):
         if not can_download:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
-        # Check if file exists
+        if attachment.content_hash:
+            return file_storage_service.send(
+                attachment.content_hash,
+                download_name=attachment.original_filename,
+                mime_type=attachment.mime_type
+            )
+        
+        # Legacy attachments written straight to disk
         if not os.path.exists(attachment.file_path):
             return jsonify({'success': False, 'error': 'File not found on server'}), 404
         
@@ -1186,7 +1092,8 @@ def download_attachment(attachment_id):
             attachment.file_path,
             as_attachment=True,
             download_name=attachment.original_filename,
-            mimetype=attachment.mime_type
+            mimetype=attachment.mime_type,
+            conditional=True
         )
         
     except Exception as e:
@@ -1220,18 +1127,19 @@ def delete_attachment(attachment_id):
                 attachment.uploaded_by_admin == current_user_id
             )
         elif regular_user:
-            can_delete = attachment.uploaded_by_user == current_user_id
+            can_delete = attachment.uploaded_by == current_user_id
         
         if not can_delete:
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
-        # Delete file from disk
-        if os.path.exists(attachment.file_path):
+        # Delete from database, then drop the stored file reference
+        content_hash = attachment.content_hash
+        if not content_hash and os.path.exists(attachment.file_path):
             os.remove(attachment.file_path)
         
-        # Delete from database
         db.session.delete(attachment)
         db.session.commit()
+        file_storage_service.release(content_hash)
         
         return jsonify({
             'success': True,
@@ -1283,7 +1191,7 @@ def get_smart_replies(ticket_id):
         for msg in messages:
             conversation_history.append({
                 'message': msg.message,
-                'is_admin_reply': msg.is_admin_reply,
+                'is_admin_reply': msg.admin_user_id is not None,
                 'created_at': msg.created_at.isoformat()
             })
         
@@ -1291,7 +1199,8 @@ def get_smart_replies(ticket_id):
         suggestions = ai_service.generate_smart_replies(
             ticket_subject=ticket.subject,
             conversation_history=conversation_history,
-            ticket_category=ticket.category.name if ticket.category else None
+            ticket_category=ticket.category.name if ticket.category else None,
+            ticket_id=ticket_id
         )
         
         return jsonify({
@@ -1309,10 +1218,14 @@ def get_smart_replies(ticket_id):
 def analyze_message_sentiment():
     """Analyze sentiment of a message"""
     try:
-        data = request.get_json()
-        message = data.get('message', '').strip()
+        data = request.get_json() or {}
+        messages = data.get('messages')
+        message = (data.get('message') or '').strip()
         
-        if not message:
+        if messages is not None:
+            if not isinstance(messages, list) or not messages or len(messages) > MAX_SENTIMENT_BATCH:
+                return jsonify({'success': False, 'error': f'messages must be a list of 1-{MAX_SENTIMENT_BATCH} strings'}), 400
+        elif not message:
             return jsonify({'success': False, 'error': 'Message is required'}), 400
         
         current_user_id = get_jwt_identity()
@@ -1333,6 +1246,12 @@ def analyze_message_sentiment():
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
         # Analyze sentiment
+        if messages is not None:
+            return jsonify({
+                'success': True,
+                'sentiments': ai_service.analyze_sentiment_batch([str(item) for item in messages])
+            }), 200
+        
         sentiment_result = ai_service.analyze_sentiment(message)
         
         return jsonify({
@@ -1345,6 +1264,27 @@ def analyze_message_sentiment():
         return jsonify({'success': False, 'error': 'Failed to analyze sentiment'}), 500
 
 
+@support_bp.route('/support/ai/tag-open-tickets', methods=['POST'])
+@jwt_required()
+@require_admin_permission('support.tickets.update')
+def tag_open_tickets():
+    """Re-tag sentiment and urgency on all open tickets"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = ticket_sentiment_service.tag_open_tickets(use_remote=bool(data.get('use_remote', False)))
+        
+        return jsonify({
+            'success': True,
+            'tagged': result['tagged'],
+            'remote': result['remote']
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error tagging open tickets: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to tag tickets'}), 500
+
+
 @support_bp.route('/support/ai/summarize-ticket/<int:ticket_id>', methods=['GET'])
 @jwt_required()
 def summarize_ticket(ticket_id):
@@ -1380,12 +1320,12 @@ def summarize_ticket(ticket_id):
         for msg in messages:
             conversation_history.append({
                 'message': msg.message,
-                'is_admin_reply': msg.is_admin_reply,
+                'is_admin_reply': msg.admin_user_id is not None,
                 'created_at': msg.created_at.isoformat()
             })
         
         # Generate summary
-        summary = ai_service.summarize_ticket(conversation_history)
+        summary = ai_service.summarize_ticket(conversation_history, ticket_id=ticket_id)
         
         return jsonify({
             'success': True,
@@ -1618,6 +1558,7 @@ def bulk_delete_tickets():
             return jsonify({'success': False, 'error': 'No tickets found to delete'}), 404
         
         deleted_count = 0
+        released_hashes = []
         for ticket in tickets:
             try:
                 # Delete related records first
@@ -1626,7 +1567,13 @@ def bulk_delete_tickets():
                 # Delete messages
                 SupportMessage.query.filter_by(ticket_id=ticket.id).delete()
                 
-                # Delete attachments
+                # Delete attachments (stored file references are released after commit)
+                released_hashes.extend(
+                    content_hash for (content_hash,) in db.session.query(SupportAttachment.content_hash).filter(
+                        SupportAttachment.ticket_id == ticket.id,
+                        SupportAttachment.content_hash.isnot(None)
+                    )
+                )
                 SupportAttachment.query.filter_by(ticket_id=ticket.id).delete()
                 
                 # Delete assignment history
@@ -1643,6 +1590,8 @@ def bulk_delete_tickets():
         
         # Commit all changes
         db.session.commit()
+        for content_hash in released_hashes:
+            file_storage_service.release(content_hash)
         
         logger.info(f"Bulk deleted {deleted_count} tickets by admin {current_admin_id}")
         
@@ -8,6 +8,8 @@ from ..models.user import User
 from ..models.rbac import AdminUser
 from .security_service import security_service
 from .audit_service import audit_service
+from .user_agent_service import user_agent_service
+from .geoip_service import geoip_service
 import logging
 import json
 import csv
@@ -48,6 +50,12 @@ class ActivityService:
             if not action_category:
                 raise ValueError("action_category is required")
 
+            device = user_agent_service.classify(user_agent)
+            if ip_address and not country_code:
+                location = geoip_service.lookup(ip_address)
+                country_code = location['country_code']
+                city = city or (location['city'] if country_code else None)
+            
             # Create activity log entry
             activity_log = UserActivityLog(
                 user_id=user_id,
@@ -67,6 +75,9 @@ class ActivityService:
                 session_id=session_id,
                 request_id=request_id,
                 user_agent=user_agent,
+                device_type=device.device_type,
+                browser=device.browser,
+                os=device.os,
                 ip_address=ip_address,
                 country_code=country_code,
                 city=city
@@ -0,0 +1,241 @@
+"""
+AI Gateway
+Single entry point for chat-completion calls to the OpenAI-compatible API.
+
+- One pooled requests.Session (keep-alive connections, no per-call handshake)
+- Results cached in the shared TTL store under a caller-supplied key, or the
+  SHA-256 of model + prompt when none is given
+- Identical prompts already in flight are coalesced: one upstream call, every
+  waiter gets its result
+- A semaphore bounds concurrent upstream calls per process
+- Connect/read timeouts, and a circuit breaker that stops calling the API for
+  a cool-down period after consecutive failures
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..utils.logger import get_logger
+from ..utils.shared_store import SharedTTLStore
+
+logger = get_logger(__name__)
+
+SYSTEM_PROMPT = 'You are a helpful customer support assistant. Provide concise, professional, and helpful responses.'
+
+
+def content_digest(*parts: Any) -> str:
+    """Stable SHA-256 over the given parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after reset_timeout"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True  # the single trial call
+            return False
+
+    def release_trial(self) -> None:
+        """Hand back a trial call that never reached the API, so the next caller can make it"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"AI circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class AIGateway:
+    """Pooled, cached, coalesced and rate-bounded chat completions"""
+
+    def __init__(self, api_key: str = None, base_url: str = 'https://api.openai.com/v1',
+                 model: str = 'gpt-3.5-turbo', connect_timeout: float = 3.05, read_timeout: float = 20.0,
+                 max_concurrency: int = 4, queue_timeout: float = 10.0, cache_ttl: int = 3600,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.cache_ttl = cache_ttl
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.cache = SharedTTLStore('ai_responses')
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._stats = {'cache_hits': 0, 'coalesced': 0, 'upstream_calls': 0,
+                       'failures': 0, 'short_circuited': 0, 'rejected': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Authorization': f'Bearer {self.api_key}',
+                                        'Content-Type': 'application/json'})
+                self._session = session
+            return self._session
+
+    def complete(self, prompt: str, cache_key: str = None, max_tokens: int = 500,
+                 temperature: float = 0.7) -> Optional[str]:
+        """Message content of a completion for prompt, or None if the API is unavailable"""
+        key = cache_key or content_digest(self.model, max_tokens, temperature, prompt)
+        cached = self.cache.get_json(key)
+        if cached is not None:
+            self._count('cache_hits')
+            return cached
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            self._count('coalesced')
+            try:
+                return future.result(timeout=self.queue_timeout + sum(self.timeout))
+            except FutureTimeoutError:
+                return None
+
+        try:
+            # A call that finished between our cache miss and taking the lead already cached its result
+            result = self.cache.get_json(key)
+            if result is None:
+                result = self._call(prompt, max_tokens, temperature)
+                if result is not None:
+                    self.cache.set_json(key, result, self.cache_ttl)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            logger.error(f"Error completing AI prompt: {str(e)}")
+            future.set_result(None)
+            return None
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _call(self, prompt: str, max_tokens: int, temperature: float) -> Optional[str]:
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            return None
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.breaker.release_trial()
+            self._count('rejected')
+            logger.warning("AI call rejected: all upstream slots busy")
+            return None
+
+        try:
+            self._count('upstream_calls')
+            response = self.session.post(
+                f'{self.base_url}/chat/completions',
+                json={
+                    'model': self.model,
+                    'messages': [
+                        {'role': 'system', 'content': SYSTEM_PROMPT},
+                        {'role': 'user', 'content': prompt}
+                    ],
+                    'max_tokens': max_tokens,
+                    'temperature': temperature
+                },
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            self._failed(f"AI API request failed: {str(e)}")
+            return None
+        except BaseException:
+            # Anything else still has to settle a half-open trial
+            self._count('failures')
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._slots.release()
+
+        if response.status_code == 200:
+            try:
+                content = response.json()['choices'][0]['message']['content']
+            except (ValueError, KeyError, IndexError, TypeError):
+                self._failed("AI API returned an unexpected response body")
+                return None
+            self.breaker.record_success()
+            return content
+        if response.status_code == 429 or response.status_code >= 500:
+            self._failed(f"AI API error: {response.status_code} - {response.text[:200]}")
+        else:
+            # The request itself was rejected; the service is up, so the breaker stays closed
+            self.breaker.record_success()
+            logger.error(f"AI API error: {response.status_code} - {response.text[:200]}")
+        return None
+
+    def _failed(self, message: str) -> None:
+        self._count('failures')
+        self.breaker.record_failure()
+        logger.error(message)
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({'circuit': self.breaker.state, 'in_flight': len(self._inflight),
+                      'max_concurrency': self.max_concurrency, 'cache': self.cache.get_stats()})
+        return stats
+
+    def close(self) -> None:
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
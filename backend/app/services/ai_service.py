@@ -1,21 +1,36 @@
 import os
 import json
-import requests
 from typing import List, Dict, Optional
-from datetime import datetime
 import logging
 
+from .ai_gateway import AIGateway, content_digest
+from .sentiment_classifier import sentiment_classifier, URGENCY_LEVELS
+
+SENTIMENTS = ('positive', 'negative', 'neutral', 'angry', 'frustrated')
+
 logger = logging.getLogger(__name__)
 
 class AIService:
     def __init__(self):
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.openai_base_url = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+        self.gateway = AIGateway(
+            api_key=self.openai_api_key,
+            base_url=self.openai_base_url,
+            model=os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+            read_timeout=float(os.getenv('AI_READ_TIMEOUT', '20')),
+            max_concurrency=int(os.getenv('AI_MAX_CONCURRENCY', '4')),
+            cache_ttl=int(os.getenv('AI_CACHE_TTL', '3600'))
+        )
+        # Local sentiment results below this confidence are re-checked by the remote model
+        self.remote_confidence_threshold = float(os.getenv('AI_SENTIMENT_REMOTE_THRESHOLD', '0.6'))
         
     def generate_smart_replies(self, ticket_subject: str, conversation_history: List[Dict], 
-                              ticket_category: str = None, user_sentiment: str = None) -> List[str]:
+                              ticket_category: str = None, user_sentiment: str = None,
+                              ticket_id: int = None) -> List[str]:
         """
-        Generate smart reply suggestions based on ticket context
+        Generate smart reply suggestions based on ticket context.
+        Results are cached per ticket until its messages change.
         """
         try:
             if not self.openai_api_key:
@@ -29,10 +44,9 @@ class AIService:
             prompt = self._create_smart_reply_prompt(context, ticket_category, user_sentiment)
             
             # Call OpenAI API
-            response = self._call_openai_api(prompt)
+            suggestions_text = self._complete(prompt, 'smart_replies', ticket_id)
             
-            if response and 'choices' in response:
-                suggestions_text = response['choices'][0]['message']['content']
+            if suggestions_text:
                 suggestions = self._parse_suggestions(suggestions_text)
                 return suggestions[:5]  # Return max 5 suggestions
             else:
@@ -43,14 +57,17 @@ class AIService:
             logger.error(f"Error generating smart replies: {str(e)}")
             return self._get_default_suggestions(ticket_category)
     
-    def analyze_sentiment(self, message: str) -> Dict:
+    def analyze_sentiment(self, message: str, allow_remote: bool = True) -> Dict:
         """
-        Analyze sentiment of a message
+        Analyze sentiment of a message.
+        The local classifier answers first; only low-confidence results go to
+        the remote model when one is configured.
         """
+        result = dict(sentiment_classifier.classify(message), source='local')
+        if not allow_remote or result['confidence'] >= self.remote_confidence_threshold or not self.openai_api_key:
+            return result
+        
         try:
-            if not self.openai_api_key:
-                return {"sentiment": "neutral", "confidence": 0.5, "urgency": "low"}
-            
             prompt = f"""
             Analyze the sentiment and urgency of this customer support message:
             "{message}"
@@ -62,24 +79,35 @@ class AIService:
             - keywords: list of important words that indicate sentiment
             """
             
-            response = self._call_openai_api(prompt)
-            
-            if response and 'choices' in response:
-                content = response['choices'][0]['message']['content']
-                try:
-                    return json.loads(content)
-                except json.JSONDecodeError:
-                    return {"sentiment": "neutral", "confidence": 0.5, "urgency": "low"}
-            else:
-                return {"sentiment": "neutral", "confidence": 0.5, "urgency": "low"}
-                
+            content = self._complete(prompt, 'sentiment')
+            if content:
+                remote = json.loads(content)
+                if remote.get('sentiment') in SENTIMENTS and remote.get('urgency') in URGENCY_LEVELS:
+                    return {
+                        'sentiment': remote['sentiment'],
+                        'confidence': float(remote.get('confidence', 0.5)),
+                        'urgency': remote['urgency'],
+                        'keywords': remote.get('keywords') or result['keywords'],
+                        'source': 'remote'
+                    }
+        except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+            logger.warning("Remote sentiment response was not valid JSON, using local result")
         except Exception as e:
             logger.error(f"Error analyzing sentiment: {str(e)}")
-            return {"sentiment": "neutral", "confidence": 0.5, "urgency": "low"}
+        return result
+    
+    def analyze_sentiment_batch(self, messages: List[str]) -> List[Dict]:
+        """
+        Analyze the sentiment of many messages with the local classifier only.
+        A batch never waits on the remote model, so its cost stays bounded by
+        the classifier however many results are low-confidence.
+        """
+        return [dict(result, source='local') for result in sentiment_classifier.classify_many(messages)]
     
-    def summarize_ticket(self, conversation_history: List[Dict]) -> str:
+    def summarize_ticket(self, conversation_history: List[Dict], ticket_id: int = None) -> str:
         """
-        Generate a summary of the ticket conversation
+        Generate a summary of the ticket conversation.
+        Results are cached per ticket until its messages change.
         """
         try:
             if not self.openai_api_key:
@@ -99,10 +127,10 @@ class AIService:
             - Key actions taken
             """
             
-            response = self._call_openai_api(prompt)
+            summary = self._complete(prompt, 'summary', ticket_id)
             
-            if response and 'choices' in response:
-                return response['choices'][0]['message']['content'].strip()
+            if summary:
+                return summary.strip()
             else:
                 return "Unable to generate summary"
                 
@@ -110,46 +138,13 @@ class AIService:
             logger.error(f"Error summarizing ticket: {str(e)}")
             return "Unable to generate summary"
     
-    def _call_openai_api(self, prompt: str) -> Optional[Dict]:
-        """Make API call to OpenAI"""
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.openai_api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'model': 'gpt-3.5-turbo',
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': 'You are a helpful customer support assistant. Provide concise, professional, and helpful responses.'
-                    },
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'max_tokens': 500,
-                'temperature': 0.7
-            }
-            
-            response = requests.post(
-                f'{self.openai_base_url}/chat/completions',
-                headers=headers,
-                json=data,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error calling OpenAI API: {str(e)}")
-            return None
+    def _complete(self, prompt: str, operation: str, ticket_id: int = None) -> Optional[str]:
+        """Completion through the gateway; ticket results are keyed by ticket id and content hash"""
+        cache_key = None
+        if ticket_id is not None:
+            # The prompt embeds the ticket's message set, so a new message yields a new key
+            cache_key = f"ticket:{ticket_id}:{operation}:{content_digest(self.gateway.model, prompt)}"
+        return self.gateway.complete(prompt, cache_key=cache_key)
     
     def _prepare_conversation_context(self, subject: str, history: List[Dict]) -> str:
         """Prepare conversation context for AI analysis"""
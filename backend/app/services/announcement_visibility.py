@@ -0,0 +1,353 @@
+"""
+Announcement visibility
+
+Announcements change rarely but are read on every navigation, so each
+worker keeps the live set in memory instead of querying it per request.
+Every active, published, unexpired announcement is loaded once with its
+schedule and expiry; targeting is compiled into a per-user-id index and a
+per-group inverted index, so resolving one user's announcements is a few set
+lookups plus a check of each candidate's time window.
+
+The compiled set carries a version from the shared store. A commit that
+creates, edits or deletes an announcement bumps the version, and every
+worker rebuilds on its next read; the set is also rebuilt every
+ANNOUNCEMENT_CACHE_TTL seconds as a backstop.
+
+Views and clicks are queued in memory and written by a background flush:
+one lookup of existing view rows, bulk inserts and updates, and one counter
+UPDATE per announcement for the whole batch.
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, event, inspect, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.communication import Announcement, AnnouncementView
+from app.utils.logger import get_logger
+from app.utils.shared_store import SharedTTLStore
+
+logger = get_logger(__name__)
+
+# Session.info flag set when a flush or bulk statement edits announcements
+ANNOUNCEMENTS_CHANGED = 'announcement_visibility_changed'
+# Engagement counters are written by the recorder and do not change visibility
+ENGAGEMENT_ATTRIBUTES = frozenset({'view_count', 'click_count', 'updated_at'})
+
+
+class _Entry(NamedTuple):
+    created_at: datetime
+    starts_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    data: Dict
+
+
+class _CompiledAnnouncements(NamedTuple):
+    version: int
+    loaded_at: float
+    entries: Dict[int, _Entry]
+    global_ids: FrozenSet[int]
+    by_user: Dict[int, FrozenSet[int]]
+    by_group: Dict[str, FrozenSet[int]]
+    any_user: FrozenSet[int]  # targeted announcements without a user list
+    any_group: FrozenSet[int]  # targeted announcements without a group list
+
+
+def _is_live(entry: _Entry, now: datetime) -> bool:
+    return (entry.starts_at is None or entry.starts_at <= now) and (entry.expires_at is None or entry.expires_at > now)
+
+
+def _normalize_user_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AnnouncementVisibilityCache:
+    """Per-worker compiled index of live announcements, invalidated through a shared version"""
+
+    def __init__(self, refresh_interval: int = None):
+        self.refresh_interval = refresh_interval or int(os.getenv('ANNOUNCEMENT_CACHE_TTL', 300))
+        self.store = SharedTTLStore('announcements')
+        self._compiled: Optional[_CompiledAnnouncements] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _shared_version(self) -> int:
+        try:
+            return int(self.store.get_json('version') or 0)
+        except Exception as e:
+            logger.warning(f"Could not read announcement cache version: {str(e)}")
+            return -1
+
+    def bump_version(self) -> None:
+        """Make every worker rebuild its announcement set on the next read"""
+        self._compiled = None
+        try:
+            self.store.incr('version', 1, ttl=30 * 24 * 3600)
+        except Exception as e:
+            logger.warning(f"Could not bump announcement cache version: {str(e)}")
+
+    def _is_current(self, compiled: Optional[_CompiledAnnouncements], version: int) -> bool:
+        return (compiled is not None and compiled.version == version and version >= 0
+                and time.monotonic() - compiled.loaded_at < self.refresh_interval)
+
+    def _compile(self, version: int) -> _CompiledAnnouncements:
+        now = datetime.utcnow()
+        announcements = Announcement.query.filter(
+            Announcement.is_active == True,
+            Announcement.is_published == True,
+            or_(Announcement.expires_at.is_(None), Announcement.expires_at > now)
+        ).all()
+
+        entries, global_ids, any_user, any_group = {}, set(), set(), set()
+        by_user, by_group = defaultdict(set), defaultdict(set)
+        for announcement in announcements:
+            entries[announcement.id] = _Entry(announcement.created_at, announcement.scheduled_at,
+                                              announcement.expires_at, announcement.to_dict())
+            if announcement.is_global:
+                global_ids.add(announcement.id)
+                continue
+            # An empty or missing list leaves that dimension untargeted
+            user_ids = {_normalize_user_id(value) for value in announcement.target_user_ids or []} - {None}
+            groups = {str(group) for group in announcement.target_user_groups or []}
+            for user_id in user_ids:
+                by_user[user_id].add(announcement.id)
+            if not user_ids:
+                any_user.add(announcement.id)
+            for group in groups:
+                by_group[group].add(announcement.id)
+            if not groups:
+                any_group.add(announcement.id)
+
+        self.builds += 1
+        logger.debug(f"Compiled {len(entries)} live announcements at version {version}")
+        return _CompiledAnnouncements(
+            version=version,
+            loaded_at=time.monotonic(),
+            entries=entries,
+            global_ids=frozenset(global_ids),
+            by_user={key: frozenset(ids) for key, ids in by_user.items()},
+            by_group={key: frozenset(ids) for key, ids in by_group.items()},
+            any_user=frozenset(any_user),
+            any_group=frozenset(any_group)
+        )
+
+    def compiled(self) -> _CompiledAnnouncements:
+        version = self._shared_version()
+        compiled = self._compiled
+        if self._is_current(compiled, version):
+            return compiled
+        with self._lock:
+            compiled = self._compiled
+            if not self._is_current(compiled, version):
+                compiled = self._compile(version)
+                self._compiled = compiled
+        return compiled
+
+    def visible(self, user_id=None, user_groups: Iterable[str] = None) -> List[Dict]:
+        """Announcements visible now to a user and/or groups, newest first"""
+        compiled = self.compiled()
+        candidates = set(compiled.global_ids)
+
+        user_id = _normalize_user_id(user_id)
+        user_groups = [str(group) for group in user_groups or []]
+        if user_id is not None or user_groups:
+            targeted = None
+            if user_id is not None:
+                targeted = compiled.by_user.get(user_id, frozenset()) | compiled.any_user
+            if user_groups:
+                by_group = compiled.any_group.union(*(compiled.by_group.get(group, ()) for group in user_groups))
+                targeted = by_group if targeted is None else targeted & by_group
+            candidates |= targeted
+
+        now = datetime.utcnow()
+        visible = [entry for entry in map(compiled.entries.get, candidates) if _is_live(entry, now)]
+        visible.sort(key=lambda entry: entry.created_at or datetime.min, reverse=True)
+        return [entry.data for entry in visible]
+
+
+class AnnouncementEngagementRecorder:
+    """Queues announcement views and clicks and writes them in batches off the request path"""
+
+    def __init__(self, delay: float = None, batch_size: int = None):
+        self.delay = delay if delay is not None else float(os.getenv('ANNOUNCEMENT_ENGAGEMENT_DELAY', 2.0))
+        self.batch_size = batch_size or int(os.getenv('ANNOUNCEMENT_ENGAGEMENT_BATCH', 500))
+        self._views: Dict[Tuple[int, int], Dict] = {}
+        self._clicks: Dict[Tuple[int, int], Dict] = {}
+        self._timer = None
+        self._app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {'views_queued': 0, 'clicks_queued': 0, 'flushes': 0, 'errors': 0}
+
+    def record_view(self, announcement_id, user_id, session_id=None, ip_address=None, user_agent=None) -> None:
+        self._enqueue(self._views, 'views_queued', announcement_id, user_id, {
+            'viewed_at': datetime.utcnow(), 'session_id': session_id,
+            'ip_address': ip_address, 'user_agent': user_agent
+        })
+
+    def record_click(self, announcement_id, user_id, session_id=None) -> None:
+        self._enqueue(self._clicks, 'clicks_queued', announcement_id, user_id, {
+            'clicked_at': datetime.utcnow(), 'session_id': session_id
+        })
+
+    def _enqueue(self, queue, stat, announcement_id, user_id, event_data) -> None:
+        key = (int(announcement_id), int(user_id))
+        with self._lock:
+            # Repeated events for the same pair collapse to the latest
+            queue[key] = event_data
+            self.stats[stat] += 1
+            pending = len(self._views) + len(self._clicks)
+            if has_app_context():
+                self._app = current_app._get_current_object()
+            if pending >= self.batch_size:
+                self._start_timer(0)
+            elif self._timer is None:
+                self._start_timer(self.delay)
+
+    def _start_timer(self, delay) -> None:
+        if self._app is None:
+            logger.warning("Announcement engagement not scheduled: no application context")
+            return
+        if self._timer is not None:
+            if delay:
+                return
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._run, args=(self._app,))
+        self._timer.daemon = True
+        self._timer.name = 'announcement-engagement'
+        self._timer.start()
+
+    def _run(self, app) -> None:
+        with app.app_context():
+            try:
+                self.flush()
+            finally:
+                db.session.remove()
+
+    def flush(self) -> int:
+        """Write every queued view and click; returns the number of events written"""
+        with self._flush_lock:
+            with self._lock:
+                views, clicks, self._views, self._clicks, self._timer = self._views, self._clicks, {}, {}, None
+            if not views and not clicks:
+                return 0
+            try:
+                self._write(views, clicks)
+                db.session.commit()
+                self.stats['flushes'] += 1
+                return len(views) + len(clicks)
+            except Exception as e:
+                db.session.rollback()
+                self.stats['errors'] += 1
+                logger.error(f"Error recording {len(views)} announcement views and {len(clicks)} clicks: {str(e)}")
+                return 0
+
+    def _existing_views(self, pairs) -> Dict[Tuple[int, int], Tuple[int, bool]]:
+        views = AnnouncementView.__table__
+        announcement_ids = {announcement_id for announcement_id, _ in pairs}
+        user_ids = {user_id for _, user_id in pairs}
+        rows = db.session.execute(
+            select(views.c.id, views.c.announcement_id, views.c.user_id, views.c.clicked)
+            .where(views.c.announcement_id.in_(announcement_ids), views.c.user_id.in_(user_ids))
+        ).all()
+        existing = {}
+        for row in rows:
+            key = (row.announcement_id, row.user_id)
+            if key in pairs and key not in existing:
+                existing[key] = (row.id, bool(row.clicked))
+        return existing
+
+    def _write(self, views, clicks) -> None:
+        table, announcements = AnnouncementView.__table__, Announcement.__table__
+        existing = self._existing_views(set(views) | set(clicks))
+
+        new_views = [key for key in views if key not in existing]
+        seen_again = [key for key in views if key in existing]
+        if new_views:
+            db.session.execute(insert(table), [
+                {'announcement_id': announcement_id, 'user_id': user_id, 'clicked': False, **views[(announcement_id, user_id)]}
+                for announcement_id, user_id in new_views
+            ])
+            clicked_after_viewing = set(new_views) & set(clicks)
+            if clicked_after_viewing:
+                existing.update(self._existing_views(clicked_after_viewing))
+        if seen_again:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('view_id')).values(
+                    viewed_at=bindparam('viewed_at'), session_id=bindparam('session_id'),
+                    ip_address=bindparam('ip_address'), user_agent=bindparam('user_agent')),
+                [{'view_id': existing[key][0], **views[key]} for key in seen_again]
+            )
+
+        # As before, a click counts once and only for an announcement the user has viewed
+        first_clicks = [key for key in clicks if key in existing and not existing[key][1]]
+        if first_clicks:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('view_id'), table.c.clicked.isnot(True)).values(
+                    clicked=True, clicked_at=bindparam('clicked_at'), session_id=bindparam('session_id')),
+                [{'view_id': existing[key][0], **clicks[key]} for key in first_clicks]
+            )
+
+        deltas = defaultdict(lambda: [0, 0])
+        for announcement_id, _ in new_views:
+            deltas[announcement_id][0] += 1
+        for announcement_id, _ in first_clicks:
+            deltas[announcement_id][1] += 1
+        if deltas:
+            db.session.execute(
+                update(announcements).where(announcements.c.id == bindparam('announcement_id')).values(
+                    view_count=db.func.coalesce(announcements.c.view_count, 0) + bindparam('views'),
+                    click_count=db.func.coalesce(announcements.c.click_count, 0) + bindparam('clicks')),
+                [{'announcement_id': announcement_id, 'views': counts[0], 'clicks': counts[1]}
+                 for announcement_id, counts in deltas.items()]
+            )
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'pending': len(self._views) + len(self._clicks)}
+
+
+# Global instances
+announcement_visibility = AnnouncementVisibilityCache()
+announcement_engagement = AnnouncementEngagementRecorder()
+
+
+def _visibility_changed(announcement: Announcement) -> bool:
+    state = inspect(announcement)
+    return any(attr.history.has_changes() for attr in state.attrs if attr.key not in ENGAGEMENT_ATTRIBUTES)
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_announcement_changes(session, flush_context, instances):
+    if any(isinstance(obj, Announcement) for obj in session.new) or \
+            any(isinstance(obj, Announcement) for obj in session.deleted) or \
+            any(isinstance(obj, Announcement) and _visibility_changed(obj) for obj in session.dirty):
+        session.info[ANNOUNCEMENTS_CHANGED] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_announcement_statements(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is Announcement:
+        orm_execute_state.session.info[ANNOUNCEMENTS_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_announcement_version(session):
+    if session.info.pop(ANNOUNCEMENTS_CHANGED, False):
+        announcement_visibility.bump_version()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_announcement_changes(session):
+    session.info.pop(ANNOUNCEMENTS_CHANGED, None)
@@ -0,0 +1,186 @@
+"""
+Avatar Pipeline
+
+Turns an uploaded avatar into fixed-size variants off the request thread.
+A worker from a small pool decodes the original from file storage, applies
+the EXIF orientation, center-crops to a square and encodes each size as
+WebP without metadata (EXIF, GPS, ICC profiles are dropped). Variants are
+stored content-addressed like any upload and recorded on UserProfile.
+
+Processing is idempotent: a profile whose variants were built from its
+current avatar is skipped unless forced, and results computed for an avatar
+that was replaced in the meantime are discarded.
+"""
+
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from .. import db
+from ..models.user_profile import UserProfile
+from ..utils.logger import get_logger
+from .file_storage_service import file_storage_service
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+AVATAR_SIZES = (32, 64, 256)
+AVATAR_FORMAT = 'WEBP'
+AVATAR_MIME_TYPE = 'image/webp'
+AVATAR_QUALITY = 80
+MAX_SOURCE_PIXELS = 40_000_000  # refuse decompression bombs well before Pillow's own limit
+
+# Image formats accepted as avatar uploads: Pillow format -> (MIME type, extension)
+AVATAR_SOURCE_TYPES = {
+    'PNG': ('image/png', 'png'),
+    'JPEG': ('image/jpeg', 'jpg'),
+    'GIF': ('image/gif', 'gif'),
+    'WEBP': ('image/webp', 'webp'),
+}
+AVATAR_MIME_BY_EXTENSION = {extension: mime_type for mime_type, extension in AVATAR_SOURCE_TYPES.values()}
+AVATAR_MIME_BY_EXTENSION['jpeg'] = 'image/jpeg'
+
+# Signatures used to recognise the same formats when Pillow is not installed
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+
+def detect_avatar_type(stream) -> Optional[Tuple[str, str]]:
+    """
+    (MIME type, extension) of an uploaded image, judged from its bytes rather
+    than the client's Content-Type or filename; None for anything that is not
+    a PNG, JPEG, GIF or WebP image. The stream is rewound afterwards.
+    """
+    start = stream.tell()
+    try:
+        if PIL_AVAILABLE:
+            try:
+                with Image.open(stream) as image:
+                    image_format = image.format
+            except Exception:
+                return None
+        else:
+            header = stream.read(12)
+            image_format = next((name for signature, name in _SIGNATURES if header.startswith(signature)), None)
+            if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+                image_format = 'WEBP'
+        return AVATAR_SOURCE_TYPES.get(image_format)
+    finally:
+        stream.seek(start)
+
+
+def render_avatar_variants(data: bytes, sizes=AVATAR_SIZES) -> Dict[int, bytes]:
+    """Encode one square, metadata-free WebP per size from the original image bytes"""
+    if not PIL_AVAILABLE:
+        raise RuntimeError('Avatar processing requires Pillow: pip install Pillow')
+
+    with Image.open(io.BytesIO(data)) as source:
+        width, height = source.size
+        if width * height > MAX_SOURCE_PIXELS:
+            raise ValueError(f'Image too large to process ({width}x{height})')
+        # Ask the decoder for a downscaled image when it can (JPEG draft mode)
+        source.draft('RGB', (max(sizes) * 2, max(sizes) * 2))
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    # Center crop to a square once, then shrink from the largest size down
+    image = ImageOps.fit(image, (max(sizes), max(sizes)), method=Image.LANCZOS)
+    image.info = {}  # drop EXIF/ICC/XMP carried over from the source
+    variants = {}
+    for size in sorted(sizes, reverse=True):
+        if image.size[0] != size:
+            image = image.resize((size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, AVATAR_FORMAT, quality=AVATAR_QUALITY, method=4)
+        variants[size] = output.getvalue()
+    return variants
+
+
+class AvatarPipeline:
+    """Background avatar processing in a bounded thread pool"""
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='avatar')
+            return self._executor
+
+    def submit(self, user_id: int, content_hash: str, force: bool = False):
+        """Queue processing of a user's avatar and return the future"""
+        from flask import current_app
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    return self.process(user_id, content_hash, force=force)
+                except Exception as e:
+                    logger.error(f"Error processing avatar for user {user_id}: {str(e)}")
+                    return False
+                finally:
+                    db.session.remove()
+
+        return self._pool().submit(run)
+
+    def process(self, user_id: int, content_hash: str, force: bool = False) -> bool:
+        """Build and record variants for one avatar; returns True if variants were written"""
+        profile = UserProfile.query.filter_by(user_id=user_id).first()
+        if not profile or profile.avatar_content_hash != content_hash:
+            return False  # avatar replaced or removed since this job was queued
+        if not force and (profile.avatar_variants or {}).get('source') == content_hash:
+            return False  # already processed
+
+        with file_storage_service.open(content_hash) as blob:
+            data = blob.read()
+        rendered = render_avatar_variants(data)
+
+        variants = {'source': content_hash, 'sizes': {}}
+        for size, image_bytes in rendered.items():
+            stored = file_storage_service.save(io.BytesIO(image_bytes), max_size=len(image_bytes),
+                                               mime_type=AVATAR_MIME_TYPE)
+            variants['sizes'][str(size)] = stored.content_hash
+        db.session.commit()
+
+        # Record the variants only if the avatar is still the one we processed
+        profile = UserProfile.query.filter_by(user_id=user_id, avatar_content_hash=content_hash).first()
+        if not profile:
+            release_avatar_variants(variants)
+            return False
+        previous = profile.avatar_variants
+        profile.avatar_variants = variants
+        db.session.commit()
+        release_avatar_variants(previous)
+
+        logger.info(f"Avatar variants {', '.join(variants['sizes'])} built for user {user_id}")
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+def release_avatar_variants(variants: Optional[Dict]) -> None:
+    """Drop the stored-file references held by a profile's avatar variants"""
+    for variant_hash in ((variants or {}).get('sizes') or {}).values():
+        file_storage_service.release(variant_hash)
+
+
+# Global instance
+avatar_pipeline = AvatarPipeline()
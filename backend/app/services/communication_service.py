@@ -1,12 +1,10 @@
-import threading
-import time
 import json
 import smtplib
 import requests
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from sqlalchemy import and_, or_, desc, func, text
+from sqlalchemy import and_, desc, func, text
 from sqlalchemy.orm import joinedload
 
 from app import db, mail
@@ -19,6 +17,10 @@ from app.models.user import User
 from app.models.rbac import AdminUser
 from app.services.audit_service import AuditService
 from app.services.security_service import SecurityService
+from app.services.notification_delivery_engine import NotificationDeliveryEngine
+from app.services.notification_fanout import NotificationFanOut
+from app.services.notification_counters import notification_counters
+from app.services.announcement_visibility import announcement_visibility, announcement_engagement
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -30,8 +32,17 @@ class NotificationService:
     def __init__(self):
         self.audit_service = AuditService()
         self.security_service = SecurityService()
-        self.delivery_queue = []
-        self.is_processing = False
+        self.http = requests.Session()  # Pooled connections for webhook delivery
+        self.delivery_engine = NotificationDeliveryEngine(
+            transports={
+                NotificationType.EMAIL: self._deliver_email_notification,
+                NotificationType.SMS: self._deliver_sms_notification,
+                NotificationType.PUSH: self._deliver_push_notification,
+                NotificationType.IN_APP: self._deliver_in_app_notification,
+                NotificationType.WEBHOOK: self._deliver_webhook_notification,
+            },
+            should_deliver=self._should_deliver_notification
+        )
     
     def create_notification(self, user_id, notification_type, title, message, 
                           admin_user_id=None, priority=NotificationPriority.NORMAL,
@@ -60,6 +71,7 @@ class NotificationService:
             
             db.session.add(notification)
             db.session.commit()
+            notification_counters.notifications_created([user_id])
             
             # Log the action
             if admin_user_id:
@@ -133,98 +145,11 @@ class NotificationService:
     
     def add_to_delivery_queue(self, notification):
         """Add notification to delivery queue"""
-        self.delivery_queue.append(notification)
-        
-        # Start processing if not already running
-        if not self.is_processing:
-            self.start_delivery_processor()
-    
-    def start_delivery_processor(self):
-        """Start the delivery processor in a background thread"""
-        if self.is_processing:
-            return
-        
-        self.is_processing = True
-        thread = threading.Thread(target=self._delivery_processor, daemon=True)
-        thread.start()
-    
-    def _delivery_processor(self):
-        """Background processor for notification delivery"""
-        while self.is_processing and self.delivery_queue:
-            try:
-                notification = self.delivery_queue.pop(0)
-                self._deliver_notification(notification)
-                time.sleep(0.1)  # Small delay to prevent overwhelming
-            except Exception as e:
-                logger.error(f"Error in delivery processor: {str(e)}")
-                time.sleep(1)
-        
-        self.is_processing = False
-    
-    def _deliver_notification(self, notification):
-        """Deliver a single notification"""
-        try:
-            # Check user preferences
-            preferences = self._get_user_preferences(notification.user_id)
-            if not self._should_deliver_notification(notification, preferences):
-                notification.status = NotificationStatus.CANCELLED
-                db.session.commit()
-                return
-            
-            # Attempt delivery based on type
-            success = False
-            error_message = None
-            
-            if notification.type == NotificationType.EMAIL:
-                success, error_message = self._deliver_email_notification(notification)
-            elif notification.type == NotificationType.SMS:
-                success, error_message = self._deliver_sms_notification(notification)
-            elif notification.type == NotificationType.PUSH:
-                success, error_message = self._deliver_push_notification(notification)
-            elif notification.type == NotificationType.IN_APP:
-                success, error_message = self._deliver_in_app_notification(notification)
-            elif notification.type == NotificationType.WEBHOOK:
-                success, error_message = self._deliver_webhook_notification(notification)
-            
-            # Update notification status
-            notification.attempt_count += 1
-            notification.last_attempt_at = datetime.utcnow()
-            
-            if success:
-                notification.status = NotificationStatus.SENT
-                notification.sent_at = datetime.utcnow()
-            else:
-                notification.error_message = error_message
-                if notification.attempt_count >= notification.max_attempts:
-                    notification.status = NotificationStatus.FAILED
-                    notification.failed_at = datetime.utcnow()
-                else:
-                    # Re-queue for retry
-                    self.delivery_queue.append(notification)
-            
-            db.session.commit()
-            
-        except Exception as e:
-            logger.error(f"Error delivering notification {notification.id}: {str(e)}")
-            notification.attempt_count += 1
-            notification.last_attempt_at = datetime.utcnow()
-            notification.error_message = str(e)
-            
-            if notification.attempt_count >= notification.max_attempts:
-                notification.status = NotificationStatus.FAILED
-                notification.failed_at = datetime.utcnow()
-            
-            db.session.commit()
+        self.delivery_engine.submit([notification])
     
-    def _get_user_preferences(self, user_id):
-        """Get user communication preferences"""
-        preferences = CommunicationPreference.query.filter_by(user_id=user_id).first()
-        if not preferences:
-            # Create default preferences
-            preferences = CommunicationPreference(user_id=user_id)
-            db.session.add(preferences)
-            db.session.commit()
-        return preferences
+    def add_many_to_delivery_queue(self, notifications):
+        """Queue many notifications; preferences and recipients are resolved in bulk"""
+        return self.delivery_engine.submit(notifications)
     
     def _should_deliver_notification(self, notification, preferences):
         """Check if notification should be delivered based on user preferences"""
@@ -259,17 +184,19 @@ class NotificationService:
         
         return False
     
+    # Transports run on delivery engine worker threads and receive a
+    # DeliveryJob snapshot, so they must not touch the database.
+    
     def _deliver_email_notification(self, notification):
         """Deliver email notification"""
         try:
-            user = User.query.get(notification.user_id)
-            if not user or not user.email:
+            if not notification.recipient_email:
                 return False, "User email not found"
             
             # Create email message
             msg = MIMEMultipart()
             msg['From'] = 'noreply@tradingjournal.com'  # Configure from app config
-            msg['To'] = user.email
+            msg['To'] = notification.recipient_email
             msg['Subject'] = notification.title
             
             # Add body
@@ -280,7 +207,7 @@ class NotificationService:
             # with mail.connect() as conn:
             #     conn.send(msg)
             
-            logger.info(f"Email notification sent to {user.email}")
+            logger.info(f"Email notification sent to {notification.recipient_email}")
             return True, None
             
         except Exception as e:
@@ -340,7 +267,7 @@ class NotificationService:
                     'timestamp': datetime.utcnow().isoformat()
                 }
                 
-                response = requests.post(webhook_url, json=payload, timeout=10)
+                response = self.http.post(webhook_url, json=payload, timeout=10)
                 response.raise_for_status()
                 
                 logger.info(f"Webhook notification sent to {webhook_url}")
@@ -369,6 +296,7 @@ class NotificationService:
             notification.failed_at = None
             
             db.session.commit()
+            notification_counters.notifications_created([notification.user_id])
             
             # Add to delivery queue
             self.add_to_delivery_queue(notification)
@@ -411,9 +339,12 @@ class NotificationService:
                 raise ValueError("Notification not found")
             
             if notification.type == NotificationType.IN_APP:
+                was_unread = notification.status == NotificationStatus.PENDING
                 notification.status = NotificationStatus.DELIVERED
                 notification.delivered_at = datetime.utcnow()
                 db.session.commit()
+                if was_unread:
+                    notification_counters.notifications_settled([user_id])
             
             return notification
             
@@ -432,8 +363,9 @@ class AnnouncementService:
     def create_announcement(self, admin_user_id, announcement_type, title, content,
                           summary=None, is_global=True, target_user_ids=None,
                           target_user_groups=None, is_scheduled=False, scheduled_at=None,
-                          expires_at=None, is_active=True, is_published=False, metadata=None):
-        """Create a new announcement"""
+                          expires_at=None, is_active=True, is_published=False, metadata=None,
+                          notify_users=False):
+        """Create a new announcement; notify_users fans out notifications once it is live"""
         try:
             announcement = Announcement(
                 admin_user_id=admin_user_id,
@@ -468,6 +400,9 @@ class AnnouncementService:
                 details=f"Created announcement: {title}"
             )
             
+            if notify_users and announcement.published_at:
+                self.notify_announcement(announcement)
+            
             return announcement
             
         except Exception as e:
@@ -475,58 +410,42 @@ class AnnouncementService:
             logger.error(f"Error creating announcement: {str(e)}")
             raise
     
+    def notify_announcement(self, announcement):
+        """
+        Notify the announcement's audience in the background.
+        Recipients are streamed by id and written in bulk chunks, so a global
+        announcement costs a handful of statements instead of one per user.
+        """
+        if announcement.is_global:
+            recipient_ids = [row[0] for row in db.session.query(User.id).filter(User.is_active == True)]
+        else:
+            recipient_ids = list(announcement.target_user_ids or [])
+        if not recipient_ids:
+            return None
+        
+        title = announcement.title
+        message = announcement.summary or announcement.content
+        metadata = {'announcement_id': announcement.id, 'announcement_type': announcement.type.value}
+        
+        def render(user_id, preferences):
+            rows = [{'type': NotificationType.IN_APP, 'title': title, 'message': message,
+                     'notification_metadata': metadata}]
+            if preferences is None or preferences.push_enabled:
+                rows.append({'type': NotificationType.PUSH, 'title': title, 'message': message,
+                             'notification_metadata': metadata})
+            return rows
+        
+        return notification_fanout.fan_out_async(recipient_ids, render)
+    
     def get_visible_announcements(self, user_id=None, user_groups=None):
-        """Get announcements visible to a user"""
+        """
+        Announcements visible to a user, as dictionaries, newest first.
+        Served from the in-memory visibility index, which is rebuilt after
+        announcements are edited; without a user or groups only global
+        announcements are returned.
+        """
         try:
-            now = datetime.utcnow()
-            
-            # Base query for visible announcements
-            query = Announcement.query.filter(
-                Announcement.is_active == True,
-                Announcement.is_published == True,
-                or_(
-                    Announcement.scheduled_at.is_(None),
-                    Announcement.scheduled_at <= now
-                ),
-                or_(
-                    Announcement.expires_at.is_(None),
-                    Announcement.expires_at > now
-                )
-            )
-            
-            # Filter by targeting
-            if user_id or user_groups:
-                # Get global announcements
-                global_announcements = query.filter(Announcement.is_global == True)
-                
-                # Get targeted announcements
-                targeted_announcements = query.filter(Announcement.is_global == False)
-                
-                if user_id:
-                    # Check user-specific targeting
-                    targeted_announcements = targeted_announcements.filter(
-                        or_(
-                            Announcement.target_user_ids.contains([user_id]),
-                            Announcement.target_user_ids.is_(None)
-                        )
-                    )
-                
-                if user_groups:
-                    # Check group targeting
-                    targeted_announcements = targeted_announcements.filter(
-                        or_(
-                            Announcement.target_user_groups.overlap(user_groups),
-                            Announcement.target_user_groups.is_(None)
-                        )
-                    )
-                
-                # Combine results
-                announcements = global_announcements.union(targeted_announcements)
-            else:
-                # Return only global announcements
-                announcements = query.filter(Announcement.is_global == True)
-            
-            return announcements.order_by(desc(Announcement.created_at)).all()
+            return announcement_visibility.visible(user_id, user_groups)
             
         except Exception as e:
             logger.error(f"Error getting visible announcements: {str(e)}")
@@ -534,67 +453,13 @@ class AnnouncementService:
     
     def record_announcement_view(self, announcement_id, user_id, session_id=None,
                                ip_address=None, user_agent=None):
-        """Record that a user viewed an announcement"""
-        try:
-            # Check if view already exists
-            existing_view = AnnouncementView.query.filter_by(
-                announcement_id=announcement_id,
-                user_id=user_id
-            ).first()
-            
-            if existing_view:
-                # Update existing view
-                existing_view.viewed_at = datetime.utcnow()
-                existing_view.session_id = session_id
-                existing_view.ip_address = ip_address
-                existing_view.user_agent = user_agent
-            else:
-                # Create new view
-                view = AnnouncementView(
-                    announcement_id=announcement_id,
-                    user_id=user_id,
-                    session_id=session_id,
-                    ip_address=ip_address,
-                    user_agent=user_agent
-                )
-                db.session.add(view)
-                
-                # Increment view count
-                announcement = Announcement.query.get(announcement_id)
-                if announcement:
-                    announcement.view_count += 1
-            
-            db.session.commit()
-            
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Error recording announcement view: {str(e)}")
-            raise
+        """Queue a view of an announcement; views are written in background batches"""
+        announcement_engagement.record_view(announcement_id, user_id, session_id=session_id,
+                                            ip_address=ip_address, user_agent=user_agent)
     
     def record_announcement_click(self, announcement_id, user_id, session_id=None):
-        """Record that a user clicked on an announcement"""
-        try:
-            view = AnnouncementView.query.filter_by(
-                announcement_id=announcement_id,
-                user_id=user_id
-            ).first()
-            
-            if view and not view.clicked:
-                view.clicked = True
-                view.clicked_at = datetime.utcnow()
-                view.session_id = session_id
-                
-                # Increment click count
-                announcement = Announcement.query.get(announcement_id)
-                if announcement:
-                    announcement.click_count += 1
-                
-                db.session.commit()
-            
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Error recording announcement click: {str(e)}")
-            raise
+        """Queue a click on an announcement; counted once, for users who have viewed it"""
+        announcement_engagement.record_click(announcement_id, user_id, session_id=session_id)
     
     def get_announcement_statistics(self, announcement_id):
         """Get statistics for an announcement"""
@@ -800,6 +665,7 @@ class CommunicationPreferenceService:
                     setattr(preferences, field, value)
             
             db.session.commit()
+            notification_service.delivery_engine.preferences.invalidate(user_id)
             
             # Log the action if admin is updating
             if admin_user_id:
@@ -862,6 +728,7 @@ class CommunicationPreferenceService:
 
 # Initialize services
 notification_service = NotificationService()
+notification_fanout = NotificationFanOut(notification_service.delivery_engine)
 announcement_service = AnnouncementService()
 messaging_service = MessagingService()
 communication_preference_service = CommunicationPreferenceService()
@@ -0,0 +1,276 @@
+"""
+Coupon Redemption Service
+Atomic usage counters for promotions, coupons and affiliate referral codes.
+
+Each redemption is one conditional UPDATE that increments the counter only
+while it is under its limit (`... WHERE usage_count < usage_limit
+RETURNING ...`), so concurrent checkouts cannot oversell a code and no
+counter is ever read into Python first. Nothing here commits; the counter
+changes land with the caller's transaction, and the row lock is held only
+until that commit.
+
+Once a limited code runs out it is flagged sold out in the shared store for
+COUPON_SOLD_OUT_TTL seconds, and further attempts are refused without
+touching its row, which keeps flash-sale codes from queueing on one lock.
+A transaction that takes the last use sets the flag only when it commits.
+
+Affiliate conversion rates and performance tiers are derived values; the
+affiliates touched by a transaction are recalculated in one statement on a
+background thread after it commits, instead of inside the checkout.
+"""
+
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, case, cast, event, or_, select, update
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models.affiliate import Affiliate
+from ..models.coupon import Coupon
+from ..models.promotion import Promotion
+from ..utils.logger import get_logger
+from ..utils.shared_store import SharedTTLStore
+
+logger = get_logger(__name__)
+
+# Session.info key collecting affiliate ids whose derived metrics need recalculating
+PENDING_AFFILIATES = 'coupon_redemption_affiliates'
+# Session.info key collecting codes whose last use this transaction took
+PENDING_SOLD_OUT = 'coupon_redemption_sold_out'
+
+
+def _under_limit(count, limit):
+    # A missing or zero limit means unlimited, as Promotion.is_valid and Coupon.is_valid treat it
+    return or_(limit.is_(None), limit == 0, count < limit)
+
+
+def _affiliate_rates() -> Dict:
+    """conversion_rate and performance in SQL, as Affiliate.update_conversion_rate/calculate_performance compute them"""
+    affiliates = Affiliate.__table__
+    rate = case((affiliates.c.referrals > 0,
+                 db.func.round(affiliates.c.conversions * 100.0 / affiliates.c.referrals, 1)), else_=0.0)
+    performance = case((rate >= 40, 'excellent'), (rate >= 30, 'good'), (rate >= 10, 'poor'), else_='new')
+    return {'conversion_rate': rate, 'performance': cast(performance, affiliates.c.performance.type)}
+
+
+class AffiliateMetricsRecalculator:
+    """Recalculates affiliate conversion rates and performance shortly after their counters change"""
+
+    def __init__(self, delay: float = None):
+        self.delay = delay if delay is not None else float(os.getenv('AFFILIATE_METRICS_DELAY', 2.0))
+        self._pending = set()
+        self._timer = None
+        self._lock = threading.Lock()
+        self.runs = 0
+
+    def schedule(self, affiliate_ids: Iterable[int]) -> None:
+        """Queue affiliates for the next background pass, starting one if none is waiting"""
+        if not has_app_context():
+            logger.warning("Affiliate metrics not scheduled: no application context")
+            return
+        with self._lock:
+            self._pending.update(affiliate_ids)
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self._run, args=(current_app._get_current_object(),))
+                self._timer.daemon = True
+                self._timer.name = 'affiliate-metrics'
+                self._timer.start()
+
+    def _run(self, app) -> None:
+        with self._lock:
+            affiliate_ids, self._pending, self._timer = self._pending, set(), None
+        with app.app_context():
+            try:
+                self.recalculate(affiliate_ids)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error recalculating affiliate metrics: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def recalculate(self, affiliate_ids: Iterable[int]) -> int:
+        """Recompute and commit derived metrics for the given affiliates; returns rows updated"""
+        affiliate_ids = sorted(set(affiliate_ids))
+        if not affiliate_ids:
+            return 0
+        affiliates = Affiliate.__table__
+        result = db.session.execute(
+            update(affiliates).where(affiliates.c.id.in_(affiliate_ids)).values(**_affiliate_rates())
+        )
+        db.session.commit()
+        self.runs += 1
+        return result.rowcount
+
+
+class CouponRedemptionService:
+    """Contention-free usage counting for promotions, coupons and affiliate codes"""
+
+    def __init__(self, sold_out_ttl: int = None):
+        self.sold_out_ttl = sold_out_ttl or int(os.getenv('COUPON_SOLD_OUT_TTL', 30))
+        self.store = SharedTTLStore('coupon_redemptions')
+        self.metrics = AffiliateMetricsRecalculator()
+        self._lock = threading.Lock()
+        self._stats = {'redeemed': 0, 'rejected': 0, 'sold_out_fast_path': 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _is_sold_out(self, key: str) -> bool:
+        if self.store.get_json(f"sold_out:{key}"):
+            self._count('sold_out_fast_path')
+            return True
+        return False
+
+    def _mark_sold_out(self, key: str) -> None:
+        self.store.set_json(f"sold_out:{key}", True, self.sold_out_ttl)
+
+    def _mark_sold_out_on_commit(self, key: str) -> None:
+        # The use is only real once the caller commits; a rolled-back checkout must not block the code
+        db.session.info.setdefault(PENDING_SOLD_OUT, set()).add(key)
+
+    def _mark_found_sold_out(self, key: str) -> None:
+        """Flag a code other checkouts already used up, unless this transaction took the last use itself"""
+        if key in db.session.info.get(PENDING_SOLD_OUT, ()):
+            return
+        self._mark_sold_out(key)
+
+    def clear_sold_out(self, kind: str, record_id: int) -> None:
+        """Forget a sold-out flag, e.g. after an admin raises a limit"""
+        self.store.delete(f"sold_out:{kind}:{record_id}")
+
+    def _touch_affiliate(self, affiliate_id: int) -> None:
+        db.session.info.setdefault(PENDING_AFFILIATES, set()).add(affiliate_id)
+
+    def redeem_promotion(self, promotion_id: int, revenue_amount=0) -> Tuple[bool, str]:
+        """Count one use of a promotion and its revenue; (False, reason) when it cannot be used"""
+        key = f"promotion:{promotion_id}"
+        if self._is_sold_out(key):
+            self._count('rejected')
+            return False, "Usage limit reached"
+
+        now = datetime.utcnow()
+        promotions = Promotion.__table__
+        used = db.func.coalesce(promotions.c.usage_count, 0)
+        row = db.session.execute(
+            update(promotions)
+            .where(promotions.c.id == promotion_id,
+                   promotions.c.status == 'active',
+                   _under_limit(used, promotions.c.usage_limit),
+                   or_(promotions.c.start_date.is_(None), promotions.c.start_date <= now),
+                   or_(promotions.c.end_date.is_(None), promotions.c.end_date >= now))
+            .values(usage_count=used + 1,
+                    revenue=db.func.coalesce(promotions.c.revenue, 0) + (revenue_amount or 0),
+                    conversions=db.func.coalesce(promotions.c.conversions, 0) + 1,
+                    # The last permitted use expires the promotion, as Promotion.update_status would
+                    status=case((and_(promotions.c.usage_limit > 0, used + 1 >= promotions.c.usage_limit), 'expired'),
+                                else_=promotions.c.status),
+                    updated_at=now)
+            .returning(promotions.c.usage_count, promotions.c.usage_limit)
+        ).first()
+
+        if row:
+            self._count('redeemed')
+            if row.usage_limit and row.usage_count >= row.usage_limit:
+                self._mark_sold_out_on_commit(key)
+            return True, "Success"
+
+        self._count('rejected')
+        current = db.session.execute(
+            select(promotions.c.status, promotions.c.usage_count, promotions.c.usage_limit)
+            .where(promotions.c.id == promotion_id)
+        ).first()
+        if current is None:
+            return False, "Promotion not found"
+        if current.usage_limit and (current.usage_count or 0) >= current.usage_limit:
+            self._mark_found_sold_out(key)
+            return False, "Usage limit reached"
+        if current.status != 'active':
+            return False, f"Promotion is {current.status}"
+        return False, "Promotion is not valid"
+
+    def redeem_coupon(self, coupon_id: int) -> bool:
+        """Count one use of a coupon; an affiliate code also counts a referral for its affiliate"""
+        key = f"coupon:{coupon_id}"
+        if self._is_sold_out(key):
+            self._count('rejected')
+            return False
+
+        now = datetime.utcnow()
+        coupons = Coupon.__table__
+        used = db.func.coalesce(coupons.c.used_count, 0)
+        row = db.session.execute(
+            update(coupons)
+            .where(coupons.c.id == coupon_id,
+                   coupons.c.is_active.is_(True),
+                   _under_limit(used, coupons.c.max_uses),
+                   or_(coupons.c.valid_from.is_(None), coupons.c.valid_from <= now),
+                   or_(coupons.c.valid_until.is_(None), coupons.c.valid_until >= now))
+            .values(used_count=used + 1, updated_at=now)
+            .returning(coupons.c.used_count, coupons.c.max_uses, coupons.c.is_affiliate_code, coupons.c.affiliate_id)
+        ).first()
+
+        if not row:
+            self._count('rejected')
+            limits = db.session.execute(
+                select(coupons.c.used_count, coupons.c.max_uses).where(coupons.c.id == coupon_id)
+            ).first()
+            if limits and limits.max_uses and (limits.used_count or 0) >= limits.max_uses:
+                self._mark_found_sold_out(key)
+            return False
+
+        self._count('redeemed')
+        if row.max_uses and row.used_count >= row.max_uses:
+            self._mark_sold_out_on_commit(key)
+        if row.is_affiliate_code and row.affiliate_id:
+            affiliates = Affiliate.__table__
+            db.session.execute(
+                update(affiliates).where(affiliates.c.id == row.affiliate_id)
+                .values(referrals=affiliates.c.referrals + 1, updated_at=now)
+            )
+            self._touch_affiliate(row.affiliate_id)
+        return True
+
+    def record_conversion(self, affiliate_id: int, commission: float) -> None:
+        """Count a paid conversion and its commission for an affiliate"""
+        affiliates = Affiliate.__table__
+        db.session.execute(
+            update(affiliates).where(affiliates.c.id == affiliate_id).values(
+                conversions=affiliates.c.conversions + 1,
+                total_earnings=affiliates.c.total_earnings + (commission or 0),
+                updated_at=datetime.utcnow())
+        )
+        self._touch_affiliate(affiliate_id)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({'metrics_runs': self.metrics.runs, 'sold_out_ttl': self.sold_out_ttl})
+        return stats
+
+
+# Global instance
+coupon_redemption_service = CouponRedemptionService()
+
+
+@event.listens_for(Session, 'after_commit')
+def _schedule_affiliate_metrics(session):
+    affiliate_ids = session.info.pop(PENDING_AFFILIATES, None)
+    if affiliate_ids:
+        coupon_redemption_service.metrics.schedule(affiliate_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_sold_out(session):
+    for key in session.info.pop(PENDING_SOLD_OUT, None) or ():
+        coupon_redemption_service._mark_sold_out(key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_updates(session):
+    session.info.pop(PENDING_AFFILIATES, None)
+    session.info.pop(PENDING_SOLD_OUT, None)
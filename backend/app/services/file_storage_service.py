@@ -0,0 +1,370 @@
+"""
+File Storage Service
+
+Content-addressed storage for uploads (support attachments, avatars).
+Uploads are streamed to a temporary file in fixed-size chunks while their
+SHA-256 is computed and the size limit is enforced, then stored under the
+digest. Identical files are stored once; StoredFile rows count references
+and a blob is removed when its last reference is released.
+
+The StoredFile row serialises writers and deleters of a blob: save() takes
+its reference (locking or inserting the row) before writing the blob, and
+release() deletes the blob while holding the row lock, so an upload can
+never skip writing a blob that is about to be deleted. A blob written for
+a reference that is then rolled back is removed again.
+
+Backends share one interface: LocalStorageBackend (a directory) and
+S3StorageBackend (any S3-compatible service; boto3 is optional).
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+from flask import current_app, redirect, send_file, Response
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models.stored_file import StoredFile
+from ..utils.logger import get_logger
+
+try:
+    import boto3
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# session.info key: blobs written in the session's open transaction
+NEW_BLOBS = 'file_storage_new_blobs'
+
+
+class FileTooLargeError(ValueError):
+    """Raised while streaming when an upload exceeds its size limit"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f'File too large. Maximum size is {max_size // (1024 * 1024)}MB')
+        self.max_size = max_size
+
+
+def storage_key(content_hash: str) -> str:
+    """Fan blobs out over two directory levels: ab/cd/abcd..."""
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+
+class LocalStorageBackend:
+    """Blobs in a local directory"""
+
+    name = 'local'
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.temp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def store(self, temp_path: str, key: str, mime_type: str) -> bool:
+        """Move a finished upload into place; False if the blob already existed"""
+        path = self.path(key)
+        if os.path.exists(path):
+            os.unlink(temp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)  # atomic on the same filesystem
+        return True
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def open(self, key: str):
+        return open(self.path(key), 'rb')
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self.path(key)
+
+    def presigned_url(self, key: str, download_name: str, mime_type: str,
+                      as_attachment: bool, expires_in: int = 300) -> Optional[str]:
+        return None
+
+
+class S3StorageBackend:
+    """Blobs in an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    name = 's3'
+
+    def __init__(self, bucket: str, prefix: str = '', client=None, endpoint_url: str = None, region: str = None):
+        if client is None:
+            if not BOTO3_AVAILABLE:
+                raise RuntimeError('S3 storage requires boto3: pip install boto3')
+            client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.temp_dir = tempfile.gettempdir()
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def store(self, temp_path: str, key: str, mime_type: str) -> bool:
+        try:
+            if self.exists(key):
+                return False
+            # upload_file switches to multipart uploads for large files
+            self.client.upload_file(temp_path, self.bucket, self._object_key(key),
+                                    ExtraArgs={'ContentType': mime_type})
+            return True
+        finally:
+            os.unlink(temp_path)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            status = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if status in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def open(self, key: str):
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body']
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    def presigned_url(self, key: str, download_name: str, mime_type: str,
+                      as_attachment: bool, expires_in: int = 300) -> Optional[str]:
+        disposition = 'attachment' if as_attachment else 'inline'
+        return self.client.generate_presigned_url('get_object', Params={
+            'Bucket': self.bucket,
+            'Key': self._object_key(key),
+            'ResponseContentType': mime_type,
+            'ResponseContentDisposition': f'{disposition}; filename="{download_name}"'
+        }, ExpiresIn=expires_in)
+
+
+class FileStorageService:
+    """Streaming, deduplicated file storage with reference counting"""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        """Backend configured from the app config on first use"""
+        if self._backend is None:
+            config = current_app.config
+            if config.get('STORAGE_BACKEND') == 's3':
+                self._backend = S3StorageBackend(
+                    bucket=config['STORAGE_S3_BUCKET'],
+                    prefix=config.get('STORAGE_S3_PREFIX', ''),
+                    endpoint_url=config.get('STORAGE_S3_ENDPOINT_URL'),
+                    region=config.get('STORAGE_S3_REGION')
+                )
+            else:
+                self._backend = LocalStorageBackend(
+                    config.get('STORAGE_ROOT') or os.path.join(current_app.root_path, '..', 'uploads', 'store')
+                )
+            logger.info(f"File storage using {self._backend.name} backend")
+        return self._backend
+
+    def save(self, stream, max_size: int, mime_type: str = None) -> StoredFile:
+        """
+        Stream an upload into storage and add one reference to it.
+        The reference is flushed, not committed, so it commits together with
+        the record that points at it. Raises FileTooLargeError past max_size.
+        """
+        backend = self.backend
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=backend.temp_dir, prefix='upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise FileTooLargeError(max_size)
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            content_hash = digest.hexdigest()
+            key = storage_key(content_hash)
+            # Hold the row before touching the blob so a concurrent release cannot delete it
+            stored = self._add_reference(content_hash, key, size, mime_type or 'application/octet-stream')
+            created = backend.store(temp_path, key, mime_type or 'application/octet-stream')
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        if created:
+            db.session.info.setdefault(NEW_BLOBS, []).append((db.session.get_bind(), backend, content_hash, key))
+        logger.info(f"Stored {content_hash[:12]} ({size} bytes, {'new' if created else 'deduplicated'}, "
+                    f"{stored.ref_count} references)")
+        return stored
+
+    def _add_reference(self, content_hash: str, key: str, size: int, mime_type: str) -> StoredFile:
+        updated = StoredFile.query.filter_by(content_hash=content_hash).update(
+            {StoredFile.ref_count: StoredFile.ref_count + 1}, synchronize_session=False
+        )
+        if not updated:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(StoredFile(content_hash=content_hash, storage_key=key, size=size,
+                                              mime_type=mime_type, ref_count=1))
+            except IntegrityError:
+                # A concurrent upload of the same content created the row first
+                StoredFile.query.filter_by(content_hash=content_hash).update(
+                    {StoredFile.ref_count: StoredFile.ref_count + 1}, synchronize_session=False
+                )
+        db.session.flush()
+        stored = StoredFile.query.filter_by(content_hash=content_hash).one()
+        db.session.refresh(stored)
+        return stored
+
+    def release(self, content_hash: Optional[str]) -> None:
+        """
+        Drop one reference, deleting the blob with its last reference.
+        Call after the referencing record's deletion has been committed.
+        """
+        if not content_hash:
+            return
+        try:
+            stored = StoredFile.query.filter_by(content_hash=content_hash).with_for_update().first()
+            if not stored:
+                return
+            stored.ref_count -= 1
+            if stored.ref_count <= 0:
+                # Deleted under the row lock: an upload of the same content waits for
+                # this transaction and then writes the blob afresh
+                self.backend.delete(stored.storage_key)
+                db.session.delete(stored)
+                logger.info(f"Deleted unreferenced blob {content_hash[:12]}")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error releasing stored file {content_hash[:12]}: {str(e)}")
+
+    @staticmethod
+    def discard_new_blob(bind, backend, content_hash: str, key: str) -> None:
+        """
+        Delete a blob whose reference was rolled back, unless another upload
+        of the same content has referenced it since. Inserting an empty row
+        first waits out any concurrent upload still holding an uncommitted one.
+        """
+        table = StoredFile.__table__
+        try:
+            with bind.connect() as connection:
+                try:
+                    with connection.begin():
+                        connection.execute(table.insert().values(
+                            content_hash=content_hash, storage_key=key, size=0, ref_count=0
+                        ))
+                except IntegrityError:
+                    pass
+                with connection.begin():
+                    ref_count = connection.execute(
+                        select(table.c.ref_count).where(table.c.content_hash == content_hash).with_for_update()
+                    ).scalar()
+                    if ref_count is not None and ref_count <= 0:
+                        backend.delete(key)
+                        connection.execute(table.delete().where(table.c.content_hash == content_hash))
+                        logger.info(f"Deleted blob {content_hash[:12]} after its upload was rolled back")
+        except Exception as e:
+            logger.error(f"Error discarding blob {content_hash[:12]}: {str(e)}")
+
+    def get(self, content_hash: str) -> Optional[StoredFile]:
+        return StoredFile.query.filter_by(content_hash=content_hash).first()
+
+    def open(self, content_hash: str):
+        return self.backend.open(storage_key(content_hash))
+
+    def send(self, content_hash: str, download_name: str, mime_type: str = None,
+             as_attachment: bool = True, max_age: int = None) -> Response:
+        """
+        Response for a stored file. Local files are handed to the web server
+        (X-Sendfile / X-Accel-Redirect) when configured, otherwise streamed
+        with Range and conditional request support; S3 objects redirect to a
+        short-lived presigned URL.
+        """
+        backend = self.backend
+        key = storage_key(content_hash)
+        mime_type = mime_type or 'application/octet-stream'
+
+        url = backend.presigned_url(key, download_name, mime_type, as_attachment)
+        if url:
+            return redirect(url)
+
+        path = backend.local_path(key)
+        mode = current_app.config.get('STORAGE_SENDFILE', '')
+        if mode == 'x-accel-redirect':
+            response = Response(mimetype=mime_type)
+            response.headers['X-Accel-Redirect'] = f"{current_app.config.get('STORAGE_ACCEL_PREFIX', '/protected-files')}/{key}"
+        elif mode == 'x-sendfile':
+            response = Response(mimetype=mime_type)
+            response.headers['X-Sendfile'] = path
+        else:
+            # conditional=True answers Range and If-None-Match requests
+            return send_file(path, mimetype=mime_type, as_attachment=as_attachment,
+                             download_name=download_name, conditional=True,
+                             etag=content_hash, max_age=max_age)
+
+        disposition = 'attachment' if as_attachment else 'inline'
+        response.headers['Content-Disposition'] = f'{disposition}; filename="{download_name}"'
+        response.headers['ETag'] = f'"{content_hash}"'
+        if max_age is not None:
+            response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        return response
+
+
+def incoming_file(request, field: str = 'file'):
+    """
+    (stream, filename, mime_type) for an upload, or None.
+    Accepts multipart form uploads and raw request bodies (filename from the
+    X-File-Name header), which stream without being spooled first.
+    """
+    if field in request.files:
+        file = request.files[field]
+        if not file.filename:
+            return None
+        return file.stream, file.filename, file.content_type
+    filename = request.headers.get('X-File-Name')
+    if filename and request.content_length:
+        return request.stream, filename, request.mimetype
+    return None
+
+
+# Global instance
+file_storage_service = FileStorageService()
+
+
+@event.listens_for(Session, 'after_commit')
+def _keep_new_blobs(session):
+    if not session.in_nested_transaction():
+        session.info.pop(NEW_BLOBS, None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_new_blobs(session, previous_transaction):
+    if previous_transaction.parent is None:
+        for blob in session.info.pop(NEW_BLOBS, None) or ():
+            FileStorageService.discard_new_blob(*blob)
@@ -0,0 +1,509 @@
+"""
+Fraud Batch Scoring Service
+Re-scores historical orders against the current fraud rules in bulk.
+
+Runs either from scripts/rescore_fraud_orders.py or as a background job
+started from the admin API; job status is kept in a shared store so any
+worker can report it.
+"""
+
+import os
+import threading
+import time
+import ipaddress
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterator
+from uuid import uuid4
+import logging
+
+from sqlalchemy import select
+
+from .. import db
+from ..utils.shared_store import SharedTTLStore
+from .fraud_detection_service import FraudDetectionService
+
+logger = logging.getLogger(__name__)
+
+# Title prefix that identifies alerts written by batch re-scoring
+BATCH_ALERT_TITLE = 'Batch Re-score'
+
+# How long a finished job's status can still be looked up
+JOB_TTL = int(os.getenv('FRAUD_BATCH_JOB_TTL', '86400'))
+
+# Scoring rules are loaded once per worker process
+_worker_rules = None
+
+
+def _get_worker_rules() -> FraudDetectionService:
+    global _worker_rules
+    if _worker_rules is None:
+        _worker_rules = FraudDetectionService()
+    return _worker_rules
+
+
+def classify_ip(ip_address: Optional[str], rules: FraudDetectionService) -> str:
+    """Classify an IP address into a coarse class used as a scoring feature"""
+    if not ip_address or ip_address == 'unknown':
+        return 'missing'
+    try:
+        ip = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return 'invalid'
+    if rules._is_suspicious_ip(ip_address):
+        return 'suspicious'
+    if rules._is_vpn_or_proxy(ip_address):
+        return 'vpn_proxy'
+    if ip.is_loopback or ip.is_private:
+        return 'private'
+    return 'public'
+
+
+def score_feature_chunk(features: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Score a columnar chunk of order features.
+    Module-level so it can be shipped to a process pool; mirrors the
+    weighting of FraudDetectionService.analyze_payment_risk without the
+    per-request side effects (alert persistence, session tracking).
+    """
+    rules = _get_worker_rules()
+    weights = rules.risk_weights
+    disposable_domains = set(rules.suspicious_patterns['email_domains'])
+    email_limit = rules.velocity_limits['same_email']
+    ip_limit = rules.velocity_limits['same_ip']
+
+    results = []
+    for i, order_id in enumerate(features['order_id']):
+        factors = []
+
+        # Email component
+        email = features['email'][i]
+        email_score = 0.0
+        if not email:
+            factors.append('No email provided')
+            email_score = 0.3
+        else:
+            if features['email_domain'][i] in disposable_domains:
+                factors.append('Disposable email domain detected')
+                email_score += 0.4
+            if any(pattern in email for pattern in ('test', 'fake', 'dummy')):
+                factors.append('Suspicious email pattern')
+                email_score += 0.3
+
+        # IP component
+        ip_class = features['ip_class'][i]
+        ip_score = 0.0
+        if ip_class == 'missing':
+            factors.append('No IP address')
+            ip_score = 0.2
+        elif ip_class == 'suspicious':
+            factors.append('Suspicious IP address')
+            ip_score = 0.3
+        elif ip_class == 'vpn_proxy':
+            factors.append('VPN/Proxy detected')
+            ip_score = 0.4
+
+        # Card component (only the BIN survives tokenization)
+        card_bin = features['card_bin'][i]
+        card_score = 0.0
+        if not card_bin:
+            factors.append('No card data provided')
+            card_score = 0.5
+        elif rules._is_high_risk_bin(card_bin):
+            factors.append('High-risk BIN detected')
+            card_score = 0.3
+
+        # Velocity component from the trailing one-hour window
+        velocity_score = 0.0
+        if features['email_velocity'][i] > email_limit:
+            factors.append('High email velocity detected')
+            velocity_score += 0.4
+        if features['ip_velocity'][i] > ip_limit:
+            factors.append('High IP velocity detected')
+            velocity_score += 0.5
+
+        # Behavioral component
+        amount = features['amount'][i] or 0
+        behavior_score = 0.0
+        if amount > 10000:
+            factors.append('Unusually high payment amount')
+            behavior_score += 0.3
+        if amount > 0 and amount % 100 == 0:
+            factors.append('Round number payment amount')
+            behavior_score += 0.1
+
+        risk_score = min(
+            min(email_score, 1.0) * weights['email'] +
+            min(ip_score, 1.0) * weights['ip'] +
+            min(card_score, 1.0) * weights['card'] +
+            min(velocity_score, 1.0) * weights['velocity'] +
+            min(behavior_score, 1.0) * weights['behavior'],
+            1.0
+        )
+
+        results.append({
+            'order_id': order_id,
+            'risk_score': risk_score,
+            'risk_level': rules._determine_risk_level(risk_score),
+            'risk_factors': factors
+        })
+
+    return results
+
+
+class _VelocityWindow:
+    """Trailing time-window counter per key, fed in timestamp order"""
+
+    def __init__(self, window_seconds: int):
+        self.window = timedelta(seconds=window_seconds)
+        self._events = defaultdict(deque)
+
+    def add(self, key: Optional[str], timestamp: datetime) -> int:
+        """Record an event and return the count inside the window ending at timestamp"""
+        if not key:
+            return 0
+        events = self._events[key]
+        events.append(timestamp)
+        cutoff = timestamp - self.window
+        while events and events[0] < cutoff:
+            events.popleft()
+        return len(events)
+
+
+class FraudBatchScoringService:
+    """Batch re-scoring of historical orders for fraud operations"""
+
+    def __init__(self):
+        self.default_days = 90
+        self.default_chunk_size = 500
+        self.velocity_window_seconds = 3600  # Matches the live per-hour velocity limits
+        self.persist_levels = {'medium', 'high', 'critical'}
+        self.jobs = SharedTTLStore('fraud_batch_jobs')
+        self._job_lock = threading.Lock()
+        self._running_job = None
+
+    def start_job(self, app, **options) -> Dict[str, Any]:
+        """
+        Run score_historical_orders on a background thread and return its job
+        status. Only one job runs per process; while it runs, starting another
+        returns the running one.
+        """
+        with self._job_lock:
+            if self._running_job:
+                return self.get_job(self._running_job) or {'job_id': self._running_job, 'status': 'running'}
+            job_id = f"RESCORE_JOB_{uuid4().hex[:12].upper()}"
+            self._running_job = job_id
+        job = {'job_id': job_id, 'status': 'running', 'options': options,
+               'started_at': datetime.utcnow().isoformat()}
+        self.jobs.set_json(job_id, job, JOB_TTL)
+
+        def run():
+            with app.app_context():
+                try:
+                    job['summary'] = self.score_historical_orders(**options)
+                    job['status'] = 'completed'
+                except Exception as e:
+                    logger.error(f"Fraud batch scoring job {job_id} failed: {str(e)}")
+                    job['status'] = 'failed'
+                    job['error'] = str(e)
+                finally:
+                    db.session.remove()
+                    job['finished_at'] = datetime.utcnow().isoformat()
+                    self.jobs.set_json(job_id, job, JOB_TTL)
+                    with self._job_lock:
+                        self._running_job = None
+
+        threading.Thread(target=run, name='fraud-batch-scoring', daemon=True).start()
+        return dict(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a background job, with its summary once it has finished"""
+        return self.jobs.get_json(job_id)
+
+    def score_historical_orders(self, days: int = None, chunk_size: int = None,
+                                workers: int = None, persist: bool = True) -> Dict[str, Any]:
+        """Stream orders from the last `days` days, score them in chunks and bulk-write alerts"""
+        days = days or self.default_days
+        chunk_size = chunk_size or self.default_chunk_size
+        workers = max(1, workers or 1)
+        run_id = f"RESCORE_{uuid4().hex[:12].upper()}"
+        since = datetime.utcnow() - timedelta(days=days)
+
+        summary = {
+            'run_id': run_id,
+            'days': days,
+            'orders_scored': 0,
+            'alerts_created': 0,
+            'alerts_updated': 0,
+            'patterns_created': 0,
+            'patterns_updated': 0,
+            'risk_levels': {'low': 0, 'medium': 0, 'high': 0, 'critical': 0},
+            'persisted': persist
+        }
+        started = time.perf_counter()
+
+        chunks = self._iter_feature_chunks(since, chunk_size)
+        for chunk_results, chunk_context in self._score_chunks(chunks, workers):
+            summary['orders_scored'] += len(chunk_results)
+            for result in chunk_results:
+                summary['risk_levels'][result['risk_level']] += 1
+            if persist:
+                written = self._persist_chunk(run_id, chunk_results, chunk_context)
+                summary['alerts_created'] += written['alerts_created']
+                summary['alerts_updated'] += written['alerts_updated']
+                summary['patterns_created'] += written['patterns_created']
+                summary['patterns_updated'] += written['patterns_updated']
+
+        elapsed = time.perf_counter() - started
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['orders_per_second'] = round(summary['orders_scored'] / elapsed, 1) if elapsed > 0 else 0.0
+
+        logger.info(
+            f"Fraud batch scoring {run_id}: {summary['orders_scored']} orders in "
+            f"{summary['elapsed_seconds']}s ({summary['orders_per_second']}/s), "
+            f"{summary['alerts_created']} alerts"
+        )
+        return summary
+
+    def _score_chunks(self, chunks: Iterator, workers: int) -> Iterator:
+        """Score feature chunks inline or across a process pool, preserving chunk order"""
+        if workers == 1:
+            for features, context in chunks:
+                yield score_feature_chunk(features), context
+            return
+
+        # Keep a bounded number of chunks in flight so memory stays flat
+        max_in_flight = workers * 2
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for features, context in chunks:
+                pending.append((executor.submit(score_feature_chunk, features), context))
+                if len(pending) >= max_in_flight:
+                    future, ctx = pending.popleft()
+                    yield future.result(), ctx
+            while pending:
+                future, ctx = pending.popleft()
+                yield future.result(), ctx
+
+    def _iter_feature_chunks(self, since: datetime, chunk_size: int) -> Iterator:
+        """Stream orders in time order and emit columnar feature chunks"""
+        from ..models.payment import Order
+
+        rules = _get_worker_rules()
+        email_window = _VelocityWindow(self.velocity_window_seconds)
+        ip_window = _VelocityWindow(self.velocity_window_seconds)
+
+        statement = select(
+            Order.id, Order.customer_email, Order.total_amount,
+            Order.created_at, Order.order_metadata
+        ).where(
+            Order.created_at >= since
+        ).order_by(
+            Order.created_at, Order.id
+        )
+
+        # Stream on a dedicated connection so per-chunk commits on the
+        # session do not close the server-side cursor
+        with db.engine.connect() as connection:
+            result = connection.execution_options(yield_per=chunk_size).execute(statement)
+            partitions = result.partitions()
+            if db.engine.dialect.name == 'sqlite':
+                # SQLite cannot commit while a read cursor is open (development only)
+                partitions = list(partitions)
+                connection.close()
+            for batch in partitions:
+                yield self._extract_features(batch, rules, email_window, ip_window)
+
+    def _extract_features(self, rows: List[Any], rules: FraudDetectionService,
+                          email_window: _VelocityWindow, ip_window: _VelocityWindow):
+        """Build the columnar feature set for one chunk of order rows"""
+        order_ids = [row.id for row in rows]
+        payment_info = self._load_payment_info(order_ids)
+
+        features = {
+            'order_id': order_ids,
+            'email': [],
+            'email_domain': [],
+            'ip_class': [],
+            'card_bin': [],
+            'email_velocity': [],
+            'ip_velocity': [],
+            'amount': []
+        }
+        context = {}
+
+        for row in rows:
+            email = (row.customer_email or '').strip().lower()
+            metadata = row.order_metadata or {}
+            payment_id, payment_metadata = payment_info.get(row.id, (None, None))
+            ip_address = metadata.get('ip_address') or metadata.get('client_ip')
+            created_at = row.created_at or datetime.utcnow()
+
+            features['email'].append(email)
+            features['email_domain'].append(email.split('@')[-1] if email else '')
+            features['ip_class'].append(classify_ip(ip_address, rules))
+            features['card_bin'].append(self._extract_card_bin(metadata, payment_metadata))
+            features['email_velocity'].append(email_window.add(email, created_at))
+            features['ip_velocity'].append(ip_window.add(ip_address, created_at))
+            features['amount'].append(row.total_amount)
+
+            context[row.id] = {
+                'payment_id': payment_id,
+                'customer_email': row.customer_email,
+                'ip_address': ip_address,
+                'amount': row.total_amount,
+                'card_bin': features['card_bin'][-1],
+                'created_at': created_at
+            }
+
+        return features, context
+
+    def _load_payment_info(self, order_ids: List[int]) -> Dict[int, Any]:
+        """Fetch the latest payment id and metadata for a chunk of orders in one query"""
+        from ..models.payment import Payment
+
+        if not order_ids:
+            return {}
+        info = {}
+        rows = db.session.query(
+            Payment.order_id, Payment.id, Payment.payment_metadata
+        ).filter(
+            Payment.order_id.in_(order_ids)
+        ).order_by(Payment.id)
+        for order_id, payment_id, payment_metadata in rows:
+            info[order_id] = (payment_id, payment_metadata)  # Latest payment wins
+        return info
+
+    def _extract_card_bin(self, order_metadata: Dict[str, Any],
+                          payment_metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Recover the card BIN from stored metadata, if the provider returned one"""
+        card_bin = order_metadata.get('card_bin')
+        if not card_bin and payment_metadata:
+            card_bin = payment_metadata.get('card_bin')
+            if not card_bin:
+                try:
+                    charges = payment_metadata['payment_intent']['charges']['data']
+                    card_bin = charges[0]['payment_method_details']['card'].get('iin')
+                except (KeyError, IndexError, TypeError):
+                    card_bin = None
+        return str(card_bin)[:6] if card_bin else None
+
+    def _persist_chunk(self, run_id: str, results: List[Dict[str, Any]],
+                       context: Dict[int, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Write alerts and fold pattern statistics for one scored chunk.
+        Re-runs are idempotent: an order that already has a batch alert gets
+        that alert updated in place, and its occurrence is not counted into
+        the pattern statistics a second time.
+        """
+        from ..models.fraud_alert import FraudAlert, FraudPattern, AlertType, AlertSeverity
+
+        now = datetime.utcnow()
+        flagged = [result for result in results if result['risk_level'] in self.persist_levels]
+        written = {'alerts_created': 0, 'alerts_updated': 0, 'patterns_created': 0, 'patterns_updated': 0}
+        if not flagged:
+            return written
+
+        existing_alerts = dict(db.session.query(FraudAlert.order_id, FraudAlert.id).filter(
+            FraudAlert.order_id.in_([result['order_id'] for result in flagged]),
+            FraudAlert.alert_type == AlertType.GENERAL_FRAUD,
+            FraudAlert.title.like(f"{BATCH_ALERT_TITLE}%")
+        ))
+
+        alert_rows = []
+        alert_updates = []
+        pattern_stats = {}
+
+        for result in flagged:
+            ctx = context[result['order_id']]
+            alert = {
+                'severity': AlertSeverity(result['risk_level']),
+                'risk_score': result['risk_score'],
+                'risk_factors': result['risk_factors'],
+                'ip_address': ctx['ip_address'],
+                'payment_id': ctx['payment_id'],
+                'amount': ctx['amount'],
+                'card_bin': ctx['card_bin'],
+                'customer_email': ctx['customer_email'],
+                'title': f"{BATCH_ALERT_TITLE} - {result['risk_level'].upper()} Risk",
+                'description': f"Order re-scored with {result['risk_level']} risk level. Score: {result['risk_score']:.2f}",
+                'details': {'batch_run_id': run_id, 'risk_factors': result['risk_factors']},
+                'updated_at': now
+            }
+            alert_id = existing_alerts.get(result['order_id'])
+            if alert_id is not None:
+                # Already alerted and counted by an earlier run
+                alert_updates.append({'id': alert_id, **alert})
+                continue
+            alert_rows.append({
+                'alert_id': f"FRAUD_{uuid4().hex[:12].upper()}",
+                'alert_type': AlertType.GENERAL_FRAUD,
+                'order_id': result['order_id'],
+                'created_at': now,
+                **alert
+            })
+
+            pattern_key = ctx['ip_address'] or ctx['customer_email'] or 'unknown'
+            stats = pattern_stats.setdefault(pattern_key, {
+                'count': 0, 'total': 0.0,
+                'first_seen': ctx['created_at'], 'last_seen': ctx['created_at']
+            })
+            stats['count'] += 1
+            stats['total'] += result['risk_score']
+            stats['first_seen'] = min(stats['first_seen'], ctx['created_at'])
+            stats['last_seen'] = max(stats['last_seen'], ctx['created_at'])
+
+        written['alerts_created'] = len(alert_rows)
+        written['alerts_updated'] = len(alert_updates)
+
+        try:
+            if alert_updates:
+                db.session.bulk_update_mappings(FraudAlert, alert_updates)
+            if alert_rows:
+                db.session.bulk_insert_mappings(FraudAlert, alert_rows)
+            if not pattern_stats:
+                db.session.commit()
+                return written
+
+            existing = FraudPattern.query.filter(
+                FraudPattern.pattern_type == AlertType.GENERAL_FRAUD.value,
+                FraudPattern.pattern_key.in_(list(pattern_stats.keys())),
+                FraudPattern.is_active == True
+            ).all()
+            for pattern in existing:
+                stats = pattern_stats.pop(pattern.pattern_key)
+                pattern.apply_occurrences(stats['count'], stats['total'], stats['last_seen'])
+            written['patterns_updated'] = len(existing)
+
+            new_patterns = []
+            for pattern_key, stats in pattern_stats.items():
+                average = stats['total'] / stats['count']
+                new_patterns.append({
+                    'pattern_type': AlertType.GENERAL_FRAUD.value,
+                    'pattern_key': pattern_key,
+                    'occurrence_count': stats['count'],
+                    'first_seen': stats['first_seen'],
+                    'last_seen': stats['last_seen'],
+                    'risk_level': FraudPattern.risk_level_for_score(average),
+                    'total_risk_score': stats['total'],
+                    'average_risk_score': average,
+                    'details': {'batch_run_id': run_id},
+                    'created_at': now,
+                    'updated_at': now
+                })
+            if new_patterns:
+                db.session.bulk_insert_mappings(FraudPattern, new_patterns)
+            written['patterns_created'] = len(new_patterns)
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error persisting fraud batch chunk for {run_id}: {str(e)}")
+            raise
+
+        return written
+
+
+# Create singleton instance
+fraud_batch_scoring_service = FraudBatchScoringService()
@@ -34,6 +34,14 @@ class FraudDetectionService:
             'same_ip': 10,    # 10 payments per hour
             'same_card': 3    # 3 payments per hour
         }
+        # Weight of each analysis component in the combined risk score
+        self.risk_weights = {
+            'email': 0.2,
+            'ip': 0.25,
+            'card': 0.3,
+            'velocity': 0.15,
+            'behavior': 0.1
+        }
     
     def _get_environment(self):
         """Get current environment for fraud detection configuration"""
@@ -107,28 +115,28 @@ class FraudDetectionService:
             # Email analysis
             email_risk = self._analyze_email_risk(payment_data.get('customer_email', ''))
             risk_factors.extend(email_risk['factors'])
-            risk_score += email_risk['score'] * 0.2
+            risk_score += email_risk['score'] * self.risk_weights['email']
             
             # IP analysis - get real client IP, checking proxy headers first
             ip_address = self._get_client_ip()
             ip_risk = self._analyze_ip_risk(ip_address)
             risk_factors.extend(ip_risk['factors'])
-            risk_score += ip_risk['score'] * 0.25
+            risk_score += ip_risk['score'] * self.risk_weights['ip']
             
             # Card analysis
             card_risk = self._analyze_card_risk(payment_data.get('card_data', {}))
             risk_factors.extend(card_risk['factors'])
-            risk_score += card_risk['score'] * 0.3
+            risk_score += card_risk['score'] * self.risk_weights['card']
             
             # Velocity analysis
             velocity_risk = self._analyze_velocity_risk(payment_data, user_data)
             risk_factors.extend(velocity_risk['factors'])
-            risk_score += velocity_risk['score'] * 0.15
+            risk_score += velocity_risk['score'] * self.risk_weights['velocity']
             
             # Behavioral analysis
             behavior_risk = self._analyze_behavioral_patterns(payment_data, user_data)
             risk_factors.extend(behavior_risk['factors'])
-            risk_score += behavior_risk['score'] * 0.1
+            risk_score += behavior_risk['score'] * self.risk_weights['behavior']
             
             # Determine risk level
             risk_level = self._determine_risk_level(risk_score)
@@ -0,0 +1,274 @@
+"""
+GeoIP Service
+Offline IP geolocation from a memory-mapped range database.
+
+The database is a compact file built from a CSV range export (DB-IP or
+IP2Location lite) by scripts/build_geoip_database.py:
+
+    header   b'GEO1', IPv4 count, IPv6 count, IPv6 offset, records offset
+    IPv4     sorted fixed-width entries: start (4 bytes), end (4 bytes), record offset
+    IPv6     sorted fixed-width entries: start (16 bytes), end (16 bytes), record offset
+    records  deduplicated, length-prefixed 'code|country|region|city|lat|lon' strings
+
+Addresses are stored big-endian, so a binary search compares byte slices of
+the mapping directly and nothing is loaded into memory up front. MaxMind
+.mmdb files are read through maxminddb in MODE_MMAP when it is installed.
+
+Recent lookups are memoized per loaded database, and the file is re-opened
+when it changes on disk (builds replace it atomically), which also drops
+the memo.
+"""
+
+import ipaddress
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import lru_cache, partial
+from typing import Dict, Iterable, Optional, Tuple
+
+from ..utils.logger import get_logger
+
+# Try to import maxminddb, but don't fail if not available
+try:
+    import maxminddb
+    MAXMINDDB_AVAILABLE = True
+except ImportError:
+    MAXMINDDB_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+MAGIC = b'GEO1'
+HEADER = struct.Struct('>4sIIII')  # magic, v4 count, v6 count, v6 offset, records offset
+V4_ENTRY = struct.Struct('>4s4sI')
+V6_ENTRY = struct.Struct('>16s16sI')
+RECORD_LENGTH = struct.Struct('>H')
+FIELD_SEPARATOR = '|'
+
+CACHE_SIZE = 8192
+
+
+def empty_location(country: str = 'Unknown', city: str = 'Unknown', region: str = 'Unknown') -> Dict:
+    return {'country': country, 'country_code': None, 'city': city, 'region': region,
+            'latitude': None, 'longitude': None}
+
+
+def _special_location(address) -> Optional[Dict]:
+    """Labels for addresses no database covers"""
+    if address.is_loopback:
+        return empty_location('Local', 'Localhost', 'Development')
+    if address.is_private or address.is_link_local:
+        return empty_location('Private Network', 'Private', 'Internal')
+    return None
+
+
+def decode_record(data: bytes) -> Dict:
+    code, country, region, city, latitude, longitude = data.decode('utf-8').split(FIELD_SEPARATOR)
+    return {
+        'country': country or code or 'Unknown',
+        'country_code': code or None,
+        'city': city or 'Unknown',
+        'region': region or 'Unknown',
+        'latitude': float(latitude) if latitude else None,
+        'longitude': float(longitude) if longitude else None,
+    }
+
+
+def write_database(ranges: Iterable[Tuple], path: str) -> Dict[str, int]:
+    """
+    Write a GEO1 file from (start, end, code, country, region, city, latitude, longitude)
+    tuples, where start and end are ipaddress objects of the same version. The
+    file is written next to path and moved into place, so running services
+    pick it up on their next check.
+    """
+    v4, v6, records, record_offsets = [], [], bytearray(), {}
+    for start, end, *fields in ranges:
+        if start.version != end.version or int(start) > int(end):
+            raise ValueError(f"Invalid range {start} - {end}")
+        data = FIELD_SEPARATOR.join('' if value is None else str(value).replace(FIELD_SEPARATOR, ' ')
+                                    for value in fields).encode('utf-8')
+        offset = record_offsets.get(data)
+        if offset is None:
+            offset = record_offsets[data] = len(records)
+            records += RECORD_LENGTH.pack(len(data)) + data
+        (v4 if start.version == 4 else v6).append((start.packed, end.packed, offset))
+    v4.sort()
+    v6.sort()
+
+    v6_offset = HEADER.size + len(v4) * V4_ENTRY.size
+    records_offset = v6_offset + len(v6) * V6_ENTRY.size
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, len(v4), len(v6), v6_offset, records_offset))
+        for entry in v4:
+            handle.write(V4_ENTRY.pack(*entry))
+        for entry in v6:
+            handle.write(V6_ENTRY.pack(*entry))
+        handle.write(records)
+    os.replace(temporary, path)
+    return {'ipv4_ranges': len(v4), 'ipv6_ranges': len(v6), 'records': len(record_offsets),
+            'bytes': records_offset + len(records)}
+
+
+class RangeDatabase:
+    """Read-only view of a GEO1 file through mmap"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.v4_count, self.v6_count, self.v6_offset, self.records_offset = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a GEO1 database")
+
+    def lookup(self, packed: bytes) -> Optional[Dict]:
+        if len(packed) == 4:
+            offset = self._search(packed, HEADER.size, self.v4_count, V4_ENTRY.size, 4)
+        else:
+            offset = self._search(packed, self.v6_offset, self.v6_count, V6_ENTRY.size, 16)
+        if offset is None:
+            return None
+        start = self.records_offset + offset
+        (length,) = RECORD_LENGTH.unpack_from(self._map, start)
+        start += RECORD_LENGTH.size
+        return decode_record(self._map[start:start + length])
+
+    def _search(self, key: bytes, base: int, count: int, entry_size: int, width: int) -> Optional[int]:
+        """Record offset of the range containing key: the last range starting at or before it"""
+        data = self._map
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            position = base + middle * entry_size
+            if data[position:position + width] <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        position = base + (low - 1) * entry_size
+        if key > data[position + width:position + 2 * width]:
+            return None
+        return int.from_bytes(data[position + 2 * width:position + 2 * width + 4], 'big')
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class MaxMindDatabase:
+    """GeoLite2/GeoIP2 City .mmdb read in MODE_MMAP"""
+
+    def __init__(self, path: str):
+        self._reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+
+    def lookup(self, packed: bytes) -> Optional[Dict]:
+        record = self._reader.get(ipaddress.ip_address(packed))
+        if not record:
+            return None
+        country = record.get('country') or record.get('registered_country') or {}
+        subdivisions = record.get('subdivisions') or [{}]
+        city = record.get('city') or {}
+        location = record.get('location') or {}
+        return {
+            'country': country.get('names', {}).get('en') or country.get('iso_code') or 'Unknown',
+            'country_code': country.get('iso_code'),
+            'city': city.get('names', {}).get('en') or 'Unknown',
+            'region': subdivisions[0].get('names', {}).get('en') or 'Unknown',
+            'latitude': location.get('latitude'),
+            'longitude': location.get('longitude'),
+        }
+
+    def close(self) -> None:
+        self._reader.close()
+
+
+class GeoIPService:
+    """Memoized IPv4/IPv6 geolocation with hot reload of the database file"""
+
+    def __init__(self, path: Optional[str] = None, check_interval: float = 30.0, cache_size: int = CACHE_SIZE):
+        self.path = path if path is not None else os.getenv('GEOIP_DATABASE_PATH', '')
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._signature = None
+        self._next_check = 0.0
+        self._state = self._bind(None)
+        self.reloads = 0
+
+    def _bind(self, database):
+        """A database with its own memo, swapped in together so a reload never mixes the two"""
+        return database, lru_cache(maxsize=self.cache_size)(partial(self._resolve, database))
+
+    def lookup(self, ip_address: Optional[str]) -> Dict:
+        """Location dict (country, country_code, city, region, latitude, longitude) for an IP"""
+        if not ip_address:
+            return empty_location()
+        if time.monotonic() >= self._next_check:
+            self._refresh()
+        return dict(self._state[1](ip_address))
+
+    @staticmethod
+    def _resolve(database, ip_address: str) -> Dict:
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return empty_location()
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        special = _special_location(address)
+        if special:
+            return special
+        if database is None:
+            return empty_location()
+        try:
+            return database.lookup(address.packed) or empty_location()
+        except Exception as e:
+            logger.error(f"GeoIP lookup failed for {ip_address}: {e}")
+            return empty_location()
+
+    def _refresh(self) -> None:
+        """Open the database, or re-open it when the file has changed"""
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+            if not self.path:
+                return
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                if self._signature is not None:
+                    logger.warning(f"GeoIP database {self.path} is gone; keeping the loaded copy")
+                return
+            signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if signature == self._signature:
+                return
+            try:
+                if self.path.endswith('.mmdb'):
+                    if not MAXMINDDB_AVAILABLE:
+                        logger.warning("maxminddb is not installed; cannot read .mmdb GeoIP databases")
+                        self._signature = signature
+                        return
+                    database = MaxMindDatabase(self.path)
+                else:
+                    database = RangeDatabase(self.path)
+            except Exception as e:
+                logger.error(f"Failed to open GeoIP database {self.path}: {e}")
+                self._signature = signature
+                return
+            # Readers still holding the old mapping finish on it; it is unmapped once released
+            self._state = self._bind(database)
+            self._signature = signature
+            self.reloads += 1
+            logger.info(f"GeoIP database loaded from {self.path}")
+
+    def get_stats(self) -> Dict:
+        database, resolve = self._state
+        info = resolve.cache_info()
+        return {'path': self.path, 'loaded': database is not None, 'reloads': self.reloads,
+                'cache_hits': info.hits, 'cache_misses': info.misses, 'cache_size': info.currsize}
+
+
+# Global instance
+geoip_service = GeoIPService()
@@ -1,6 +1,5 @@
 import logging
 import json
-import hashlib
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from flask import request
@@ -8,6 +7,9 @@ from .. import db
 from ..models import User, UserLoginHistory
 from .security_service import security_service
 from .audit_service import audit_service
+from .login_risk_tracker import login_risk_tracker, location_key
+from .user_agent_service import user_agent_service
+from .geoip_service import geoip_service
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +22,8 @@ class LoginHistoryService:
             'multiple_failed_logins': 5,  # Number of failed logins to trigger suspicion
             'unusual_location': True,  # Flag logins from unusual locations
             'rapid_successive_logins': 3,  # Number of rapid successive logins
-            'time_threshold_minutes': 5  # Time window for rapid logins
+            'time_threshold_minutes': 5,  # Time window for rapid logins
+            'ip_failed_logins': 20  # Failed logins from one IP, across accounts, within 30 minutes
         }
     
     def log_login_attempt(
@@ -46,8 +49,13 @@ class LoginHistoryService:
             # Get geolocation information
             geo_info = self._get_geolocation(client_ip)
             
+            device_fingerprint = self._generate_device_fingerprint(user_agent, client_ip)
+            
             # Check for suspicious activity
-            is_suspicious = self._check_suspicious_activity(user_id, client_ip, is_successful)
+            suspicious_reasons = self._check_suspicious_activity(
+                user_id, client_ip, is_successful, geo_info, device_fingerprint
+            )
+            is_suspicious = bool(suspicious_reasons)
             
             # Create login history entry
             login_entry = UserLoginHistory(
@@ -55,7 +63,7 @@ class LoginHistoryService:
                 login_timestamp=datetime.utcnow(),
                 ip_address=client_ip,
                 user_agent=user_agent,
-                device_fingerprint=self._generate_device_fingerprint(user_agent, client_ip),
+                device_fingerprint=device_fingerprint,
                 device_type=device_info.get('device_type', 'unknown'),
                 browser=device_info.get('browser', 'unknown'),
                 os=device_info.get('os', 'unknown'),
@@ -110,7 +118,8 @@ class LoginHistoryService:
                         'ip_address': client_ip,
                         'user_agent': user_agent,
                         'is_successful': is_successful,
-                        'location': geo_info
+                        'location': geo_info,
+                        'reasons': suspicious_reasons
                     },
                     severity='high'
                 )
@@ -288,162 +297,47 @@ class LoginHistoryService:
         """
         Parse user agent string to extract device information
         """
-        try:
-            # Simple user agent parsing (in production, use a library like user-agents)
-            user_agent_lower = user_agent.lower()
-            
-            device_info = {
-                'device_type': 'desktop',
-                'browser': 'unknown',
-                'os': 'unknown'
-            }
-            
-            # Detect device type
-            if 'mobile' in user_agent_lower or 'android' in user_agent_lower or 'iphone' in user_agent_lower:
-                device_info['device_type'] = 'mobile'
-            elif 'tablet' in user_agent_lower or 'ipad' in user_agent_lower:
-                device_info['device_type'] = 'tablet'
-            
-            # Detect browser
-            if 'chrome' in user_agent_lower:
-                device_info['browser'] = 'Chrome'
-            elif 'firefox' in user_agent_lower:
-                device_info['browser'] = 'Firefox'
-            elif 'safari' in user_agent_lower:
-                device_info['browser'] = 'Safari'
-            elif 'edge' in user_agent_lower:
-                device_info['browser'] = 'Edge'
-            elif 'opera' in user_agent_lower:
-                device_info['browser'] = 'Opera'
-            
-            # Detect OS
-            if 'windows' in user_agent_lower:
-                device_info['os'] = 'Windows'
-            elif 'mac' in user_agent_lower or 'darwin' in user_agent_lower:
-                device_info['os'] = 'macOS'
-            elif 'linux' in user_agent_lower:
-                device_info['os'] = 'Linux'
-            elif 'android' in user_agent_lower:
-                device_info['os'] = 'Android'
-            elif 'ios' in user_agent_lower or 'iphone' in user_agent_lower:
-                device_info['os'] = 'iOS'
-            
-            return device_info
-            
-        except Exception as e:
-            logger.error(f"Error parsing user agent: {e}")
-            return {'device_type': 'unknown', 'browser': 'unknown', 'os': 'unknown'}
+        return user_agent_service.parse(user_agent)
     
     def _get_geolocation(self, ip_address: str) -> Dict:
         """
-        Get geolocation information for IP address
+        Get geolocation information for IP address from the offline GeoIP database
         """
-        try:
-            # This is a placeholder for geolocation service integration
-            # In production, use a service like MaxMind, IP2Location, or similar
-            
-            # For development, return mock data
-            geo_info = {
-                'country': 'Unknown',
-                'city': 'Unknown',
-                'region': 'Unknown',
-                'latitude': None,
-                'longitude': None
-            }
-            
-            # Mock data for common IPs
-            if ip_address in ['127.0.0.1', 'localhost']:
-                geo_info.update({
-                    'country': 'Local',
-                    'city': 'Localhost',
-                    'region': 'Development'
-                })
-            elif ip_address.startswith('192.168.') or ip_address.startswith('10.') or ip_address.startswith('172.'):
-                geo_info.update({
-                    'country': 'Private Network',
-                    'city': 'Private',
-                    'region': 'Internal'
-                })
-            
-            # TODO: Implement actual geolocation service
-            # Example with a geolocation service:
-            # geo_service = GeoLocationService()
-            # geo_info = geo_service.get_location(ip_address)
-            
-            return geo_info
-            
-        except Exception as e:
-            logger.error(f"Error getting geolocation: {e}")
-            return {
-                'country': 'Unknown',
-                'city': 'Unknown',
-                'region': 'Unknown',
-                'latitude': None,
-                'longitude': None
-            }
+        return geoip_service.lookup(ip_address)
     
     def _generate_device_fingerprint(self, user_agent: str, ip_address: str) -> str:
         """
         Generate a device fingerprint for tracking
         """
-        try:
-            # Create a fingerprint based on user agent and IP
-            fingerprint_data = f"{user_agent}|{ip_address}"
-            return hashlib.sha256(fingerprint_data.encode()).hexdigest()[:16]
-        except Exception as e:
-            logger.error(f"Error generating device fingerprint: {e}")
-            return "unknown"
+        return user_agent_service.device_fingerprint(user_agent, ip_address)
     
-    def _check_suspicious_activity(self, user_id: int, ip_address: str, is_successful: bool) -> bool:
+    def _check_suspicious_activity(
+        self,
+        user_id: Optional[int],
+        ip_address: str,
+        is_successful: bool,
+        geo_info: Dict = None,
+        device_fingerprint: str = None
+    ) -> List[str]:
         """
-        Check if the login attempt is suspicious
+        Check if the login attempt is suspicious; returns the reasons (empty if not).
+        Served from the login risk tracker's rolling windows, not login history.
         """
         try:
-            # Get recent login attempts for this user
-            recent_attempts = UserLoginHistory.query.filter(
-                UserLoginHistory.user_id == user_id,
-                UserLoginHistory.login_timestamp >= datetime.utcnow() - timedelta(minutes=30)
-            ).all()
-            
-            # Check for multiple failed logins
-            failed_attempts = [a for a in recent_attempts if not a.is_successful]
-            if len(failed_attempts) >= self.suspicious_patterns['multiple_failed_logins']:
-                return True
-            
-            # Check for rapid successive logins
-            if len(recent_attempts) >= self.suspicious_patterns['rapid_successive_logins']:
-                # Check if they're within the time threshold
-                time_threshold = datetime.utcnow() - timedelta(minutes=self.suspicious_patterns['time_threshold_minutes'])
-                rapid_attempts = [a for a in recent_attempts if a.login_timestamp >= time_threshold]
-                if len(rapid_attempts) >= self.suspicious_patterns['rapid_successive_logins']:
-                    return True
-            
-            # Check for unusual location (simplified check)
-            if self.suspicious_patterns['unusual_location']:
-                # Get user's common login locations
-                common_locations = db.session.query(
-                    UserLoginHistory.country,
-                    UserLoginHistory.city
-                ).filter(
-                    UserLoginHistory.user_id == user_id,
-                    UserLoginHistory.is_successful == True,
-                    UserLoginHistory.login_timestamp >= datetime.utcnow() - timedelta(days=30)
-                ).group_by(
-                    UserLoginHistory.country,
-                    UserLoginHistory.city
-                ).all()
-                
-                # If this is a new location and user has previous logins, flag as suspicious
-                if common_locations and is_successful:
-                    current_location = (None, None)  # Would be set from geolocation
-                    if current_location not in common_locations:
-                        return True
-            
-            return False
+            geo_info = geo_info or {}
+            assessment = login_risk_tracker.assess(
+                user_id,
+                ip_address,
+                is_successful,
+                location_key(geo_info.get('country'), geo_info.get('city')),
+                device_fingerprint,
+                self.suspicious_patterns
+            )
+            return assessment['reasons']
             
         except Exception as e:
             logger.error(f"Error checking suspicious activity: {e}")
-            return False
+            return []
 
 
 # Global login history service instance
@@ -0,0 +1,143 @@
+"""
+Login Risk Tracker
+Rolling login-attempt windows and known locations/devices per user, kept in
+the shared TTL store so suspicious-activity checks never scan login history.
+
+Attempts are counted in one-minute buckets that expire with the window, so a
+rolling count is a single multi-get over a fixed number of keys. Known
+locations and device fingerprints are expiring sets refreshed by every
+successful login. The database is read only when the store has no state for
+a user (cold start, Redis flush); per-IP windows simply start empty.
+"""
+
+import calendar
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from .. import db
+from ..models import UserLoginHistory
+from ..utils.logger import get_logger
+from ..utils.shared_store import SharedTTLStore
+
+logger = get_logger(__name__)
+
+
+def location_key(country: Optional[str], city: Optional[str]) -> Optional[str]:
+    """Compact 'country|city' key, or None when the location is not known"""
+    if not country or country == 'Unknown':
+        return None
+    return f"{country}|{city or ''}"
+
+
+class LoginRiskTracker:
+    """Per-user and per-IP attempt windows with O(1) checks"""
+
+    def __init__(self, failure_window: int = 1800, bucket_seconds: int = 60, history_days: int = 30):
+        self.failure_window = failure_window  # longest window; every bucket lives this long
+        self.bucket_seconds = bucket_seconds
+        self.history_ttl = history_days * 86400
+        self.store = SharedTTLStore('login_risk')
+
+    def _buckets(self, now: float, window: int) -> List[int]:
+        current = int(now // self.bucket_seconds)
+        return list(range(current - window // self.bucket_seconds + 1, current + 1))
+
+    def assess(self, user_id: Optional[int], ip_address: str, is_successful: bool,
+               location: Optional[str], fingerprint: Optional[str], thresholds: Dict) -> Dict:
+        """
+        Score an attempt against the windows as they were before it, then record it.
+        Returns the triggered reasons plus whether location and device are new.
+        """
+        now = time.time()
+        if user_id is not None:
+            self._warm_user(user_id, now)
+
+        failure_buckets = self._buckets(now, self.failure_window)
+        rapid_buckets = self._buckets(now, min(thresholds['time_threshold_minutes'] * 60, self.failure_window))
+        keys = [f"ip:{ip_address}:f:{bucket}" for bucket in failure_buckets]
+        if user_id is not None:
+            keys += [f"u:{user_id}:f:{bucket}" for bucket in failure_buckets]
+            keys += [f"u:{user_id}:a:{bucket}" for bucket in rapid_buckets]
+        counts = [value or 0 for value in self.store.get_many_json(keys)]
+        window = len(failure_buckets)
+        ip_failures = sum(counts[:window])
+
+        reasons = []
+        if ip_failures >= thresholds['ip_failed_logins']:
+            reasons.append('ip_failure_burst')
+
+        new_location = new_device = False
+        if user_id is not None:
+            if sum(counts[window:2 * window]) >= thresholds['multiple_failed_logins']:
+                reasons.append('multiple_failed_logins')
+            if sum(counts[2 * window:]) >= thresholds['rapid_successive_logins']:
+                reasons.append('rapid_successive_logins')
+            if is_successful:
+                known_locations = self.store.members(f"u:{user_id}:locations")
+                new_location = location is not None and location not in known_locations
+                if new_location and known_locations and thresholds['unusual_location']:
+                    reasons.append('unusual_location')
+                new_device = fingerprint is not None and fingerprint not in self.store.members(f"u:{user_id}:devices")
+
+        self._record(user_id, ip_address, is_successful, location, fingerprint, now)
+        return {'reasons': reasons, 'new_location': new_location, 'new_device': new_device}
+
+    def _record(self, user_id, ip_address, is_successful, location, fingerprint, now) -> None:
+        bucket = int(now // self.bucket_seconds)
+        ttl = self.failure_window + self.bucket_seconds
+        if not is_successful:
+            self.store.incr(f"ip:{ip_address}:f:{bucket}", ttl=ttl)
+        if user_id is None:
+            return
+        self.store.incr(f"u:{user_id}:a:{bucket}", ttl=ttl)
+        if is_successful:
+            if location:
+                self.store.add_member(f"u:{user_id}:locations", location, self.history_ttl)
+            if fingerprint:
+                self.store.add_member(f"u:{user_id}:devices", fingerprint, self.history_ttl)
+        else:
+            self.store.incr(f"u:{user_id}:f:{bucket}", ttl=ttl)
+
+    def _warm_user(self, user_id: int, now: float) -> None:
+        """Seed a user's windows and known locations from login history once per history period"""
+        if self.store.get_json(f"u:{user_id}:warm"):
+            return
+
+        since = datetime.utcfromtimestamp(now) - timedelta(seconds=self.failure_window)
+        attempts = db.session.query(UserLoginHistory.login_timestamp, UserLoginHistory.is_successful).filter(
+            UserLoginHistory.user_id == user_id,
+            UserLoginHistory.login_timestamp >= since
+        ).all()
+        ttl = self.failure_window + self.bucket_seconds
+        failures, recent = {}, {}
+        for login_timestamp, is_successful in attempts:
+            bucket = calendar.timegm(login_timestamp.utctimetuple()) // self.bucket_seconds
+            recent[bucket] = recent.get(bucket, 0) + 1
+            if not is_successful:
+                failures[bucket] = failures.get(bucket, 0) + 1
+        for bucket, count in recent.items():
+            self.store.set_json(f"u:{user_id}:a:{bucket}", count, ttl)
+        for bucket, count in failures.items():
+            self.store.set_json(f"u:{user_id}:f:{bucket}", count, ttl)
+
+        known = db.session.query(
+            UserLoginHistory.country, UserLoginHistory.city, UserLoginHistory.device_fingerprint
+        ).filter(
+            UserLoginHistory.user_id == user_id,
+            UserLoginHistory.is_successful == True,
+            UserLoginHistory.login_timestamp >= datetime.utcfromtimestamp(now) - timedelta(seconds=self.history_ttl)
+        ).distinct().all()
+        for country, city, fingerprint in known:
+            location = location_key(country, city)
+            if location:
+                self.store.add_member(f"u:{user_id}:locations", location, self.history_ttl)
+            if fingerprint:
+                self.store.add_member(f"u:{user_id}:devices", fingerprint, self.history_ttl)
+
+        self.store.set_json(f"u:{user_id}:warm", 1, self.history_ttl)
+        logger.debug(f"Login risk state for user {user_id} seeded from {len(attempts)} recent attempts")
+
+
+# Global instance
+login_risk_tracker = LoginRiskTracker()
@@ -0,0 +1,110 @@
+"""
+Notification counters
+
+Per-user unread counts (PENDING notifications) kept in the shared TTL store.
+Writers adjust a live counter incrementally; a counter that is missing is
+recounted from the database on the next read. Counters expire after
+reconcile_interval seconds and adjustments do not extend that, so every
+counter is recounted at least that often and drift cannot accumulate.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable
+
+from app import db
+from app.models.communication import Notification, NotificationType, NotificationStatus, NotificationPriority
+from app.utils.logger import get_logger
+from app.utils.shared_store import SharedTTLStore
+from app.utils.sql_aggregates import count_if
+
+logger = get_logger(__name__)
+
+
+class NotificationCounters:
+    """Cached unread counters and single-query notification statistics"""
+
+    def __init__(self, reconcile_interval=300):
+        self.reconcile_interval = reconcile_interval
+        self.store = SharedTTLStore('notification_counters')
+
+    def _unread_key(self, user_id):
+        return f"unread:{user_id}"
+
+    def get_unread_count(self, user_id):
+        """Unread count from the cache, recounted from the database on a miss"""
+        cached = self.store.get_json(self._unread_key(user_id))
+        if cached is not None:
+            return cached
+        return self.reconcile(user_id)
+
+    def reconcile(self, user_id):
+        """Recount one user's unread notifications and cache the result"""
+        unread = Notification.query.filter_by(
+            user_id=user_id,
+            status=NotificationStatus.PENDING
+        ).count()
+        self.store.set_json(self._unread_key(user_id), unread, self.reconcile_interval)
+        return unread
+
+    def adjust_unread(self, user_id, delta):
+        """Apply a change to a live counter; a missing counter is left for the next read"""
+        if not delta:
+            return
+        try:
+            value = self.store.incr_existing(self._unread_key(user_id), delta)
+            if value is not None and value < 0:
+                # Lost an increment somewhere; recount on the next read
+                self.store.delete(self._unread_key(user_id))
+        except Exception as e:
+            logger.warning(f"Error adjusting unread counter for user {user_id}: {str(e)}")
+
+    def adjust_unread_many(self, deltas: Dict[int, int]):
+        for user_id, delta in deltas.items():
+            self.adjust_unread(user_id, delta)
+
+    def notifications_created(self, user_ids: Iterable[int]):
+        """Count new PENDING notifications, one user id per row"""
+        self.adjust_unread_many(Counter(user_ids))
+
+    def notifications_settled(self, user_ids: Iterable[int]):
+        """Count notifications that left PENDING, one user id per row"""
+        self.adjust_unread_many({user_id: -count for user_id, count in Counter(user_ids).items()})
+
+    def set_unread(self, user_id, value):
+        self.store.set_json(self._unread_key(user_id), value, self.reconcile_interval)
+
+    def invalidate(self, user_id):
+        self.store.delete(self._unread_key(user_id))
+
+    def get_stats(self, user_id):
+        """Type, status, priority and 7-day counts for one user in a single query"""
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        row = db.session.query(
+            count_if(Notification.type == NotificationType.EMAIL).label('email'),
+            count_if(Notification.type == NotificationType.SMS).label('sms'),
+            count_if(Notification.type == NotificationType.PUSH).label('push'),
+            count_if(Notification.type == NotificationType.IN_APP).label('in_app'),
+            count_if(Notification.status == NotificationStatus.PENDING).label('pending'),
+            count_if(Notification.status == NotificationStatus.DELIVERED).label('delivered'),
+            count_if(Notification.status == NotificationStatus.FAILED).label('failed'),
+            count_if(Notification.priority == NotificationPriority.HIGH).label('high'),
+            count_if(Notification.priority == NotificationPriority.NORMAL).label('normal'),
+            count_if(Notification.priority == NotificationPriority.LOW).label('low'),
+            count_if(Notification.created_at >= week_ago).label('last_7_days')
+        ).filter(Notification.user_id == user_id).one()
+        counts = {key: int(value or 0) for key, value in row._mapping.items()}
+
+        # The pending count is exact here, so refresh the cached counter too
+        self.set_unread(user_id, counts['pending'])
+
+        return {
+            'by_type': {key: counts[key] for key in ('email', 'sms', 'push', 'in_app')},
+            'by_status': {key: counts[key] for key in ('pending', 'delivered', 'failed')},
+            'by_priority': {key: counts[key] for key in ('high', 'normal', 'low')},
+            'recent_activity': {'last_7_days': counts['last_7_days']}
+        }
+
+
+# Global instance
+notification_counters = NotificationCounters()
@@ -0,0 +1,421 @@
+"""
+Notification delivery engine
+
+Each channel (email, SMS, push, in-app, webhook) has its own worker pool
+and a token bucket that shapes calls to its provider. Workers never touch
+the database: jobs carry a snapshot of what the transport needs, results
+are collected by a single committer that writes statuses in batches, and
+failed attempts wait in a delay queue with exponential backoff.
+"""
+
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from types import SimpleNamespace
+
+from app import db
+from app.models.communication import (
+    Notification, CommunicationPreference, NotificationType, NotificationStatus
+)
+from app.models.user import User
+from app.services.notification_counters import notification_counters
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket; rate=None means unlimited"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or (rate or 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        """Block until a token is available (or stop_event is set)"""
+        if self.rate is None:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class DelayQueue:
+    """Items become available once their delay has elapsed"""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+
+    def put(self, item, delay):
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), item))
+            self._condition.notify()
+
+    def pop_due(self, timeout=None):
+        """Wait up to timeout for items to come due and return all that are"""
+        with self._condition:
+            now = time.monotonic()
+            if not self._heap or self._heap[0][0] > now:
+                wait = timeout
+                if self._heap:
+                    wait = self._heap[0][0] - now if timeout is None else min(timeout, self._heap[0][0] - now)
+                self._condition.wait(wait)
+                now = time.monotonic()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+            return due
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap)
+
+
+class DeliveryJob:
+    """Snapshot of a notification carried through the worker pools"""
+
+    __slots__ = ('id', 'user_id', 'type', 'title', 'message', 'notification_metadata',
+                 'recipient_data', 'recipient_email', 'attempt_count', 'max_attempts')
+
+    def __init__(self, notification, recipient_email=None):
+        self.id = notification.id
+        self.user_id = notification.user_id
+        self.type = notification.type
+        self.title = notification.title
+        self.message = notification.message
+        self.notification_metadata = notification.notification_metadata
+        self.recipient_data = notification.recipient_data
+        self.recipient_email = recipient_email
+        self.attempt_count = notification.attempt_count or 0
+        self.max_attempts = notification.max_attempts or 3
+
+
+class PreferenceCache:
+    """TTL + LRU cache of communication preference snapshots"""
+
+    # Snapshot fields and the model defaults used for users without a row
+    DEFAULTS = {
+        'email_enabled': True,
+        'sms_enabled': False,
+        'push_enabled': True,
+        'in_app_enabled': True,
+        'quiet_hours_enabled': False,
+        'quiet_hours_start': None,
+        'quiet_hours_end': None,
+    }
+
+    def __init__(self, ttl=300, max_size=50000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (expires_at, snapshot)
+        self._lock = threading.Lock()
+
+    def get_many(self, user_ids):
+        """Preferences for each user; misses are loaded with one query"""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in set(user_ids):
+                entry = self._entries.get(user_id)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+                else:
+                    missing.append(user_id)
+
+        if missing:
+            loaded = self._load(missing)
+            with self._lock:
+                for user_id, snapshot in loaded.items():
+                    self._entries[user_id] = (now + self.ttl, snapshot)
+                    self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            found.update(loaded)
+        return found
+
+    def _load(self, user_ids):
+        rows = CommunicationPreference.query.filter(CommunicationPreference.user_id.in_(user_ids)).all()
+        snapshots = {
+            row.user_id: SimpleNamespace(**{field: getattr(row, field) for field in self.DEFAULTS})
+            for row in rows
+        }
+
+        # Users without preferences get the defaults persisted, as before
+        absent = [user_id for user_id in user_ids if user_id not in snapshots]
+        if absent:
+            try:
+                db.session.bulk_insert_mappings(CommunicationPreference, [{'user_id': user_id} for user_id in absent])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not create default communication preferences: {str(e)}")
+            for user_id in absent:
+                snapshots[user_id] = SimpleNamespace(**self.DEFAULTS)
+        return snapshots
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+class NotificationDeliveryEngine:
+    """Concurrent, rate-shaped notification delivery"""
+
+    # channel -> (workers, rate per second, burst)
+    DEFAULT_CHANNELS = {
+        NotificationType.EMAIL: (8, 50, 100),
+        NotificationType.SMS: (4, 10, 20),
+        NotificationType.PUSH: (8, 200, 400),
+        NotificationType.IN_APP: (2, None, None),
+        NotificationType.WEBHOOK: (8, 50, 100),
+    }
+
+    def __init__(self, transports, should_deliver=None, channels=None, preferences=None,
+                 batch_size=200, flush_interval=0.25, retry_base_delay=2.0, retry_max_delay=300.0):
+        self.transports = transports
+        self.should_deliver = should_deliver or (lambda job, preferences: True)
+        self.channels = {**self.DEFAULT_CHANNELS, **(channels or {})}
+        self.preferences = preferences or PreferenceCache()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        self.app = None
+        self._queues = {channel: queue.Queue() for channel in self.channels}
+        self._buckets = {channel: TokenBucket(rate, burst) for channel, (_, rate, burst) in self.channels.items()}
+        self._retries = DelayQueue()
+        self._results = queue.Queue()
+        self._threads = []
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self.stats = {'submitted': 0, 'sent': 0, 'failed': 0, 'retried': 0, 'cancelled': 0, 'commits': 0}
+        self._stats_lock = threading.Lock()
+
+    # -- lifecycle -------------------------------------------------------------
+
+    @property
+    def running(self):
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self, app):
+        """Start channel workers, the retry scheduler and the status committer"""
+        with self._start_lock:
+            if self.running:
+                return
+            self.app = app
+            self._stop.clear()
+            self._threads = []
+            for channel, (workers, _, _) in self.channels.items():
+                for index in range(workers):
+                    self._spawn(self._worker, f"notify-{channel.value}-{index}", channel)
+            self._spawn(self._retry_scheduler, 'notify-retries')
+            self._spawn(self._committer, 'notify-committer')
+            logger.info(f"Notification delivery engine started with {len(self._threads)} threads")
+
+    def _spawn(self, target, name, *args):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Stop all threads; queued jobs are dropped and stay PENDING in the database"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted job has reached a final status"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    # -- submission ------------------------------------------------------------
+
+    def submit(self, notifications):
+        """
+        Queue notifications for delivery. Must be called inside an app context;
+        preferences and email recipients are resolved here in bulk.
+        """
+        notifications = [n for n in notifications if n is not None]
+        if not notifications:
+            return 0
+        if not self.running:
+            from flask import current_app
+            self.start(current_app._get_current_object())
+
+        # Snapshot first: resolving preferences may commit and expire the ORM objects
+        jobs = [DeliveryJob(notification) for notification in notifications]
+        preferences = self.preferences.get_many([job.user_id for job in jobs])
+        email_user_ids = {job.user_id for job in jobs if job.type == NotificationType.EMAIL}
+        emails = self._recipient_emails(email_user_ids) if email_user_ids else {}
+
+        with self._idle:
+            self._in_flight += len(jobs)
+        self._count('submitted', len(jobs))
+
+        for job in jobs:
+            job.recipient_email = emails.get(job.user_id)
+            if not self.should_deliver(job, preferences.get(job.user_id)):
+                self._results.put((job, 'cancelled', None, datetime.utcnow()))
+            elif job.type not in self._queues:
+                self._results.put((job, False, f"No transport for {job.type}", datetime.utcnow()))
+            else:
+                self._queues[job.type].put(job)
+        return len(jobs)
+
+    def _recipient_emails(self, user_ids):
+        """Email address per user id, in one query"""
+        return dict(db.session.query(User.id, User.email).filter(User.id.in_(user_ids)).all())
+
+    # -- threads ---------------------------------------------------------------
+
+    def _worker(self, channel):
+        jobs = self._queues[channel]
+        bucket = self._buckets[channel]
+        transport = self.transports.get(channel)
+        while not self._stop.is_set():
+            try:
+                job = jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if not bucket.acquire(self._stop):
+                break
+            try:
+                success, error_message = transport(job)
+            except Exception as e:
+                success, error_message = False, str(e)
+            self._results.put((job, success, error_message, datetime.utcnow()))
+
+    def _retry_scheduler(self):
+        while not self._stop.is_set():
+            for job in self._retries.pop_due(timeout=0.5):
+                self._queues[job.type].put(job)
+
+    def _committer(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._results.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._results.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit_batch(batch)
+
+    def _retry_delay(self, attempt):
+        """Exponential backoff with jitter"""
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _commit_batch(self, batch):
+        """Write one status update per result in a single transaction"""
+        mappings, retries, finished, settled_users = [], [], 0, []
+        counts = {'sent': 0, 'failed': 0, 'cancelled': 0}
+        for job, outcome, error_message, attempted_at in batch:
+            if outcome == 'cancelled':
+                mappings.append({'id': job.id, 'status': NotificationStatus.CANCELLED})
+                settled_users.append(job.user_id)
+                counts['cancelled'] += 1
+                finished += 1
+                continue
+
+            job.attempt_count += 1
+            mapping = {'id': job.id, 'attempt_count': job.attempt_count, 'last_attempt_at': attempted_at}
+            if outcome:
+                mapping.update(status=NotificationStatus.SENT, sent_at=attempted_at, error_message=None)
+                settled_users.append(job.user_id)
+                counts['sent'] += 1
+                finished += 1
+            elif job.attempt_count >= job.max_attempts:
+                mapping.update(status=NotificationStatus.FAILED, failed_at=attempted_at, error_message=error_message)
+                settled_users.append(job.user_id)
+                counts['failed'] += 1
+                finished += 1
+            else:
+                mapping.update(error_message=error_message)
+                retries.append(job)
+            mappings.append(mapping)
+
+        try:
+            self._write_statuses(mappings)
+            self._count('commits')
+            notification_counters.notifications_settled(settled_users)
+        except Exception as e:
+            logger.error(f"Error committing {len(mappings)} notification statuses: {str(e)}")
+
+        for job in retries:
+            self._retries.put(job, self._retry_delay(job.attempt_count))
+        counts['retried'] = len(retries)
+        with self._stats_lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+        if finished:
+            with self._idle:
+                self._in_flight -= finished
+                if not self._in_flight:
+                    self._idle.notify_all()
+
+    def _write_statuses(self, mappings):
+        """Apply a batch of status mappings in one transaction"""
+        with self.app.app_context():
+            try:
+                db.session.bulk_update_mappings(Notification, mappings)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            'in_flight': self._in_flight,
+            'retry_queue': len(self._retries),
+            'queued': {channel.value: jobs.qsize() for channel, jobs in self._queues.items()}
+        }
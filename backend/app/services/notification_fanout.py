@@ -0,0 +1,117 @@
+"""
+Notification fan-out
+
+Turns one event into notifications for many recipients in a few
+statements: recipients' preferences are resolved with one query per chunk,
+the Notification rows are written with a single executemany insert, and
+email/SMS/push rows are handed to the delivery engine in one batch.
+In-app rows stay PENDING, which is how they are shown as unread.
+"""
+
+import threading
+from types import SimpleNamespace
+
+from sqlalchemy import insert
+
+from app import db
+from app.models.communication import Notification, NotificationType, NotificationPriority, NotificationStatus
+from app.services.notification_counters import notification_counters
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Channels delivered by the delivery engine; in-app rows are only stored
+ENGINE_CHANNELS = (NotificationType.EMAIL, NotificationType.SMS, NotificationType.PUSH, NotificationType.WEBHOOK)
+
+
+class NotificationFanOut:
+    """Bulk notification writer shared by ticket and announcement notifications"""
+
+    def __init__(self, delivery_engine, chunk_size=1000):
+        self.delivery_engine = delivery_engine
+        self.chunk_size = chunk_size
+
+    def fan_out(self, recipient_ids, render, use_preferences=True):
+        """
+        Create notifications for every recipient.
+
+        render(user_id, preferences) returns the row dicts (type, title,
+        message, priority, notification_metadata) for one recipient, at most
+        one per channel; preferences is None when use_preferences is False.
+        Returns the number of rows written.
+        """
+        written = 0
+        chunk = []
+        for user_id in recipient_ids:
+            chunk.append(user_id)
+            if len(chunk) >= self.chunk_size:
+                written += self._fan_out_chunk(chunk, render, use_preferences)
+                chunk = []
+        if chunk:
+            written += self._fan_out_chunk(chunk, render, use_preferences)
+        return written
+
+    def fan_out_async(self, recipient_ids, render, use_preferences=True):
+        """Run fan_out on a background thread and return immediately"""
+        from flask import current_app
+        app = current_app._get_current_object()
+        recipient_ids = list(recipient_ids)
+
+        def run():
+            with app.app_context():
+                try:
+                    self.fan_out(recipient_ids, render, use_preferences)
+                except Exception as e:
+                    logger.error(f"Error fanning out notifications: {str(e)}")
+                finally:
+                    db.session.remove()
+
+        thread = threading.Thread(target=run, name='notification-fanout', daemon=True)
+        thread.start()
+        return thread
+
+    def _fan_out_chunk(self, user_ids, render, use_preferences):
+        preferences = self.delivery_engine.preferences.get_many(user_ids) if use_preferences else {}
+
+        rows = []
+        for user_id in dict.fromkeys(user_ids):
+            for row in render(user_id, preferences.get(user_id)):
+                rows.append({
+                    'user_id': user_id,
+                    'priority': row.get('priority') or NotificationPriority.NORMAL,
+                    'type': row['type'],
+                    'title': row['title'],
+                    'message': row['message'],
+                    'notification_metadata': row.get('notification_metadata'),
+                    'status': NotificationStatus.PENDING,
+                    'attempt_count': 0,
+                    'max_attempts': 3
+                })
+        if not rows:
+            return 0
+
+        # Each recipient gets at most one row per channel, so (user_id, type)
+        # identifies a row without asking the database for parameter order
+        try:
+            inserted = db.session.execute(
+                insert(Notification).returning(Notification.id, Notification.user_id, Notification.type),
+                rows
+            ).all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        notification_counters.notifications_created(row['user_id'] for row in rows)
+
+        ids = {(user_id, notification_type): notification_id for notification_id, user_id, notification_type in inserted}
+        deliverable = [
+            SimpleNamespace(id=ids[(row['user_id'], row['type'])], recipient_data=None, **row)
+            for row in rows
+            if row['type'] in ENGINE_CHANNELS
+        ]
+        if deliverable:
+            self.delivery_engine.submit(deliverable)
+
+        logger.info(f"Fanned out {len(rows)} notifications to {len(user_ids)} recipients")
+        return len(rows)
@@ -0,0 +1,137 @@
+"""
+Password Verifier
+Bounded executor for password hashing on the login path.
+
+PBKDF2, scrypt and bcrypt all release the GIL while they run, so a small
+thread pool sized to the CPU count hashes in parallel while request threads
+wait without holding the interpreter. At most `workers` hashes run at once
+and at most `max_queue` more wait; past that, verification is refused with
+PasswordVerifierBusy and the login endpoints answer 429, so a login spike
+cannot take every core from the rest of the API.
+
+authenticate() looks an email up in admin_users and users with one UNION ALL
+over their unique email indexes, verifies the admin account first (as the
+login handlers always have), and rehashes the password in the same request
+when PASSWORD_HASH_METHOD has changed since the hash was made.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import literal, select, union_all
+
+from .. import db
+from ..models.rbac import AdminUser
+from ..models.user import User
+from ..utils.logger import get_logger
+from ..utils.passwords import check_password, hash_password, needs_rehash
+
+logger = get_logger(__name__)
+
+
+class PasswordVerifierBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 429"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__('Password verification queue is full')
+        self.retry_after = retry_after
+
+
+class PasswordVerifier:
+    """Bounded, load-shedding password hashing for login endpoints"""
+
+    def __init__(self, workers: int = None, max_queue: int = None, wait_timeout: float = 10.0):
+        self.workers = workers or int(os.getenv('PASSWORD_HASH_WORKERS', 0)) or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else int(
+            os.getenv('PASSWORD_HASH_QUEUE', self.workers * 4))
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {'verified': 0, 'shed': 0, 'timed_out': 0, 'rehashed': 0, 'hash_seconds': 0.0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='password-hash')
+        return self._executor
+
+    def _run(self, function, *args):
+        """Run a hashing call on the pool, or refuse it when the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            self._count('shed')
+            raise PasswordVerifierBusy()
+        try:
+            future = self._get_executor().submit(self._timed, function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.wait_timeout)
+        except FutureTimeoutError:
+            self._count('timed_out')
+            raise PasswordVerifierBusy()
+
+    def _timed(self, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self._count('hash_seconds', time.perf_counter() - started)
+
+    def _count(self, key: str, amount=1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def verify(self, password_hash, password: str) -> bool:
+        """Check a password on the pool; raises PasswordVerifierBusy when saturated"""
+        result = self._run(check_password, password_hash, password)
+        self._count('verified')
+        return result
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method on the pool"""
+        return self._run(hash_password, password)
+
+    def authenticate(self, email: str, password: str) -> Tuple[Optional[str], Optional[object]]:
+        """
+        ('admin', AdminUser) or ('user', User) whose password matches, else (None, None).
+        A rehashed password is left on the account for the caller's commit.
+        """
+        admins, users = AdminUser.__table__, User.__table__
+        statement = union_all(
+            select(literal(0).label('priority'), admins.c.id, admins.c.password_hash).where(admins.c.email == email),
+            select(literal(1).label('priority'), users.c.id, users.c.password_hash).where(users.c.email == email),
+        )
+        candidates = sorted(db.session.execute(statement).all())
+
+        for priority, account_id, password_hash in candidates:
+            if not self.verify(password_hash, password):
+                continue
+            account_type, model = ('admin', AdminUser) if priority == 0 else ('user', User)
+            account = db.session.get(model, account_id)
+            if account is not None and needs_rehash(password_hash):
+                try:
+                    account.password_hash = self.hash(password)
+                    self._count('rehashed')
+                    logger.info(f"Rehashed password for {account_type} {account_id} with the configured method")
+                except PasswordVerifierBusy:
+                    pass  # the login stands; the upgrade waits for the next one
+            return account_type, account
+        return None, None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({'workers': self.workers, 'max_queue': self.max_queue})
+        return stats
+
+
+# Global instance
+password_verifier = PasswordVerifier()
@@ -0,0 +1,391 @@
+"""
+Payment Activation Service
+Turns a successful payment into a paid order, a payment record and an active
+subscription in one transaction.
+
+The order is claimed with a conditional UPDATE (only while it is not yet
+paid), so a repeated success callback never records a second payment or
+counts an affiliate conversion twice. The user is resolved with one
+statement over the unique email index (falling back to the JWT identity by
+primary key), and subscription plans come from an in-memory catalog that is
+reloaded every PLAN_CATALOG_TTL seconds or whenever a plan is written.
+Affiliate conversions go through coupon_redemption_service's atomic UPDATEs;
+plain coupon uses are counted at checkout, not here. Every request logs how
+long each phase took.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import case, event, or_, select, update
+from sqlalchemy.orm import selectinload
+
+from .. import db
+from ..models.affiliate import Affiliate
+from ..models.coupon import Coupon
+from ..models.payment import Order, Payment
+from ..models.subscription import SubscriptionPlan
+from ..models.user import User
+from ..models.user_subscription import BillingCycle, SubscriptionStatus, UserSubscription
+from ..utils.logger import get_logger
+from .coupon_redemption_service import coupon_redemption_service
+
+logger = get_logger(__name__)
+
+SUBSCRIPTION_DAYS = 30
+
+# Keyword in a product name -> User.subscription_plan, checked in order
+USER_PLAN_KEYWORDS = (('basic', 'basic'), ('premium', 'premium'), ('pro', 'pro'), ('enterprise', 'enterprise'))
+# Keyword in a cleaned product name -> catalog plan name, checked in order
+PLAN_NAME_KEYWORDS = (('basic', 'Basic'), ('professional', 'Professional'), ('pro', 'Professional'),
+                      ('enterprise', 'Enterprise'), ('premium', 'Premium'))
+
+
+class PaymentActivationError(Exception):
+    """Raised when a payment cannot be applied; carries the HTTP status for the route"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class CatalogPlan(NamedTuple):
+    id: int
+    name: str
+    billing_cycle: str
+    is_active: bool
+
+
+class PlanCatalog:
+    """Subscription plans held in memory; plans change rarely and are read on every payment"""
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('PLAN_CATALOG_TTL', 300))
+        self._plans: Optional[List[CatalogPlan]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def invalidate(self) -> None:
+        self._plans = None
+
+    def plans(self) -> List[CatalogPlan]:
+        plans = self._plans
+        if plans is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._plans is plans:
+                    table = SubscriptionPlan.__table__
+                    rows = db.session.execute(
+                        select(table.c.id, table.c.name, table.c.billing_cycle, table.c.is_active)
+                        .order_by(table.c.sort_order, table.c.id)
+                    ).all()
+                    self._plans = [CatalogPlan(row.id, row.name, getattr(row.billing_cycle, 'value', row.billing_cycle),
+                                               bool(row.is_active)) for row in rows]
+                    self._loaded_at = time.monotonic()
+                    self.reloads += 1
+                plans = self._plans
+        return plans
+
+    def get(self, plan_id) -> Optional[CatalogPlan]:
+        try:
+            plan_id = int(plan_id)
+        except (TypeError, ValueError):
+            return None
+        return next((plan for plan in self.plans() if plan.id == plan_id), None)
+
+    def by_name(self, name: str, active_only: bool = False) -> Optional[CatalogPlan]:
+        return next((plan for plan in self.plans()
+                     if plan.name == name and (plan.is_active or not active_only)), None)
+
+    def match_product(self, product_name: str) -> Optional[CatalogPlan]:
+        """Plan for an order item: name contains the product, then keyword aliases, then a shared word"""
+        clean = product_name.lower().replace(' subscription', '').replace(' plan', '').strip()
+        if not clean:
+            return None
+        plans = self.plans()
+        plan = next((plan for plan in plans if clean in plan.name.lower()), None)
+        if plan:
+            return plan
+        for keyword, plan_name in PLAN_NAME_KEYWORDS:
+            if keyword in clean:
+                plan = self.by_name(plan_name)
+                break
+        if plan:
+            return plan
+        return next((plan for plan in plans
+                     if plan.is_active and any(word in clean for word in plan.name.lower().split())), None)
+
+    def resolve(self, order: Order) -> Optional[CatalogPlan]:
+        """Plan bought by an order: metadata plan_id, then item names, then the active Basic plan"""
+        plan = self.get((order.order_metadata or {}).get('plan_id'))
+        for item in order.items:
+            if plan:
+                break
+            plan = self.match_product(item.product_name or '')
+        return plan or self.by_name('Basic', active_only=True)
+
+
+class _PhaseTimer:
+    """Milliseconds spent in each phase of one request"""
+
+    def __init__(self):
+        self.started = self._mark = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def lap(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] = (now - self._mark) * 1000
+        self._mark = now
+
+    @property
+    def total(self) -> float:
+        return (self._mark - self.started) * 1000
+
+    def summary(self) -> str:
+        parts = ' '.join(f"{phase}={ms:.1f}ms" for phase, ms in self.phases.items())
+        return f"{parts} total={self.total:.1f}ms"
+
+
+def user_plan_for(order: Order) -> str:
+    """User.subscription_plan value for an order, from its first item's product name"""
+    if order.items and order.items[0].product_name:
+        name = order.items[0].product_name.lower()
+        for keyword, plan in USER_PLAN_KEYWORDS:
+            if keyword in name:
+                return plan
+    return 'premium'
+
+
+class PaymentActivationService:
+    """Applies successful payments to orders, users, subscriptions, coupons and affiliates"""
+
+    def __init__(self, catalog: PlanCatalog = None):
+        self.catalog = catalog or PlanCatalog()
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'claimed': 0, 'phase_ms': {}}
+
+    def _find_order(self, order_id, payment_intent_id) -> Optional[Order]:
+        statement = select(Order).options(selectinload(Order.items))
+        if order_id:
+            statement = statement.where(Order.id == order_id)
+        elif payment_intent_id:
+            statement = statement.where(Order.payment_intent_id == payment_intent_id)
+        else:
+            return None
+        return db.session.execute(statement.limit(1)).scalars().first()
+
+    def _find_user(self, email: str, current_user_id=None):
+        """(id, email) of the user paying: the email's account, else the JWT identity's"""
+        users = User.__table__
+        conditions = [users.c.email == email]
+        try:
+            if current_user_id is not None:
+                conditions.append(users.c.id == int(current_user_id))
+        except (TypeError, ValueError):
+            pass
+        return db.session.execute(
+            select(users.c.id, users.c.email)
+            .where(or_(*conditions))
+            .order_by(case((users.c.email == email, 0), else_=1))
+            .limit(1)
+        ).first()
+
+    def _find_referral(self, order: Order):
+        """Coupon row for the order's referral or promotion code, with its affiliate's name"""
+        code = (order.order_metadata or {}).get('referral_code') or order.promotion_code
+        if not code:
+            return None
+        coupons, affiliates = Coupon.__table__, Affiliate.__table__
+        return db.session.execute(
+            select(coupons.c.id, coupons.c.code, coupons.c.is_active, coupons.c.is_affiliate_code,
+                   coupons.c.affiliate_id, coupons.c.affiliate_commission_percent,
+                   affiliates.c.name.label('affiliate_name'))
+            .select_from(coupons.outerjoin(affiliates, coupons.c.affiliate_id == affiliates.c.id))
+            .where(coupons.c.code == code.upper())
+        ).first()
+
+    def _activate_user(self, user_id: int, subscription_plan: str, now: datetime) -> None:
+        users = User.__table__
+        db.session.execute(
+            update(users).where(users.c.id == user_id).values(
+                is_active=True, subscription_status='active', subscription_plan=subscription_plan,
+                is_admin=False, updated_at=now)
+        )
+
+    def _commission(self, referral, amount: float, now: datetime) -> Optional[Dict]:
+        """Commission record for an active affiliate code, stored on the order's metadata"""
+        if not referral.is_affiliate_code:
+            return None
+        if not (referral.is_active and referral.affiliate_id and amount):
+            logger.warning(f"Referral code {referral.code} not found or inactive")
+            return None
+        return {
+            'affiliate_commission': amount * ((referral.affiliate_commission_percent or 0) / 100),
+            'affiliate_id': referral.affiliate_id,
+            'affiliate_name': referral.affiliate_name,
+            'commission_processed_at': now.isoformat()
+        }
+
+    def _count_conversion(self, referral, commission: Dict) -> None:
+        """Count an affiliate code's conversion and commission"""
+        coupon_redemption_service.record_conversion(referral.affiliate_id, commission['affiliate_commission'])
+        logger.info(f"Affiliate commission processed: ${commission['affiliate_commission']:.2f} "
+                    f"for affiliate {referral.affiliate_name}")
+
+    def _create_subscription(self, user_id: int, plan: CatalogPlan, order: Order, payment_intent_id, now) -> bool:
+        existing = db.session.execute(
+            select(UserSubscription.id).where(UserSubscription.user_id == user_id,
+                                              UserSubscription.status == SubscriptionStatus.ACTIVE).limit(1)
+        ).first()
+        if existing:
+            logger.info(f"User {user_id} already has active subscription {existing.id}")
+            return False
+        db.session.add(UserSubscription(
+            user_id=user_id,
+            plan_id=plan.id,
+            subscription_id=f"payment_{order.id}",
+            plan_name=plan.name,
+            plan_type=plan.billing_cycle,
+            status=SubscriptionStatus.ACTIVE,
+            amount=order.total_amount,
+            currency='USD',
+            billing_cycle=BillingCycle(plan.billing_cycle.upper()),
+            unit_amount=order.total_amount,
+            total_amount=order.total_amount,
+            start_date=now,
+            end_date=now + timedelta(days=SUBSCRIPTION_DAYS),
+            payment_method='card',
+            payment_provider='stripe',
+            payment_provider_id=payment_intent_id,
+            admin_notes=f'Created from payment success for order {order.order_number}'
+        ))
+        return True
+
+    def _record(self, timer: _PhaseTimer, claimed: bool) -> None:
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['claimed'] += int(claimed)
+            totals = self._stats['phase_ms']
+            for phase, ms in list(timer.phases.items()) + [('total', timer.total)]:
+                totals[phase] = totals.get(phase, 0.0) + ms
+
+    def activate(self, order_id=None, payment_intent_id: str = None, customer_email: str = None,
+                 current_user_id=None) -> Dict:
+        """
+        Apply a successful payment and activate the paying user, committing once.
+        Raises PaymentActivationError for a missing order or user and for a failed commit.
+        """
+        timer = _PhaseTimer()
+        now = datetime.utcnow()
+
+        order = self._find_order(order_id, payment_intent_id)
+        timer.lap('order')
+        user = self._find_user(customer_email, current_user_id)
+        timer.lap('user')
+
+        if not order:
+            logger.error(f"Order not found - order_id: {order_id}, "
+                         f"payment_intent_id: {payment_intent_id[:8] if payment_intent_id else 'N/A'}...")
+            if not user:
+                raise PaymentActivationError('Order not found', 404)
+            self._activate_user(user.id, 'premium', now)
+            self._commit(timer)
+            logger.info(f"Activated user {user.id} directly (order not found): {timer.summary()}")
+            self._record(timer, False)
+            return {'order': None, 'payment': None, 'order_found': False}
+
+        if not user:
+            logger.error(f"No user found for payment - order: {order.order_number}")
+            raise PaymentActivationError(f'No user found with email {customer_email}. Please contact support.', 404)
+
+        plan = self.catalog.resolve(order)
+        if not plan:
+            logger.warning("No subscription plan found, skipping UserSubscription creation")
+        referral = self._find_referral(order)
+        timer.lap('lookup')
+
+        payment_intent_id = payment_intent_id or order.payment_intent_id
+        commission = self._commission(referral, order.total_amount, now) if referral else None
+        claim = {'status': 'paid', 'payment_status': 'paid', 'paid_at': now, 'payment_intent_id': payment_intent_id}
+        if commission:
+            claim['order_metadata'] = {**(order.order_metadata or {}), **commission}
+        claimed = db.session.execute(
+            update(Order)
+            .where(Order.id == order.id, or_(Order.payment_status.is_(None), Order.payment_status != 'paid'))
+            .values(**claim)
+        ).rowcount == 1
+
+        payment = None
+        if claimed:
+            payment = Payment(
+                order_id=order.id,
+                amount=order.total_amount,
+                currency='usd',
+                payment_method='card',
+                provider='stripe',
+                provider_payment_id=payment_intent_id or order.order_number,
+                provider_transaction_id=f"txn_{order.order_number}_{int(now.timestamp())}",
+                status='succeeded',
+                processed_at=now
+            )
+            db.session.add(payment)
+            if commission:
+                # Only affiliate conversions: plain coupons were already counted at checkout
+                self._count_conversion(referral, commission)
+            if plan:
+                self._create_subscription(user.id, plan, order, payment_intent_id, now)
+        else:
+            logger.info(f"Order {order.order_number} was already paid; activating user only")
+            payment = db.session.execute(
+                select(Payment).where(Payment.order_id == order.id).order_by(Payment.id.desc()).limit(1)
+            ).scalars().first()
+
+        self._activate_user(user.id, user_plan_for(order), now)
+        db.session.flush()
+        result = {
+            'order': order.to_dict(),
+            'payment': payment.to_dict() if payment else None,
+            'order_found': True,
+            'already_processed': not claimed,
+            'referral_code_processed': claimed and commission is not None,
+            'affiliate_commission': commission if claimed else None,
+        }
+        timer.lap('write')
+
+        self._commit(timer)
+        logger.info(f"Payment success for order {order.order_number}, user {user.id}"
+                    f"{'' if claimed else ' (already paid)'}: {timer.summary()}")
+        self._record(timer, claimed)
+        return result
+
+    def _commit(self, timer: _PhaseTimer) -> None:
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Payment activation commit failed: {type(e).__name__}")
+            raise PaymentActivationError('Failed to save payment information. Please contact support.', 500)
+        timer.lap('commit')
+
+    def get_stats(self) -> Dict:
+        """Request counts and mean milliseconds per phase"""
+        with self._lock:
+            requests = self._stats['requests']
+            means = {phase: round(ms / requests, 2) for phase, ms in self._stats['phase_ms'].items()} if requests else {}
+            return {'requests': requests, 'claimed': self._stats['claimed'], 'mean_phase_ms': means,
+                    'plan_catalog_reloads': self.catalog.reloads}
+
+
+# Global instance
+payment_activation_service = PaymentActivationService()
+
+
+@event.listens_for(SubscriptionPlan, 'after_insert')
+@event.listens_for(SubscriptionPlan, 'after_update')
+@event.listens_for(SubscriptionPlan, 'after_delete')
+def _invalidate_plan_catalog(mapper, connection, target):
+    payment_activation_service.catalog.invalidate()
@@ -0,0 +1,148 @@
+"""
+Payment Metrics Service
+Order counts and revenue behind the payment and invoice dashboards.
+
+Every figure comes from one pass over orders with conditional aggregates;
+"today" is a half-open UTC timestamp range on paid_at rather than a DATE()
+of the column. The snapshot is cached in the shared store for a few seconds
+and dropped as soon as a transaction that changes an order's status (or adds
+or removes an order) commits, so the dashboard never waits on its own write.
+"""
+
+from datetime import datetime, time as dt_time, timedelta
+from typing import Any, Dict
+
+from sqlalchemy import and_, event, func, inspect
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models.payment import Order
+from ..utils.logger import get_logger
+from ..utils.shared_store import SharedTTLStore
+from ..utils.sql_aggregates import count_if, sum_if
+
+logger = get_logger(__name__)
+
+# Session.info flag set when a flush or bulk statement changes orders
+ORDERS_CHANGED = 'payment_metrics_orders_changed'
+
+
+class PaymentMetricsService:
+    """Single-pass payment and invoice statistics with a short-lived cache"""
+
+    def __init__(self, cache_ttl: int = 15):
+        self.cache_ttl = cache_ttl
+        self.store = SharedTTLStore('payment_stats')
+
+    def get_snapshot(self, use_cache: bool = True) -> Dict[str, Any]:
+        """All order counts and revenue sums in one query"""
+        if use_cache:
+            cached = self.store.get_json('orders')
+            if cached is not None:
+                return cached
+
+        now = datetime.utcnow()
+        today_start = datetime.combine(now.date(), dt_time.min)
+        settled = and_(Order.status == 'paid', Order.payment_status == 'paid')
+        paid_today = and_(settled, Order.paid_at >= today_start, Order.paid_at < today_start + timedelta(days=1))
+
+        row = db.session.query(
+            func.count(Order.id).label('total'),
+            count_if(Order.status == 'pending').label('pending'),
+            count_if(Order.status == 'paid').label('paid'),
+            count_if(Order.status == 'failed').label('failed'),
+            count_if(Order.status == 'refunded').label('refunded'),
+            count_if(settled).label('settled'),
+            sum_if(settled, Order.total_amount).label('total_revenue'),
+            count_if(paid_today).label('settled_today'),
+            sum_if(paid_today, Order.total_amount).label('today_revenue')
+        ).one()
+
+        snapshot = {key: int(value or 0) for key, value in row._mapping.items()
+                    if key not in ('total_revenue', 'today_revenue')}
+        snapshot['total_revenue'] = float(row.total_revenue or 0)
+        snapshot['today_revenue'] = float(row.today_revenue or 0)
+        snapshot['generated_at'] = now.isoformat()
+        self.store.set_json('orders', snapshot, self.cache_ttl)
+        return snapshot
+
+    @staticmethod
+    def _payment_stats(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'total': snapshot['total'],
+            'pending': snapshot['pending'],
+            'paid': snapshot['paid'],
+            'failed': snapshot['failed'],
+            'refunded': snapshot['refunded'],
+            'totalRevenue': snapshot['total_revenue'],
+            'todayRevenue': snapshot['today_revenue']
+        }
+
+    @staticmethod
+    def _invoice_stats(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        # Invoices are only issued for settled orders, so every invoice counts as paid
+        return {
+            'total': snapshot['settled'],
+            'paid': snapshot['settled'],
+            'pending': 0,
+            'overdue': 0,
+            'totalAmount': snapshot['total_revenue']
+        }
+
+    def get_payment_stats(self, use_cache: bool = True) -> Dict[str, Any]:
+        return self._payment_stats(self.get_snapshot(use_cache))
+
+    def get_invoice_stats(self, use_cache: bool = True) -> Dict[str, Any]:
+        return self._invoice_stats(self.get_snapshot(use_cache))
+
+    def get_dashboard_stats(self, use_cache: bool = True) -> Dict[str, Any]:
+        """Payment and invoice statistics from the same snapshot, for the admin dashboard"""
+        snapshot = self.get_snapshot(use_cache)
+        return {
+            'payments': self._payment_stats(snapshot),
+            'invoices': self._invoice_stats(snapshot),
+            'todayOrders': snapshot['settled_today'],
+            'generatedAt': snapshot['generated_at']
+        }
+
+    def invalidate(self) -> None:
+        """Drop cached statistics"""
+        self.store.delete('orders')
+
+
+# Global instance
+payment_metrics_service = PaymentMetricsService()
+
+
+def _order_status_changed(order: Order) -> bool:
+    state = inspect(order)
+    return any(state.attrs[name].history.has_changes() for name in ('status', 'payment_status', 'total_amount', 'paid_at'))
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_order_changes(session, flush_context, instances):
+    if any(isinstance(obj, Order) for obj in session.new) or \
+            any(isinstance(obj, Order) for obj in session.deleted) or \
+            any(isinstance(obj, Order) and _order_status_changed(obj) for obj in session.dirty):
+        session.info[ORDERS_CHANGED] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_order_statements(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is Order:
+        orm_execute_state.session.info[ORDERS_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_payment_metrics(session):
+    if session.info.pop(ORDERS_CHANGED, False):
+        try:
+            payment_metrics_service.invalidate()
+        except Exception as e:
+            logger.warning(f"Could not invalidate payment metrics: {str(e)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_order_changes(session):
+    session.info.pop(ORDERS_CHANGED, None)
@@ -9,6 +9,8 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, List, Optional
 import logging
 
+from ..utils.rolling_metrics import RollingMetrics
+
 logger = logging.getLogger(__name__)
 
 class PaymentMonitoringService:
@@ -21,22 +23,20 @@ class PaymentMonitoringService:
             'high_volume': int(os.getenv('PAYMENT_MONITORING_HIGH_VOLUME', '100')),  # payments per minute
             'high_value': float(os.getenv('PAYMENT_MONITORING_HIGH_VALUE', '10000')),  # single payment amount
             'failure_rate': float(os.getenv('PAYMENT_MONITORING_FAILURE_RATE', '0.1')),  # 10% failure rate
-            'response_time': float(os.getenv('PAYMENT_MONITORING_RESPONSE_TIME', '5.0'))  # seconds
+            'response_time': float(os.getenv('PAYMENT_MONITORING_RESPONSE_TIME', '5.0')),  # seconds
+            'min_sample': int(os.getenv('PAYMENT_MONITORING_MIN_SAMPLE', '20'))  # payments before rate alerts
         }
         self.monitoring_metrics = {
             'total_payments': 0,
             'successful_payments': 0,
             'failed_payments': 0,
             'total_volume': 0.0,
-            'average_response_time': 0.0,
             'last_reset': datetime.now(timezone.utc)
         }
+        self.failure_statuses = {'failed', 'error', 'declined', 'blocked', 'cancelled'}
         
-        # Separate volume tracking for high volume detection
-        self.volume_tracking = {
-            'count': 0,
-            'last_reset': datetime.now(timezone.utc)
-        }
+        # Windowed metrics (1m/5m/1h) shared across workers through Redis when available
+        self.rolling_metrics = RollingMetrics('payments')
         
     def monitor_payment_attempt(self, payment_data: Dict[str, Any], 
                               start_time: float) -> Dict[str, Any]:
@@ -48,17 +48,20 @@ class PaymentMonitoringService:
             # Update metrics
             self._update_metrics(payment_data, response_time)
             
+            # Read the recent windows once for all detectors
+            windows = self._get_windowed_metrics(['1m', '5m'])
+            
             # Check for anomalies
-            anomalies = self._detect_anomalies(payment_data, response_time)
+            anomalies = self._detect_anomalies(payment_data, response_time, windows)
             
             # Generate alerts if needed
             if anomalies:
-                self._generate_alerts(anomalies, payment_data)
+                self._generate_alerts(anomalies, payment_data, windows)
             
             return {
                 'response_time': response_time,
                 'anomalies': anomalies,
-                'metrics': self._get_current_metrics()
+                'metrics': self._get_current_metrics(windows)
             }
             
         except Exception as e:
@@ -68,44 +71,70 @@ class PaymentMonitoringService:
     def _update_metrics(self, payment_data: Dict[str, Any], response_time: float) -> None:
         """Update monitoring metrics"""
         try:
-            self.monitoring_metrics['total_payments'] += 1
-            
-            # Update volume tracking for high volume detection
-            self.volume_tracking['count'] += 1
-            
-            # Update success/failure counts
-            if payment_data.get('status') == 'success':
-                self.monitoring_metrics['successful_payments'] += 1
-            else:
-                self.monitoring_metrics['failed_payments'] += 1
-            
-            # Update volume
+            failed = payment_data.get('status') in self.failure_statuses
             amount = payment_data.get('amount', 0)
-            if isinstance(amount, (int, float)):
-                self.monitoring_metrics['total_volume'] += amount
+            if not isinstance(amount, (int, float)):
+                amount = 0
             
-            # Update average response time
-            current_avg = self.monitoring_metrics['average_response_time']
-            total_payments = self.monitoring_metrics['total_payments']
+            # Lifetime totals for this worker
+            self.monitoring_metrics['total_payments'] += 1
+            if failed:
+                self.monitoring_metrics['failed_payments'] += 1
+            else:
+                self.monitoring_metrics['successful_payments'] += 1
+            self.monitoring_metrics['total_volume'] += amount
             
-            self.monitoring_metrics['average_response_time'] = (
-                (current_avg * (total_payments - 1) + response_time) / total_payments
+            # Windowed counters, volume and latency sketch
+            self.rolling_metrics.record(
+                counters={'payments': 1, 'failed': 1 if failed else 0},
+                sums={'volume': amount},
+                samples={'response_time': response_time}
             )
             
         except Exception as e:
             logger.error(f"Metrics update failed: {str(e)}")
     
-    def _detect_anomalies(self, payment_data: Dict[str, Any], response_time: float) -> List[Dict[str, Any]]:
+    def _get_windowed_metrics(self, window_names: List[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Summarize the rolling windows into rates and latency percentiles"""
+        windows = {}
+        snapshot = self.rolling_metrics.snapshot(window_names)
+        
+        for name, window in snapshot.items():
+            counters = window['counters']
+            sums = window['sums']
+            payments = counters.get('payments', 0)
+            failed = counters.get('failed', 0)
+            samples = counters.get('response_time_samples', 0)
+            latency = window['quantiles'].get('response_time', {})
+            
+            windows[name] = {
+                'payments': payments,
+                'successful_payments': payments - failed,
+                'failed_payments': failed,
+                'failure_rate': failed / payments if payments else 0.0,
+                'success_rate': (payments - failed) / payments if payments else 0.0,
+                'payments_per_minute': payments / (window['window_seconds'] / 60),
+                'volume': sums.get('volume', 0.0),
+                'average_response_time': sums.get('response_time', 0.0) / samples if samples else 0.0,
+                'response_time_p50': latency.get('p50'),
+                'response_time_p95': latency.get('p95'),
+                'response_time_p99': latency.get('p99')
+            }
+        
+        return windows
+    
+    def _detect_anomalies(self, payment_data: Dict[str, Any], response_time: float,
+                          windows: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Detect payment anomalies"""
         anomalies = []
         
         try:
             # Check for high volume
-            if self._is_high_volume():
+            if self._is_high_volume(windows):
                 anomalies.append({
                     'type': 'high_volume',
                     'severity': 'warning',
-                    'message': f"High payment volume detected: {self.monitoring_metrics['total_payments']} payments"
+                    'message': f"High payment volume detected: {windows['1m']['payments']} payments in the last minute"
                 })
             
             # Check for high value payments
@@ -118,12 +147,13 @@ class PaymentMonitoringService:
                 })
             
             # Check failure rate
-            failure_rate = self._calculate_failure_rate()
-            if failure_rate > self.alert_thresholds['failure_rate']:
+            failure_rate = self._calculate_failure_rate(windows)
+            if (windows['5m']['payments'] >= self.alert_thresholds['min_sample'] and
+                    failure_rate > self.alert_thresholds['failure_rate']):
                 anomalies.append({
                     'type': 'high_failure_rate',
                     'severity': 'critical',
-                    'message': f"High failure rate detected: {failure_rate:.2%}"
+                    'message': f"High failure rate detected: {failure_rate:.2%} over the last 5 minutes"
                 })
             
             # Check response time
@@ -143,35 +173,19 @@ class PaymentMonitoringService:
         
         return anomalies
     
-    def _is_high_volume(self) -> bool:
-        """Check if payment volume is high"""
+    def _is_high_volume(self, windows: Dict[str, Dict[str, Any]]) -> bool:
+        """Check if payment volume over the last minute is high"""
         try:
-            # Check payments per minute
-            current_time = datetime.now(timezone.utc)
-            time_diff = (current_time - self.volume_tracking['last_reset']).total_seconds()
-            
-            if time_diff >= 60:  # Reset every minute
-                self.volume_tracking['count'] = 0
-                self.volume_tracking['last_reset'] = current_time
-                return False
-            
-            self.volume_tracking['count'] += 1
-            payments_per_minute = self.volume_tracking['count'] / max(time_diff / 60, 1)
-            return payments_per_minute > self.alert_thresholds['high_volume']
+            return windows['1m']['payments_per_minute'] > self.alert_thresholds['high_volume']
             
         except Exception as e:
             logger.error(f"High volume check failed: {str(e)}")
             return False
     
-    def _calculate_failure_rate(self) -> float:
-        """Calculate current failure rate"""
+    def _calculate_failure_rate(self, windows: Dict[str, Dict[str, Any]], window: str = '5m') -> float:
+        """Calculate the failure rate over a recent window"""
         try:
-            total = self.monitoring_metrics['total_payments']
-            if total == 0:
-                return 0.0
-            
-            failed = self.monitoring_metrics['failed_payments']
-            return failed / total
+            return windows[window]['failure_rate']
             
         except Exception as e:
             logger.error(f"Failure rate calculation failed: {str(e)}")
@@ -229,16 +243,18 @@ class PaymentMonitoringService:
         # For now, return False as placeholder
         return False
     
-    def _generate_alerts(self, anomalies: List[Dict[str, Any]], payment_data: Dict[str, Any]) -> None:
+    def _generate_alerts(self, anomalies: List[Dict[str, Any]], payment_data: Dict[str, Any],
+                         windows: Dict[str, Dict[str, Any]]) -> None:
         """Generate alerts for anomalies"""
         try:
+            metrics = self._get_current_metrics(windows)
             for anomaly in anomalies:
                 alert = {
                     'alert_id': f"monitor_{int(time.time())}_{anomaly['type']}",
                     'timestamp': datetime.now(timezone.utc).isoformat(),
                     'anomaly': anomaly,
                     'payment_data': self._sanitize_payment_data(payment_data),
-                    'metrics': self._get_current_metrics()
+                    'metrics': metrics
                 }
                 
                 # Send alert based on severity
@@ -282,51 +298,45 @@ class PaymentMonitoringService:
         # This would send to logging system
         logger.info(f"PAYMENT INFO: {alert}")
     
-    def _get_current_metrics(self) -> Dict[str, Any]:
-        """Get current monitoring metrics"""
+    def _get_current_metrics(self, windows: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Get current monitoring metrics; rates come from the 5 minute window"""
+        recent = windows['5m']
         return {
             'total_payments': self.monitoring_metrics['total_payments'],
             'successful_payments': self.monitoring_metrics['successful_payments'],
             'failed_payments': self.monitoring_metrics['failed_payments'],
-            'success_rate': self._calculate_success_rate(),
-            'failure_rate': self._calculate_failure_rate(),
+            'success_rate': recent['success_rate'],
+            'failure_rate': recent['failure_rate'],
             'total_volume': self.monitoring_metrics['total_volume'],
-            'average_response_time': self.monitoring_metrics['average_response_time'],
-            'last_reset': self.monitoring_metrics['last_reset'].isoformat()
+            'average_response_time': recent['average_response_time'],
+            'response_time_p95': recent['response_time_p95'],
+            'last_reset': self.monitoring_metrics['last_reset'].isoformat(),
+            'windows': windows,
+            'shared_across_workers': self.rolling_metrics.shared
         }
     
-    def _calculate_success_rate(self) -> float:
-        """Calculate success rate"""
-        try:
-            total = self.monitoring_metrics['total_payments']
-            if total == 0:
-                return 0.0
-            
-            successful = self.monitoring_metrics['successful_payments']
-            return successful / total
-            
-        except Exception as e:
-            logger.error(f"Success rate calculation failed: {str(e)}")
-            return 0.0
-    
     def get_monitoring_dashboard_data(self) -> Dict[str, Any]:
         """Get data for monitoring dashboard"""
         try:
+            windows = self._get_windowed_metrics()
             return {
-                'metrics': self._get_current_metrics(),
+                'metrics': self._get_current_metrics(windows),
                 'thresholds': self.alert_thresholds,
-                'status': self._get_system_status(),
+                'status': self._get_system_status(windows),
                 'last_updated': datetime.now(timezone.utc).isoformat()
             }
         except Exception as e:
             logger.error(f"Dashboard data generation failed: {str(e)}")
             return {'error': str(e)}
     
-    def _get_system_status(self) -> str:
-        """Get overall system status"""
+    def _get_system_status(self, windows: Dict[str, Dict[str, Any]]) -> str:
+        """Get overall system status from the last 5 minutes"""
         try:
-            failure_rate = self._calculate_failure_rate()
-            avg_response_time = self.monitoring_metrics['average_response_time']
+            if windows['5m']['payments'] == 0:
+                return 'healthy'
+            
+            failure_rate = self._calculate_failure_rate(windows)
+            avg_response_time = windows['5m']['average_response_time']
             
             if failure_rate > 0.2 or avg_response_time > 10:
                 return 'critical'
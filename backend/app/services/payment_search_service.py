@@ -0,0 +1,155 @@
+"""
+Payment Search Service
+Order lookups for dispute resolution.
+
+Every search criterion maps to an indexed predicate: order numbers and
+payment intent ids are exact matches, a full email address is an equality on
+lower(customer_email), partial emails and names are LIKE patterns on the
+lowercased columns (prefix patterns use the text_pattern_ops indexes,
+substrings the pg_trgm indexes on PostgreSQL), amounts are normalised to
+cents and searched as a range on total_amount, and dates become half-open
+created_at ranges. The planner ranks the criteria by selectivity and the
+narrowest one drives the query: its matching ids are collected first in a
+materialized CTE (an optimisation fence on PostgreSQL, so the database cannot
+fold it back into one AND-ed scan) and the remaining criteria only filter
+those candidates.
+
+scripts/check_payment_search_plans.py runs EXPLAIN over these queries and
+fails if any of them falls back to a sequential scan of orders.
+"""
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Dict, List, NamedTuple
+
+from sqlalchemy import func, select
+
+from ..models.payment import Order
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+# pg_trgm cannot use an index for fragments shorter than one trigram
+MIN_SUBSTRING_LENGTH = 3
+CENT = Decimal('0.01')
+
+
+class PaymentSearchError(Exception):
+    """Raised for search criteria that cannot be parsed"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class SearchPredicate(NamedTuple):
+    name: str
+    rank: int  # lower is more selective
+    clause: Any
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _parse_datetime(value: str, field: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise PaymentSearchError(f"Invalid {field}, expected YYYY-MM-DD or an ISO timestamp")
+    if parsed.tzinfo is not None:
+        # created_at is naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _is_date_only(value: str) -> bool:
+    return len(value.strip()) == 10
+
+
+class PaymentSearchService:
+    """Plans and runs indexed order searches"""
+
+    @staticmethod
+    def _text_predicate(name: str, column, value: str, rank: int) -> SearchPredicate:
+        value = value.strip().lower()
+        pattern = _escape_like(value)
+        if len(value) < MIN_SUBSTRING_LENGTH:
+            # Too short for a trigram lookup; match from the start instead
+            return SearchPredicate(f"{name}_prefix", rank, func.lower(column).like(f"{pattern}%", escape='\\'))
+        return SearchPredicate(f"{name}_contains", rank + 1,
+                               func.lower(column).like(f"%{pattern}%", escape='\\'))
+
+    @staticmethod
+    def _amount_predicate(value) -> SearchPredicate:
+        try:
+            cents = Decimal(str(value).strip()).quantize(CENT, rounding=ROUND_HALF_UP)
+        except (InvalidOperation, ValueError):
+            raise PaymentSearchError("Invalid amount")
+        # total_amount is a float column, so match anything that rounds to the same cent
+        low, high = float(cents - CENT / 2), float(cents + CENT / 2)
+        return SearchPredicate('amount', 3, (Order.total_amount >= low) & (Order.total_amount < high))
+
+    def plan(self, criteria: Dict[str, Any]) -> List[SearchPredicate]:
+        """Indexed predicates for the given criteria, most selective first"""
+        predicates = []
+        if criteria.get('order_number'):
+            predicates.append(SearchPredicate('order_number', 0, Order.order_number == criteria['order_number'].strip()))
+        if criteria.get('payment_intent_id'):
+            predicates.append(SearchPredicate('payment_intent_id', 1,
+                                              Order.payment_intent_id == criteria['payment_intent_id'].strip()))
+        email = (criteria.get('email') or '').strip().lower()
+        if email and '@' in email and '.' in email.split('@', 1)[1]:
+            # A complete address: equality on the lowercased column
+            predicates.append(SearchPredicate('email', 2, func.lower(Order.customer_email) == email))
+        elif email:
+            predicates.append(self._text_predicate('email', Order.customer_email, email, 4))
+        if criteria.get('amount') not in (None, ''):
+            predicates.append(self._amount_predicate(criteria['amount']))
+        if criteria.get('name'):
+            predicates.append(self._text_predicate('name', Order.customer_name, criteria['name'], 5))
+
+        date_from, date_to = criteria.get('date_from'), criteria.get('date_to')
+        if date_from:
+            predicates.append(SearchPredicate('date_from', 7, Order.created_at >= _parse_datetime(date_from, 'date_from')))
+        if date_to:
+            end = _parse_datetime(date_to, 'date_to')
+            if _is_date_only(date_to):
+                # A bare date includes the whole day
+                predicates.append(SearchPredicate('date_to', 7, Order.created_at < end + timedelta(days=1)))
+            else:
+                predicates.append(SearchPredicate('date_to', 7, Order.created_at <= end))
+
+        predicates.sort(key=lambda predicate: predicate.rank)
+        return predicates
+
+    def build_query(self, criteria: Dict[str, Any], limit: int = DEFAULT_LIMIT):
+        """The ORM query for a search, with its plan"""
+        predicates = self.plan(criteria)
+        query = Order.query
+        if len(predicates) > 1:
+            # Only the driving predicate's index is read; the others filter its candidates
+            candidates = (select(Order.id).where(predicates[0].clause)
+                          .cte('search_candidates').prefix_with('MATERIALIZED', dialect='postgresql'))
+            query = query.join(candidates, Order.id == candidates.c.id)
+            predicates_to_filter = predicates[1:]
+        else:
+            predicates_to_filter = predicates
+        for predicate in predicates_to_filter:
+            query = query.filter(predicate.clause)
+        limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+        return query.order_by(Order.created_at.desc()).limit(limit), predicates
+
+    def search(self, criteria: Dict[str, Any], limit: int = DEFAULT_LIMIT) -> Dict[str, Any]:
+        """Matching orders, newest first, and the predicates used in order"""
+        query, predicates = self.build_query(criteria, limit)
+        orders = query.all()
+        logger.info(f"Payment search on {[p.name for p in predicates]} matched {len(orders)} orders")
+        return {'orders': orders, 'plan': [predicate.name for predicate in predicates]}
+
+
+# Global instance
+payment_search_service = PaymentSearchService()
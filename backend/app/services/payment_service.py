@@ -97,9 +97,10 @@ class PaymentService:
             if not promotion.is_valid():
                 raise Exception("Promotion is not valid")
             
-            # Check usage limits
-            if promotion.usage_limit and promotion.usage_count >= promotion.usage_limit:
-                raise Exception("Promotion usage limit exceeded")
+            # Claim a use atomically; the limit is enforced by the UPDATE, not a prior read
+            redeemed, reason = promotion.increment_usage()
+            if not redeemed:
+                raise Exception("Promotion usage limit exceeded" if reason == "Usage limit reached" else reason)
             
             # Set promotion details (discount calculation will be done in calculate_totals)
             if promotion.type == 'percentage':
@@ -107,9 +108,6 @@ class PaymentService:
             elif promotion.type == 'fixed':
                 order.discount_fixed = float(promotion.value)
             
-            # Update promotion usage
-            promotion.increment_usage()
-            
             return promotion
             
         except Exception as e:
@@ -7,12 +7,13 @@ import hashlib
 import hmac
 import secrets
 import json
-import re
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional
 from flask import current_app
 import logging
 
+from .pci_log_scanner import pci_log_scanner
+
 logger = logging.getLogger(__name__)
 
 class PCIComplianceService:
@@ -341,9 +342,16 @@ class PCIComplianceService:
         }
         
         # Check for sensitive data in logs
-        if self._check_sensitive_data_in_logs():
+        logs_status = self._check_sensitive_data_in_logs()
+        if logs_status == 'found':
             validation_results['violations'].append('Sensitive data found in logs')
             validation_results['pci_compliant'] = False
+        elif logs_status == 'unverified':
+            # No recent scan means the logs are unchecked, which cannot count as compliant
+            validation_results['violations'].append('Logs not verified free of sensitive data: PCI log scan missing or stale')
+            validation_results['recommendations'].append('Run the PCI log scan to verify logs contain no sensitive data')
+            validation_results['pci_compliant'] = False
+        validation_results['log_scan'] = self._log_scan_summary()
         
         # Check encryption requirements
         if not self._check_encryption_requirements():
@@ -357,133 +365,30 @@ class PCIComplianceService:
         
         return validation_results
     
-    def _check_sensitive_data_in_logs(self) -> bool:
-        """Check if sensitive data is being logged"""
-        import os
-        import re
-        import glob
-        
-        try:
-            # Define sensitive data patterns
-            sensitive_patterns = {
-                'credit_card': r'\b(?:\d{4}[-\s]?){3}\d{4}\b',  # Credit card numbers
-                'cvv': r'\b\d{3,4}\b',  # CVV codes
-                'ssn': r'\b\d{3}-\d{2}-\d{4}\b',  # SSN format
-                'email': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',  # Email addresses
-                'password': r'password["\']?\s*[:=]\s*["\']?[^"\'\s]+["\']?',  # Password fields
-                'api_key': r'api[_-]?key["\']?\s*[:=]\s*["\']?[A-Za-z0-9_-]+["\']?',  # API keys
-                'token': r'token["\']?\s*[:=]\s*["\']?[A-Za-z0-9._-]+["\']?',  # Tokens
-            }
-            
-            # Check log files in logs directory
-            log_dir = "logs"
-            if not os.path.exists(log_dir):
-                logger.info("No logs directory found - assuming no sensitive data in logs")
-                return False
-            
-            # Find all log files
-            log_files = glob.glob(os.path.join(log_dir, "*.log"))
-            if not log_files:
-                logger.info("No log files found - assuming no sensitive data in logs")
-                return False
-            
-            sensitive_data_found = False
-            violations = []
-            
-            for log_file in log_files:
-                try:
-                    with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                        # Check each pattern
-                        for pattern_name, pattern in sensitive_patterns.items():
-                            matches = re.findall(pattern, content, re.IGNORECASE)
-                            if matches:
-                                # Filter out false positives
-                                valid_matches = self._filter_sensitive_matches(matches, pattern_name)
-                                if valid_matches:
-                                    violations.append(f"{pattern_name}: {len(valid_matches)} matches in {os.path.basename(log_file)}")
-                                    sensitive_data_found = True
-                                    
-                except Exception as e:
-                    logger.warning(f"Could not scan log file {log_file}: {str(e)}")
-                    continue
-            
-            if sensitive_data_found:
-                logger.error(f"Sensitive data found in logs: {violations}")
-            else:
-                logger.info("No sensitive data found in log files")
-                
-            return sensitive_data_found
-            
-        except Exception as e:
-            logger.error(f"Error checking sensitive data in logs: {str(e)}")
-            # Return True to be safe - assume sensitive data might be present
-            return True
-    
-    def _filter_sensitive_matches(self, matches: List[str], pattern_name: str) -> List[str]:
-        """Filter out false positives from sensitive data matches"""
-        filtered_matches = []
-        
-        for match in matches:
-            # Skip common false positives
-            if pattern_name == 'credit_card':
-                # Skip common non-card number patterns
-                if not self._is_likely_card_number(match):
-                    continue
-            elif pattern_name == 'cvv':
-                # Skip common non-CVV patterns
-                if not self._is_likely_cvv(match):
-                    continue
-            elif pattern_name == 'email':
-                # Skip common non-email patterns
-                if not self._is_likely_email(match):
-                    continue
-            
-            filtered_matches.append(match)
-        
-        return filtered_matches
-    
-    def _is_likely_card_number(self, number: str) -> bool:
-        """Check if a number is likely a credit card number"""
-        # Remove spaces and dashes
-        clean_number = re.sub(r'[-\s]', '', number)
-        
-        # Must be 13-19 digits
-        if not re.match(r'^\d{13,19}$', clean_number):
-            return False
-        
-        # Luhn algorithm check
-        return self._luhn_check(clean_number)
-    
-    def _is_likely_cvv(self, cvv: str) -> bool:
-        """Check if a number is likely a CVV"""
-        # CVV should be 3-4 digits
-        if not re.match(r'^\d{3,4}$', cvv):
-            return False
-        
-        # Skip common false positives
-        false_positives = ['000', '123', '999', '0000', '1234', '9999']
-        return cvv not in false_positives
-    
-    def _is_likely_email(self, email: str) -> bool:
-        """Check if a string is likely an email address"""
-        # Basic email validation
-        email_pattern = r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}$'
-        return bool(re.match(email_pattern, email))
-    
-    def _luhn_check(self, number: str) -> bool:
-        """Luhn algorithm for credit card validation"""
-        def digits_of(n):
-            return [int(d) for d in str(n)]
-        
-        digits = digits_of(number)
-        odd_digits = digits[-1::-2]
-        even_digits = digits[-2::-2]
-        checksum = sum(odd_digits)
-        for d in even_digits:
-            checksum += sum(digits_of(d * 2))
-        return checksum % 10 == 0
+    def _check_sensitive_data_in_logs(self) -> str:
+        """
+        Whether sensitive data is being logged, from the last incremental log
+        scan: 'clean', 'found', or 'unverified' when no current report exists
+        """
+        report = pci_log_scanner.last_report()
+        if report is not None and report.get('sensitive_data_found'):
+            return 'found'
+        if not pci_log_scanner.report_is_current(report):
+            logger.warning("PCI log scan is missing or stale - sensitive data in logs is unverified")
+            return 'unverified'
+        return 'clean'
+    
+    def _log_scan_summary(self) -> Optional[Dict[str, Any]]:
+        """When the last log scan ran and what it found, without file details"""
+        report = pci_log_scanner.last_report()
+        if report is None:
+            return None
+        return {
+            'scanned_at': report.get('scanned_at'),
+            'current': pci_log_scanner.report_is_current(report),
+            'sensitive_data_found': report.get('sensitive_data_found', False),
+            'totals': report.get('totals', {})
+        }
     
     def _check_encryption_requirements(self) -> bool:
         """Check if encryption requirements are met"""
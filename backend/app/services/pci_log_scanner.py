@@ -0,0 +1,357 @@
+"""
+PCI Log Scanner
+Incremental scan of logs/*.log for card numbers and other sensitive data.
+
+Files are streamed in fixed-size chunks. A literal prefilter picks the lines
+that could hold sensitive data and one compiled alternation of all patterns
+runs over those lines; chunks are cut at the last newline and the partial
+line is carried into the next read, so no match is split (a single line
+longer than MAX_LINE is cut with an OVERLAP tail instead). Card candidates
+are confirmed with a Luhn check.
+
+Each file's checkpoint (inode and offset of the last complete line scanned)
+and its findings are kept in a JSON state file, so a run only reads bytes
+appended since the previous one; rotated or truncated files start over.
+Backlogs larger than one segment are split at line boundaries and spread
+over a process pool. The state file doubles as the last report, which the
+compliance check reads instead of scanning.
+"""
+
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 4 * 1024 * 1024
+SEGMENT_SIZE = 64 * 1024 * 1024  # backlog per pool task
+MAX_LINE = 1024 * 1024  # longest line carried whole between chunks
+OVERLAP = 256  # tail re-scanned when a line is longer than MAX_LINE
+MAX_SAMPLES = 20  # masked sample locations kept per file
+
+
+def _secret(key: bytes, name: str) -> bytes:
+    """key, a ':' or '=' and the value, captured as <name>_value"""
+    return key + rb'''["']?[ \t]*[:=][ \t]*["']?(?P<''' + name.encode() + rb'''_value>[^"'\s,;}&]+)'''
+
+
+# One alternation, one pass; findings are keyed by the group that matched
+PATTERNS = [
+    ('credit_card', rb'(?<![\w.-])(?:\d{13,19}|\d{4}(?P<card_separator>[ -])\d{4}(?P=card_separator)\d{4}'
+                    rb'(?P=card_separator)\d{4}(?:(?P=card_separator)\d{3})?|\d{4}(?P<amex_separator>[ -])\d{6}'
+                    rb'(?P=amex_separator)\d{5})(?!\w|[.-]\d)'),
+    ('ssn', rb'\b\d{3}-\d{2}-\d{4}\b'),
+    ('cvv', _secret(rb'\b(?:cvv2?|cvc2?|security[_ ]?code)', 'cvv')),
+    ('email', rb'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'),
+    ('password', _secret(rb'password', 'password')),
+    ('api_key', _secret(rb'api[_-]?key', 'api_key')),
+    ('token', _secret(rb'token', 'token')),
+]
+MATCHER = re.compile(b'|'.join(b'(?P<' + name.encode() + b'>' + pattern + b')' for name, pattern in PATTERNS),
+                     re.IGNORECASE)
+PATTERN_NAMES = [name for name, _ in PATTERNS]
+
+# Every match contains one of these once text is lowercased and digits folded
+# to '0'; lines without any are skipped at bytes.find speed, so the
+# alternation only runs on the few lines that might match
+TRIGGERS = (
+    b'0' * 13, b'0000 0000 0000', b'0000-0000-0000', b'0000 000000 00000', b'0000-000000-00000',  # cards
+    b'000-00-0000',  # SSN
+    b'cvv', b'cvc', b'security',
+    b'@',
+    b'password', b'apikey', b'api_key', b'api-key', b'token',
+)
+FOLD = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ123456789', b'abcdefghijklmnopqrstuvwxyz' + b'0' * 9)
+
+# Values that show a secret was already masked before it was logged
+MASKED_VALUES = frozenset((b'[redacted]', b'redacted', b'***', b'****', b'********', b'null', b'none',
+                           b'undefined', b'<redacted>', b'[filtered]', b'masked'))
+
+
+def _try_lock(handle) -> bool:
+    """Take an exclusive, non-blocking lock on an open file; False if another process holds it"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt is not None:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def luhn_valid(digits: bytes) -> bool:
+    total = 0
+    for index, char in enumerate(reversed(digits)):
+        digit = char - 48
+        if index % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def _finding(match) -> Optional[Tuple[str, str]]:
+    """(type, masked preview) for a real finding, None for a false positive"""
+    kind = match.lastgroup
+    text = match.group(kind)
+    if kind == 'credit_card':
+        digits = bytes(char for char in text if 48 <= char <= 57)
+        if not 13 <= len(digits) <= 19 or len(set(digits)) == 1 or not luhn_valid(digits):
+            return None
+        return kind, f"****{digits[-4:].decode()}"
+    if kind == 'ssn':
+        if text.startswith((b'000', b'666', b'9')) or text[4:6] == b'00' or text.endswith(b'0000'):
+            return None
+        return kind, f"***-**-{text[-4:].decode()}"
+    if kind == 'email':
+        local, _, domain = text.decode('utf-8', 'replace').partition('@')
+        return kind, f"{local[:1]}***@{domain}"
+    value = match.group(f'{kind}_value')
+    if value.lower() in MASKED_VALUES or set(value) == {ord('*')}:
+        return None
+    if kind in ('api_key', 'token') and len(value) < 8:
+        return None  # 'token=1', 'api_key=None' and similar are not secrets
+    if kind == 'cvv' and not (value.isdigit() and 3 <= len(value) <= 4):
+        return None
+    label = text[:text.index(value)].rstrip(b'"\' \t:=').decode('utf-8', 'replace')
+    return kind, f"{label}=[REDACTED]"
+
+
+def _candidate_lines(data: bytes, limit: int) -> List[Tuple[int, int]]:
+    """Sorted (start, end) of the lines starting before limit that contain a trigger"""
+    folded = data.translate(FOLD)
+    lines = {}
+    for trigger in TRIGGERS:
+        index = folded.find(trigger)
+        while 0 <= index:
+            start = folded.rfind(b'\n', 0, index) + 1
+            if start >= limit:
+                break
+            end = folded.find(b'\n', index)
+            end = len(data) if end < 0 else end
+            lines[start] = end
+            index = folded.find(trigger, end)
+    return sorted(lines.items())
+
+
+def _scan_buffer(data: bytes, base: int, limit: int, counts: Dict[str, int], samples: List[Dict]) -> None:
+    """Count findings that start before limit; base is the file offset of data"""
+    for start, end in _candidate_lines(data, limit):
+        # No pattern crosses a newline, so matching line by line finds the same matches
+        for match in MATCHER.finditer(data, start, end):
+            if match.start() >= limit:
+                break
+            finding = _finding(match)
+            if finding is None:
+                continue
+            kind, preview = finding
+            counts[kind] = counts.get(kind, 0) + 1
+            if len(samples) < MAX_SAMPLES:
+                samples.append({'type': kind, 'offset': base + match.start(), 'preview': preview})
+
+
+def scan_segment(path: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Dict:
+    """
+    Scan bytes [start, end) of a file, where both ends are line boundaries.
+    Module-level so it can be shipped to a process pool.
+    """
+    counts: Dict[str, int] = {}
+    samples: List[Dict] = []
+    carry = b''
+    data_offset = start  # file offset of the first byte of carry + chunk
+    position = start
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while position < end:
+            chunk = handle.read(min(chunk_size, end - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            data = carry + chunk
+            if position >= end:
+                cut = len(data)
+            else:
+                cut = data.rfind(b'\n') + 1
+                if not cut:
+                    if len(data) < MAX_LINE:
+                        carry = data
+                        continue
+                    cut = len(data) - OVERLAP
+            # Matches starting after the cut are found again on the next pass
+            _scan_buffer(data, data_offset, cut, counts, samples)
+            carry = data[cut:]
+            data_offset += cut
+    return {'counts': counts, 'samples': samples, 'bytes': end - start}
+
+
+def _line_end(handle, position: int, limit: int) -> int:
+    """Offset just past the first newline at or after position (limit if none)"""
+    handle.seek(position)
+    while position < limit:
+        block = handle.read(min(65536, limit - position))
+        if not block:
+            break
+        index = block.find(b'\n')
+        if index >= 0:
+            return position + index + 1
+        position += len(block)
+    return limit
+
+
+def _last_line_end(handle, start: int, size: int) -> int:
+    """Offset just past the last newline in [start, size), so a line being written is left for later"""
+    position = size
+    while position > start:
+        read_from = max(start, position - 65536)
+        handle.seek(read_from)
+        block = handle.read(position - read_from)
+        index = block.rfind(b'\n')
+        if index >= 0:
+            return read_from + index + 1
+        position = read_from
+        if size - position > MAX_LINE:
+            return size  # one enormous unterminated line: scan it rather than wait forever
+    return start
+
+
+def plan_segments(path: str, start: int, size: int, segment_size: int = SEGMENT_SIZE) -> List[Tuple[int, int]]:
+    """Split the unscanned bytes of a file into line-aligned segments"""
+    with open(path, 'rb') as handle:
+        end = _last_line_end(handle, start, size)
+        segments = []
+        position = start
+        while position < end:
+            boundary = end if end - position <= segment_size else _line_end(handle, position + segment_size, end)
+            segments.append((position, boundary))
+            position = boundary
+    return segments
+
+
+class PCILogScanner:
+    """Incremental sensitive-data scanner over a log directory"""
+
+    def __init__(self, log_dir: str = 'logs', state_path: Optional[str] = None,
+                 chunk_size: int = CHUNK_SIZE, segment_size: int = SEGMENT_SIZE):
+        self.log_dir = log_dir
+        self.state_path = state_path or os.getenv('PCI_LOG_SCAN_STATE', os.path.join('instance', 'pci_log_scan.json'))
+        self.chunk_size = chunk_size
+        self.segment_size = segment_size
+        self.max_report_age = timedelta(hours=float(os.getenv('PCI_LOG_SCAN_MAX_AGE_HOURS', '24')))
+
+    def last_report(self) -> Optional[Dict]:
+        """The report written by the last scan, or None if no scan has run"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read PCI log scan report {self.state_path}: {e}")
+            return None
+
+    def report_is_current(self, report: Optional[Dict]) -> bool:
+        """Whether a report exists and is recent enough to vouch for the logs"""
+        try:
+            scanned_at = datetime.fromisoformat(report['scanned_at'])
+        except (TypeError, KeyError, ValueError):
+            return False
+        return datetime.utcnow() - scanned_at <= self.max_report_age
+
+    def scan(self, workers: int = 1) -> Dict:
+        """Scan new bytes in every log file, merge the findings and persist the report"""
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(f"{self.state_path}.lock", 'w') as lock:
+            if not _try_lock(lock):
+                logger.info("PCI log scan already running; returning the last report")
+                return self.last_report() or {'running': True}
+            return self._scan(workers)
+
+    def _scan(self, workers: int) -> Dict:
+        started = time.perf_counter()
+        previous = (self.last_report() or {}).get('files', {})
+        files = {}
+        tasks = []
+        for path in sorted(glob.glob(os.path.join(self.log_dir, '*.log'))):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            name = os.path.basename(path)
+            entry = previous.get(name)
+            if not entry or entry.get('inode') != stat.st_ino or entry.get('offset', 0) > stat.st_size:
+                entry = {'inode': stat.st_ino, 'offset': 0, 'counts': {}, 'samples': []}  # new or rotated
+            files[name] = entry
+            try:
+                segments = plan_segments(path, entry['offset'], stat.st_size, self.segment_size)
+            except OSError as e:
+                logger.warning(f"Could not scan log file {path}: {e}")
+                continue
+            tasks.extend((name, path, start, end) for start, end in segments)
+
+        bytes_scanned = 0
+        for (name, _, _, end), result in zip(tasks, self._run(tasks, workers)):
+            entry = files[name]
+            for kind, count in result['counts'].items():
+                entry['counts'][kind] = entry['counts'].get(kind, 0) + count
+            entry['samples'] = (entry['samples'] + result['samples'])[:MAX_SAMPLES]
+            entry['offset'] = end
+            bytes_scanned += result['bytes']
+
+        totals = {name: 0 for name in PATTERN_NAMES}
+        for entry in files.values():
+            for kind, count in entry['counts'].items():
+                totals[kind] += count
+        report = {
+            'scanned_at': datetime.utcnow().isoformat(),
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+            'bytes_scanned': bytes_scanned,
+            'workers': workers,
+            'sensitive_data_found': any(totals.values()),
+            'totals': totals,
+            'files': files,
+        }
+        self._write_report(report)
+
+        if report['sensitive_data_found']:
+            found = {kind: count for kind, count in totals.items() if count}
+            logger.error(f"Sensitive data found in logs: {found}")
+        logger.info(f"PCI log scan read {bytes_scanned} new bytes from {len(files)} files "
+                    f"in {report['elapsed_seconds']}s")
+        return report
+
+    def _run(self, tasks: List[Tuple], workers: int):
+        """Segment results in task order, inline or across a process pool"""
+        if workers <= 1 or len(tasks) <= 1:
+            return [scan_segment(path, start, end, self.chunk_size) for _, path, start, end in tasks]
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            return list(executor.map(scan_segment, *zip(*[(path, start, end, self.chunk_size)
+                                                          for _, path, start, end in tasks])))
+
+    def _write_report(self, report: Dict) -> None:
+        temporary = f"{self.state_path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(report, f)
+        os.chmod(temporary, 0o600)
+        os.replace(temporary, self.state_path)
+
+
+# Global instance
+pci_log_scanner = PCILogScanner()
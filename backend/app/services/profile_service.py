@@ -1,6 +1,5 @@
 import logging
 import os
-import hashlib
 import secrets
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
@@ -10,6 +9,8 @@ from .. import db
 from ..models import User, UserProfile, ProfileChangeHistory, UserLoginHistory, PasswordResetToken
 from .security_service import security_service
 from .audit_service import audit_service
+from .file_storage_service import file_storage_service, FileTooLargeError
+from .avatar_pipeline import avatar_pipeline, release_avatar_variants, detect_avatar_type
 
 logger = logging.getLogger(__name__)
 
@@ -20,10 +21,7 @@ class ProfileService:
     def __init__(self):
         self.allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
         self.max_file_size = 5 * 1024 * 1024  # 5MB
-        self.upload_folder = 'uploads/avatars'
-        
-        # Ensure upload directory exists
-        os.makedirs(self.upload_folder, exist_ok=True)
+        self.upload_folder = 'uploads/avatars'  # Avatars uploaded before content-addressed storage
     
     def get_user_profile(self, user_id: int, include_changes: bool = False) -> Optional[Dict]:
         """
@@ -188,14 +186,6 @@ class ProfileService:
             if extension not in self.allowed_extensions:
                 return False, {}, [f'File type not allowed. Allowed types: {", ".join(self.allowed_extensions)}']
             
-            # Check file size
-            file.seek(0, 2)  # Seek to end
-            file_size = file.tell()
-            file.seek(0)  # Reset to beginning
-            
-            if file_size > self.max_file_size:
-                return False, {}, [f'File too large. Maximum size: {self.max_file_size // (1024*1024)}MB']
-            
             # Get user profile
             user = User.query.get(user_id)
             if not user:
@@ -205,19 +195,31 @@ class ProfileService:
             if not profile:
                 profile = self.create_default_profile(user_id)
             
-            # Generate unique filename
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            file_hash = hashlib.md5(f"{user_id}_{timestamp}".encode()).hexdigest()[:8]
-            new_filename = f"avatar_{user_id}_{file_hash}_{timestamp}.{extension}"
-            
-            # Save file
-            file_path = os.path.join(self.upload_folder, new_filename)
-            file.save(file_path)
+            # The stored type comes from the image bytes, never the client's Content-Type,
+            # since avatars are served inline on a public route
+            detected = detect_avatar_type(file.stream)
+            if not detected:
+                return False, {}, ['File is not a PNG, JPEG, GIF or WebP image']
+            mime_type, extension = detected
+            
+            # Stream into content-addressed storage; the size limit is enforced while reading
+            try:
+                stored = file_storage_service.save(
+                    file.stream, max_size=self.max_file_size, mime_type=mime_type
+                )
+            except FileTooLargeError:
+                return False, {}, [f'File too large. Maximum size: {self.max_file_size // (1024*1024)}MB']
+            file_size = stored.size
+            new_filename = f"{stored.content_hash}.{extension}"
             
             # Update profile
             old_avatar = profile.avatar_filename
-            profile.avatar_url = f"/uploads/avatars/{new_filename}"
+            old_content_hash = profile.avatar_content_hash
+            old_variants = profile.avatar_variants
+            profile.avatar_url = f"/api/profile/avatars/{stored.content_hash}"
             profile.avatar_filename = new_filename
+            profile.avatar_content_hash = stored.content_hash
+            profile.avatar_variants = None
             profile.avatar_upload_date = datetime.utcnow()
             profile.updated_at = datetime.utcnow()
             
@@ -244,11 +246,17 @@ class ProfileService:
             )
             
             db.session.commit()
+            file_storage_service.release(old_content_hash)
+            release_avatar_variants(old_variants)
+            
+            # Thumbnails are built in the background; avatar_url serves the original meanwhile
+            avatar_pipeline.submit(user_id, stored.content_hash)
             
             avatar_data = {
                 'avatar_url': profile.avatar_url,
                 'avatar_filename': profile.avatar_filename,
-                'avatar_upload_date': profile.avatar_upload_date.isoformat()
+                'avatar_upload_date': profile.avatar_upload_date.isoformat(),
+                'avatar_variants': {}  # filled in once the avatar pipeline has run
             }
             
             logger.info(f"Avatar uploaded for user {user_id}: {new_filename}")
@@ -275,14 +283,19 @@ class ProfileService:
             if not old_avatar:
                 return False, ['No avatar to delete']
             
-            # Delete file from filesystem
-            file_path = os.path.join(self.upload_folder, old_avatar)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            old_content_hash = profile.avatar_content_hash
+            old_variants = profile.avatar_variants
+            if not old_content_hash:
+                # Legacy avatar written straight to disk
+                file_path = os.path.join(self.upload_folder, old_avatar)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
             
             # Update profile
             profile.avatar_url = None
             profile.avatar_filename = None
+            profile.avatar_content_hash = None
+            profile.avatar_variants = None
             profile.avatar_upload_date = None
             profile.updated_at = datetime.utcnow()
             
@@ -309,6 +322,8 @@ class ProfileService:
             )
             
             db.session.commit()
+            file_storage_service.release(old_content_hash)
+            release_avatar_variants(old_variants)
             
             logger.info(f"Avatar deleted for user {user_id}: {old_avatar}")
             return True, []
@@ -2,39 +2,69 @@
 Real-time chat service for ticket messages
 """
 
-import json
 import logging
-from typing import Dict, Set, Optional, Any, List
+from typing import Dict, Any, List
 from datetime import datetime
 import threading
-import time
+
+from ..utils.shared_store import SharedTTLStore
 
 logger = logging.getLogger(__name__)
 
 class RealtimeChatService:
-    """Service for real-time chat functionality in support tickets"""
+    """
+    Service for real-time chat functionality in support tickets.
+
+    Socket.IO rooms and broadcasts go through the configured message queue,
+    so an emit from any worker reaches clients on every worker. Presence,
+    typing and message status live in a shared TTL store (Redis when
+    available) keyed per ticket and per user, so no global lock is taken:
+    each worker only tracks the sids connected to itself and refreshes
+    their presence from a periodic task.
+    """
     
-    def __init__(self, socketio=None):
+    def __init__(self, socketio=None, store: SharedTTLStore = None):
         logger.info(f"Creating RealtimeChatService with SocketIO: {socketio is not None} (type: {type(socketio).__name__ if socketio else 'None'})")
-        self.socketio = socketio
-        self._lock = threading.RLock()  # Use RLock for nested locking
-        self.connected_clients: Dict[str, Dict] = {}  # client_id -> client_info
-        self.ticket_rooms: Dict[int, Set[str]] = {}  # ticket_id -> set of client_ids
-        self.user_rooms: Dict[int, Set[str]] = {}  # user_id -> set of client_ids
-        self.admin_rooms: Set[str] = set()  # admin room names
-        self.typing_users: Dict[int, Dict] = {}  # ticket_id -> {user_id: typing_info}
-        self.message_status: Dict[str, str] = {}  # message_id -> status (sent, delivered, read)
+        self.socketio = None
+        self.store = store or SharedTTLStore('chat')
+        self.presence_ttl = 120  # Seconds a client stays listed without a refresh
+        self.typing_ttl = 10  # Typing indicators expire after this many seconds
+        self.message_status_ttl = 86400
+        self.cleanup_interval = 30
+        self.connected_clients: Dict[str, Dict] = {}  # client_id -> client_info (this worker only)
         self._cleanup_timer = None  # Background cleanup timer
         
         if socketio:
-            logger.info("Setting up SocketIO event handlers...")
-            self._setup_event_handlers()
-            # Start periodic cleanup with threading timer
-            self._start_periodic_cleanup()
-            logger.info("SocketIO event handlers and cleanup setup complete")
+            self.init_socketio(socketio)
         else:
             logger.warning("No SocketIO provided - real-time features will be disabled")
     
+    def init_socketio(self, socketio):
+        """Attach a SocketIO server, register handlers and start the refresh task"""
+        self.stop()
+        self.socketio = socketio
+        logger.info("Setting up SocketIO event handlers...")
+        self._setup_event_handlers()
+        # Start periodic cleanup with threading timer
+        self._start_periodic_cleanup(self.cleanup_interval)
+        logger.info("SocketIO event handlers and cleanup setup complete")
+    
+    def _client_presence(self, client_info: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'user_id': client_info.get('user_id'),
+            'is_admin': client_info.get('is_admin', False),
+            'connected_at': client_info['connected_at'].isoformat() if client_info.get('connected_at') else None
+        }
+    
+    def _publish_presence(self, client_id: str, client_info: Dict[str, Any]):
+        """Write (or refresh) a client's presence in the shared store"""
+        self.store.set_json(f"client:{client_id}", self._client_presence(client_info), self.presence_ttl)
+        user_id = client_info.get('user_id')
+        if user_id:
+            self.store.add_member(f"user:{user_id}:clients", client_id, self.presence_ttl)
+        for ticket_id in list(client_info.get('ticket_rooms', ())):
+            self.store.add_member(f"ticket:{ticket_id}:clients", client_id, self.presence_ttl)
+    
     def _setup_event_handlers(self):
         """Setup WebSocket event handlers for chat"""
         try:
@@ -45,14 +75,15 @@ class RealtimeChatService:
             def handle_connect():
                 """Handle client connection"""
                 client_id = request.sid
-                with self._lock:
-                    self.connected_clients[client_id] = {
-                        'connected_at': datetime.utcnow(),
-                        'user_id': None,
-                        'is_admin': False,
-                        'rooms': set(),
-                        'ticket_rooms': set()
-                    }
+                client_info = {
+                    'connected_at': datetime.utcnow(),
+                    'user_id': None,
+                    'is_admin': False,
+                    'rooms': set(),
+                    'ticket_rooms': set()
+                }
+                self.connected_clients[client_id] = client_info
+                self._publish_presence(client_id, client_info)
                 logger.info(f"Chat client connected: {client_id}")
                 emit('chat_connected', {'client_id': client_id})
             
@@ -60,35 +91,19 @@ class RealtimeChatService:
             def handle_disconnect():
                 """Handle client disconnection"""
                 client_id = request.sid
-                with self._lock:
-                    if client_id in self.connected_clients:
-                        client_info = self.connected_clients[client_id]
-                        user_id = client_info.get('user_id')
-                        
-                        # Remove from all rooms
-                        for room in client_info.get('rooms', set()):
-                            leave_room(room)
-                        
-                        # Remove from ticket rooms
-                        for ticket_id in client_info.get('ticket_rooms', set()):
-                            if ticket_id in self.ticket_rooms:
-                                self.ticket_rooms[ticket_id].discard(client_id)
-                                if not self.ticket_rooms[ticket_id]:
-                                    del self.ticket_rooms[ticket_id]
-                        
-                        # Remove from user rooms
-                        if user_id and user_id in self.user_rooms:
-                            self.user_rooms[user_id].discard(client_id)
-                            if not self.user_rooms[user_id]:
-                                del self.user_rooms[user_id]
-                        
-                        # Remove from admin rooms
-                        for room in client_info.get('rooms', set()):
-                            if room.startswith('admin_'):
-                                self.admin_rooms.discard(room)
-                        
-                        # Clean up client info
-                        del self.connected_clients[client_id]
+                client_info = self.connected_clients.pop(client_id, None)
+                if client_info:
+                    # Remove from all rooms
+                    for room in client_info.get('rooms', set()):
+                        leave_room(room)
+                    
+                    # Remove from ticket and user presence
+                    for ticket_id in client_info.get('ticket_rooms', set()):
+                        self.store.remove_member(f"ticket:{ticket_id}:clients", client_id)
+                    user_id = client_info.get('user_id')
+                    if user_id:
+                        self.store.remove_member(f"user:{user_id}:clients", client_id)
+                    self.store.delete(f"client:{client_id}")
                 
                 logger.info(f"Chat client disconnected: {client_id}")
             
@@ -117,25 +132,22 @@ class RealtimeChatService:
                     logger.error(f"Authentication failed: {e}")
                     return
                 
-                if client_id in self.connected_clients:
-                    self.connected_clients[client_id].update({
+                client_info = self.connected_clients.get(client_id)
+                if client_info is not None:
+                    client_info.update({
                         'user_id': user_id,
                         'is_admin': is_admin,
                         'authenticated_at': datetime.utcnow()
                     })
                     
-                    # Add to user room
-                    if user_id:
-                        if user_id not in self.user_rooms:
-                            self.user_rooms[user_id] = set()
-                        self.user_rooms[user_id].add(client_id)
-                    
                     # Add to admin room if admin
                     if is_admin:
                         admin_room = 'admin_support'
                         join_room(admin_room)
-                        self.admin_rooms.add(admin_room)
-                        self.connected_clients[client_id]['rooms'].add(admin_room)
+                        client_info['rooms'].add(admin_room)
+                    
+                    # Publish presence (adds the client to its user's set)
+                    self._publish_presence(client_id, client_info)
                     
                     emit('chat_authenticated', {
                         'user_id': user_id,
@@ -175,15 +187,12 @@ class RealtimeChatService:
                 room_name = f'ticket_{ticket_id}'
                 join_room(room_name)
                 
-                with self._lock:
-                    if ticket_id not in self.ticket_rooms:
-                        self.ticket_rooms[ticket_id] = set()
-                    self.ticket_rooms[ticket_id].add(client_id)
-                    
-                    self.connected_clients[client_id]['ticket_rooms'].add(ticket_id)
-                    self.connected_clients[client_id]['rooms'].add(room_name)
-                    
-                    participants_count = len(self.ticket_rooms[ticket_id])
+                client_info = self.connected_clients.get(client_id)
+                if client_info is not None:
+                    client_info['ticket_rooms'].add(ticket_id)
+                    client_info['rooms'].add(room_name)
+                self.store.add_member(f"ticket:{ticket_id}:clients", client_id, self.presence_ttl)
+                participants_count = len(self.store.members(f"ticket:{ticket_id}:clients"))
                 
                 emit('ticket_chat_joined', {
                     'ticket_id': ticket_id,
@@ -199,18 +208,18 @@ class RealtimeChatService:
                 client_id = request.sid
                 ticket_id = data.get('ticket_id')
                 
-                if ticket_id and client_id in self.connected_clients:
+                client_info = self.connected_clients.get(client_id)
+                if ticket_id and client_info is not None:
                     room_name = f'ticket_{ticket_id}'
                     leave_room(room_name)
                     
-                    with self._lock:
-                        if ticket_id in self.ticket_rooms:
-                            self.ticket_rooms[ticket_id].discard(client_id)
-                            if not self.ticket_rooms[ticket_id]:
-                                del self.ticket_rooms[ticket_id]
-                        
-                        self.connected_clients[client_id]['ticket_rooms'].discard(ticket_id)
-                        self.connected_clients[client_id]['rooms'].discard(room_name)
+                    try:
+                        ticket_id = int(ticket_id)
+                    except (ValueError, TypeError):
+                        pass
+                    client_info['ticket_rooms'].discard(ticket_id)
+                    client_info['rooms'].discard(room_name)
+                    self.store.remove_member(f"ticket:{ticket_id}:clients", client_id)
                     
                     emit('ticket_chat_left', {
                         'ticket_id': ticket_id,
@@ -230,16 +239,14 @@ class RealtimeChatService:
                 if not ticket_id or not user_id:
                     return
                 
-                # Update typing status
-                with self._lock:
-                    if ticket_id not in self.typing_users:
-                        self.typing_users[ticket_id] = {}
-                    
-                    self.typing_users[ticket_id][user_id] = {
-                        'user_name': user_name,
-                        'started_at': datetime.utcnow(),
-                        'client_id': client_id
-                    }
+                # Update typing status; it expires on its own after typing_ttl
+                self.store.set_json(f"typing:{ticket_id}:{user_id}", {
+                    'user_id': user_id,
+                    'user_name': user_name,
+                    'started_at': datetime.utcnow().isoformat(),
+                    'client_id': client_id
+                }, self.typing_ttl)
+                self.store.add_member(f"ticket:{ticket_id}:typing", user_id, self.typing_ttl)
                 
                 # Broadcast to other users in the ticket
                 self.socketio.emit('user_typing', {
@@ -260,11 +267,8 @@ class RealtimeChatService:
                     return
                 
                 # Remove typing status
-                with self._lock:
-                    if ticket_id in self.typing_users and user_id in self.typing_users[ticket_id]:
-                        del self.typing_users[ticket_id][user_id]
-                        if not self.typing_users[ticket_id]:
-                            del self.typing_users[ticket_id]
+                self.store.remove_member(f"ticket:{ticket_id}:typing", user_id)
+                self.store.delete(f"typing:{ticket_id}:{user_id}")
                 
                 # Broadcast to other users in the ticket
                 self.socketio.emit('user_typing', {
@@ -285,9 +289,8 @@ class RealtimeChatService:
                     return
                 
                 # Update message status
-                with self._lock:
-                    for message_id in message_ids:
-                        self.message_status[message_id] = 'read'
+                for message_id in message_ids:
+                    self.store.set_json(f"message:{message_id}:status", 'read', self.message_status_ttl)
                 
                 # Broadcast read status to other users
                 self.socketio.emit('messages_read', {
@@ -343,8 +346,7 @@ class RealtimeChatService:
             # Add message status
             message_id = message_data.get('id')
             if message_id:
-                with self._lock:
-                    self.message_status[message_id] = 'sent'
+                self.store.set_json(f"message:{message_id}:status", 'sent', self.message_status_ttl)
             
             # Broadcast to all users in the ticket room
             self.socketio.emit('new_message', {
@@ -369,8 +371,7 @@ class RealtimeChatService:
         if not self.socketio:
             return
         
-        with self._lock:
-            self.message_status[message_id] = status
+        self.store.set_json(f"message:{message_id}:status", status, self.message_status_ttl)
         
         room_name = f'ticket_{ticket_id}'
         self.socketio.emit('message_status_update', {
@@ -400,59 +401,42 @@ class RealtimeChatService:
             'data': data
         }, room='admin_support')
     
+    def get_message_status(self, message_id: str) -> str:
+        """Get the last known delivery status of a message"""
+        return self.store.get_json(f"message:{message_id}:status")
+    
     def get_typing_users(self, ticket_id: int) -> List[Dict[str, Any]]:
         """Get current typing users for a ticket"""
-        with self._lock:
-            if ticket_id not in self.typing_users:
-                return []
-            
-            typing_list = []
-            current_time = datetime.utcnow()
-            
-            for user_id, typing_info in self.typing_users[ticket_id].items():
-                # Remove stale typing indicators (older than 10 seconds)
-                if (current_time - typing_info['started_at']).total_seconds() > 10:
-                    del self.typing_users[ticket_id][user_id]
-                    continue
-                
-                typing_list.append({
-                    'user_id': user_id,
-                    'user_name': typing_info['user_name'],
-                    'started_at': typing_info['started_at'].isoformat()
-                })
+        user_ids = self.store.members(f"ticket:{ticket_id}:typing")
+        if not user_ids:
+            return []
         
-        return typing_list
+        typing_infos = self.store.get_many_json([f"typing:{ticket_id}:{user_id}" for user_id in user_ids])
+        return [
+            {
+                'user_id': typing_info['user_id'],
+                'user_name': typing_info['user_name'],
+                'started_at': typing_info['started_at']
+            }
+            for typing_info in typing_infos if typing_info
+        ]
     
     def get_connected_users(self, ticket_id: int) -> List[Dict[str, Any]]:
-        """Get connected users for a ticket"""
-        with self._lock:
-            if ticket_id not in self.ticket_rooms:
-                return []
-            
-            connected_users = []
-            for client_id in self.ticket_rooms[ticket_id]:
-                if client_id in self.connected_clients:
-                    client_info = self.connected_clients[client_id]
-                    connected_users.append({
-                        'user_id': client_info.get('user_id'),
-                        'is_admin': client_info.get('is_admin', False),
-                        'connected_at': client_info.get('connected_at').isoformat() if client_info.get('connected_at') else None
-                    })
+        """Get connected users for a ticket, across all workers"""
+        client_ids = self.store.members(f"ticket:{ticket_id}:clients")
+        if not client_ids:
+            return []
         
-        return connected_users
+        return [
+            presence for presence in self.store.get_many_json([f"client:{client_id}" for client_id in client_ids])
+            if presence
+        ]
     
     def cleanup_stale_connections(self):
-        """Clean up stale connections and typing indicators"""
-        current_time = datetime.utcnow()
-        
-        with self._lock:
-            # Clean up stale typing indicators
-            for ticket_id in list(self.typing_users.keys()):
-                for user_id in list(self.typing_users[ticket_id].keys()):
-                    if (current_time - self.typing_users[ticket_id][user_id]['started_at']).total_seconds() > 30:
-                        del self.typing_users[ticket_id][user_id]
-                if not self.typing_users[ticket_id]:
-                    del self.typing_users[ticket_id]
+        """Refresh presence for this worker's clients and drop expired entries"""
+        for client_id, client_info in list(self.connected_clients.items()):
+            self._publish_presence(client_id, client_info)
+        self.store.purge_expired()
     
     def _start_periodic_cleanup(self, interval: int = 30):
         """Start periodic cleanup with threading timer"""
@@ -460,12 +444,13 @@ class RealtimeChatService:
             try:
                 self.cleanup_stale_connections()
                 logger.debug("Performed periodic cleanup of stale connections")
-                # Schedule next cleanup
+            except Exception as e:
+                logger.error(f"Error in periodic cleanup task: {e}")
+            # Schedule next cleanup even after a failure so presence keeps being refreshed
+            if self._cleanup_timer is not None:
                 self._cleanup_timer = threading.Timer(interval, cleanup_task)
                 self._cleanup_timer.daemon = True
                 self._cleanup_timer.start()
-            except Exception as e:
-                logger.error(f"Error in periodic cleanup task: {e}")
         
         # Start first cleanup
         self._cleanup_timer = threading.Timer(interval, cleanup_task)
@@ -489,22 +474,22 @@ realtime_chat_service = RealtimeChatService(None)
 
 
 def initialize_realtime_chat_service(socketio=None):
-    """Initialize the global real-time chat service"""
-    global realtime_chat_service
+    """
+    Attach SocketIO to the global real-time chat service.
+    The existing instance is updated in place so modules that imported it
+    before app start-up broadcast through the same service.
+    """
     try:
         logger.info(f"Initializing chat service with SocketIO: {socketio is not None} (type: {type(socketio).__name__ if socketio else 'None'})")
         
         if socketio is None:
             logger.warning("No SocketIO instance provided to realtime chat service")
-            # Still create a service but with no SocketIO for graceful degradation
-            realtime_chat_service = RealtimeChatService(None)
-            return
-        
-        # Stop existing service if running
-        if hasattr(realtime_chat_service, 'stop'):
+            # Keep the service without SocketIO for graceful degradation
             realtime_chat_service.stop()
+            realtime_chat_service.socketio = None
+            return
         
-        realtime_chat_service = RealtimeChatService(socketio)
+        realtime_chat_service.init_socketio(socketio)
         logger.info("Real-time chat service initialized successfully with SocketIO")
         
         # Verify the assignment worked
@@ -515,6 +500,5 @@ def initialize_realtime_chat_service(socketio=None):
             
     except Exception as e:
         logger.error(f"Failed to initialize real-time chat service: {e}")
-        # Create a dummy service for graceful degradation
-        realtime_chat_service = RealtimeChatService(None)
-
+        # Degrade gracefully to a service without real-time features
+        realtime_chat_service.socketio = None
@@ -1,36 +1,194 @@
 """
 Real-time service for broadcasting updates to users
+
+Updates are fanned out on write into a per-user inbox. Every update gets a
+monotonically increasing sequence number, and clients poll with the last
+sequence they saw, so a poll only touches items newer than its cursor.
+The inbox lives in Redis streams when available so every worker answers
+the same way, with an in-process fallback for development.
 """
 
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+from collections import deque
 from datetime import datetime
+import os
+import threading
+import time
 import json
+import logging
+
+# Try to import Redis, but don't fail if not available
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class _LocalUpdateStore:
+    """In-process inbox store (single worker only)"""
+
+    shared = False
+
+    def __init__(self, inbox_size: int):
+        self.inbox_size = inbox_size
+        self._sequence = 0
+        self._subscribers = {}  # plan_id -> set of user_ids
+        self._inboxes = {}  # user_id -> deque of (seq, update)
+        self._condition = threading.Condition()
+
+    def subscribe(self, user_id: str, plan_id: str) -> None:
+        with self._condition:
+            self._subscribers.setdefault(plan_id, set()).add(user_id)
+
+    def unsubscribe(self, user_id: str, plan_id: str) -> None:
+        with self._condition:
+            if plan_id in self._subscribers:
+                self._subscribers[plan_id].discard(user_id)
+                if not self._subscribers[plan_id]:
+                    del self._subscribers[plan_id]
+
+    def subscribers(self, plan_id: str) -> List[str]:
+        with self._condition:
+            return list(self._subscribers.get(plan_id, ()))
+
+    def append(self, plan_id: str, update: Dict[str, Any]) -> Optional[int]:
+        with self._condition:
+            user_ids = self._subscribers.get(plan_id)
+            if not user_ids:
+                return None
+            self._sequence += 1
+            entry = (self._sequence, dict(update, seq=self._sequence))
+            for user_id in user_ids:
+                inbox = self._inboxes.get(user_id)
+                if inbox is None:
+                    inbox = self._inboxes[user_id] = deque(maxlen=self.inbox_size)
+                inbox.append(entry)
+            self._condition.notify_all()
+            return self._sequence
+
+    def _read(self, user_id: str, cursor: int, limit: int) -> List[Dict[str, Any]]:
+        inbox = self._inboxes.get(user_id)
+        if not inbox or inbox[-1][0] <= cursor:
+            return []
+        # Walk back from the newest entry; cost is proportional to new items
+        newer = []
+        for seq, update in reversed(inbox):
+            if seq <= cursor:
+                break
+            newer.append(update)
+        newer.reverse()
+        return newer[:limit]
+
+    def read(self, user_id: str, cursor: int, limit: int, wait: float) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + wait
+        with self._condition:
+            updates = self._read(user_id, cursor, limit)
+            while not updates and wait > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+                updates = self._read(user_id, cursor, limit)
+            return updates
+
+
+class _RedisUpdateStore:
+    """Redis streams inbox store shared by every worker"""
+
+    shared = True
+
+    # Allocate the sequence and fan out atomically so every inbox stays ordered
+    _APPEND_SCRIPT = """
+local members = redis.call('SMEMBERS', KEYS[2])
+if #members == 0 then return 0 end
+local seq = redis.call('INCR', KEYS[1])
+local payload = string.gsub(ARGV[1], '__SEQ__', seq)
+for _, user_id in ipairs(members) do
+    local inbox = ARGV[2] .. user_id
+    redis.call('XADD', inbox, 'MAXLEN', '~', ARGV[3], seq .. '-0', 'update', payload)
+    redis.call('EXPIRE', inbox, ARGV[4])
+end
+return seq
+"""
+
+    def __init__(self, client, inbox_size: int, inbox_ttl: int):
+        self.client = client
+        self.inbox_size = inbox_size
+        self.inbox_ttl = inbox_ttl
+        self._append = client.register_script(self._APPEND_SCRIPT)
+
+    def _plan_key(self, plan_id: str) -> str:
+        return f"realtime:plan:{plan_id}:subscribers"
+
+    def subscribe(self, user_id: str, plan_id: str) -> None:
+        self.client.sadd(self._plan_key(plan_id), user_id)
+
+    def unsubscribe(self, user_id: str, plan_id: str) -> None:
+        self.client.srem(self._plan_key(plan_id), user_id)
+
+    def subscribers(self, plan_id: str) -> List[str]:
+        return list(self.client.smembers(self._plan_key(plan_id)))
+
+    def append(self, plan_id: str, update: Dict[str, Any]) -> Optional[int]:
+        payload = json.dumps(dict(update, seq='__SEQ__')).replace('"__SEQ__"', '__SEQ__')
+        seq = self._append(
+            keys=['realtime:sequence', self._plan_key(plan_id)],
+            args=[payload, 'realtime:inbox:', self.inbox_size, self.inbox_ttl]
+        )
+        return int(seq) or None
+
+    def read(self, user_id: str, cursor: int, limit: int, wait: float) -> List[Dict[str, Any]]:
+        inbox = f"realtime:inbox:{user_id}"
+        if wait > 0:
+            # XREAD returns entries strictly newer than the given id
+            response = self.client.xread({inbox: f"{cursor}-0"}, count=limit, block=int(wait * 1000))
+            entries = response[0][1] if response else []
+        else:
+            entries = self.client.xrange(inbox, min=f"{cursor}-1", max='+', count=limit)
+        return [json.loads(fields['update']) for _, fields in entries]
+
 
 class RealtimeService:
     """Service for managing real-time updates"""
-    
+
     def __init__(self):
-        self.subscribers = {}  # plan_id -> list of user_ids
-        self.update_queue = []  # Queue of updates to broadcast
-    
+        self.inbox_size = 100  # Updates retained per user
+        self.inbox_ttl = 86400  # Idle inboxes expire after a day
+        self.max_wait = 25.0  # Long-poll ceiling in seconds
+        self.store = self._initialize_store()
+
+    def _initialize_store(self):
+        """Use Redis streams when reachable, otherwise an in-process inbox"""
+        if REDIS_AVAILABLE:
+            try:
+                try:
+                    from flask import current_app
+                    redis_url = current_app.config.get('REDIS_URL', 'redis://localhost:6379/0')
+                except RuntimeError:
+                    # Built at import, before any app context: read the same setting config does
+                    redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+                client = redis.from_url(redis_url, decode_responses=True, socket_connect_timeout=2,
+                                        socket_timeout=self.max_wait + 5)
+                client.ping()
+                logger.info("Realtime update inbox shared via Redis streams")
+                return _RedisUpdateStore(client, self.inbox_size, self.inbox_ttl)
+            except Exception as e:
+                logger.warning(f"Redis unavailable for realtime updates, using in-process inbox: {e}")
+        return _LocalUpdateStore(self.inbox_size)
+
     def subscribe_user_to_plan(self, user_id: int, plan_id: int):
         """Subscribe a user to receive updates for a specific plan"""
-        if plan_id not in self.subscribers:
-            self.subscribers[plan_id] = set()
-        self.subscribers[plan_id].add(user_id)
-    
+        self.store.subscribe(str(user_id), str(plan_id))
+
     def unsubscribe_user_from_plan(self, user_id: int, plan_id: int):
         """Unsubscribe a user from plan updates"""
-        if plan_id in self.subscribers:
-            self.subscribers[plan_id].discard(user_id)
-            if not self.subscribers[plan_id]:
-                del self.subscribers[plan_id]
-    
-    def broadcast_plan_update(self, plan_id: int, update_type: str, data: Dict[str, Any]):
-        """Broadcast an update to all users subscribed to a plan"""
-        if plan_id not in self.subscribers:
-            return
-        
+        self.store.unsubscribe(str(user_id), str(plan_id))
+
+    def broadcast_plan_update(self, plan_id: int, update_type: str, data: Dict[str, Any]) -> Optional[int]:
+        """Append an update to the inbox of every user subscribed to a plan; returns its sequence"""
         update = {
             'type': 'plan_update',
             'plan_id': plan_id,
@@ -38,33 +196,33 @@ class RealtimeService:
             'data': data,
             'timestamp': datetime.utcnow().isoformat()
         }
-        
-        # Add to queue for polling
-        self.update_queue.append({
-            'plan_id': plan_id,
-            'user_ids': list(self.subscribers[plan_id]),
-            'update': update
-        })
-        
-        # Keep only last 100 updates to prevent memory issues
-        if len(self.update_queue) > 100:
-            self.update_queue = self.update_queue[-100:]
-    
-    def get_updates_for_user(self, user_id: int, since: datetime = None):
-        """Get all updates for a specific user since a given time"""
-        updates = []
-        
-        for update_item in self.update_queue:
-            if user_id in update_item['user_ids']:
-                if since is None or datetime.fromisoformat(update_item['update']['timestamp']) > since:
-                    updates.append(update_item['update'])
-        
-        return updates
-    
+
+        try:
+            return self.store.append(str(plan_id), update)
+        except Exception as e:
+            logger.error(f"Failed to broadcast update for plan {plan_id}: {e}")
+            return None
+
+    def get_updates_for_user(self, user_id: int, cursor: int = 0, limit: int = 100,
+                             wait: float = 0) -> Dict[str, Any]:
+        """
+        Get updates newer than `cursor` for a user.
+        With wait > 0 the call blocks (long-poll) until an update arrives or
+        the wait elapses. The returned cursor is passed back on the next poll.
+        """
+        wait = max(0.0, min(float(wait or 0), self.max_wait))
+        cursor = max(0, int(cursor or 0))
+        updates = self.store.read(str(user_id), cursor, limit, wait)
+
+        return {
+            'updates': updates,
+            'cursor': updates[-1]['seq'] if updates else cursor
+        }
+
     def get_plan_subscribers(self, plan_id: int) -> List[int]:
         """Get all user IDs subscribed to a plan"""
-        return list(self.subscribers.get(plan_id, []))
+        return [int(user_id) if user_id.isdigit() else user_id
+                for user_id in self.store.subscribers(str(plan_id))]
 
 # Global instance
 realtime_service = RealtimeService()
-
@@ -0,0 +1,152 @@
+"""
+Revenue Analytics Service
+Users and paid-order revenue per country for the analytics dashboard.
+
+Orders carry the customer's email, not a country, so revenue is attributed
+by joining orders to users on the unique email index. Completed days are
+served from country_revenue_daily, a rollup rebuilt with one grouped
+INSERT ... SELECT per refresh; today (and any range reaching it) is added
+live from orders paid since midnight UTC, found through the paid_at index.
+The user counts, rollup and live delta are combined in a single grouped
+statement.
+
+The rollup is brought up to yesterday on first use each day; the nightly
+scripts/refresh_revenue_rollup.py re-derives recent days so refunds and late
+status changes are picked up.
+"""
+
+import threading
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Date, and_, delete, func, insert, literal, select, union_all
+from sqlalchemy.exc import IntegrityError
+
+from .. import db
+from ..models.payment import Order
+from ..models.revenue_rollup import CountryRevenueDaily
+from ..models.user import User
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min)
+
+
+class RevenueAnalyticsService:
+    """Revenue-by-country from a daily rollup plus a live delta for today"""
+
+    def __init__(self):
+        self._current_through: Optional[date] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _has_country():
+        users = User.__table__
+        return and_(users.c.country.isnot(None), users.c.country != '')
+
+    @staticmethod
+    def _paid_orders_by_country(*columns):
+        """SELECT over paid orders joined to their customers by email"""
+        orders, users = Order.__table__, User.__table__
+        return (
+            select(*columns)
+            .select_from(orders.join(users, users.c.email == orders.c.customer_email))
+            .where(orders.c.status == 'paid', orders.c.payment_status == 'paid', RevenueAnalyticsService._has_country())
+        )
+
+    def refresh_rollup(self, start_day: date, end_day: date) -> int:
+        """Rebuild the rollup rows for start_day..end_day inclusive; returns the rows written"""
+        if start_day > end_day:
+            return 0
+        orders, users, rollup = Order.__table__, User.__table__, CountryRevenueDaily.__table__
+        day = func.date(orders.c.paid_at, type_=Date)
+        source = self._paid_orders_by_country(
+            day, users.c.country, func.sum(orders.c.total_amount), func.count(orders.c.id), literal(datetime.utcnow())
+        ).where(
+            orders.c.paid_at >= _day_start(start_day), orders.c.paid_at < _day_start(end_day + timedelta(days=1))
+        ).group_by(day, users.c.country)
+
+        try:
+            db.session.execute(delete(rollup).where(rollup.c.day >= start_day, rollup.c.day <= end_day))
+            result = db.session.execute(
+                insert(rollup).from_select(['day', 'country', 'revenue', 'orders', 'refreshed_at'], source)
+            )
+            db.session.commit()
+        except IntegrityError:
+            # Another worker rebuilt the same days first
+            db.session.rollback()
+            logger.info(f"Revenue rollup for {start_day}..{end_day} was refreshed concurrently")
+            return 0
+        logger.info(f"Refreshed revenue rollup for {start_day}..{end_day}: {result.rowcount} rows")
+        return result.rowcount
+
+    def ensure_rollup_current(self) -> Optional[date]:
+        """Roll up every completed day not yet in the rollup; returns the last day covered"""
+        yesterday = datetime.utcnow().date() - timedelta(days=1)
+        if self._current_through == yesterday:
+            return yesterday
+        with self._lock:
+            if self._current_through == yesterday:
+                return yesterday
+            rollup, orders = CountryRevenueDaily.__table__, Order.__table__
+            last_day = db.session.execute(select(func.max(rollup.c.day))).scalar()
+            if last_day is not None:
+                start = last_day + timedelta(days=1)
+            else:
+                first_paid = db.session.execute(select(func.min(orders.c.paid_at))).scalar()
+                start = first_paid.date() if first_paid else None
+            if start is not None and start <= yesterday:
+                self.refresh_rollup(start, yesterday)
+            self._current_through = yesterday
+        return yesterday
+
+    def revenue_by_country(self, start: date = None, end: date = None) -> List[Dict]:
+        """
+        Users (current) and paid revenue (within start..end, inclusive, UTC days) per country,
+        sorted by user count. Without a range, revenue is all-time.
+        """
+        today = datetime.utcnow().date()
+        rollup_end = min(end, today - timedelta(days=1)) if end else today - timedelta(days=1)
+        orders, users, rollup = Order.__table__, User.__table__, CountryRevenueDaily.__table__
+
+        parts = [
+            select(users.c.country.label('country'), func.count(users.c.id).label('users'),
+                   literal(0.0).label('revenue'), literal(0).label('orders'))
+            .where(self._has_country()).group_by(users.c.country)
+        ]
+        if start is None or start <= rollup_end:
+            self.ensure_rollup_current()
+            historical = select(rollup.c.country, literal(0), func.sum(rollup.c.revenue), func.sum(rollup.c.orders)) \
+                .where(rollup.c.day <= rollup_end)
+            if start is not None:
+                historical = historical.where(rollup.c.day >= start)
+            parts.append(historical.group_by(rollup.c.country))
+        if end is None or end >= today:
+            live_from = _day_start(max(today, start) if start else today)
+            parts.append(
+                self._paid_orders_by_country(users.c.country, literal(0), func.sum(orders.c.total_amount),
+                                             func.count(orders.c.id))
+                .where(orders.c.paid_at >= live_from).group_by(users.c.country)
+            )
+
+        combined = union_all(*parts).subquery()
+        rows = db.session.execute(
+            select(combined.c.country, func.sum(combined.c.users), func.sum(combined.c.revenue),
+                   func.sum(combined.c.orders))
+            .group_by(combined.c.country)
+        ).all()
+
+        countries = [
+            {'country': country, 'users': int(user_count or 0), 'revenue': float(revenue or 0),
+             'orders': int(order_count or 0)}
+            for country, user_count, revenue, order_count in rows
+        ]
+        countries.sort(key=lambda row: (row['users'], row['revenue']), reverse=True)
+        return countries
+
+
+# Global instance
+revenue_analytics_service = RevenueAnalyticsService()
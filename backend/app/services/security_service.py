@@ -255,16 +255,14 @@ class SecurityService:
         return bool(has_upper and has_lower and has_digit and has_special)
     
     def hash_password(self, password: str) -> str:
-        """Hash password using bcrypt"""
-        from flask_bcrypt import Bcrypt
-        bcrypt = Bcrypt()
-        return bcrypt.generate_password_hash(password).decode('utf-8')
+        """Hash password with the configured PASSWORD_HASH_METHOD"""
+        from ..utils.passwords import hash_password
+        return hash_password(password)
     
     def verify_password(self, password: str, hashed: str) -> bool:
-        """Verify password against hash"""
-        from flask_bcrypt import Bcrypt
-        bcrypt = Bcrypt()
-        return bcrypt.check_password_hash(hashed, password)
+        """Verify password against a werkzeug or bcrypt hash"""
+        from ..utils.passwords import check_password
+        return check_password(hashed, password)
     
     def generate_secure_token(self, length: int = 32) -> str:
         """Generate secure random token"""
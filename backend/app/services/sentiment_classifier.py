@@ -0,0 +1,210 @@
+"""
+Sentiment Classifier
+In-process sentiment and urgency tagging for support messages.
+
+A weighted lexicon of unigrams and short phrases (up to three words) is
+compiled once into dict lookups at import. Scoring a message is one regex
+tokenization pass plus n-gram lookups, with negation and intensifier
+handling and shouting/exclamation signals, so it runs in well under a
+millisecond and needs no model files or network access. The result has the
+same shape as the remote model's: sentiment, confidence, urgency, keywords.
+"""
+
+import math
+import re
+from typing import Dict, Iterable, List
+
+# Valence of words and phrases; negative values are complaints
+VALENCE = {
+    'thanks': 1.5, 'thank you': 2.0, 'appreciate': 2.0, 'great': 2.0, 'awesome': 2.5, 'excellent': 2.5,
+    'perfect': 2.0, 'love': 2.5, 'amazing': 2.5, 'fantastic': 2.5, 'helpful': 1.5, 'happy': 1.5,
+    'good': 1.0, 'nice': 1.0, 'works': 1.0, 'working now': 2.0, 'resolved': 1.5, 'fixed': 1.5,
+    'quick': 1.0, 'glad': 1.5, 'pleased': 1.5, 'well done': 2.0, 'solved': 1.5, 'satisfied': 1.5,
+    'broken': -2.0, 'error': -1.0, 'errors': -1.0, 'fail': -1.5, 'fails': -1.5, 'failed': -1.5,
+    'failing': -1.5, 'failure': -1.5, 'issue': -0.5, 'problem': -1.0, 'bug': -1.0, 'wrong': -1.5,
+    'bad': -1.5, 'slow': -1.0, 'crash': -2.0, 'crashes': -2.0, 'crashed': -2.0, 'unable': -1.0,
+    'missing': -1.0, 'lost': -1.5, 'disappointed': -2.0, 'disappointing': -2.0, 'poor': -1.5,
+    'terrible': -2.5, 'horrible': -2.5, 'awful': -2.5, 'useless': -2.5, 'worst': -3.0, 'hate': -3.0,
+    'not working': -2.0, 'stopped working': -2.0, 'does not work': -2.0, "doesn't work": -2.0,
+    'never works': -2.5, 'charged twice': -2.5, 'double charged': -2.5, 'no response': -2.0,
+    'unacceptable': -3.0, 'ridiculous': -3.0, 'scam': -3.0, 'rip off': -3.0, 'waste': -2.0,
+    'annoying': -2.0, 'annoyed': -2.0, 'frustrated': -2.5, 'frustrating': -2.5, 'angry': -3.0,
+    'furious': -3.5, 'pathetic': -3.0, 'incompetent': -3.0, 'disgusted': -3.0, 'outrageous': -3.0,
+    'confusing': -1.0, 'confused': -1.0, 'stuck': -1.5, 'locked out': -2.0, 'cannot access': -2.0,
+    'outage': -2.0, 'is down': -2.0, 'site down': -2.0, 'production down': -2.0, 'data loss': -2.5,
+}
+
+# Markers that separate anger and frustration from plain negativity
+ANGER = {
+    'angry': 2.0, 'furious': 2.5, 'unacceptable': 2.0, 'ridiculous': 2.0, 'scam': 2.5, 'rip off': 2.5,
+    'worst': 1.5, 'hate': 1.5, 'pathetic': 2.0, 'incompetent': 2.0, 'disgusted': 2.0, 'outrageous': 2.0,
+    'lawyer': 2.5, 'sue': 2.0, 'chargeback': 2.0, 'report you': 2.0, 'cancel my': 1.0, 'wtf': 2.0,
+    'useless': 1.0, 'joke': 1.0, 'liars': 2.5, 'stealing': 2.5,
+}
+FRUSTRATION = {
+    'frustrated': 2.0, 'frustrating': 2.0, 'annoying': 1.5, 'annoyed': 1.5, 'still': 0.75, 'again': 0.75,
+    'yet again': 1.5, 'third time': 2.0, 'multiple times': 1.5, 'several times': 1.5, 'how many times': 2.0,
+    'keep getting': 1.5, 'keeps happening': 1.5, 'no response': 1.5, 'waiting for': 1.0, 'still waiting': 2.0,
+    'no one': 1.0, 'nobody': 1.0, 'tired of': 2.0, 'fed up': 2.0, 'days': 0.5, 'weeks': 1.0,
+    'no reply': 1.5, 'ignored': 1.5,
+}
+
+# Urgency signals by level; the highest level found wins
+URGENCY = {
+    'critical': (
+        'urgent', 'urgently', 'asap', 'emergency', 'immediately', 'right now', 'outage', 'data loss',
+        'lost all', 'hacked', 'security breach', 'unauthorized', 'fraud', 'charged twice', 'double charged',
+        'locked out', 'cannot access', 'production down', 'site down', 'is down', 'all my data',
+    ),
+    'high': (
+        'today', 'deadline', 'blocked', 'blocking', "can't login", 'cannot login', "can't log in",
+        'cannot log in', 'not working', 'stopped working', 'refund', 'charged', 'payment failed',
+        'as soon as possible', 'critical', 'crash', 'crashes', 'crashed', 'lost',
+    ),
+    'medium': (
+        'issue', 'problem', 'error', 'bug', 'broken', 'failed', 'fails', 'failing', 'wrong', 'help', 'soon',
+    ),
+}
+URGENCY_LEVELS = ('low', 'medium', 'high', 'critical')
+
+NEGATORS = frozenset((
+    'not', 'no', 'never', "don't", "doesn't", "didn't", "isn't", "wasn't", "aren't", "won't",
+    "can't", 'cannot', 'dont', 'doesnt', 'didnt', 'isnt', 'wasnt', 'cant', 'wont', 'without',
+))
+INTENSIFIERS = {'very': 1.5, 'really': 1.4, 'extremely': 1.8, 'so': 1.3, 'totally': 1.5, 'absolutely': 1.6,
+                'completely': 1.5, 'super': 1.4, 'incredibly': 1.7}
+NEGATION_SCOPE = 3
+
+# Punctuation is kept as clause breaks: phrases never span it and negation stops at it
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?|[!?.,;:]")
+CLAUSE_BREAKS = frozenset(('!', '?', '.', ',', ';', ':', 'but', 'however', 'although'))
+
+
+class SentimentClassifier:
+    """Lexicon classifier compiled once; classify() and classify_many() share its tables"""
+
+    def __init__(self, valence: Dict[str, float] = VALENCE, anger: Dict[str, float] = ANGER,
+                 frustration: Dict[str, float] = FRUSTRATION, urgency: Dict[str, Iterable[str]] = URGENCY):
+        # Every term maps to (valence, anger, frustration, urgency rank) so a
+        # single dict lookup per n-gram collects all of its signals
+        terms: Dict[tuple, list] = {}
+
+        def entry(term):
+            return terms.setdefault(tuple(term.split()), [0.0, 0.0, 0.0, 0])
+
+        for term, weight in valence.items():
+            entry(term)[0] = weight
+        for term, weight in anger.items():
+            entry(term)[1] = weight
+        for term, weight in frustration.items():
+            entry(term)[2] = weight
+        for level, phrases in urgency.items():
+            rank = URGENCY_LEVELS.index(level)
+            for term in phrases:
+                signal = entry(term)
+                signal[3] = max(signal[3], rank)
+        self.terms = {key: tuple(value) for key, value in terms.items()}
+        self.max_words = max(len(key) for key in self.terms)
+
+    def classify(self, message: str) -> Dict:
+        """Sentiment, confidence, urgency and matched keywords for one message"""
+        text = message or ''
+        tokens = TOKEN_PATTERN.findall(text)
+        words = [token.lower() for token in tokens]
+        terms = self.terms
+        max_words = self.max_words
+
+        valence = anger = frustration = 0.0
+        positive = negative = 0.0
+        urgency = 0
+        keywords = []
+        negated_until = -1
+        boost = 1.0
+        index = 0
+        count = len(words)
+        while index < count:
+            word = words[index]
+            if word in NEGATORS:
+                negated_until = index + NEGATION_SCOPE
+            elif word in CLAUSE_BREAKS:
+                negated_until = -1
+            # Longest phrase first, so 'not working' wins over the negator 'not'
+            match = None
+            for size in range(min(max_words, count - index), 0, -1):
+                signal = terms.get(tuple(words[index:index + size]))
+                if signal is not None:
+                    match = (size, signal)
+                    break
+            if match is None:
+                if word in INTENSIFIERS:
+                    boost = INTENSIFIERS[word]
+                else:
+                    boost = 1.0 if word not in NEGATORS else boost
+                index += 1
+                continue
+
+            size, (weight, anger_weight, frustration_weight, rank) = match
+            phrase = ' '.join(words[index:index + size])
+            if weight:
+                # A phrase that starts with the negator carries its own polarity
+                negated = index <= negated_until and words[index] not in NEGATORS
+                weight *= boost * (-0.5 if negated else 1.0)
+                valence += weight
+                if weight > 0:
+                    positive += weight
+                else:
+                    negative -= weight
+            anger += anger_weight * boost
+            frustration += frustration_weight * boost
+            urgency = max(urgency, rank)
+            keywords.append(phrase)
+            boost = 1.0
+            index += size
+
+        # Shouting and exclamation marks amplify whatever negativity is there
+        exclamations = words.count('!')
+        shouted = sum(1 for token in tokens if len(token) > 2 and token.isupper())
+        if negative > positive:
+            anger += 0.5 * min(exclamations, 4) + 0.75 * min(shouted, 4)
+        if exclamations >= 3 and urgency < 2 and negative:
+            urgency += 1
+
+        sentiment, score = self._label(valence, anger, frustration)
+        confidence = self._confidence(score, positive, negative, count, bool(keywords))
+        return {
+            'sentiment': sentiment,
+            'confidence': confidence,
+            'urgency': URGENCY_LEVELS[urgency],
+            'keywords': list(dict.fromkeys(keywords))[:10],
+        }
+
+    def classify_many(self, messages: List[str]) -> List[Dict]:
+        """Classify a batch of messages"""
+        classify = self.classify
+        return [classify(message) for message in messages]
+
+    @staticmethod
+    def _label(valence: float, anger: float, frustration: float):
+        if anger >= 2.0 and anger >= frustration and valence < 0:
+            return 'angry', anger + abs(valence) / 2
+        if frustration >= 1.5 and valence <= 0:
+            return 'frustrated', frustration + abs(valence) / 2
+        if valence <= -1.0:
+            return 'negative', -valence
+        if valence >= 1.0:
+            return 'positive', valence
+        return 'neutral', 1.0 - abs(valence)
+
+    @staticmethod
+    def _confidence(score: float, positive: float, negative: float, length: int, matched: bool) -> float:
+        if not matched:
+            # Nothing recognised: fairly sure a short message is neutral, much less so a long one
+            return 0.7 if length <= 15 else 0.45
+        # Stronger evidence raises confidence; mixed polarity lowers it
+        mixed = min(positive, negative) / max(positive, negative) if positive and negative else 0.0
+        confidence = 0.5 + 0.45 * math.tanh(score / 3.0) - 0.25 * mixed
+        return round(min(max(confidence, 0.3), 0.95), 2)
+
+
+# Global instance
+sentiment_classifier = SentimentClassifier()
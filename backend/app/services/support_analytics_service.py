@@ -0,0 +1,133 @@
+"""
+Support Analytics Service
+Aggregate queries behind the support dashboards. Ticket counts, SLA-overdue
+counts (from the persisted sla_due_at deadline) and per-agent rating
+statistics are each computed by a single grouped query with conditional
+aggregates, and results are cached for a short time.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import and_, func
+
+from .. import db
+from ..models.rbac import AdminUser
+from ..models.support import SupportTicket, TicketPriority, TicketStatus
+from ..utils.logger import get_logger
+from ..utils.shared_store import SharedTTLStore
+from ..utils.sql_aggregates import count_if, sum_if
+
+logger = get_logger(__name__)
+
+
+def overdue_condition(now: datetime = None):
+    """SQL expression for SupportTicket.is_overdue; served by the partial sla_due_at index"""
+    return SupportTicket.sla_due_at < (now or datetime.utcnow())
+
+
+class SupportAnalyticsService:
+    """Single-pass support statistics with a short-lived cache"""
+
+    def __init__(self, cache_ttl: int = 30):
+        self.cache_ttl = cache_ttl
+        self.store = SharedTTLStore('support_stats')
+
+    def get_ticket_stats(self, use_cache: bool = True) -> Dict[str, int]:
+        """Status, priority, overdue and unassigned counts in one query"""
+        if use_cache:
+            cached = self.store.get_json('tickets')
+            if cached is not None:
+                return cached
+
+        row = db.session.query(
+            func.count(SupportTicket.id).label('total_tickets'),
+            count_if(SupportTicket.status == TicketStatus.OPEN).label('open_tickets'),
+            count_if(SupportTicket.status == TicketStatus.IN_PROGRESS).label('in_progress_tickets'),
+            count_if(SupportTicket.status == TicketStatus.RESOLVED).label('resolved_tickets'),
+            count_if(SupportTicket.status == TicketStatus.CLOSED).label('closed_tickets'),
+            count_if(SupportTicket.priority == TicketPriority.URGENT).label('urgent_tickets'),
+            count_if(SupportTicket.priority == TicketPriority.HIGH).label('high_tickets'),
+            count_if(SupportTicket.priority == TicketPriority.MEDIUM).label('medium_tickets'),
+            count_if(SupportTicket.priority == TicketPriority.LOW).label('low_tickets'),
+            count_if(overdue_condition()).label('overdue_tickets'),
+            count_if(SupportTicket.assigned_to.is_(None)).label('unassigned_tickets')
+        ).one()
+
+        stats = {key: int(value or 0) for key, value in row._mapping.items()}
+        self.store.set_json('tickets', stats, self.cache_ttl)
+        return stats
+
+    def get_agent_stats(self, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Per-agent ticket, completion and rating statistics in one GROUP BY"""
+        if use_cache:
+            cached = self.store.get_json('agents')
+            if cached is not None:
+                return cached
+
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        rated = SupportTicket.user_rating.isnot(None)
+        recent = and_(rated, SupportTicket.rated_at >= thirty_days_ago)
+
+        rows = db.session.query(
+            AdminUser.id,
+            AdminUser.username,
+            AdminUser.first_name,
+            AdminUser.last_name,
+            AdminUser.email,
+            func.count(SupportTicket.id).label('total_tickets'),
+            count_if(SupportTicket.status == TicketStatus.CLOSED).label('closed_tickets'),
+            count_if(SupportTicket.status == TicketStatus.RESOLVED).label('resolved_tickets'),
+            count_if(rated).label('rated_tickets'),
+            func.coalesce(func.sum(SupportTicket.user_rating), 0).label('total_rating_points'),
+            count_if(recent).label('recent_rated_tickets'),
+            sum_if(recent, SupportTicket.user_rating).label('recent_rating_points'),
+            *[count_if(SupportTicket.user_rating == stars).label(f'rated_{stars}') for stars in range(1, 6)]
+        ).join(
+            SupportTicket, SupportTicket.assigned_to == AdminUser.id
+        ).group_by(
+            AdminUser.id, AdminUser.username, AdminUser.first_name, AdminUser.last_name, AdminUser.email
+        ).all()
+
+        agents = []
+        for row in rows:
+            total = int(row.total_tickets)
+            rated_count = int(row.rated_tickets)
+            points = int(row.total_rating_points)
+            recent_count = int(row.recent_rated_tickets)
+            closed = int(row.closed_tickets)
+            resolved = int(row.resolved_tickets)
+            avg_rating = round(points / rated_count, 2) if rated_count else 0
+            full_name = f"{row.first_name} {row.last_name}" if row.first_name and row.last_name else row.username
+
+            agents.append({
+                'id': row.id,
+                'username': row.username,
+                'full_name': full_name,
+                'email': row.email,
+                'total_tickets': total,
+                'closed_tickets': closed,
+                'resolved_tickets': resolved,
+                'rated_tickets': rated_count,
+                'total_rating_points': points,
+                'average_rating': avg_rating,
+                'recent_average_rating': round(int(row.recent_rating_points) / recent_count, 2) if recent_count else 0,
+                'completion_rate': round((closed + resolved) / total * 100, 1) if total else 0,
+                'rating_breakdown': {
+                    f'{stars}_star': int(getattr(row, f'rated_{stars}')) for stars in range(5, 0, -1)
+                },
+                'excellence_score': round((avg_rating / 5) * 100, 1) if avg_rating > 0 else 0
+            })
+
+        # Best performers first
+        agents.sort(key=lambda agent: agent['total_rating_points'], reverse=True)
+        self.store.set_json('agents', agents, self.cache_ttl)
+        return agents
+
+    def invalidate(self) -> None:
+        """Drop cached statistics (e.g. after bulk ticket changes)"""
+        self.store.delete('tickets', 'agents')
+
+
+# Global instance
+support_analytics_service = SupportAnalyticsService()
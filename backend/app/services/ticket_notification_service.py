@@ -11,18 +11,20 @@ import requests
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from sqlalchemy import and_, or_, desc, func, text
+from sqlalchemy import and_, desc, func, text
 from sqlalchemy.orm import joinedload
 
 from app import db, mail
 from app.models.communication import (
     Notification, NotificationTemplate, NotificationType, NotificationPriority, 
-    NotificationStatus, CommunicationPreference
+    NotificationStatus
 )
 from app.models.support import SupportTicket, SupportMessage, TicketStatus, TicketPriority
 from app.models.user import User
-from app.models.rbac import AdminUser
+from app.models.rbac import AdminUser, AdminRole, UserRoleAssignment
 from app.services.audit_service import AuditService
+from app.services.communication_service import notification_fanout
+from app.services.notification_counters import notification_counters
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -33,8 +35,7 @@ class TicketNotificationService:
     
     def __init__(self):
         self.audit_service = AuditService()
-        self.delivery_queue = []
-        self.is_processing = False
+        self.support_roles = ('support_agent', 'support_team', 'admin')
         self.notification_templates = self._load_notification_templates()
     
     def _load_notification_templates(self):
@@ -407,156 +408,50 @@ class TicketNotificationService:
     def _send_notifications(self, user_id, notification_type, notification_data, priority=NotificationPriority.NORMAL):
         """Send notifications through all enabled channels"""
         try:
-            # Get user communication preferences
-            preferences = CommunicationPreference.query.filter_by(user_id=user_id).first()
-            if not preferences:
-                # Create default preferences
-                preferences = CommunicationPreference(user_id=user_id)
-                db.session.add(preferences)
-                db.session.commit()
-            
-            template = self.notification_templates.get(notification_type, {})
-            
-            # Send email notification
-            if preferences.email_enabled:
-                self._send_email_notification(user_id, template.get('email', {}), notification_data, priority)
-            
-            # Send SMS notification
-            if preferences.sms_enabled:
-                self._send_sms_notification(user_id, template.get('sms', {}), notification_data, priority)
-            
-            # Send push notification
-            if preferences.push_enabled:
-                self._send_push_notification(user_id, template.get('push', {}), notification_data, priority)
-            
-            # Always send in-app notification
-            self._send_in_app_notification(user_id, notification_type, notification_data, priority)
-            
-        except Exception as e:
-            logger.error(f"Error sending notifications: {str(e)}")
-    
-    def _send_email_notification(self, user_id, template, data, priority):
-        """Send email notification"""
-        try:
-            user = User.query.get(user_id)
-            if not user or not user.email:
-                return False
-            
-            # Format template
-            subject = template.get('subject', '').format(**data)
-            body = template.get('body', '').format(**data)
-            
-            # Create notification record
-            notification = Notification(
-                user_id=user_id,
-                type=NotificationType.EMAIL,
-                priority=priority,
-                title=subject,
-                message=body,
-                status=NotificationStatus.PENDING
-            )
-            
-            db.session.add(notification)
-            db.session.commit()
-            
-            # Send email (placeholder - integrate with your email service)
-            logger.info(f"Email notification queued for user {user_id}: {subject}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error sending email notification: {str(e)}")
-            return False
-    
-    def _send_sms_notification(self, user_id, template, data, priority):
-        """Send SMS notification"""
-        try:
-            user = User.query.get(user_id)
-            if not user:
-                return False
-            
-            # Format template
-            body = template.get('body', '').format(**data)
-            
-            # Create notification record
-            notification = Notification(
-                user_id=user_id,
-                type=NotificationType.SMS,
-                priority=priority,
-                title="SMS Notification",
-                message=body,
-                status=NotificationStatus.PENDING
-            )
-            
-            db.session.add(notification)
-            db.session.commit()
-            
-            # Send SMS (placeholder - integrate with your SMS service)
-            logger.info(f"SMS notification queued for user {user_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error sending SMS notification: {str(e)}")
-            return False
-    
-    def _send_push_notification(self, user_id, template, data, priority):
-        """Send push notification"""
-        try:
-            user = User.query.get(user_id)
-            if not user:
-                return False
-            
-            # Format template
-            title = template.get('title', '').format(**data)
-            body = template.get('body', '').format(**data)
-            
-            # Create notification record
-            notification = Notification(
-                user_id=user_id,
-                type=NotificationType.PUSH,
-                priority=priority,
-                title=title,
-                message=body,
-                status=NotificationStatus.PENDING
+            notification_fanout.fan_out(
+                [user_id],
+                lambda recipient_id, preferences: self._render_user_notifications(
+                    notification_type, notification_data, priority, preferences
+                )
             )
-            
-            db.session.add(notification)
-            db.session.commit()
-            
-            # Send push notification (placeholder - integrate with Firebase/OneSignal)
-            logger.info(f"Push notification queued for user {user_id}: {title}")
-            return True
-            
         except Exception as e:
-            logger.error(f"Error sending push notification: {str(e)}")
-            return False
+            logger.error(f"Error sending notifications: {str(e)}")
     
-    def _send_in_app_notification(self, user_id, notification_type, data, priority):
-        """Send in-app notification"""
-        try:
-            # Create in-app notification
-            notification = Notification(
-                user_id=user_id,
-                type=NotificationType.IN_APP,
-                priority=priority,
-                title=f"Ticket Update: {data.get('ticket_number', '')}",
-                message=self._get_in_app_message(notification_type, data),
-                status=NotificationStatus.PENDING,
-                notification_metadata={
-                    'notification_type': notification_type,
-                    'ticket_id': data.get('ticket_id'),
-                    'ticket_number': data.get('ticket_number')
-                }
-            )
-            
-            db.session.add(notification)
-            db.session.commit()
-            
-            logger.info(f"In-app notification created for user {user_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error sending in-app notification: {str(e)}")
-            return False
+    def _render_user_notifications(self, notification_type, data, priority, preferences):
+        """Build one notification row per channel the user has enabled"""
+        template = self.notification_templates.get(notification_type, {})
+        channels = []
+        if preferences is None or preferences.email_enabled:
+            channels.append((NotificationType.EMAIL, 'subject', 'body'))
+        if preferences is not None and preferences.sms_enabled:
+            channels.append((NotificationType.SMS, None, 'body'))
+        if preferences is None or preferences.push_enabled:
+            channels.append((NotificationType.PUSH, 'title', 'body'))
+        
+        rows = []
+        for channel, title_key, body_key in channels:
+            channel_template = template.get(channel.value, {})
+            try:
+                title = channel_template.get(title_key, '').format(**data) if title_key else "SMS Notification"
+                body = channel_template.get(body_key, '').format(**data)
+            except (KeyError, IndexError, ValueError) as e:
+                logger.error(f"Error formatting {channel.value} notification '{notification_type}': {str(e)}")
+                continue
+            rows.append({'type': channel, 'priority': priority, 'title': title, 'message': body})
+        
+        # Always send in-app notification
+        rows.append({
+            'type': NotificationType.IN_APP,
+            'priority': priority,
+            'title': f"Ticket Update: {data.get('ticket_number', '')}",
+            'message': self._get_in_app_message(notification_type, data),
+            'notification_metadata': {
+                'notification_type': notification_type,
+                'ticket_id': data.get('ticket_id'),
+                'ticket_number': data.get('ticket_number')
+            }
+        })
+        return rows
     
     def _get_in_app_message(self, notification_type, data):
         """Get in-app notification message"""
@@ -572,46 +467,52 @@ class TicketNotificationService:
     
     def _send_admin_notification(self, admin_id, title, message, priority=NotificationPriority.NORMAL):
         """Send notification to admin user"""
+        return self._notify_admins([admin_id], title, message, priority, background=False)
+    
+    def _notify_admins(self, admin_ids, title, message, priority=NotificationPriority.NORMAL, background=True):
+        """Create in-app notifications for many admins with one insert"""
         try:
-            # Create in-app notification for admin
-            notification = Notification(
-                user_id=admin_id,
-                type=NotificationType.IN_APP,
-                priority=priority,
-                title=title,
-                message=message,
-                status=NotificationStatus.PENDING
-            )
-            
-            db.session.add(notification)
-            db.session.commit()
+            render = lambda admin_id, preferences: [{
+                'type': NotificationType.IN_APP,
+                'priority': priority,
+                'title': title,
+                'message': message
+            }]
+            if background:
+                notification_fanout.fan_out_async(admin_ids, render, use_preferences=False)
+            else:
+                notification_fanout.fan_out(admin_ids, render, use_preferences=False)
             
-            logger.info(f"Admin notification sent to {admin_id}: {title}")
+            logger.info(f"Admin notification sent to {len(admin_ids)} admins: {title}")
             return True
             
         except Exception as e:
             logger.error(f"Error sending admin notification: {str(e)}")
             return False
     
+    def _support_team_ids(self):
+        """IDs of active admins holding a support or admin role, in one query"""
+        rows = db.session.query(UserRoleAssignment.admin_user_id).join(
+            AdminRole, AdminRole.id == UserRoleAssignment.role_id
+        ).join(
+            AdminUser, AdminUser.id == UserRoleAssignment.admin_user_id
+        ).filter(
+            AdminRole.name.in_(self.support_roles),
+            AdminRole.is_active == True,
+            UserRoleAssignment.is_active == True,
+            AdminUser.is_active == True
+        ).distinct().all()
+        return [row[0] for row in rows]
+    
     def _notify_support_team_new_ticket(self, ticket):
         """Notify support team about new ticket"""
         try:
-            # Get all support agents and admins
-            support_users = AdminUser.query.join(AdminUser.assigned_roles).filter(
-                or_(
-                    AdminUser.assigned_roles.any(name='support_agent'),
-                    AdminUser.assigned_roles.any(name='support_team'),
-                    AdminUser.assigned_roles.any(name='admin')
-                )
-            ).all()
-            
-            for admin in support_users:
-                self._send_admin_notification(
-                    admin_id=admin.id,
-                    title=f"New Ticket: {ticket.ticket_number}",
-                    message=f"New {ticket.priority.value} priority ticket: {ticket.subject}",
-                    priority=NotificationPriority.HIGH if ticket.priority == TicketPriority.URGENT else NotificationPriority.NORMAL
-                )
+            self._notify_admins(
+                self._support_team_ids(),
+                title=f"New Ticket: {ticket.ticket_number}",
+                message=f"New {ticket.priority.value} priority ticket: {ticket.subject}",
+                priority=NotificationPriority.HIGH if ticket.priority == TicketPriority.URGENT else NotificationPriority.NORMAL
+            )
             
             logger.info(f"Support team notified about new ticket: {ticket.ticket_number}")
             
@@ -622,25 +523,14 @@ class TicketNotificationService:
         """Notify support team about user reply"""
         try:
             # Get assigned admin or all support team if no assignment
-            if ticket.assigned_to:
-                admins = [AdminUser.query.get(ticket.assigned_to)]
-            else:
-                admins = AdminUser.query.join(AdminUser.assigned_roles).filter(
-                    or_(
-                        AdminUser.assigned_roles.any(name='support_agent'),
-                        AdminUser.assigned_roles.any(name='support_team'),
-                        AdminUser.assigned_roles.any(name='admin')
-                    )
-                ).all()
-            
-            for admin in admins:
-                if admin:
-                    self._send_admin_notification(
-                        admin_id=admin.id,
-                        title=f"User Reply: {ticket.ticket_number}",
-                        message=f"New reply from {ticket.user_name}: {message.message[:50]}...",
-                        priority=NotificationPriority.HIGH
-                    )
+            admin_ids = [ticket.assigned_to] if ticket.assigned_to else self._support_team_ids()
+            
+            self._notify_admins(
+                admin_ids,
+                title=f"User Reply: {ticket.ticket_number}",
+                message=f"New reply from {ticket.user_name}: {message.message[:50]}...",
+                priority=NotificationPriority.HIGH
+            )
             
             logger.info(f"Support team notified about user reply: {ticket.ticket_number}")
             
@@ -650,22 +540,12 @@ class TicketNotificationService:
     def _notify_support_team_urgent_ticket(self, ticket):
         """Notify support team about urgent ticket"""
         try:
-            # Get all support agents and admins
-            support_users = AdminUser.query.join(AdminUser.assigned_roles).filter(
-                or_(
-                    AdminUser.assigned_roles.any(name='support_agent'),
-                    AdminUser.assigned_roles.any(name='support_team'),
-                    AdminUser.assigned_roles.any(name='admin')
-                )
-            ).all()
-            
-            for admin in support_users:
-                self._send_admin_notification(
-                    admin_id=admin.id,
-                    title=f"URGENT: {ticket.ticket_number}",
-                    message=f"Urgent priority ticket requires immediate attention: {ticket.subject}",
-                    priority=NotificationPriority.HIGH
-                )
+            self._notify_admins(
+                self._support_team_ids(),
+                title=f"URGENT: {ticket.ticket_number}",
+                message=f"Urgent priority ticket requires immediate attention: {ticket.subject}",
+                priority=NotificationPriority.HIGH
+            )
             
             logger.info(f"Support team notified about urgent ticket: {ticket.ticket_number}")
             
@@ -693,9 +573,12 @@ class TicketNotificationService:
             ).first()
             
             if notification:
+                was_unread = notification.status == NotificationStatus.PENDING
                 notification.status = NotificationStatus.DELIVERED
                 notification.delivered_at = datetime.utcnow()
                 db.session.commit()
+                if was_unread:
+                    notification_counters.notifications_settled([user_id])
                 return True
             
             return False
@@ -707,16 +590,16 @@ class TicketNotificationService:
     def mark_all_notifications_read(self, user_id):
         """Mark all user notifications as read"""
         try:
-            notifications = Notification.query.filter_by(
+            Notification.query.filter_by(
                 user_id=user_id,
                 status=NotificationStatus.PENDING
-            ).all()
-            
-            for notification in notifications:
-                notification.status = NotificationStatus.DELIVERED
-                notification.delivered_at = datetime.utcnow()
+            ).update({
+                Notification.status: NotificationStatus.DELIVERED,
+                Notification.delivered_at: datetime.utcnow()
+            }, synchronize_session=False)
             
             db.session.commit()
+            notification_counters.set_unread(user_id, 0)
             return True
             
         except Exception as e:
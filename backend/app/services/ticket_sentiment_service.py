@@ -0,0 +1,115 @@
+"""
+Ticket Sentiment Service
+Tags support tickets with the sentiment and urgency of their latest
+customer message. Single tickets are tagged inline when customers write;
+tag_open_tickets re-tags every open ticket in keyset batches, classifying
+each batch locally and writing the tags back with one executemany UPDATE.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, func, update
+
+from .. import db
+from ..models.support import SupportMessage, SupportTicket, TicketStatus
+from ..utils.logger import get_logger
+from .ai_service import ai_service
+from .sentiment_classifier import sentiment_classifier
+
+logger = get_logger(__name__)
+
+OPEN_STATUSES = (TicketStatus.OPEN, TicketStatus.IN_PROGRESS, TicketStatus.PENDING)
+
+
+def ticket_text(subject: Optional[str], message: Optional[str]) -> str:
+    """What a ticket is classified on: its subject plus the latest customer message"""
+    return f"{subject or ''}. {message or ''}"
+
+
+class TicketSentimentService:
+    """Sentiment tags for support tickets"""
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+
+    def tag_ticket(self, ticket: SupportTicket, message: str = None) -> Dict:
+        """Tag a ticket in the current session with the local classifier (caller commits)"""
+        result = sentiment_classifier.classify(ticket_text(ticket.subject, message or ticket.description))
+        ticket.sentiment = result['sentiment']
+        ticket.sentiment_urgency = result['urgency']
+        ticket.sentiment_confidence = result['confidence']
+        ticket.sentiment_tagged_at = datetime.utcnow()
+        return result
+
+    def tag_open_tickets(self, batch_size: int = None, use_remote: bool = False) -> Dict[str, int]:
+        """Re-tag all open tickets; use_remote sends low-confidence tickets to the remote model"""
+        batch_size = batch_size or self.batch_size
+        table = SupportTicket.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam('ticket_id'))
+            # Tagging is not an edit: keep updated_at instead of firing its onupdate
+            .values(sentiment=bindparam('sentiment'), sentiment_urgency=bindparam('urgency'),
+                    sentiment_confidence=bindparam('confidence'), sentiment_tagged_at=bindparam('tagged_at'),
+                    updated_at=table.c.updated_at)
+        )
+        totals = {'tagged': 0, 'remote': 0}
+        pool = ThreadPoolExecutor(max_workers=ai_service.gateway.max_concurrency) if use_remote else None
+        last_id = 0
+        try:
+            while True:
+                tickets = (db.session.query(SupportTicket.id, SupportTicket.subject, SupportTicket.description)
+                           .filter(SupportTicket.status.in_(OPEN_STATUSES), SupportTicket.id > last_id)
+                           .order_by(SupportTicket.id)
+                           .limit(batch_size)
+                           .all())
+                if not tickets:
+                    break
+                last_id = tickets[-1].id
+
+                latest = self._latest_customer_messages([ticket.id for ticket in tickets])
+                texts = [ticket_text(ticket.subject, latest.get(ticket.id, ticket.description)) for ticket in tickets]
+                results = sentiment_classifier.classify_many(texts)
+
+                if pool is not None:
+                    uncertain = [index for index, result in enumerate(results)
+                                 if result['confidence'] < ai_service.remote_confidence_threshold]
+                    for index, result in zip(uncertain, pool.map(lambda i: ai_service.analyze_sentiment(texts[i]),
+                                                                 uncertain)):
+                        if result.get('source') == 'remote':
+                            results[index] = result
+                            totals['remote'] += 1
+
+                now = datetime.utcnow()
+                db.session.execute(statement, [
+                    {'ticket_id': ticket.id, 'sentiment': result['sentiment'], 'urgency': result['urgency'],
+                     'confidence': result['confidence'], 'tagged_at': now}
+                    for ticket, result in zip(tickets, results)
+                ])
+                db.session.commit()
+                totals['tagged'] += len(tickets)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        logger.info(f"Tagged sentiment on {totals['tagged']} open tickets ({totals['remote']} by the remote model)")
+        return totals
+
+    @staticmethod
+    def _latest_customer_messages(ticket_ids) -> Dict[int, str]:
+        latest = (db.session.query(func.max(SupportMessage.id).label('message_id'))
+                  .filter(SupportMessage.ticket_id.in_(ticket_ids),
+                          SupportMessage.admin_user_id.is_(None),
+                          SupportMessage.is_internal.isnot(True))
+                  .group_by(SupportMessage.ticket_id)
+                  .subquery())
+        rows = (db.session.query(SupportMessage.ticket_id, SupportMessage.message)
+                .join(latest, SupportMessage.id == latest.c.message_id)
+                .all())
+        return {ticket_id: message for ticket_id, message in rows}
+
+
+# Global instance
+ticket_sentiment_service = TicketSentimentService()
@@ -0,0 +1,204 @@
+"""
+User Agent Service
+Normalized device, browser and OS classification for User-Agent strings.
+
+All browser, OS, device and bot tokens are alternatives of one precompiled
+regex, so a UA string is scanned once; the tokens found are then resolved by
+precedence (Edge and Opera also announce Chrome, Chrome announces Safari).
+Results are memoized in a bounded LRU cache because the same few hundred UA
+strings account for nearly all traffic.
+
+backfill_device_columns streams over a table that stores raw user agents
+(UserLoginHistory, UserActivityLog) and rewrites its normalized device
+columns in keyset batches.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import bindparam, update
+
+from .. import db
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_USER_AGENT_LENGTH = 512  # longer strings are truncated before matching and caching
+CACHE_SIZE = 4096
+
+# (group name, pattern); a '<name>_v' group inside a pattern captures the major version
+TOKENS = [
+    # A *bot/*crawler/*spider word only counts as a crawler name when a version or
+    # suffix follows (Googlebot/2.1, Slackbot-LinkExpanding); handset models such
+    # as "CUBOT X30" end in "bot" too
+    ('bot', r'(?P<bot_name>[A-Za-z][\w\-]*?(?:bot|crawler|spider)(?=[/\-;])|Slurp|facebookexternalhit|HeadlessChrome|'
+            r'curl|Wget|python-requests|python-urllib|Go-http-client|Java(?=/)|libwww-perl|Scrapy|PostmanRuntime|'
+            r'axios|node-fetch)'),
+    ('edge', r'Edg(?:e|A|iOS)?/(?P<edge_v>\d+)'),
+    ('opera', r'(?:OPR|OPiOS|Opera)[/ ](?P<opera_v>\d+)'),
+    ('samsung', r'SamsungBrowser/(?P<samsung_v>\d+)'),
+    ('yandex', r'YaBrowser/(?P<yandex_v>\d+)'),
+    ('firefox', r'(?:Firefox|FxiOS)/(?P<firefox_v>\d+)'),
+    ('chrome', r'(?:Chrome|CriOS)/(?P<chrome_v>\d+)'),
+    ('ie', r'(?:MSIE (?P<ie_v>\d+)|Trident/\d+.*?rv:(?P<ie_rv>\d+))'),
+    ('safari_version', r'Version/(?P<safari_version_v>\d+)'),
+    ('safari', r'Safari/'),
+    ('windows', r'Windows NT (?P<windows_v>\d+\.\d+)'),
+    ('ipad', r'iPad'),
+    ('iphone', r'iPhone|iPod'),
+    ('ios_version', r'OS (?P<ios_version_v>\d+)[_\d]* like Mac OS X'),
+    ('android', r'Android(?: (?P<android_v>\d+))?'),
+    ('chromeos', r'CrOS'),
+    ('macos', r'Mac OS X(?: (?P<macos_v>\d+)[._]\d+)?'),
+    ('linux', r'Linux'),
+    ('mobile', r'Mobi'),
+    ('tablet', r'Tablet'),
+]
+# Every token starts at a word boundary; anchoring there lets the scan skip mid-word positions
+MATCHER = re.compile(r'\b(?:' + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKENS) + ')', re.IGNORECASE)
+VERSIONED = frozenset(name for name, pattern in TOKENS if f'<{name}_v>' in pattern)
+
+# Browser precedence: the first family present wins
+BROWSERS = [
+    ('edge', 'Edge'), ('opera', 'Opera'), ('samsung', 'Samsung Internet'), ('yandex', 'Yandex'),
+    ('firefox', 'Firefox'), ('chrome', 'Chrome'), ('ie', 'Internet Explorer'),
+]
+WINDOWS_VERSIONS = {'10.0': '10', '6.3': '8.1', '6.2': '8', '6.1': '7', '6.0': 'Vista', '5.1': 'XP'}
+
+
+class DeviceInfo(NamedTuple):
+    device_type: str  # desktop, mobile, tablet, bot, unknown
+    browser: str
+    browser_version: Optional[str]
+    os: str
+    os_version: Optional[str]
+    is_bot: bool
+
+
+UNKNOWN = DeviceInfo('unknown', 'unknown', None, 'unknown', None, False)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _classify(user_agent: str) -> DeviceInfo:
+    found: Dict[str, Optional[str]] = {}
+    for match in MATCHER.finditer(user_agent):
+        name = match.lastgroup
+        if name not in found:
+            version = match.group(f'{name}_v') if name in VERSIONED else None
+            if name == 'ie':
+                version = version or match.group('ie_rv')
+            elif name == 'bot':
+                found['bot_name'] = match.group('bot_name')
+            found[name] = version
+
+    if 'bot' in found:
+        name = found['bot_name']
+        return DeviceInfo('bot', 'Headless Chrome' if name.lower() == 'headlesschrome' else name, None,
+                          'unknown', None, True)
+
+    browser, browser_version = 'unknown', None
+    for key, family in BROWSERS:
+        if key in found:
+            browser, browser_version = family, found[key]
+            break
+    else:
+        if 'safari' in found or 'safari_version' in found:
+            browser, browser_version = 'Safari', found.get('safari_version')
+
+    if 'windows' in found:
+        os_name, os_version = 'Windows', WINDOWS_VERSIONS.get(found['windows'], found['windows'])
+    elif 'iphone' in found or 'ipad' in found:
+        os_name, os_version = 'iOS', found.get('ios_version')
+    elif 'android' in found:
+        os_name, os_version = 'Android', found['android']
+    elif 'chromeos' in found:
+        os_name, os_version = 'Chrome OS', None
+    elif 'macos' in found:
+        os_name, os_version = 'macOS', found['macos']
+    elif 'linux' in found:
+        os_name, os_version = 'Linux', None
+    else:
+        os_name, os_version = 'unknown', None
+
+    if 'ipad' in found or 'tablet' in found or ('android' in found and 'mobile' not in found):
+        device_type = 'tablet'
+    elif 'mobile' in found or 'iphone' in found:
+        device_type = 'mobile'
+    elif os_name in ('Windows', 'macOS', 'Linux', 'Chrome OS'):
+        device_type = 'desktop'
+    else:
+        device_type = 'unknown'
+
+    return DeviceInfo(device_type, browser, browser_version, os_name, os_version, False)
+
+
+class UserAgentService:
+    """Memoized user agent classification and device fingerprints"""
+
+    def classify(self, user_agent: Optional[str]) -> DeviceInfo:
+        if not user_agent or user_agent == 'Unknown':
+            return UNKNOWN
+        return _classify(user_agent[:MAX_USER_AGENT_LENGTH])
+
+    def parse(self, user_agent: Optional[str]) -> Dict:
+        """Classification as a dict (device_type, browser, browser_version, os, os_version, is_bot)"""
+        return self.classify(user_agent)._asdict()
+
+    def device_fingerprint(self, user_agent: Optional[str], ip_address: str) -> str:
+        """
+        Stable device key: browser, OS and device type rather than the raw UA,
+        so browser updates do not turn a known device into a new one
+        """
+        info = self.classify(user_agent)
+        data = f"{info.browser}|{info.os}|{info.device_type}|{ip_address}"
+        return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+    def cache_stats(self) -> Dict[str, int]:
+        info = _classify.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+
+    def backfill_device_columns(self, model, batch_size: int = 1000, only_missing: bool = False) -> Dict[str, int]:
+        """
+        Recompute device_type/browser/os from user_agent for every row of model.
+        Rows are read in keyset batches of (id, user_agent, current values) and only
+        rows whose values change are written, with one executemany per batch.
+        """
+        table = model.__table__
+        values = {'device_type': bindparam('new_device_type'), 'browser': bindparam('new_browser'),
+                  'os': bindparam('new_os')}
+        if 'updated_at' in table.c:
+            values['updated_at'] = table.c.updated_at  # a backfill is not an edit
+        statement = update(table).where(table.c.id == bindparam('row_id')).values(**values)
+
+        totals = {'scanned': 0, 'updated': 0}
+        last_id = 0
+        while True:
+            query = db.session.query(model.id, model.user_agent, model.device_type, model.browser, model.os) \
+                .filter(model.id > last_id)
+            if only_missing:
+                query = query.filter(model.device_type.is_(None))
+            rows = query.order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            changes = []
+            for row in rows:
+                info = self.classify(row.user_agent)
+                if (row.device_type, row.browser, row.os) != (info.device_type, info.browser, info.os):
+                    changes.append({'row_id': row.id, 'new_device_type': info.device_type,
+                                    'new_browser': info.browser, 'new_os': info.os})
+            if changes:
+                db.session.execute(statement, changes)
+            db.session.commit()
+            totals['scanned'] += len(rows)
+            totals['updated'] += len(changes)
+
+        logger.info(f"Device columns backfilled on {table.name}: {totals['updated']}/{totals['scanned']} rows changed")
+        return totals
+
+
+# Global instance
+user_agent_service = UserAgentService()
@@ -1,9 +1,9 @@
-import json
 import logging
-from typing import Dict, Set, Optional, Any
+from typing import Dict, Set, Optional, Any, List
 from datetime import datetime
 import threading
-import time
+
+from ..utils.presence_tracker import PresenceTracker
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +15,12 @@ class WebSocketService:
         self.socketio = socketio
         self.connected_clients: Dict[str, Dict] = {}  # client_id -> client_info
         self.admin_rooms: Set[str] = set()  # admin room names
-        self.user_status_cache: Dict[int, Dict] = {}  # user_id -> status_info
+        self.presence = PresenceTracker(inactive_after=300, evict_after=1800)
+        self.status_tick = 1.0  # Seconds between batched status broadcasts
+        self._pending_updates: List[Dict] = []  # transitions awaiting the next broadcast
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
         self._start_status_monitor()
         
         if socketio:
@@ -126,9 +131,18 @@ class WebSocketService:
                 if client_id in self.connected_clients and self.connected_clients[client_id].get('is_admin'):
                     statuses = {}
                     for user_id in user_ids:
-                        statuses[user_id] = self.user_status_cache.get(user_id, {'status': 'unknown'})
+                        statuses[user_id] = self.presence.get(user_id) or {'status': 'unknown'}
                     
                     emit('user_statuses', {'statuses': statuses})
+            
+            @self.socketio.on('heartbeat')
+            def handle_heartbeat(data=None):
+                """Keep an authenticated user online"""
+                client_info = self.connected_clients.get(request.sid)
+                if client_info and client_info.get('user_id'):
+                    transition = self.presence.heartbeat(client_info['user_id'])
+                    if transition:
+                        self._queue_status_updates([{'user_id': client_info['user_id'], **transition}])
                     
         except ImportError:
             logger.warning("Flask-SocketIO not available, WebSocket functionality disabled")
@@ -136,55 +150,72 @@ class WebSocketService:
             logger.error(f"Error setting up WebSocket handlers: {e}")
     
     def _update_user_status(self, user_id: int, status: str, additional_data: Dict = None):
-        """Update user status and broadcast to admin clients"""
+        """Update user status; admin clients receive it with the next batched broadcast"""
         try:
-            # Update status cache
-            self.user_status_cache[user_id] = {
-                'status': status,
-                'updated_at': datetime.utcnow().isoformat(),
-                **(additional_data or {})
-            }
-            
-            # Broadcast to admin clients if SocketIO is available
-            if self.socketio:
-                self.socketio.emit('user_status_update', {
-                    'user_id': user_id,
-                    'status': status,
-                    'updated_at': self.user_status_cache[user_id]['updated_at'],
-                    **(additional_data or {})
-                }, room='admin_dashboard')
-            
+            entry = self.presence.set_status(user_id, status, additional_data)
+            self._queue_status_updates([{'user_id': user_id, **entry}])
             logger.debug(f"Updated user {user_id} status to: {status}")
             
         except Exception as e:
             logger.error(f"Error updating user status: {e}")
     
+    def _queue_status_updates(self, updates: List[Dict]):
+        """Queue status transitions and wake the monitor if it is idle"""
+        with self._pending_lock:
+            was_empty = not self._pending_updates
+            self._pending_updates.extend(updates)
+        if was_empty:
+            self._wake.set()
+    
+    def _flush_status_updates(self):
+        """Broadcast all queued transitions to admin clients in one event"""
+        with self._pending_lock:
+            updates, self._pending_updates = self._pending_updates, []
+        if updates and self.socketio:
+            self.socketio.emit('user_status_batch', {
+                'updates': updates,
+                'timestamp': datetime.utcnow().isoformat()
+            }, room='admin_dashboard')
+        return updates
+    
     def _start_status_monitor(self):
-        """Start background thread to monitor user status"""
+        """
+        Start background thread that expires presence.
+        The thread sleeps until the earliest presence deadline (or the next
+        tick when transitions are queued), applies only the due transitions
+        and broadcasts them as one batch.
+        """
         def monitor_status():
-            while True:
+            while not self._stopped.is_set():
                 try:
-                    # Check for inactive users (no activity for 5 minutes)
-                    current_time = datetime.utcnow()
-                    inactive_threshold = 300  # 5 minutes
+                    expired = self.presence.expire_due()
+                    if expired:
+                        self._queue_status_updates(expired)
+                    self._wake.clear()
+                    self._flush_status_updates()
                     
-                    for user_id, status_info in self.user_status_cache.items():
-                        if status_info['status'] == 'online':
-                            last_update = datetime.fromisoformat(status_info['updated_at'])
-                            if (current_time - last_update).total_seconds() > inactive_threshold:
-                                self._update_user_status(user_id, 'inactive')
-                    
-                    time.sleep(60)  # Check every minute
+                    next_deadline = self.presence.next_deadline()
+                    timeout = 60.0
+                    if next_deadline is not None:
+                        timeout = min(timeout, max(0.0, next_deadline - self.presence.clock()))
+                    # New transitions wake the thread; wait out the tick so they batch up
+                    if self._wake.wait(timeout) and not self._stopped.is_set():
+                        self._stopped.wait(self.status_tick)
                     
                 except Exception as e:
                     logger.error(f"Error in status monitor: {e}")
-                    time.sleep(60)
+                    self._stopped.wait(self.status_tick)
         
         # Start monitoring thread
         monitor_thread = threading.Thread(target=monitor_status, daemon=True)
         monitor_thread.start()
         logger.info("Started user status monitoring thread")
     
+    def stop(self):
+        """Stop the status monitor thread"""
+        self._stopped.set()
+        self._wake.set()
+    
     def broadcast_user_update(self, user_id: int, update_type: str, data: Dict):
         """Broadcast user update to admin clients"""
         try:
@@ -244,17 +275,18 @@ class WebSocketService:
             'total_clients': len(self.connected_clients),
             'admin_clients': len([c for c in self.connected_clients.values() if c.get('is_admin')]),
             'user_clients': len([c for c in self.connected_clients.values() if not c.get('is_admin')]),
-            'online_users': len([uid for uid, status in self.user_status_cache.items() if status['status'] == 'online']),
-            'inactive_users': len([uid for uid, status in self.user_status_cache.items() if status['status'] == 'inactive'])
+            'online_users': self.presence.count('online'),
+            'inactive_users': self.presence.count('inactive'),
+            'tracked_users': len(self.presence)
         }
     
     def get_user_status(self, user_id: int) -> Optional[Dict]:
         """Get current status of a user"""
-        return self.user_status_cache.get(user_id)
+        return self.presence.get(user_id)
     
     def get_all_user_statuses(self) -> Dict:
         """Get status of all tracked users"""
-        return self.user_status_cache.copy()
+        return self.presence.snapshot()
 
 
 # Global WebSocket service instance (will be initialized when SocketIO is available)
@@ -264,5 +296,6 @@ websocket_service = WebSocketService()
 def initialize_websocket_service(socketio=None):
     """Initialize the global WebSocket service"""
     global websocket_service
+    websocket_service.stop()
     websocket_service = WebSocketService(socketio)
     logger.info("WebSocket service initialized")
@@ -0,0 +1,44 @@
+"""
+Local Pub/Sub Manager
+In-process stand-in for the Redis/Kombu Socket.IO message queue. Several
+SocketIO servers created in one process (e.g. in tests or the chat load
+test) share broadcasts through it exactly as separate workers would through
+a real queue.
+"""
+
+import queue
+import threading
+
+import socketio
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Socket.IO client manager that publishes through in-process queues"""
+
+    name = 'local'
+    _channels = {}  # channel -> list of subscriber queues
+    _channels_lock = threading.Lock()
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._queue = queue.Queue()
+        if not write_only:
+            with self._channels_lock:
+                self._channels.setdefault(channel, []).append(self._queue)
+
+    def _publish(self, data):
+        with self._channels_lock:
+            subscribers = list(self._channels.get(self.channel, []))
+        for subscriber in subscribers:
+            subscriber.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+    def close(self):
+        """Detach from the channel"""
+        with self._channels_lock:
+            subscribers = self._channels.get(self.channel, [])
+            if self._queue in subscribers:
+                subscribers.remove(self._queue)
@@ -0,0 +1,68 @@
+"""
+Password Hashing Helpers
+One place for the configured password hash method, so hashing, checking and
+rehash-on-login agree across User and AdminUser.
+
+PASSWORD_HASH_METHOD takes a werkzeug method ('pbkdf2:sha256:600000',
+'scrypt:32768:8:1') or 'bcrypt:<cost>'. Hashes in any of these formats
+verify; a hash whose method differs from the configured one reports
+needs_rehash, so raising the cost upgrades accounts as they log in.
+"""
+
+import os
+from functools import lru_cache
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+BCRYPT_MAX_BYTES = 72  # bcrypt only ever used the first 72 bytes; bcrypt>=5 rejects longer input
+
+
+def _bcrypt_secret(password: str) -> bytes:
+    return password.encode('utf-8')[:BCRYPT_MAX_BYTES]
+
+
+def hash_password(password: str, method: str = None) -> str:
+    """Hash a password with the configured (or given) method"""
+    method = method or PASSWORD_HASH_METHOD
+    if method.startswith('bcrypt'):
+        cost = int(method.partition(':')[2] or 12)
+        return bcrypt.hashpw(_bcrypt_secret(password), bcrypt.gensalt(cost)).decode('utf-8')
+    return generate_password_hash(password, method=method)
+
+
+def check_password(password_hash, password: str) -> bool:
+    """Check a password against a werkzeug or bcrypt hash"""
+    if not password_hash or password is None:
+        return False
+    if isinstance(password_hash, bytes):
+        password_hash = password_hash.decode('utf-8')
+    try:
+        if password_hash.startswith(BCRYPT_PREFIXES):
+            return bcrypt.checkpw(_bcrypt_secret(password), password_hash.encode('utf-8'))
+        return check_password_hash(password_hash, password)
+    except ValueError:
+        return False  # malformed hash
+
+
+def hash_method(password_hash) -> str:
+    """Method and cost a hash was made with, e.g. 'pbkdf2:sha256:600000' or 'bcrypt:12'"""
+    if isinstance(password_hash, bytes):
+        password_hash = password_hash.decode('utf-8')
+    if password_hash.startswith(BCRYPT_PREFIXES):
+        return f"bcrypt:{int(password_hash[4:6])}"
+    return password_hash.split('$', 1)[0]
+
+
+@lru_cache(maxsize=8)
+def _normalized_method(method: str) -> str:
+    # 'scrypt' or 'bcrypt' alone mean their default costs; hashing once spells them out
+    return hash_method(hash_password('', method))
+
+
+def needs_rehash(password_hash, method: str = None) -> bool:
+    """True when a hash was made with a different method or cost than the configured one"""
+    return hash_method(password_hash) != _normalized_method(method or PASSWORD_HASH_METHOD)
@@ -0,0 +1,126 @@
+"""
+Presence Tracker
+User presence with expiry driven by a min-heap of deadlines. Heartbeats
+push a new deadline in O(log n); expiry pops only entries that are due.
+Superseded heap entries are skipped lazily and compacted when they pile up.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+class PresenceTracker:
+    """
+    Tracks online -> inactive -> evicted and offline -> evicted transitions.
+
+    inactive_after: seconds without a heartbeat before an online user turns inactive
+    evict_after: seconds an inactive or offline user is kept before being dropped
+    """
+
+    def __init__(self, inactive_after: float = 300, evict_after: float = 1800, clock=time.monotonic):
+        self.inactive_after = inactive_after
+        self.evict_after = evict_after
+        self.clock = clock
+        self._entries: Dict[Any, Dict[str, Any]] = {}  # user_id -> status entry
+        self._heap: List[tuple] = []  # (deadline, seq, user_id)
+        self._seq = itertools.count()
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def _schedule(self, user_id, entry: Dict[str, Any], delay: float) -> None:
+        entry['_deadline'] = self.clock() + delay
+        heapq.heappush(self._heap, (entry['_deadline'], next(self._seq), user_id))
+        # Heartbeats leave superseded deadlines behind; rebuild when they dominate
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(e['_deadline'], next(self._seq), uid) for uid, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _public(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in entry.items() if not key.startswith('_')}
+
+    def set_status(self, user_id, status: str, additional_data: Dict = None) -> Dict[str, Any]:
+        """Record an explicit status; returns the public status entry"""
+        with self._lock:
+            previous = self._entries.get(user_id)
+            if previous:
+                self._counts[previous['status']] -= 1
+            entry = {
+                'status': status,
+                'updated_at': datetime.utcnow().isoformat(),
+                **(additional_data or {})
+            }
+            self._entries[user_id] = entry
+            self._counts[status] += 1
+            self._schedule(user_id, entry, self.inactive_after if status == 'online' else self.evict_after)
+            return self._public(entry)
+
+    def heartbeat(self, user_id) -> Optional[Dict[str, Any]]:
+        """
+        Refresh an online user's deadline.
+        Returns the new status entry when the heartbeat changed the status
+        (unknown or inactive -> online), otherwise None.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry['status'] == 'online':
+                self._schedule(user_id, entry, self.inactive_after)
+                return None
+        return self.set_status(user_id, 'online')
+
+    def remove(self, user_id) -> None:
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry:
+                self._counts[entry['status']] -= 1
+
+    def expire_due(self, now: float = None) -> List[Dict[str, Any]]:
+        """Apply transitions for every entry whose deadline has passed"""
+        now = self.clock() if now is None else now
+        transitions = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, user_id = heapq.heappop(self._heap)
+                entry = self._entries.get(user_id)
+                if entry is None or entry['_deadline'] != deadline:
+                    continue  # superseded by a later heartbeat or status change
+
+                self._counts[entry['status']] -= 1
+                if entry['status'] == 'online':
+                    entry['status'] = 'inactive'
+                    entry['updated_at'] = datetime.utcnow().isoformat()
+                    self._counts['inactive'] += 1
+                    self._schedule(user_id, entry, self.evict_after)
+                    transitions.append({'user_id': user_id, **self._public(entry)})
+                else:
+                    del self._entries[user_id]
+                    transitions.append({
+                        'user_id': user_id,
+                        'status': 'evicted',
+                        'updated_at': datetime.utcnow().isoformat()
+                    })
+        return transitions
+
+    def next_deadline(self) -> Optional[float]:
+        """Clock time of the earliest pending deadline, if any"""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def get(self, user_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return self._public(entry) if entry else None
+
+    def snapshot(self) -> Dict[Any, Dict[str, Any]]:
+        with self._lock:
+            return {user_id: self._public(entry) for user_id, entry in self._entries.items()}
+
+    def count(self, status: str) -> int:
+        return self._counts[status]
+
+    def __len__(self) -> int:
+        return len(self._entries)
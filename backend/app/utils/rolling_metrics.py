@@ -0,0 +1,262 @@
+"""
+Rolling Metrics
+Time-bucketed counters, sums and mergeable quantile sketches over sliding
+windows, stored in Redis when available so all workers share one view.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, Iterable, List, Optional
+import logging
+
+# Try to import Redis, but don't fail if not available
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch style).
+    Every estimate is within `relative_accuracy` of the true value, and two
+    sketches merge by adding bucket counts, so per-bucket sketches can be
+    combined into any window and across workers.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, buckets: Optional[Dict[int, int]] = None):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = defaultdict(int, buckets or {})
+        self.count = sum(self.buckets.values())
+
+    def bucket_index(self, value: float) -> int:
+        """Bucket index for a positive value"""
+        return int(math.ceil(math.log(max(value, 1e-9)) / self._log_gamma))
+
+    def add(self, value: float, count: int = 1) -> None:
+        self.buckets[self.bucket_index(value)] += count
+        self.count += count
+
+    def merge(self, buckets: Dict[int, int]) -> None:
+        for index, count in buckets.items():
+            self.buckets[index] += count
+            self.count += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1), or None when empty"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class _LocalBucketStore:
+    """In-process bucket store used when Redis is unavailable"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._expiry = {}
+        self._lock = threading.Lock()
+
+    def increment(self, updates: Dict[str, Dict[str, float]], ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            for key, fields in updates.items():
+                bucket = self._buckets.setdefault(key, defaultdict(float))
+                for field, amount in fields.items():
+                    bucket[field] += amount
+                self._expiry[key] = now + ttl
+            # Opportunistic eviction of expired buckets
+            if len(self._expiry) > 1024:
+                for key in [k for k, expires in self._expiry.items() if expires < now]:
+                    self._buckets.pop(key, None)
+                    self._expiry.pop(key, None)
+
+    def read(self, keys: List[str]) -> List[Dict[str, float]]:
+        now = time.time()
+        with self._lock:
+            return [
+                dict(self._buckets[key]) if key in self._buckets and self._expiry.get(key, 0) >= now else {}
+                for key in keys
+            ]
+
+
+class _RedisBucketStore:
+    """Redis hash per bucket, shared by every worker"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def increment(self, updates: Dict[str, Dict[str, float]], ttl: int) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, fields in updates.items():
+            for field, amount in fields.items():
+                if isinstance(amount, int):
+                    pipe.hincrby(key, field, amount)
+                else:
+                    pipe.hincrbyfloat(key, field, amount)
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def read(self, keys: List[str]) -> List[Dict[str, float]]:
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        return [
+            {field: float(value) for field, value in bucket.items()}
+            for bucket in pipe.execute()
+        ]
+
+
+class RollingMetrics:
+    """
+    Sliding-window metrics for one namespace.
+
+    Each observation is added to the current bucket at every resolution.
+    A window is answered by merging the buckets that cover it, so reads
+    cost O(buckets per window) regardless of traffic.
+    """
+
+    # window name -> (window seconds, bucket resolution seconds)
+    DEFAULT_WINDOWS = {
+        '1m': (60, 10),
+        '5m': (300, 10),
+        '1h': (3600, 60)
+    }
+
+    def __init__(self, namespace: str, windows: Dict[str, tuple] = None,
+                 redis_url: str = None, relative_accuracy: float = 0.01):
+        self.namespace = namespace
+        self.windows = windows or dict(self.DEFAULT_WINDOWS)
+        self.relative_accuracy = relative_accuracy
+        self._sketch = QuantileSketch(relative_accuracy)
+
+        # Each resolution keeps buckets for its longest window
+        self.resolutions = {}
+        for window_seconds, resolution in self.windows.values():
+            self.resolutions[resolution] = max(self.resolutions.get(resolution, 0), window_seconds)
+
+        self.shared = False
+        self.store = self._initialize_store(redis_url)
+
+    def _initialize_store(self, redis_url: str = None):
+        """Use Redis when reachable, otherwise fall back to process-local buckets"""
+        if REDIS_AVAILABLE:
+            try:
+                if redis_url is None:
+                    try:
+                        from flask import current_app
+                        redis_url = current_app.config.get('REDIS_URL', 'redis://localhost:6379/0')
+                    except RuntimeError:
+                        # Built at import, before any app context: read the same setting config does
+                        redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+                client = redis.from_url(redis_url, decode_responses=True,
+                                        socket_connect_timeout=2, socket_timeout=2)
+                client.ping()
+                self.shared = True
+                logger.info(f"Rolling metrics '{self.namespace}' shared via Redis")
+                return _RedisBucketStore(client)
+            except Exception as e:
+                logger.warning(f"Redis unavailable for rolling metrics '{self.namespace}', using in-process buckets: {e}")
+        return _LocalBucketStore()
+
+    def _bucket_key(self, resolution: int, bucket_start: int) -> str:
+        return f"metrics:{self.namespace}:{resolution}:{bucket_start}"
+
+    def record(self, counters: Dict[str, int] = None, sums: Dict[str, float] = None,
+               samples: Dict[str, float] = None, timestamp: float = None) -> None:
+        """
+        Record one observation.
+        counters are integer increments, sums are float totals and samples
+        feed the quantile sketch of the same name.
+        """
+        timestamp = timestamp or time.time()
+        fields = {}
+        for name, amount in (counters or {}).items():
+            fields[f"c:{name}"] = int(amount)
+        for name, amount in (sums or {}).items():
+            fields[f"s:{name}"] = float(amount)
+        for name, value in (samples or {}).items():
+            fields[f"q:{name}:{self._sketch.bucket_index(value)}"] = 1
+            fields[f"s:{name}"] = fields.get(f"s:{name}", 0.0) + float(value)
+            fields[f"c:{name}_samples"] = fields.get(f"c:{name}_samples", 0) + 1
+
+        updates = {}
+        for resolution in self.resolutions:
+            bucket_start = int(timestamp // resolution) * resolution
+            updates[self._bucket_key(resolution, bucket_start)] = fields
+
+        try:
+            self.store.increment(updates, ttl=max(self.resolutions.values()) + 120)
+        except Exception as e:
+            logger.error(f"Rolling metrics record failed for '{self.namespace}': {e}")
+
+    def snapshot(self, window_names: Iterable[str] = None, quantiles: Iterable[float] = (0.5, 0.95, 0.99),
+                 now: float = None) -> Dict[str, Dict[str, Any]]:
+        """Aggregate counters, sums and quantiles for the requested windows"""
+        now = now or time.time()
+        window_names = list(window_names or self.windows.keys())
+
+        # Read each resolution once for the longest requested window using it
+        spans = {}
+        for name in window_names:
+            window_seconds, resolution = self.windows[name]
+            spans[resolution] = max(spans.get(resolution, 0), window_seconds)
+
+        buckets_by_resolution = {}
+        for resolution, span in spans.items():
+            current = int(now // resolution) * resolution
+            starts = [current - i * resolution for i in range(span // resolution)]
+            keys = [self._bucket_key(resolution, start) for start in starts]
+            try:
+                buckets_by_resolution[resolution] = list(zip(starts, self.store.read(keys)))
+            except Exception as e:
+                logger.error(f"Rolling metrics read failed for '{self.namespace}': {e}")
+                buckets_by_resolution[resolution] = []
+
+        result = {}
+        for name in window_names:
+            window_seconds, resolution = self.windows[name]
+            cutoff = int(now // resolution) * resolution - window_seconds
+            counters = defaultdict(int)
+            sums = defaultdict(float)
+            sketches = {}
+
+            for start, bucket in buckets_by_resolution[resolution]:
+                if start <= cutoff:
+                    continue
+                for field, value in bucket.items():
+                    kind, _, rest = field.partition(':')
+                    if kind == 'c':
+                        counters[rest] += int(value)
+                    elif kind == 's':
+                        sums[rest] += value
+                    elif kind == 'q':
+                        metric, _, index = rest.rpartition(':')
+                        sketch = sketches.setdefault(metric, QuantileSketch(self.relative_accuracy))
+                        sketch.merge({int(index): int(value)})
+
+            result[name] = {
+                'window_seconds': window_seconds,
+                'counters': dict(counters),
+                'sums': dict(sums),
+                'quantiles': {
+                    metric: {f"p{int(q * 100)}": sketch.quantile(q) for q in quantiles}
+                    for metric, sketch in sketches.items()
+                }
+            }
+
+        return result
@@ -0,0 +1,230 @@
+"""
+Shared TTL Store
+Small key/value and expiring-set store shared by every worker through Redis,
+with a striped-lock in-process fallback for development and tests.
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+import logging
+
+# Try to import Redis, but don't fail if not available
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class _LocalTTLBackend:
+    """In-process backend; locks are striped by key so unrelated keys never contend"""
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._values = {}  # key -> (expires_at, value)
+        self._sets = {}  # key -> {member: expires_at}
+
+    def _lock(self, key: str) -> threading.Lock:
+        return self._locks[zlib.crc32(key.encode()) % len(self._locks)]
+
+    def set_value(self, key: str, value: str, ttl: int) -> None:
+        with self._lock(key):
+            self._values[key] = (time.time() + ttl, value)
+
+    def get_values(self, keys: List[str]) -> List[Optional[str]]:
+        now = time.time()
+        values = []
+        for key in keys:
+            with self._lock(key):
+                entry = self._values.get(key)
+                if entry and entry[0] < now:
+                    del self._values[key]
+                    entry = None
+            values.append(entry[1] if entry else None)
+        return values
+
+    def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            with self._lock(key):
+                self._values.pop(key, None)
+                self._sets.pop(key, None)
+
+    def incr(self, key: str, amount: int, ttl: int) -> int:
+        with self._lock(key):
+            entry = self._values.get(key)
+            current = int(entry[1]) if entry and entry[0] >= time.time() else 0
+            current += amount
+            self._values[key] = (time.time() + ttl, str(current))
+            return current
+
+    def incr_existing(self, key: str, amount: int) -> Optional[int]:
+        with self._lock(key):
+            entry = self._values.get(key)
+            if not entry or entry[0] < time.time():
+                return None
+            current = int(entry[1]) + amount
+            self._values[key] = (entry[0], str(current))
+            return current
+
+    def add_member(self, key: str, member: str, ttl: int) -> None:
+        with self._lock(key):
+            self._sets.setdefault(key, {})[member] = time.time() + ttl
+
+    def remove_member(self, key: str, member: str) -> None:
+        with self._lock(key):
+            members = self._sets.get(key)
+            if members is not None:
+                members.pop(member, None)
+                if not members:
+                    del self._sets[key]
+
+    def members(self, key: str) -> List[str]:
+        now = time.time()
+        with self._lock(key):
+            members = self._sets.get(key)
+            if not members:
+                return []
+            for member in [m for m, expires in members.items() if expires < now]:
+                del members[member]
+            if not members:
+                del self._sets[key]
+                return []
+            return list(members)
+
+    def purge_expired(self) -> None:
+        now = time.time()
+        for key in list(self._values.keys()):
+            with self._lock(key):
+                entry = self._values.get(key)
+                if entry and entry[0] < now:
+                    del self._values[key]
+        for key in list(self._sets.keys()):
+            self.members(key)
+
+
+class _RedisTTLBackend:
+    """Redis backend; expiring sets are sorted sets scored by expiry time"""
+
+    # INCRBY only when the key exists; INCRBY keeps the key's TTL
+    INCR_EXISTING = """
+        if redis.call('exists', KEYS[1]) == 1 then
+            return redis.call('incrby', KEYS[1], ARGV[1])
+        end
+        return false
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._incr_existing = client.register_script(self.INCR_EXISTING)
+
+    def set_value(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(key, value, ex=ttl)
+
+    def get_values(self, keys: List[str]) -> List[Optional[str]]:
+        return self.client.mget(keys) if keys else []
+
+    def delete(self, keys: List[str]) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+    def incr(self, key: str, amount: int, ttl: int) -> int:
+        pipe = self.client.pipeline()
+        pipe.incrby(key, amount)
+        pipe.expire(key, ttl)
+        return int(pipe.execute()[0])
+
+    def incr_existing(self, key: str, amount: int) -> Optional[int]:
+        result = self._incr_existing(keys=[key], args=[amount])
+        return int(result) if result is not None else None
+
+    def add_member(self, key: str, member: str, ttl: int) -> None:
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(key, {member: now + ttl})
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.expire(key, ttl + 60)
+        pipe.execute()
+
+    def remove_member(self, key: str, member: str) -> None:
+        self.client.zrem(key, member)
+
+    def members(self, key: str) -> List[str]:
+        return list(self.client.zrangebyscore(key, time.time(), '+inf'))
+
+    def purge_expired(self) -> None:
+        pass  # Redis expires keys and add_member trims expired members
+
+
+class SharedTTLStore:
+    """TTL key/value and expiring-set store, shared via Redis when reachable"""
+
+    def __init__(self, namespace: str, redis_url: str = None):
+        self.namespace = namespace
+        self.shared = False
+        self.backend = self._initialize_backend(redis_url)
+
+    def _initialize_backend(self, redis_url: str = None):
+        if REDIS_AVAILABLE:
+            try:
+                if redis_url is None:
+                    try:
+                        from flask import current_app
+                        redis_url = current_app.config.get('REDIS_URL', 'redis://localhost:6379/0')
+                    except RuntimeError:
+                        # Built at import, before any app context: read the same setting config does
+                        redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+                client = redis.from_url(redis_url, decode_responses=True,
+                                        socket_connect_timeout=2, socket_timeout=2)
+                client.ping()
+                self.shared = True
+                logger.info(f"Shared store '{self.namespace}' using Redis")
+                return _RedisTTLBackend(client)
+            except Exception as e:
+                logger.warning(f"Redis unavailable for shared store '{self.namespace}', using in-process store: {e}")
+        return _LocalTTLBackend()
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def set_json(self, key: str, value: Any, ttl: int) -> None:
+        self.backend.set_value(self._key(key), json.dumps(value, default=str), ttl)
+
+    def get_json(self, key: str) -> Any:
+        return self.get_many_json([key])[0]
+
+    def get_many_json(self, keys: List[str]) -> List[Any]:
+        raw = self.backend.get_values([self._key(key) for key in keys])
+        return [json.loads(value) if value is not None else None for value in raw]
+
+    def delete(self, *keys: str) -> None:
+        self.backend.delete([self._key(key) for key in keys])
+
+    def incr(self, key: str, amount: int = 1, ttl: int = 3600) -> int:
+        return self.backend.incr(self._key(key), amount, ttl)
+
+    def incr_existing(self, key: str, amount: int = 1) -> Optional[int]:
+        """Increment a live counter without touching its expiry; None if it is missing"""
+        return self.backend.incr_existing(self._key(key), amount)
+
+    def add_member(self, key: str, member: Any, ttl: int) -> None:
+        """Add (or refresh) a member that expires after ttl seconds"""
+        self.backend.add_member(self._key(key), str(member), ttl)
+
+    def remove_member(self, key: str, member: Any) -> None:
+        self.backend.remove_member(self._key(key), str(member))
+
+    def members(self, key: str) -> List[str]:
+        """Members of an expiring set that have not expired"""
+        return self.backend.members(self._key(key))
+
+    def purge_expired(self) -> None:
+        self.backend.purge_expired()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'namespace': self.namespace, 'shared': self.shared}
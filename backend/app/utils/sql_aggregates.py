@@ -0,0 +1,16 @@
+"""
+SQL Aggregate Helpers
+Conditional aggregates for single-pass statistics queries.
+"""
+
+from sqlalchemy import case, func
+
+
+def count_if(condition):
+    """SUM(CASE WHEN condition THEN 1 ELSE 0 END), portable across backends"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def sum_if(condition, value):
+    """SUM(CASE WHEN condition THEN value ELSE 0 END)"""
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
@@ -14,6 +14,22 @@ class Config:
     # Redis configuration
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
+    # Socket.IO message queue shared by all workers (e.g. redis://...);
+    # 'local' uses the in-process stand-in, unset means a single worker
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    
+    # File storage: 'local' (STORAGE_ROOT) or 's3' (any S3-compatible endpoint)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'local'
+    STORAGE_ROOT = os.environ.get('STORAGE_ROOT') or os.path.join(basedir, 'uploads', 'store')
+    STORAGE_S3_BUCKET = os.environ.get('STORAGE_S3_BUCKET')
+    STORAGE_S3_PREFIX = os.environ.get('STORAGE_S3_PREFIX') or ''
+    STORAGE_S3_ENDPOINT_URL = os.environ.get('STORAGE_S3_ENDPOINT_URL')
+    STORAGE_S3_REGION = os.environ.get('STORAGE_S3_REGION')
+    # Local downloads: '' streams through Flask (with Range support),
+    # 'x-sendfile' or 'x-accel-redirect' hands the file to the web server
+    STORAGE_SENDFILE = os.environ.get('STORAGE_SENDFILE') or ''
+    STORAGE_ACCEL_PREFIX = os.environ.get('STORAGE_ACCEL_PREFIX') or '/protected-files'
+    
     # Celery configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
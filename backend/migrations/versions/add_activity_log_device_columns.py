@@ -0,0 +1,28 @@
+"""Add normalized device columns to user_activity_logs
+
+Revision ID: add_activity_log_device_columns
+Revises: add_support_ticket_sentiment
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_activity_log_device_columns'
+down_revision = 'add_support_ticket_sentiment'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user_activity_logs', sa.Column('device_type', sa.String(length=50), nullable=True))
+    op.add_column('user_activity_logs', sa.Column('browser', sa.String(length=100), nullable=True))
+    op.add_column('user_activity_logs', sa.Column('os', sa.String(length=100), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user_activity_logs', 'os')
+    op.drop_column('user_activity_logs', 'browser')
+    op.drop_column('user_activity_logs', 'device_type')
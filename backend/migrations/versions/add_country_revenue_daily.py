@@ -0,0 +1,36 @@
+"""Add country_revenue_daily rollup and index orders.paid_at
+
+Revision ID: add_country_revenue_daily
+Revises: add_payment_lookup_indexes
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_country_revenue_daily'
+down_revision = 'add_payment_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'country_revenue_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('country', sa.String(length=100), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'country', name='uq_country_revenue_daily_day_country')
+    )
+    op.create_index('ix_orders_paid_at', 'orders', ['paid_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_orders_paid_at', table_name='orders')
+    op.drop_table('country_revenue_daily')
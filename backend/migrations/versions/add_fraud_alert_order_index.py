@@ -0,0 +1,23 @@
+"""Index fraud_alerts.order_id for idempotent batch re-scoring
+
+Revision ID: add_fraud_alert_order_index
+Revises: add_payment_search_indexes
+Create Date: 2026-10-21 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_fraud_alert_order_index'
+down_revision = 'add_payment_search_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_fraud_alerts_order_id', 'fraud_alerts', ['order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_fraud_alerts_order_id', table_name='fraud_alerts')
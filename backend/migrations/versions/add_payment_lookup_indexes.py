@@ -0,0 +1,25 @@
+"""Index orders.payment_intent_id and payments.order_id for payment success lookups
+
+Revision ID: add_payment_lookup_indexes
+Revises: add_activity_log_device_columns
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_payment_lookup_indexes'
+down_revision = 'add_activity_log_device_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_orders_payment_intent_id', 'orders', ['payment_intent_id'], unique=False)
+    op.create_index('ix_payments_order_id', 'payments', ['order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_payments_order_id', table_name='payments')
+    op.drop_index('ix_orders_payment_intent_id', table_name='orders')
@@ -0,0 +1,46 @@
+"""Index orders for payment search: email/name lookups, amount and creation date
+
+Revision ID: add_payment_search_indexes
+Revises: add_country_revenue_daily
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_payment_search_indexes'
+down_revision = 'add_country_revenue_daily'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    pattern_ops = ' text_pattern_ops' if is_postgres else ''
+
+    op.create_index('ix_orders_customer_email_lower', 'orders',
+                    [sa.text(f'lower(customer_email){pattern_ops}')], unique=False)
+    op.create_index('ix_orders_customer_name_lower', 'orders',
+                    [sa.text(f'lower(customer_name){pattern_ops}')], unique=False)
+    op.create_index('ix_orders_total_amount', 'orders', ['total_amount'], unique=False)
+    op.create_index('ix_orders_created_at', 'orders', ['created_at'], unique=False)
+
+    if is_postgres:
+        # Trigram indexes serve ILIKE '%fragment%' searches on partial emails and names
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_orders_customer_email_trgm '
+                   'ON orders USING gin (lower(customer_email) gin_trgm_ops)')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_orders_customer_name_trgm '
+                   'ON orders USING gin (lower(customer_name) gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_orders_customer_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_orders_customer_email_trgm')
+    op.drop_index('ix_orders_created_at', table_name='orders')
+    op.drop_index('ix_orders_total_amount', table_name='orders')
+    op.drop_index('ix_orders_customer_name_lower', table_name='orders')
+    op.drop_index('ix_orders_customer_email_lower', table_name='orders')
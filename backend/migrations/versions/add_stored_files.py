@@ -0,0 +1,48 @@
+"""Add content-addressed stored files
+
+Revision ID: add_stored_files
+Revises: add_support_ticket_sla_due_at
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_stored_files'
+down_revision = 'add_support_ticket_sla_due_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('storage_key', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('mime_type', sa.String(length=100), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stored_files_content_hash', 'stored_files', ['content_hash'], unique=True)
+
+    op.add_column('support_attachments', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_support_attachments_content_hash', 'support_attachments', ['content_hash'], unique=False)
+
+    op.add_column('user_profiles', sa.Column('avatar_content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_user_profiles_avatar_content_hash', 'user_profiles', ['avatar_content_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_profiles_avatar_content_hash', table_name='user_profiles')
+    op.drop_column('user_profiles', 'avatar_content_hash')
+
+    op.drop_index('ix_support_attachments_content_hash', table_name='support_attachments')
+    op.drop_column('support_attachments', 'content_hash')
+
+    op.drop_index('ix_stored_files_content_hash', table_name='stored_files')
+    op.drop_table('stored_files')
@@ -0,0 +1,30 @@
+"""Add sentiment tags to support_tickets
+
+Revision ID: add_support_ticket_sentiment
+Revises: add_avatar_variants
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_support_ticket_sentiment'
+down_revision = 'add_avatar_variants'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('support_tickets', sa.Column('sentiment', sa.String(length=20), nullable=True))
+    op.add_column('support_tickets', sa.Column('sentiment_urgency', sa.String(length=20), nullable=True))
+    op.add_column('support_tickets', sa.Column('sentiment_confidence', sa.Float(), nullable=True))
+    op.add_column('support_tickets', sa.Column('sentiment_tagged_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('support_tickets', 'sentiment_tagged_at')
+    op.drop_column('support_tickets', 'sentiment_confidence')
+    op.drop_column('support_tickets', 'sentiment_urgency')
+    op.drop_column('support_tickets', 'sentiment')
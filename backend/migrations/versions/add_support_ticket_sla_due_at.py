@@ -0,0 +1,77 @@
+"""Add sla_due_at to support_tickets
+
+Revision ID: add_support_ticket_sla_due_at
+Revises: create_user_referrals
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_support_ticket_sla_due_at'
+down_revision = 'create_user_referrals'
+branch_labels = None
+depends_on = None
+
+# Mirrors app.models.support.SLA_HOURS (enum names as stored in the table)
+SLA_HOURS = {'URGENT': 2, 'HIGH': 8, 'MEDIUM': 24, 'LOW': 72}
+DEFAULT_SLA_HOURS = 24
+SLA_STOPPED_STATUSES = ('RESOLVED', 'CLOSED')
+BATCH_SIZE = 1000
+
+support_tickets = sa.table(
+    'support_tickets',
+    sa.column('id', sa.Integer),
+    sa.column('status', sa.String),
+    sa.column('priority', sa.String),
+    sa.column('created_at', sa.DateTime),
+    sa.column('sla_due_at', sa.DateTime)
+)
+
+
+def backfill_sla_due_at(connection):
+    """Stream open tickets in id order and set their deadline batch by batch"""
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(support_tickets.c.id, support_tickets.c.priority, support_tickets.c.created_at)
+            .where(support_tickets.c.id > last_id)
+            .where(support_tickets.c.status.notin_(SLA_STOPPED_STATUSES))
+            .order_by(support_tickets.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        connection.execute(
+            support_tickets.update()
+            .where(support_tickets.c.id == sa.bindparam('ticket_id'))
+            .values(sla_due_at=sa.bindparam('due_at')),
+            [{
+                'ticket_id': ticket_id,
+                'due_at': (created_at or datetime.utcnow()) + timedelta(hours=SLA_HOURS.get(priority, DEFAULT_SLA_HOURS))
+            } for ticket_id, priority, created_at in rows]
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    op.add_column('support_tickets', sa.Column('sla_due_at', sa.DateTime(), nullable=True))
+
+    backfill_sla_due_at(op.get_bind())
+
+    # Partial index: resolved/closed tickets keep sla_due_at NULL and stay out of it
+    op.create_index(
+        'ix_support_tickets_open_sla_due_at', 'support_tickets', ['sla_due_at'], unique=False,
+        postgresql_where=sa.text('sla_due_at IS NOT NULL'),
+        sqlite_where=sa.text('sla_due_at IS NOT NULL')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_support_tickets_open_sla_due_at', table_name='support_tickets')
+    op.drop_column('support_tickets', 'sla_due_at')
@@ -0,0 +1,24 @@
+"""Add avatar_variants to user_profiles
+
+Revision ID: add_avatar_variants
+Revises: add_stored_files
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_avatar_variants'
+down_revision = 'add_stored_files'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user_profiles', sa.Column('avatar_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user_profiles', 'avatar_variants')
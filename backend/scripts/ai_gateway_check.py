@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Check of the AI gateway against a local fake LLM server.
+
+Starts an OpenAI-compatible /chat/completions stub on a random local port
+(configurable latency and failure mode, counts requests, connections and
+peak concurrency) and checks caching per ticket message set, coalescing of
+identical in-flight prompts, bounded concurrency, connection reuse,
+timeouts and the circuit breaker.
+
+Usage:
+    python scripts/ai_gateway_check.py
+    python scripts/ai_gateway_check.py --latency 0.5
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeLLM:
+    """State shared by the stub's request handlers"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.fail = False
+        self.requests = 0
+        self.connections = set()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.requests, self.peak = 0, 0
+            self.connections = set()
+
+
+def make_handler(llm):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is observable
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            with llm.lock:
+                llm.requests += 1
+                llm.connections.add(self.client_address)
+                llm.active += 1
+                llm.peak = max(llm.peak, llm.active)
+            try:
+                time.sleep(llm.latency)
+                if llm.fail:
+                    status, payload = 503, {'error': {'message': 'overloaded'}}
+                else:
+                    prompt = body['messages'][-1]['content']
+                    status, payload = 200, {'choices': [{'message': {'content': f"- echo {len(prompt)}"}}]}
+            finally:
+                with llm.lock:
+                    llm.active -= 1
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client gave up (timeout check)
+
+    return Handler
+
+
+def check(condition, message):
+    print(f"  {'ok ' if condition else 'FAIL'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def conversation(count):
+    return [{'message': f'message {index}', 'is_admin_reply': index % 2 == 1} for index in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the AI gateway against a local fake LLM server')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake server response time in seconds')
+    args = parser.parse_args()
+
+    llm = FakeLLM(args.latency)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(llm))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+    from app.services.ai_gateway import AIGateway
+    from app.services.ai_service import AIService
+
+    service = AIService()
+    service.openai_api_key = 'test-key'
+    service.gateway = AIGateway(api_key='test-key', base_url=base_url, max_concurrency=4,
+                                read_timeout=2.0, failure_threshold=3, reset_timeout=1.0)
+    gateway = service.gateway
+
+    print('\ncaching per ticket message set')
+    history = conversation(4)
+    first = service.generate_smart_replies('Login fails', history, ticket_id=1)
+    second = service.generate_smart_replies('Login fails', history, ticket_id=1)
+    check(first == second and llm.requests == 1, 'repeat view of a ticket served from cache')
+    service.summarize_ticket(history, ticket_id=1)
+    check(llm.requests == 2, 'summary cached separately from smart replies')
+    service.generate_smart_replies('Login fails', conversation(5), ticket_id=1)
+    check(llm.requests == 3, 'new message changes the key and calls the API again')
+    service.generate_smart_replies('Login fails', history, ticket_id=2)
+    check(llm.requests == 4, 'another ticket with the same messages has its own entry')
+
+    print('\ncoalescing identical in-flight prompts')
+    llm.reset()
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(lambda _: gateway.complete('same prompt'), range(20)))
+    check(len(set(results)) == 1 and results[0] is not None, '20 callers received the same result')
+    check(llm.requests == 1, f'one upstream call for 20 concurrent callers ({gateway.get_stats()["coalesced"]} coalesced)')
+
+    print('\nbounded concurrency and connection reuse')
+    llm.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda index: gateway.complete(f'distinct prompt {index}'), range(32)))
+    elapsed = time.perf_counter() - started
+    check(llm.requests == 32, '32 distinct prompts made 32 calls')
+    check(llm.peak <= gateway.max_concurrency, f'peak upstream concurrency {llm.peak} <= {gateway.max_concurrency}')
+    check(len(llm.connections) <= gateway.max_concurrency,
+          f'{len(llm.connections)} connections reused for 32 calls ({elapsed:.2f}s)')
+
+    print('\ntimeouts')
+    slow = AIGateway(api_key='test-key', base_url=base_url, read_timeout=0.1)
+    started = time.perf_counter()
+    check(slow.complete('slow prompt') is None, 'read timeout returns None')
+    check(time.perf_counter() - started < args.latency + 0.5, 'caller not held past the timeout')
+    slow.close()
+
+    print('\ncircuit breaker')
+    llm.reset()
+    llm.fail = True
+    for index in range(3):
+        gateway.complete(f'failing prompt {index}')
+    check(gateway.breaker.state == 'open', 'circuit opens after 3 consecutive failures')
+    requests_before = llm.requests
+    started = time.perf_counter()
+    check(gateway.complete('while open') is None, 'open circuit fails fast')
+    check(llm.requests == requests_before and time.perf_counter() - started < 0.05, 'no upstream call while open')
+    check(service.generate_smart_replies('Login fails', conversation(9), ticket_id=3) ==
+          service._get_default_suggestions(None), 'service falls back to default suggestions')
+    llm.fail = False
+    time.sleep(gateway.breaker.reset_timeout)
+    check(gateway.complete('after cool-down') is not None, 'trial call after cool-down succeeds')
+    check(gateway.breaker.state == 'closed', 'circuit closes again')
+
+    print(f"\n{gateway.get_stats()}")
+    gateway.close()
+    server.shutdown()
+    print('\nall checks passed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark for avatar thumbnail generation.
+
+Generates synthetic source photos (JPEG and PNG at several resolutions),
+runs render_avatar_variants on each and reports per-image processing time,
+output sizes and throughput of the thread pool used by the avatar pipeline.
+
+Usage:
+    python scripts/benchmark_avatar_pipeline.py
+    python scripts/benchmark_avatar_pipeline.py --images 200 --workers 4
+"""
+
+import sys
+import os
+import io
+import time
+import random
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.avatar_pipeline import render_avatar_variants, AVATAR_SIZES, PIL_AVAILABLE
+
+SOURCES = [('JPEG', 640, 480), ('JPEG', 1920, 1080), ('JPEG', 4032, 3024), ('PNG', 1024, 1024)]
+
+
+def make_source(image_format, width, height, rng):
+    """Noisy gradient photo with EXIF, so decoding and metadata stripping do real work"""
+    from PIL import Image
+
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.effect_noise((width, height), rng.uniform(20, 60)).convert('RGB')
+    image = Image.blend(image, noise, 0.5)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # orientation: rotate 90
+    exif[0x010F] = 'Benchmark Camera'
+    output = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(output, 'JPEG', quality=90, exif=exif)
+    else:
+        image.save(output, 'PNG', exif=exif)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark avatar thumbnail generation')
+    parser.add_argument('--images', type=int, default=40, help='Images per source resolution')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    if not PIL_AVAILABLE:
+        print("Pillow is required: pip install Pillow")
+        return
+
+    rng = random.Random(7)
+    print(f"\nVariants {', '.join(f'{size}px' for size in AVATAR_SIZES)}  ({args.images} images per source)")
+    print(f"{'source':<22} {'input':>9} {'p50':>9} {'p95':>9} {'output':>9}")
+
+    for image_format, width, height in SOURCES:
+        source = make_source(image_format, width, height, rng)
+        timings, output_bytes = [], 0
+        for _ in range(args.images):
+            started = time.perf_counter()
+            variants = render_avatar_variants(source)
+            timings.append(time.perf_counter() - started)
+            output_bytes = sum(len(data) for data in variants.values())
+        timings.sort()
+        print(f"{image_format + f' {width}x{height}':<22} {len(source) / 1024:>8.0f}K "
+              f"{statistics.median(timings) * 1000:>7.1f}ms {timings[int(0.95 * (len(timings) - 1))] * 1000:>7.1f}ms "
+              f"{output_bytes / 1024:>8.1f}K")
+
+    # Pool throughput on a mixed workload
+    sources = [make_source(*SOURCES[index % len(SOURCES)], rng) for index in range(len(SOURCES))]
+    workload = [sources[index % len(sources)] for index in range(args.images * len(SOURCES))]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(render_avatar_variants, workload))
+    elapsed = time.perf_counter() - started
+    print(f"\npool of {args.workers}: {len(workload)} images in {elapsed:.2f}s ({len(workload) / elapsed:.1f} images/s)")
+
+
+if __name__ == '__main__':
+    main()
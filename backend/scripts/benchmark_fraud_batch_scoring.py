@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark for batch fraud re-scoring.
+
+Measures orders/second for:
+  1. Pure feature scoring (no database) inline and across a process pool
+  2. End-to-end streaming + scoring + bulk alert writes against a
+     throwaway SQLite database (pass --db)
+
+Usage:
+    python scripts/benchmark_fraud_batch_scoring.py --orders 50000 --workers 1 2 4
+    python scripts/benchmark_fraud_batch_scoring.py --orders 20000 --db
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'tempmail.com', 'example.org']
+BINS = [None, '424242', '510510', '411111', '371449', '601100']
+
+
+def make_feature_chunks(total, chunk_size):
+    """Generate synthetic columnar feature chunks"""
+    rng = random.Random(42)
+    chunks = []
+    for start in range(0, total, chunk_size):
+        size = min(chunk_size, total - start)
+        emails = [f"user{rng.randint(1, total // 3)}@{rng.choice(DOMAINS)}" for _ in range(size)]
+        chunks.append({
+            'order_id': list(range(start, start + size)),
+            'email': emails,
+            'email_domain': [email.split('@')[-1] for email in emails],
+            'ip_class': [rng.choice(['public', 'public', 'private', 'missing', 'vpn_proxy']) for _ in range(size)],
+            'card_bin': [rng.choice(BINS) for _ in range(size)],
+            'email_velocity': [rng.randint(1, 8) for _ in range(size)],
+            'ip_velocity': [rng.randint(1, 14) for _ in range(size)],
+            'amount': [rng.choice([29.0, 49.99, 100.0, 299.0, 12000.0]) for _ in range(size)]
+        })
+    return chunks
+
+
+def bench_scoring(total, chunk_size, worker_counts):
+    """Benchmark the pure scoring stage"""
+    from concurrent.futures import ProcessPoolExecutor
+    from app.services.fraud_batch_scoring_service import score_feature_chunk
+
+    chunks = make_feature_chunks(total, chunk_size)
+    print(f"\nScoring only: {total} orders, chunk size {chunk_size}")
+    print(f"{'workers':>8} {'seconds':>10} {'orders/s':>12}")
+
+    for workers in worker_counts:
+        started = time.perf_counter()
+        if workers == 1:
+            scored = sum(len(score_feature_chunk(chunk)) for chunk in chunks)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                scored = sum(len(result) for result in executor.map(score_feature_chunk, chunks))
+        elapsed = time.perf_counter() - started
+        print(f"{workers:>8} {elapsed:>10.3f} {scored / elapsed:>12.0f}")
+
+
+def bench_end_to_end(total, chunk_size, worker_counts):
+    """Benchmark streaming, scoring and bulk persistence against SQLite"""
+    from app import create_app, db
+    from app.models.payment import Order
+    from app.services.fraud_batch_scoring_service import fraud_batch_scoring_service
+
+    app = create_app('testing')
+    rng = random.Random(7)
+
+    with app.app_context():
+        db.create_all()
+
+        now = datetime.utcnow()
+        rows = []
+        for i in range(total):
+            domain = rng.choice(DOMAINS)
+            rows.append({
+                'order_number': f'BENCH-{i:08d}',
+                'customer_email': f'user{rng.randint(1, total // 3)}@{domain}',
+                'customer_name': 'Bench User',
+                'total_amount': rng.choice([29.0, 49.99, 100.0, 299.0, 12000.0]),
+                'status': 'paid',
+                'payment_status': 'paid',
+                'created_at': now - timedelta(seconds=rng.randint(0, 89 * 86400)),
+                'order_metadata': {'ip_address': f'203.0.113.{rng.randint(1, 40)}', 'card_bin': rng.choice(BINS)}
+            })
+        db.session.bulk_insert_mappings(Order, rows)
+        db.session.commit()
+
+        print(f"\nEnd to end (SQLite): {total} orders, chunk size {chunk_size}")
+        print(f"{'workers':>8} {'seconds':>10} {'orders/s':>12} {'alerts':>8}")
+        for workers in worker_counts:
+            summary = fraud_batch_scoring_service.score_historical_orders(
+                days=90, chunk_size=chunk_size, workers=workers, persist=True
+            )
+            print(f"{workers:>8} {summary['elapsed_seconds']:>10.3f} "
+                  f"{summary['orders_per_second']:>12.0f} {summary['alerts_created']:>8}")
+
+        db.session.remove()
+        db.drop_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch fraud scoring throughput')
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--db', action='store_true', help='Also run the end-to-end SQLite benchmark')
+    args = parser.parse_args()
+
+    # The testing config reads its database URL at import time
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.environ['TEST_DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    try:
+        bench_scoring(args.orders, args.chunk_size, args.workers)
+        if args.db:
+            bench_end_to_end(args.orders, args.chunk_size, args.workers)
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
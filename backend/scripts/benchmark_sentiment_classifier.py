@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the local sentiment classifier.
+
+Builds a synthetic corpus of support messages (short questions, complaints,
+angry and frustrated follow-ups, thank-you notes, long neutral messages),
+classifies it one message at a time and in batches, and reports per-message
+latency, label distribution and the share of messages that would be sent to
+the remote model at the configured confidence threshold.
+
+Usage:
+    python scripts/benchmark_sentiment_classifier.py
+    python scripts/benchmark_sentiment_classifier.py --messages 50000 --threshold 0.6
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import statistics
+from collections import Counter
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.sentiment_classifier import sentiment_classifier
+
+OPENERS = ['Hi,', 'Hello team,', 'Hey', '', 'Good morning,']
+BODIES = [
+    'how do I export my trade journal to CSV?',
+    'the dashboard is not working since the last update and I get an error when I open my trades.',
+    'this is RIDICULOUS!!! I was charged twice and nobody answers. I want a refund now.',
+    'still waiting for a reply, this is the third time I ask about the broken import.',
+    'thanks so much, that fixed it! Great support as always.',
+    'URGENT: I am locked out of my account and cannot access my data before the market opens.',
+    'could you tell me whether the yearly plan includes priority support and the analytics add-on, '
+    'and if I can switch plans in the middle of the billing period without losing my saved layouts?',
+    'it is not bad, but the charts are a bit slow sometimes when I load a full year of data.',
+]
+CLOSERS = ['Thanks', 'Regards', '', 'Please help', 'Cheers']
+
+
+def corpus(count, rng):
+    return [f"{rng.choice(OPENERS)} {rng.choice(BODIES)} {rng.choice(CLOSERS)}".strip() for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the local sentiment classifier')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--threshold', type=float, default=0.6, help='Remote second-tier confidence threshold')
+    args = parser.parse_args()
+
+    messages = corpus(args.messages, random.Random(11))
+
+    timings = []
+    for message in messages:
+        started = time.perf_counter()
+        sentiment_classifier.classify(message)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"\nsingle messages ({len(messages)})")
+    print(f"  p50 {statistics.median(timings) * 1e6:.0f}us  p95 {timings[int(0.95 * (len(timings) - 1))] * 1e6:.0f}us  "
+          f"max {timings[-1] * 1e6:.0f}us")
+
+    started = time.perf_counter()
+    results = []
+    for offset in range(0, len(messages), args.batch_size):
+        results.extend(sentiment_classifier.classify_many(messages[offset:offset + args.batch_size]))
+    elapsed = time.perf_counter() - started
+    print(f"\nbatches of {args.batch_size}")
+    print(f"  {len(messages) / elapsed:,.0f} messages/s ({elapsed / len(messages) * 1e6:.0f}us per message)")
+
+    labels = Counter(result['sentiment'] for result in results)
+    urgency = Counter(result['urgency'] for result in results)
+    remote = sum(1 for result in results if result['confidence'] < args.threshold)
+    print(f"\nsentiment  {dict(labels)}")
+    print(f"urgency    {dict(urgency)}")
+    print(f"second tier at confidence < {args.threshold}: {remote / len(results):.1%} of messages")
+
+
+if __name__ == '__main__':
+    main()
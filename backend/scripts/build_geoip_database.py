@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Build the offline GeoIP database from a CSV range export.
+
+Supported inputs (IPv4 and IPv6 rows may be mixed):
+    dbip         ip_start,ip_end,continent,country_code,region,city,latitude,longitude
+                 (DB-IP "IP to City Lite")
+    ip2location  ip_from,ip_to,country_code,country_name,region,city,latitude,longitude
+                 (IP2Location LITE DB5; integer or dotted addresses)
+
+The output replaces the target atomically; running services reload it on
+their next check. Point GEOIP_DATABASE_PATH at it.
+
+Usage:
+    python scripts/build_geoip_database.py dbip-city-lite.csv instance/geoip.bin
+    python scripts/build_geoip_database.py IP2LOCATION-LITE-DB5.CSV instance/geoip.bin --format ip2location
+    python scripts/build_geoip_database.py dbip-city-lite.csv instance/geoip.bin --benchmark 100000
+"""
+
+import sys
+import os
+import csv
+import time
+import random
+import argparse
+import ipaddress
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.geoip_service import GeoIPService, RangeDatabase, write_database
+
+# Column positions: start, end, country code, country name, region, city, latitude, longitude
+FORMATS = {
+    'dbip': (0, 1, 3, None, 4, 5, 6, 7),
+    'ip2location': (0, 1, 2, 3, 4, 5, 6, 7),
+}
+
+
+def parse_address(value):
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        address = ipaddress.IPv4Address(number) if number <= 0xFFFFFFFF else ipaddress.IPv6Address(number)
+    else:
+        address = ipaddress.ip_address(value)
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+def read_ranges(path, columns):
+    start, end, code, country, region, city, latitude, longitude = columns
+
+    def field(row, index):
+        if index is None or index >= len(row):
+            return ''
+        value = row[index].strip()
+        return '' if value == '-' else value
+
+    with open(path, newline='', encoding='utf-8') as handle:
+        for row in csv.reader(handle):
+            if not row or not row[start].strip() or row[start].strip().lower() in ('ip_start', 'ip_from'):
+                continue
+            first, last = parse_address(row[start]), parse_address(row[end])
+            if first.version != last.version:
+                continue  # ranges spanning the mapped IPv4 block and native IPv6
+            yield (first, last, field(row, code), field(row, country), field(row, region), field(row, city),
+                   field(row, latitude), field(row, longitude))
+
+
+def benchmark(path, count):
+    database = RangeDatabase(path)
+    addresses = [ipaddress.IPv4Address(random.getrandbits(32)) for _ in range(count)]
+    packed = [address.packed for address in addresses]
+    started = time.perf_counter()
+    found = sum(1 for key in packed if database.lookup(key))
+    elapsed = time.perf_counter() - started
+    print(f"range search: {count} random IPv4 lookups, {found} located, {elapsed / count * 1e6:.1f}us each")
+
+    service = GeoIPService(path=path)
+    strings = [str(address) for address in addresses[:1000]] * (count // 1000 or 1)
+    started = time.perf_counter()
+    for address in strings:
+        service.lookup(address)
+    elapsed = time.perf_counter() - started
+    print(f"service with memo (1000 distinct IPs): {elapsed / len(strings) * 1e6:.1f}us each, {service.get_stats()}")
+    database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the offline GeoIP range database from CSV')
+    parser.add_argument('source', help='CSV range export')
+    parser.add_argument('output', help='Database file to write (GEOIP_DATABASE_PATH)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='dbip')
+    parser.add_argument('--benchmark', type=int, default=0, metavar='N', help='Time N random lookups afterwards')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = write_database(read_ranges(args.source, FORMATS[args.format]), args.output)
+    elapsed = time.perf_counter() - started
+    print(f"wrote {args.output}: {result['ipv4_ranges']} IPv4 and {result['ipv6_ranges']} IPv6 ranges, "
+          f"{result['records']} locations, {result['bytes'] / 1024 / 1024:.1f} MiB in {elapsed:.1f}s")
+
+    if args.benchmark:
+        benchmark(args.output, args.benchmark)
+
+
+if __name__ == '__main__':
+    main()
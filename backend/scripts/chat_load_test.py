@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Load test for the real-time support chat.
+
+Two modes:
+  inprocess  Creates the app against a throwaway SQLite database and drives
+             the chat handlers through Flask-SocketIO test clients. Measures
+             connect rate, typing event throughput and room fan-out cost of
+             the service itself (presence and typing in the shared store).
+  network    Opens real Socket.IO connections against a running deployment
+             (e.g. several workers behind a load balancer sharing a message
+             queue). Needs the async client extras: pip install aiohttp.
+             With --token/--ticket-id/--user-id the clients authenticate, join
+             the ticket room and measure typing broadcast latency end to end.
+
+Usage:
+    python scripts/chat_load_test.py --clients 10000
+    python scripts/chat_load_test.py --mode network --url http://localhost:5000 \\
+        --clients 10000 --token <jwt> --ticket-id 1 --user-id 1
+"""
+
+import sys
+import os
+import time
+import argparse
+import asyncio
+import tempfile
+import importlib.util
+import statistics
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(title, count, elapsed, latencies=None):
+    line = f"{title:<28} {count:>8} in {elapsed:>7.2f}s  {count / elapsed if elapsed else 0:>10.0f}/s"
+    if latencies:
+        line += (f"  p50 {percentile(latencies, 0.5) * 1000:.2f}ms"
+                 f"  p95 {percentile(latencies, 0.95) * 1000:.2f}ms"
+                 f"  p99 {percentile(latencies, 0.99) * 1000:.2f}ms")
+    print(line)
+
+
+def run_inprocess(clients, tickets, events):
+    """Drive the chat handlers through in-process test clients"""
+    from app import create_app, socketio
+    from app.services.realtime_chat_service import realtime_chat_service
+
+    app = create_app('testing')
+    if app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        print("In-process mode needs SOCKETIO_MESSAGE_QUEUE unset (test clients cannot use a queue)")
+        return
+
+    print(f"\nIn-process: {clients} clients over {tickets} tickets "
+          f"(shared store: {'redis' if realtime_chat_service.store.shared else 'in-process'})")
+
+    started = time.perf_counter()
+    test_clients = [socketio.test_client(app) for _ in range(clients)]
+    report('connect', clients, time.perf_counter() - started)
+
+    # Place clients in ticket rooms directly; joining normally needs ticket rows
+    sids = list(realtime_chat_service.connected_clients)
+    for index, sid in enumerate(sids):
+        ticket_id = index % tickets + 1
+        socketio.server.enter_room(sid, f'ticket_{ticket_id}')
+        client_info = realtime_chat_service.connected_clients[sid]
+        client_info['ticket_rooms'].add(ticket_id)
+        realtime_chat_service.store.add_member(f"ticket:{ticket_id}:clients", sid,
+                                               realtime_chat_service.presence_ttl)
+
+    latencies = []
+    started = time.perf_counter()
+    for index in range(events):
+        client = test_clients[index % clients]
+        ticket_id = index % tickets + 1
+        sent = time.perf_counter()
+        client.emit('typing_start', {'ticket_id': ticket_id, 'user_id': index % clients + 1, 'user_name': 'Load'})
+        latencies.append(time.perf_counter() - sent)
+    report('typing_start (fan-out)', events, time.perf_counter() - started, latencies)
+
+    latencies = []
+    started = time.perf_counter()
+    for ticket_id in range(1, tickets + 1):
+        sent = time.perf_counter()
+        realtime_chat_service.broadcast_new_message(ticket_id, {'id': f'load-{ticket_id}', 'message': 'hello'})
+        latencies.append(time.perf_counter() - sent)
+    report('broadcast_new_message', tickets, time.perf_counter() - started, latencies)
+
+    started = time.perf_counter()
+    for ticket_id in range(1, tickets + 1):
+        realtime_chat_service.get_connected_users(ticket_id)
+        realtime_chat_service.get_typing_users(ticket_id)
+    report('presence + typing reads', tickets * 2, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    realtime_chat_service.cleanup_stale_connections()
+    report('presence refresh', clients, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for client in test_clients:
+        client.get_received()
+        client.disconnect()
+    report('disconnect', clients, time.perf_counter() - started)
+    realtime_chat_service.stop()
+
+
+async def run_network(url, clients, concurrency, duration, token, ticket_id, user_id):
+    """Open real connections and measure connect and typing broadcast latency"""
+    try:
+        import socketio
+    except ImportError:
+        print("Network mode requires python-socketio: pip install python-socketio")
+        return
+    # The async client's transport is aiohttp; check up front rather than on the first connect
+    if importlib.util.find_spec('aiohttp') is None:
+        print("Network mode requires aiohttp: pip install aiohttp")
+        return
+
+    connect_latencies = []
+    typing_latencies = []
+    failures = 0
+    gate = asyncio.Semaphore(concurrency)
+    sockets = []
+
+    async def open_client(index):
+        nonlocal failures
+        sio = socketio.AsyncClient(reconnection=False)
+
+        @sio.on('user_typing')
+        async def on_typing(data):
+            # user_name carries the sender's send time
+            try:
+                typing_latencies.append(time.time() - float(data.get('user_name')))
+            except (TypeError, ValueError):
+                pass
+
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await sio.connect(url, transports=['websocket'], wait_timeout=30)
+                connect_latencies.append(time.perf_counter() - started)
+                if token and ticket_id and user_id:
+                    await sio.emit('chat_authenticate', {'token': token})
+                    await sio.emit('join_ticket_chat', {'ticket_id': ticket_id, 'user_id': user_id})
+                sockets.append(sio)
+            except Exception:
+                failures += 1
+
+    print(f"\nNetwork: {clients} clients against {url} (concurrency {concurrency})")
+    started = time.perf_counter()
+    await asyncio.gather(*(open_client(index) for index in range(clients)))
+    report('connect', len(connect_latencies), time.perf_counter() - started, connect_latencies)
+    if failures:
+        print(f"{'connect failures':<28} {failures:>8}")
+
+    if sockets and token and ticket_id and user_id:
+        sent = 0
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        while time.perf_counter() < deadline:
+            sio = sockets[sent % len(sockets)]
+            await sio.emit('typing_start', {'ticket_id': ticket_id, 'user_id': user_id,
+                                            'user_name': repr(time.time())})
+            sent += 1
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(2)  # let in-flight broadcasts arrive
+        report('typing_start sent', sent, time.perf_counter() - started)
+        report('user_typing received', len(typing_latencies), time.perf_counter() - started, typing_latencies)
+    else:
+        await asyncio.sleep(duration)
+
+    await asyncio.gather(*(sio.disconnect() for sio in sockets), return_exceptions=True)
+    if connect_latencies:
+        print(f"{'mean connect':<28} {statistics.mean(connect_latencies) * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the real-time support chat')
+    parser.add_argument('--mode', choices=['inprocess', 'network'], default='inprocess')
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--tickets', type=int, default=500, help='In-process: tickets to spread clients over')
+    parser.add_argument('--events', type=int, default=20000, help='In-process: typing events to send')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=200, help='Network: connections opened at once')
+    parser.add_argument('--duration', type=float, default=10.0, help='Network: seconds to send typing events')
+    parser.add_argument('--token')
+    parser.add_argument('--ticket-id', type=int)
+    parser.add_argument('--user-id', type=int)
+    args = parser.parse_args()
+
+    if args.mode == 'network':
+        asyncio.run(run_network(args.url, args.clients, args.concurrency, args.duration,
+                                args.token, args.ticket_id, args.user_id))
+        return
+
+    # The testing config reads its database URL at import time
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.environ['TEST_DATABASE_URL'] = f'sqlite:///{db_path}'
+    try:
+        run_inprocess(args.clients, args.tickets, args.events)
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
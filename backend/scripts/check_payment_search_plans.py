@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN every kind of payment search and fail if one scans the whole orders
+table.
+
+Each sample search is built with payment_search_service.build_query and
+explained with sequential scans disabled, so a sequential scan in the plan
+means no index can serve the predicate at all, however small the table. An
+index scan without an index condition (walking created_at for the ORDER BY
+and filtering every row) counts as a full scan too. Searches on several
+criteria read orders twice, once in the driving predicate's candidate CTE
+and once by primary key to join the candidates, and both reads must be
+index lookups. On SQLite, EXPLAIN QUERY
+PLAN is checked instead and the LIKE searches, which need PostgreSQL's
+pattern-ops and pg_trgm indexes, are skipped. Exits non-zero if any plan
+scans orders.
+
+Usage:
+    python scripts/check_payment_search_plans.py
+    python scripts/check_payment_search_plans.py --config testing
+"""
+
+import sys
+import os
+import argparse
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.services.payment_search_service import payment_search_service
+
+# (label, criteria, only indexable on PostgreSQL)
+SAMPLE_SEARCHES = [
+    ('order number', {'order_number': 'ORD-20240101-0001'}, False),
+    ('payment intent', {'payment_intent_id': 'pi_3Nc9aL2eZvKYlo2C1abcdef'}, False),
+    ('full email', {'email': 'Customer@Example.com'}, False),
+    ('email prefix', {'email': 'cu'}, True),
+    ('email fragment', {'email': 'example'}, True),
+    ('name fragment', {'name': 'smith'}, True),
+    ('amount', {'amount': '49.99'}, False),
+    ('date range', {'date_from': '2024-01-01', 'date_to': '2024-01-31'}, False),
+    ('email and amount', {'email': 'customer@example.com', 'amount': '49.99'}, False),
+    ('intent and dates', {'payment_intent_id': 'pi_test', 'date_from': '2024-01-01'}, False),
+]
+
+
+def _driver_params(compiled):
+    if compiled.positional:
+        return tuple(compiled.params[name] for name in compiled.positiontup)
+    return compiled.params
+
+
+def _postgres_scans(connection, sql, params):
+    """Relations read in full: a Seq Scan, or an index scan with no index condition"""
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {sql}', params).scalar()
+    scans, nodes = [], [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        node_type = node.get('Node Type')
+        if node_type == 'Seq Scan' or (node_type in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node):
+            scans.append(node.get('Relation Name'))
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+def _sqlite_scans(connection, sql, params):
+    """Tables read in full (SCAN rather than an indexed SEARCH) in the query plan"""
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', params).all()
+    return [row[-1].split()[1] for row in rows if row[-1].startswith('SCAN ')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that payment searches are served by indexes')
+    parser.add_argument('--config', default=None, help='App config name, e.g. testing')
+    args = parser.parse_args()
+
+    app = create_app(args.config) if args.config else create_app()
+    failures = 0
+    with app.app_context():
+        dialect = db.engine.dialect
+        is_postgres = dialect.name == 'postgresql'
+        if not is_postgres and dialect.name != 'sqlite':
+            print(f"Unsupported database {dialect.name}; run against PostgreSQL or SQLite")
+            sys.exit(2)
+
+        for label, criteria, postgres_only in SAMPLE_SEARCHES:
+            query, predicates = payment_search_service.build_query(criteria)
+            plan = ', '.join(predicate.name for predicate in predicates)
+            if postgres_only and not is_postgres:
+                print(f"{label:<18} [{plan}] -> skipped (PostgreSQL only)")
+                continue
+
+            compiled = query.statement.compile(dialect=dialect)
+            connection = db.session.connection()
+            try:
+                if is_postgres:
+                    scans = _postgres_scans(connection, str(compiled), _driver_params(compiled))
+                else:
+                    scans = _sqlite_scans(connection, str(compiled), _driver_params(compiled))
+            finally:
+                db.session.rollback()
+
+            if 'orders' in scans:
+                failures += 1
+                print(f"{label:<18} [{plan}] -> FAILED: full scan of orders")
+            else:
+                print(f"{label:<18} [{plan}] -> OK")
+
+    print(f"{failures} of {len(SAMPLE_SEARCHES)} searches scan orders" if failures else "All searches use indexes")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Fire thousands of parallel redemptions at one promotion and one affiliate
+coupon, and check that neither is used past its limit.
+
+Each attempt runs in its own application context and transaction, as a
+checkout request would. The script creates a throwaway promotion, coupon
+and affiliate, checks counters and affiliate metrics afterwards, removes
+them, and exits non-zero if any count is off. Run it against PostgreSQL to
+exercise real row locking.
+
+Usage:
+    python scripts/check_redemption_concurrency.py
+    python scripts/check_redemption_concurrency.py --redemptions 5000 --limit 1000 --workers 64
+"""
+
+import sys
+import os
+import time
+import uuid
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.affiliate import Affiliate
+from app.models.coupon import Coupon
+from app.models.promotion import Promotion
+from app.services.coupon_redemption_service import coupon_redemption_service
+
+
+def hammer(app, redeem, count, workers):
+    """Run `count` redemptions across `workers` threads; returns (redeemed, errors, seconds)"""
+    def attempt(_):
+        with app.app_context():
+            try:
+                redeemed = redeem()
+                db.session.commit()
+                return 'redeemed' if redeemed else 'refused'
+            except Exception:
+                db.session.rollback()
+                return 'error'
+            finally:
+                db.session.remove()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(attempt, range(count)))
+    return outcomes.count('redeemed'), outcomes.count('error'), time.perf_counter() - started
+
+
+def check(name, redeemed, errors, stored, limit, attempts, elapsed):
+    expected = min(limit, attempts - errors)
+    ok = redeemed == stored and redeemed <= limit and (errors or redeemed == expected)
+    print(f"{name}: {attempts} attempts in {elapsed:.2f}s, {redeemed} redeemed, {errors} errors, "
+          f"stored count {stored}, limit {limit} -> {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check promotion and coupon limits under concurrent redemption')
+    parser.add_argument('--redemptions', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--config', default=None, help='App config name, e.g. testing')
+    args = parser.parse_args()
+
+    app = create_app(args.config) if args.config else create_app()
+    suffix = uuid.uuid4().hex[:8].upper()
+    with app.app_context():
+        affiliate = Affiliate(name=f'Concurrency {suffix}', email=f'concurrency-{suffix.lower()}@example.com')
+        db.session.add(affiliate)
+        db.session.flush()
+        promotion = Promotion(name=f'Concurrency {suffix}', code=f'CONC{suffix}', value=10, usage_limit=args.limit)
+        coupon = Coupon(code=f'CONCAFF{suffix}', discount_percent=10, max_uses=args.limit, is_affiliate_code=True,
+                        affiliate_id=affiliate.id, affiliate_commission_percent=20)
+        db.session.add_all([promotion, coupon])
+        db.session.commit()
+        promotion_id, coupon_id, affiliate_id = promotion.id, coupon.id, affiliate.id
+
+    ok = True
+    try:
+        redeemed, errors, elapsed = hammer(
+            app, lambda: coupon_redemption_service.redeem_promotion(promotion_id, 10)[0], args.redemptions, args.workers)
+        with app.app_context():
+            stored = db.session.get(Promotion, promotion_id)
+            ok &= check('promotion', redeemed, errors, stored.usage_count, args.limit, args.redemptions, elapsed)
+            ok &= stored.conversions == stored.usage_count and float(stored.revenue) == 10 * stored.usage_count
+            print(f"promotion status after the run: {stored.status}")
+
+        redeemed, errors, elapsed = hammer(
+            app, lambda: coupon_redemption_service.redeem_coupon(coupon_id), args.redemptions, args.workers)
+        with app.app_context():
+            stored = db.session.get(Coupon, coupon_id)
+            ok &= check('affiliate coupon', redeemed, errors, stored.used_count, args.limit, args.redemptions, elapsed)
+
+            # Conversions for half the referrals, then wait for the background recalculation
+            conversions = stored.used_count // 2
+            for _ in range(conversions):
+                coupon_redemption_service.record_conversion(affiliate_id, 2.0)
+            db.session.commit()
+            time.sleep(coupon_redemption_service.metrics.delay + 1)
+            db.session.expire_all()
+            stored_affiliate = db.session.get(Affiliate, affiliate_id)
+            expected_rate = round(conversions / stored.used_count * 100, 1) if stored.used_count else 0.0
+            metrics_ok = (stored_affiliate.referrals == stored.used_count and stored_affiliate.conversions == conversions
+                          and abs(stored_affiliate.conversion_rate - expected_rate) < 0.05)
+            print(f"affiliate: {stored_affiliate.referrals} referrals, {stored_affiliate.conversions} conversions, "
+                  f"rate {stored_affiliate.conversion_rate}% ({stored_affiliate.performance}) -> "
+                  f"{'OK' if metrics_ok else 'FAILED'}")
+            ok &= metrics_ok
+            print(f"redemption stats: {coupon_redemption_service.get_stats()}")
+    finally:
+        with app.app_context():
+            Coupon.query.filter_by(id=coupon_id).delete()
+            Promotion.query.filter_by(id=promotion_id).delete()
+            Affiliate.query.filter_by(id=affiliate_id).delete()
+            db.session.commit()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
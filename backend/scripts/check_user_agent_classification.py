@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Classify a set of known user agents and fail if any comes out wrong.
+
+Covers the usual browsers and crawlers plus the cases that have been
+misread before, such as handsets whose model name ends in "bot"
+(CUBOT) being taken for crawlers. No database is needed.
+
+Usage:
+    python scripts/check_user_agent_classification.py
+"""
+
+import sys
+import os
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.user_agent_service import user_agent_service
+
+# (user agent, expected device_type, expected browser)
+SAMPLE_USER_AGENTS = [
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Safari/537.36', 'desktop', 'Chrome'),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.1 Safari/605.1.15', 'desktop', 'Safari'),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.1 Mobile/15E148 Safari/604.1', 'mobile', 'Safari'),
+    ('Mozilla/5.0 (Linux; Android 10; CUBOT X30) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/120.0.0.0 Mobile Safari/537.36', 'mobile', 'Chrome'),
+    ('Mozilla/5.0 (Linux; Android 11; KINGKONG 5 Pro Build/CUBOT) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/119.0.0.0 Mobile Safari/537.36', 'mobile', 'Chrome'),
+    ('Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)', 'bot', 'Googlebot'),
+    ('Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)', 'bot', 'bingbot'),
+    ('Mozilla/5.0 (compatible; Baiduspider/2.0; +http://www.baidu.com/search/spider.html)', 'bot', 'Baiduspider'),
+    ('Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)', 'bot', 'Slackbot'),
+    ('Twitterbot/1.0', 'bot', 'Twitterbot'),
+    ('curl/8.4.0', 'bot', 'curl'),
+    ('python-requests/2.31.0', 'bot', 'python-requests'),
+]
+
+
+def main():
+    failures = 0
+    for user_agent, device_type, browser in SAMPLE_USER_AGENTS:
+        info = user_agent_service.classify(user_agent)
+        ok = info.device_type == device_type and info.browser == browser
+        failures += not ok
+        status = 'OK' if ok else f'FAILED: got {info.device_type}/{info.browser}'
+        print(f"{device_type + '/' + browser:<28} -> {status}")
+
+    print(f"{failures} of {len(SAMPLE_USER_AGENTS)} user agents misclassified" if failures
+          else "All user agents classified correctly")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Reclassify stored user agents and backfill the normalized device columns.
+
+Streams over login history and activity logs in keyset batches, classifies
+each raw user agent with the memoized matcher and writes device_type,
+browser and os only for rows whose values change. Safe to re-run.
+
+Usage:
+    python scripts/reclassify_user_agents.py
+    python scripts/reclassify_user_agents.py --table activity --only-missing
+"""
+
+import sys
+import os
+import time
+import argparse
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import UserLoginHistory
+from app.models.activity import UserActivityLog
+from app.services.user_agent_service import user_agent_service
+
+TABLES = {'login_history': UserLoginHistory, 'activity': UserActivityLog}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill normalized device columns from stored user agents')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--only-missing', action='store_true', help='Only rows without a device type yet')
+    parser.add_argument('--table', choices=sorted(TABLES) + ['all'], default='all')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        names = sorted(TABLES) if args.table == 'all' else [args.table]
+        for name in names:
+            started = time.perf_counter()
+            result = user_agent_service.backfill_device_columns(TABLES[name], batch_size=args.batch_size,
+                                                                only_missing=args.only_missing)
+            elapsed = time.perf_counter() - started
+            print(f"{name}: {result['updated']} of {result['scanned']} rows updated in {elapsed:.2f}s")
+        print(f"user agent cache: {user_agent_service.cache_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Rebuild the daily revenue-by-country rollup.
+
+Run nightly after midnight UTC. By default the last three completed days are
+re-derived from orders, so refunds and late status changes are reflected;
+--since rebuilds everything from a given day (e.g. after a bulk correction).
+
+Usage:
+    python scripts/refresh_revenue_rollup.py
+    python scripts/refresh_revenue_rollup.py --days 7
+    python scripts/refresh_revenue_rollup.py --since 2024-01-01
+"""
+
+import sys
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.revenue_analytics_service import revenue_analytics_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the daily revenue-by-country rollup')
+    parser.add_argument('--days', type=int, default=3, help='Completed days to rebuild, ending yesterday')
+    parser.add_argument('--since', help='Rebuild from this day (YYYY-MM-DD) through yesterday')
+    args = parser.parse_args()
+
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    start = datetime.strptime(args.since, '%Y-%m-%d').date() if args.since else yesterday - timedelta(days=args.days - 1)
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        rows = revenue_analytics_service.refresh_rollup(start, yesterday)
+        print(f"rollup {start}..{yesterday}: {rows} country-day rows in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
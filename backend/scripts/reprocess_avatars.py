@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Build avatar thumbnails for existing profiles.
+
+Idempotent: profiles whose variants were already built from their current
+avatar are skipped, so the command can be re-run (or interrupted and
+resumed) safely. --force rebuilds everything, e.g. after AVATAR_SIZES changes.
+Avatars uploaded before content-addressed storage are imported into storage
+first when their file is still under uploads/avatars.
+
+Usage:
+    python scripts/reprocess_avatars.py
+    python scripts/reprocess_avatars.py --force --workers 4
+"""
+
+import sys
+import os
+import time
+import argparse
+from concurrent.futures import as_completed
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models.user_profile import UserProfile
+from app.services.file_storage_service import file_storage_service
+from app.services.profile_service import profile_service
+from app.services.avatar_pipeline import avatar_pipeline, PIL_AVAILABLE
+
+
+def import_legacy_avatar(profile):
+    """Move a pre-storage avatar file into content-addressed storage"""
+    path = os.path.join(profile_service.upload_folder, profile.avatar_filename)
+    if not os.path.exists(path):
+        return None
+    extension = profile.avatar_filename.rsplit('.', 1)[-1].lower()
+    with open(path, 'rb') as source:
+        stored = file_storage_service.save(source, max_size=profile_service.max_file_size,
+                                           mime_type=f'image/{"jpeg" if extension == "jpg" else extension}')
+    profile.avatar_content_hash = stored.content_hash
+    profile.avatar_url = f"/api/profile/avatars/{stored.content_hash}"
+    db.session.commit()
+    os.remove(path)
+    return stored.content_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build avatar thumbnails for existing profiles')
+    parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+    parser.add_argument('--workers', type=int, default=avatar_pipeline.max_workers)
+    args = parser.parse_args()
+
+    if not PIL_AVAILABLE:
+        print("Pillow is required: pip install Pillow")
+        return
+
+    app = create_app()
+    with app.app_context():
+        jobs = []
+        for profile in UserProfile.query.filter(UserProfile.avatar_filename.isnot(None)).all():
+            content_hash = profile.avatar_content_hash
+            if not content_hash:
+                content_hash = import_legacy_avatar(profile)
+                if not content_hash:
+                    print(f"  user {profile.user_id}: legacy avatar file missing, skipped")
+                    continue
+            if not args.force and (profile.avatar_variants or {}).get('source') == content_hash:
+                continue
+            jobs.append((profile.user_id, content_hash))
+
+        print(f"{len(jobs)} avatars to process with {args.workers} workers")
+        avatar_pipeline.max_workers = args.workers
+        started = time.perf_counter()
+        futures = {avatar_pipeline.submit(user_id, content_hash, force=args.force): user_id
+                   for user_id, content_hash in jobs}
+        processed = 0
+        for future in as_completed(futures):
+            if future.result():
+                processed += 1
+        avatar_pipeline.shutdown()
+
+        elapsed = time.perf_counter() - started
+        print(f"processed {processed}/{len(jobs)} in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
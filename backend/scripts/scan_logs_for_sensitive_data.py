@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Scan log files for card numbers and other sensitive data.
+
+Incremental: only bytes written since the previous run are read, so this is
+cheap to run from cron. The report is what /api/payments/pci/compliance-check
+returns as its log verdict.
+
+Usage:
+    python scripts/scan_logs_for_sensitive_data.py
+    python scripts/scan_logs_for_sensitive_data.py --workers 4 --log-dir /var/log/talaria
+"""
+
+import sys
+import os
+import argparse
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pci_log_scanner import PCILogScanner
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally scan logs for sensitive data')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes for large backlogs')
+    parser.add_argument('--log-dir', default='logs')
+    parser.add_argument('--state', default=None, help='Report/checkpoint file (default PCI_LOG_SCAN_STATE)')
+    args = parser.parse_args()
+
+    scanner = PCILogScanner(log_dir=args.log_dir, state_path=args.state)
+    report = scanner.scan(workers=args.workers)
+    if report.get('running'):
+        print('another scan is running')
+        return
+    mib = report['bytes_scanned'] / 1024 / 1024
+    rate = mib / report['elapsed_seconds'] if report['elapsed_seconds'] else 0
+    print(f"scanned {mib:.1f} MiB in {report['elapsed_seconds']}s ({rate:.0f} MiB/s) with {args.workers} workers")
+    for name, entry in sorted(report['files'].items()):
+        found = {kind: count for kind, count in entry['counts'].items() if count}
+        print(f"  {name}: checkpoint {entry['offset']}{'  ' + str(found) if found else ''}")
+    print(f"sensitive data found: {report['sensitive_data_found']} {report['totals']}")
+    sys.exit(1 if report['sensitive_data_found'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+End-to-end check of the content-addressed file storage.
+
+Runs the same scenario against each backend on a throwaway SQLite database:
+streaming writes with size limits, deduplication and reference counting,
+blob removal with the last reference, and downloads (Range requests for the
+local backend, presigned redirects for S3).
+
+The S3 backend runs against LocalS3StandIn, a directory-backed client that
+implements the S3 calls the backend makes. Pass --s3-endpoint to run it
+against a real S3-compatible service instead (e.g. MinIO; needs boto3).
+
+Usage:
+    python scripts/storage_check.py
+    python scripts/storage_check.py --s3-endpoint http://localhost:9000 --s3-bucket talaria-test
+"""
+
+import sys
+import os
+import io
+import shutil
+import argparse
+import tempfile
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class LocalS3StandIn:
+    """Directory-backed stand-in for the boto3 S3 client calls used by S3StorageBackend"""
+
+    class NotFound(Exception):
+        response = {'Error': {'Code': '404'}}
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise self.NotFound()
+        return {'ContentLength': os.path.getsize(path)}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(Filename, path)
+
+    def get_object(self, Bucket, Key):
+        self.head_object(Bucket, Key)
+        return {'Body': open(self._path(Bucket, Key), 'rb')}
+
+    def delete_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.invalid/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def check(condition, message):
+    print(f"  {'ok ' if condition else 'FAIL'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def run_scenario(app, service, label):
+    from app import db
+    from app.models.stored_file import StoredFile
+    from app.services.file_storage_service import FileTooLargeError, storage_key
+
+    print(f"\n{label}")
+    payload = os.urandom(300 * 1024)
+
+    with app.test_request_context():
+        first = service.save(io.BytesIO(payload), max_size=1024 * 1024, mime_type='application/pdf')
+        db.session.commit()
+        second = service.save(io.BytesIO(payload), max_size=1024 * 1024, mime_type='application/pdf')
+        db.session.commit()
+        check(first.content_hash == second.content_hash, 'identical uploads share one digest')
+        check(StoredFile.query.count() == 1, 'one stored_files row for identical uploads')
+        check(service.get(first.content_hash).ref_count == 2, 'reference count is 2')
+        check(service.backend.exists(storage_key(first.content_hash)), 'blob exists in backend')
+
+        try:
+            service.save(io.BytesIO(payload), max_size=100 * 1024)
+            check(False, 'oversized upload rejected')
+        except FileTooLargeError:
+            db.session.rollback()
+            check(True, 'oversized upload rejected while streaming')
+        leftovers = [name for name in os.listdir(service.backend.temp_dir) if name.startswith('upload-')]
+        check(not leftovers, 'no temporary files left behind')
+
+        with service.open(first.content_hash) as blob:
+            check(blob.read() == payload, 'stored bytes round-trip')
+
+        response = service.send(first.content_hash, download_name='report.pdf', mime_type='application/pdf')
+        if service.backend.local_path(storage_key(first.content_hash)):
+            check(response.status_code == 200, 'download served')
+        else:
+            check(response.status_code == 302, 'download redirects to presigned URL')
+        response.close()
+
+    if service.backend.local_path(storage_key(first.content_hash)):
+        with app.test_request_context(headers={'Range': 'bytes=100-199'}):
+            response = service.send(first.content_hash, download_name='report.pdf', mime_type='application/pdf')
+            check(response.status_code == 206, 'Range request answered with 206')
+            response.close()
+
+    with app.test_request_context():
+        service.release(first.content_hash)
+        check(service.get(first.content_hash).ref_count == 1, 'release drops one reference')
+        service.release(first.content_hash)
+        check(service.get(first.content_hash) is None, 'last release deletes the row')
+        check(not service.backend.exists(storage_key(first.content_hash)), 'last release deletes the blob')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check content-addressed file storage backends')
+    parser.add_argument('--s3-endpoint', help='Run the S3 backend against this endpoint instead of the stand-in')
+    parser.add_argument('--s3-bucket', default='talaria-storage-check')
+    args = parser.parse_args()
+
+    # The testing config reads its database URL at import time
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.environ['TEST_DATABASE_URL'] = f'sqlite:///{db_path}'
+    work_dir = tempfile.mkdtemp(prefix='storage-check-')
+    try:
+        from app import create_app, db
+        from app.services.file_storage_service import FileStorageService, LocalStorageBackend, S3StorageBackend
+
+        app = create_app('testing')
+        with app.app_context():
+            db.create_all()
+
+            local = FileStorageService(LocalStorageBackend(os.path.join(work_dir, 'local')))
+            run_scenario(app, local, 'local backend')
+
+            if args.s3_endpoint:
+                s3 = FileStorageService(S3StorageBackend(args.s3_bucket, prefix='check', endpoint_url=args.s3_endpoint))
+                label = f's3 backend ({args.s3_endpoint})'
+            else:
+                stand_in = LocalS3StandIn(os.path.join(work_dir, 's3'))
+                s3 = FileStorageService(S3StorageBackend(args.s3_bucket, prefix='check', client=stand_in))
+                label = 's3 backend (local stand-in)'
+            run_scenario(app, s3, label)
+
+            db.session.remove()
+            db.drop_all()
+        print('\nall checks passed')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tag sentiment and urgency on all open support tickets.
+
+Classifies each open ticket's subject and latest customer message with the
+local classifier, in keyset batches with one UPDATE per batch. Safe to re-run.
+--use-remote sends low-confidence tickets to the remote model (needs
+OPENAI_API_KEY).
+
+Usage:
+    python scripts/tag_ticket_sentiment.py
+    python scripts/tag_ticket_sentiment.py --batch-size 1000 --use-remote
+"""
+
+import sys
+import os
+import time
+import argparse
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.ticket_sentiment_service import ticket_sentiment_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tag sentiment on open support tickets')
+    parser.add_argument('--batch-size', type=int, default=ticket_sentiment_service.batch_size)
+    parser.add_argument('--use-remote', action='store_true', help='Re-check low-confidence tickets with the remote model')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        result = ticket_sentiment_service.tag_open_tickets(batch_size=args.batch_size, use_remote=args.use_remote)
+        elapsed = time.perf_counter() - started
+        print(f"tagged {result['tagged']} open tickets in {elapsed:.2f}s ({result['remote']} by the remote model)")
+
+
+if __name__ == '__main__':
+    main()